@@ -1,10 +1,13 @@
 import uvicorn
 
+from test_project_edt.metrics import clear_multiprocess_dir
 from test_project_edt.settings import settings
 
 
 def main() -> None:
     """Entrypoint of the application."""
+    # Values of the workers of a previous run would be aggregated otherwise.
+    clear_multiprocess_dir()
     uvicorn.run(
         "test_project_edt.web.application:get_app",
         workers=settings.workers_count,
@@ -0,0 +1,373 @@
+"""
+Load a synthetic set of restaurants into the database of the settings.
+
+The restaurants are clustered around the centers of real cities, more of
+them around the most populated ones, and look like the seed data. The same
+amount and seed always produce the same restaurants::
+
+    python -m test_project_edt.benchmarks.dataset --restaurants 1000000
+
+The restaurants already stored are replaced unless `--append` is given.
+Running workers are told to drop their caches once the load finishes.
+"""
+import argparse
+import asyncio
+import functools
+import math
+import random
+import sys
+import time
+import uuid
+from typing import Any, Iterator, List, NamedTuple, Tuple
+
+from psycopg import AsyncConnection
+
+from test_project_edt.db.change_listener import CHANGES_CHANNEL
+from test_project_edt.repository.pyscopg_restaurant_repository import (
+    RESTAURANT_COLUMNS,
+    RESTAURANT_FIELDS,
+)
+from test_project_edt.settings import settings
+
+
+class City(NamedTuple):
+    name: str
+    state: str
+    latitude: float
+    longitude: float
+    # Inhabitants of the metropolitan area, in millions
+    population: float
+
+
+# Name, state, latitude, longitude and population of the cities.
+CITIES_TABLE = """
+Ciudad de México;Ciudad de México;19.4326;-99.1332;21.8
+Guadalajara;Jalisco;20.6597;-103.3496;5.3
+Monterrey;Nuevo León;25.6866;-100.3161;5.3
+Puebla;Puebla;19.0414;-98.2063;3.2
+Toluca;México;19.2826;-99.6557;2.4
+Tijuana;Baja California;32.5149;-117.0382;2.2
+León;Guanajuato;21.1250;-101.6860;1.9
+Querétaro;Querétaro;20.5888;-100.3899;1.6
+Ciudad Juárez;Chihuahua;31.6904;-106.4245;1.5
+Mérida;Yucatán;20.9674;-89.5926;1.3
+San Luis Potosí;San Luis Potosí;22.1565;-100.9855;1.2
+Aguascalientes;Aguascalientes;21.8853;-102.2916;1.1
+Mexicali;Baja California;32.6245;-115.4523;1.0
+Culiacán;Sinaloa;24.8091;-107.3940;1.0
+Chihuahua;Chihuahua;28.6320;-106.0691;1.0
+Hermosillo;Sonora;29.0729;-110.9559;0.9
+Cancún;Quintana Roo;21.1619;-86.8515;0.9
+Veracruz;Veracruz;19.1738;-96.1342;0.9
+Acapulco;Guerrero;16.8531;-99.8237;0.9
+Oaxaca;Oaxaca;17.0732;-96.7266;0.7
+"""
+
+
+def _city(line: str) -> City:
+    name, state, numbers = line.split(";", 2)
+    return City(name, state, *map(float, numbers.split(";")))
+
+
+CITIES = tuple(_city(line) for line in CITIES_TABLE.strip().splitlines())
+
+FIRST_NAMES = (
+    "Alejandro",
+    "Ana",
+    "Carlos",
+    "Daniela",
+    "Eduardo",
+    "Fernanda",
+    "Gabriel",
+    "Guadalupe",
+    "Jorge",
+    "José",
+    "Juan",
+    "Laura",
+    "Luis",
+    "María",
+    "Mariana",
+    "Miguel",
+    "Patricia",
+    "Ricardo",
+    "Rosa",
+    "Sofía",
+)
+SURNAMES = (
+    "Aguilar",
+    "Álvarez",
+    "Castillo",
+    "Chávez",
+    "Cruz",
+    "Díaz",
+    "Flores",
+    "García",
+    "Gómez",
+    "González",
+    "Gutiérrez",
+    "Hernández",
+    "Jiménez",
+    "López",
+    "Martínez",
+    "Mendoza",
+    "Morales",
+    "Moreno",
+    "Ortiz",
+    "Pérez",
+    "Ramírez",
+    "Reyes",
+    "Rodríguez",
+    "Romero",
+    "Ruiz",
+    "Sánchez",
+    "Torres",
+    "Vázquez",
+)
+STREET_KINDS = ("Calle", "Avenida", "Privada", "Callejón", "Entrada", "Cerrada")
+TOP_LEVEL_DOMAINS = ("com", "com.mx", "net", "org")
+EMAIL_DOMAINS = ("gmail.com", "hotmail.com", "yahoo.com", "outlook.com")
+# Share of the restaurants with each rating, from 0 to 4.
+RATING_WEIGHTS = (0.08, 0.14, 0.26, 0.32, 0.2)
+# Share of the restaurants away from the center, in the outskirts.
+OUTSKIRTS_SHARE = 0.1
+# Spread in degrees around the smallest cities, and its growth with the
+# square root of the population.
+BASE_SPREAD = 0.02
+POPULATION_SPREAD = 0.03
+UUID_BITS = 128
+MAX_STREET_NUMBER = 100000
+PHONE_GROUPS = 3
+COORDINATE_DIGITS = 7
+# Share of the searches for a surname, the others look for a city.
+SURNAME_SEARCH_SHARE = 0.5
+
+# Restaurants generated, and copied to the database, at once. The values
+# depend on it, so it must not change for the dataset to stay the same.
+CHUNK_SIZE = 100000
+DEFAULT_RESTAURANTS = 100000
+
+COPY_QUERY = f"COPY restaurants ({RESTAURANT_COLUMNS}) FROM STDIN"
+
+# Values of a restaurant in the order of RESTAURANT_FIELDS.
+Row = Tuple[Any, ...]
+
+
+def city_spread(city: City) -> float:
+    """
+    Standard deviation in degrees of the restaurants around a city.
+
+    :param city: the city.
+    :return: about 3km for the smallest cities and 15km for the largest ones.
+    """
+    return BASE_SPREAD + POPULATION_SPREAD * math.sqrt(city.population)
+
+
+def _company(rng: random.Random) -> Tuple[str, str]:
+    """Name of a restaurant along with the domain of its site."""
+    first, second, third = rng.sample(SURNAMES, 3)
+    name = rng.choice(
+        (
+            f"{first}, {second} and {third}",
+            f"{first} - {second}",
+            f"{first} and Sons",
+            f"Grupo {first}",
+        ),
+    )
+    domain = _domain(first, second)
+    return name, ".".join((domain, rng.choice(TOP_LEVEL_DOMAINS)))
+
+
+@functools.lru_cache(maxsize=None)
+def _domain(first: str, second: str) -> str:
+    return "".join(
+        character
+        for character in f"{first}{second}".lower()
+        if character.isascii() and character.isalpha()
+    )
+
+
+def _identifier(rng: random.Random) -> str:
+    return str(uuid.UUID(int=rng.getrandbits(UUID_BITS), version=4))
+
+
+def _email(rng: random.Random) -> str:
+    first_name = rng.choice(FIRST_NAMES)
+    surname = rng.choice(SURNAMES)
+    number = rng.randrange(100)
+    domain = rng.choice(EMAIL_DOMAINS)
+    return f"{first_name}_{surname}{number}@{domain}"
+
+
+def _phone(rng: random.Random) -> str:
+    groups = [rng.randrange(100, 1000) for _ in range(PHONE_GROUPS)]
+    return " ".join(map(str, groups))
+
+
+def _street(rng: random.Random) -> str:
+    number = rng.randrange(1, MAX_STREET_NUMBER)
+    first_name = rng.choice(FIRST_NAMES)
+    kind = rng.choice(STREET_KINDS)
+    return f"{number} {first_name} {kind}"
+
+
+def _restaurant(rng: random.Random, city: City, rating: int) -> Row:
+    """Restaurant around a city, the values are drawn in a fixed order."""
+    spread = city_spread(city)
+    if rng.random() < OUTSKIRTS_SHARE:
+        spread *= 3
+    name, domain = _company(rng)
+    values = {
+        "id": _identifier(rng),
+        "rating": rating,
+        "name": name,
+        "site": f"https://{domain}",
+        "email": _email(rng),
+        "phone": _phone(rng),
+        "street": _street(rng),
+        "city": city.name,
+        "state": city.state,
+        "lat": round(rng.gauss(city.latitude, spread), COORDINATE_DIGITS),
+        "lng": round(rng.gauss(city.longitude, spread), COORDINATE_DIGITS),
+    }
+    return tuple(values[field] for field in RESTAURANT_FIELDS)
+
+
+def search_text(rng: random.Random) -> str:
+    """
+    Text that a client could search the dataset for.
+
+    :param rng: random generator.
+    :return: the start of a surname in the names, or a city with a typo.
+    """
+    if rng.random() < SURNAME_SEARCH_SHARE:
+        surname = rng.choice(SURNAMES)
+        return surname[: rng.randint(3, len(surname))]
+    city = rng.choice(CITIES).name
+    typo = rng.randrange(1, len(city) - 1)
+    return city[:typo] + city[typo + 1 :]
+
+
+def restaurant_chunk(seed: int, chunk: int, size: int) -> List[Row]:
+    """
+    Generate a chunk of restaurants.
+
+    Every chunk has its own random generator, so any chunk can be
+    generated without the ones before it.
+
+    :param seed: seed of the dataset.
+    :param chunk: position of the chunk in the dataset.
+    :param size: restaurants of the chunk, up to CHUNK_SIZE.
+    :return: the restaurants with the values in the order of RESTAURANT_FIELDS.
+    """
+    rng = random.Random(f"{seed}:{chunk}")  # noqa: S311
+    cities = rng.choices(CITIES, [city.population for city in CITIES], k=size)
+    ratings = rng.choices(range(len(RATING_WEIGHTS)), RATING_WEIGHTS, k=size)
+    return [_restaurant(rng, city, rating) for city, rating in zip(cities, ratings)]
+
+
+def restaurant_chunks(count: int, seed: int) -> Iterator[List[Row]]:
+    """
+    Generate the restaurants of a dataset, a chunk at a time.
+
+    :param count: amount of restaurants.
+    :param seed: seed of the dataset.
+    :yield: chunks of CHUNK_SIZE restaurants, the last one may be smaller.
+    """
+    yield from (
+        restaurant_chunk(seed, chunk, min(CHUNK_SIZE, count - start))
+        for chunk, start in enumerate(range(0, count, CHUNK_SIZE))
+    )
+
+
+async def _truncate(conn: AsyncConnection[Any]) -> None:
+    # Truncating doesn't run the triggers, the aggregates go as well.
+    await conn.execute(
+        "TRUNCATE restaurants, restaurant_cell_statistics, "
+        "restaurant_region_statistics",
+    )
+    await conn.commit()
+
+
+async def _copy(conn: AsyncConnection[Any], rows: List[Row]) -> None:
+    async with conn.cursor() as cursor:
+        async with cursor.copy(COPY_QUERY) as copy:
+            for row in rows:
+                await copy.write_row(row)
+    await conn.commit()
+
+
+async def _publish(conn: AsyncConnection[Any]) -> None:
+    """Tell the workers about the load and refresh the planner statistics."""
+    await conn.execute(
+        "SELECT pg_notify(%(channel)s, json_build_object("
+        "'seq', (SELECT coalesce(max(seq), 0) FROM restaurant_changes), "
+        "'op', 'BULK')::TEXT)",
+        params={"channel": CHANGES_CHANNEL},
+    )
+    await conn.execute(
+        "ANALYZE restaurants, restaurant_cell_statistics, "
+        "restaurant_region_statistics",
+    )
+    await conn.commit()
+
+
+async def load_dataset(
+    conn: AsyncConnection[Any],
+    count: int,
+    seed: int,
+    replace: bool = True,
+) -> float:
+    """
+    Copy a dataset into the restaurants table.
+
+    Every chunk is committed on its own and logged as a bulk change,
+    another one is published once the load is done.
+
+    :param conn: connection to the database.
+    :param count: amount of restaurants.
+    :param seed: seed of the dataset.
+    :param replace: whether the restaurants already stored are removed.
+    :return: seconds taken to load the dataset.
+    """
+    start = time.perf_counter()
+    if replace:
+        await _truncate(conn)
+
+    loaded = 0
+    for rows in restaurant_chunks(count, seed):
+        await _copy(conn, rows)
+        loaded += len(rows)
+        print(f"{loaded} restaurants loaded", file=sys.stderr)  # noqa: WPS421
+
+    await _publish(conn)
+    return time.perf_counter() - start
+
+
+async def run(count: int, seed: int, replace: bool) -> float:
+    """
+    Load a dataset into the database of the settings.
+
+    :return: seconds taken to load the dataset.
+    """
+    conn = await AsyncConnection.connect(str(settings.db_url))
+    async with conn:
+        return await load_dataset(conn, count, seed, replace=replace)
+
+
+def main() -> None:
+    """Entrypoint of the generator."""
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--restaurants", type=int, default=DEFAULT_RESTAURANTS)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--append", action="store_true")
+    args = parser.parse_args()
+    elapsed = asyncio.run(run(args.restaurants, args.seed, not args.append))
+    rate = args.restaurants / elapsed
+    print(  # noqa: WPS421
+        f"{args.restaurants} restaurants loaded in {elapsed:.1f}s "
+        f"({rate:.0f} per second)",
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+"""
+Compare the CPU spent per request with and without the JSON passthrough.
+
+The application runs in process, behind an ASGI client, against the
+database of the settings::
+
+    python -m test_project_edt.benchmarks.json_passthrough --limit 1000
+
+The CPU time of the client is included in both measures, so the
+difference between them is what the passthrough saves.
+"""
+import argparse
+import asyncio
+import time
+from typing import Dict
+
+import orjson
+from httpx import AsyncClient
+from psycopg.rows import dict_row
+from psycopg_pool import AsyncConnectionPool
+
+from test_project_edt.db.dependencies import get_db_pool
+from test_project_edt.settings import settings
+from test_project_edt.web.application import get_app
+
+# Requests measured in every mode by default.
+DEFAULT_REQUESTS = 200
+
+
+async def measure(
+    client: AsyncClient,
+    url: str,
+    params: Dict[str, int],
+    requests: int,
+) -> Dict[str, float]:
+    """
+    Send the same request many times.
+
+    :return: CPU and wall milliseconds per request.
+    """
+    for _ in range(min(requests, 10)):
+        await client.get(url, params=params)
+
+    cpu_start, wall_start = time.process_time(), time.perf_counter()
+    for _ in range(requests):
+        response = await client.get(url, params=params)
+        response.raise_for_status()
+    cpu_end, wall_end = time.process_time(), time.perf_counter()
+    return {
+        "cpu_ms": (cpu_end - cpu_start) * 1000 / requests,
+        "wall_ms": (wall_end - wall_start) * 1000 / requests,
+    }
+
+
+async def measure_modes(
+    client: AsyncClient,
+    url: str,
+    requests: int,
+    limit: int,
+) -> Dict[str, Dict[str, float]]:
+    """
+    Measure the restaurants list with and without the passthrough.
+
+    :return: measures by mode.
+    """
+    results = {}
+    for passthrough in (False, True):
+        settings.restaurants_list_json_passthrough = passthrough
+        mode = "passthrough" if passthrough else "models"
+        results[mode] = await measure(client, url, {"limit": limit}, requests)
+    return results
+
+
+async def run(requests: int, limit: int) -> Dict[str, Dict[str, float]]:
+    """
+    Measure the restaurants list in both modes.
+
+    :return: measures by mode.
+    """
+    pool = AsyncConnectionPool(
+        conninfo=str(settings.db_url),
+        kwargs={"row_factory": dict_row},
+        open=False,
+    )
+    await pool.open(wait=True)
+    app = get_app()
+    app.dependency_overrides[get_db_pool] = lambda: pool
+    try:  # noqa: WPS501
+        async with AsyncClient(app=app, base_url="http://benchmark") as client:
+            return await measure_modes(
+                client,
+                app.url_path_for("get_all_restaurants"),
+                requests,
+                limit,
+            )
+    finally:
+        await pool.close()
+
+
+def main() -> None:
+    """Entrypoint of the benchmark."""
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--requests", type=int, default=DEFAULT_REQUESTS)
+    parser.add_argument("--limit", type=int, default=1000)
+    args = parser.parse_args()
+    results = asyncio.run(run(args.requests, args.limit))
+    print(orjson.dumps(results, option=orjson.OPT_INDENT_2).decode())  # noqa: WPS421
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,798 @@
+"""
+Drive the restaurants API at fixed concurrency levels and report latencies.
+
+The restaurants are seeded into the database of the settings, then the
+requests of a scenario are sent by a fixed amount of concurrent clients,
+one level after the other::
+
+    python -m test_project_edt.benchmarks.load --scenario mixed \
+        --concurrency 1 8 32 --duration 10 --output report.json
+
+The application runs in process unless `--base-url` points to a server
+already running. Every endpoint is reported with its throughput and its
+p50, p95 and p99 latencies. Given a `--baseline` report, the endpoints
+that got slower than the tolerance are listed and the exit code is 1.
+"""
+import argparse
+import asyncio
+import functools
+import math
+import random
+import sys
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from typing import (  # noqa: WPS235
+    Any,
+    AsyncIterator,
+    Callable,
+    Collection,
+    Deque,
+    Dict,
+    Iterator,
+    List,
+    Optional,
+    Sequence,
+    Tuple,
+)
+
+import orjson
+from httpx import AsyncClient, Limits, Response
+from psycopg.rows import dict_row
+from psycopg_pool import AsyncConnectionPool
+
+from test_project_edt.benchmarks.dataset import CITIES, search_text
+from test_project_edt.db.models.restaurant import Restaurant
+from test_project_edt.entities.restaurant import ImportConflictPolicy
+from test_project_edt.repository.pyscopg_restaurant_repository import (
+    PsycopgRestaurantRepository,
+)
+from test_project_edt.repository.tile_cache_repository import tiles_around
+from test_project_edt.settings import settings
+
+SEED_ID_PREFIX = "benchmark-"
+PERCENTILES = (50, 95, 99)
+# Latency changes smaller than this are noise, whatever the tolerance.
+MIN_LATENCY_DELTA_MS = 1.0
+DEFAULT_RESTAURANTS = 10000
+
+# Numbers of the random restaurants and of the ids that don't exist.
+MAX_NUMBER = 1000000
+STREETS = 500
+# Ids of the bulk imports, so that the upserts replace some of them.
+BULK_IDS = 10000
+# Cursors kept, and the share of the pages that follow one of them.
+KEPT_CURSORS = 100
+FOLLOWING_PAGES_SHARE = 0.5
+TILE_ZOOM = 13
+STATISTICS_RADII = (500, 2000, 10000)
+BATCH_RADII = (500, 1000, 5000)
+# Half of the side in degrees of the boxes of the exports and of the
+# viewport of a city map.
+EXPORT_HALF_SIDE = 0.01
+CITY_HALF_SIDE = 0.25
+
+Report = Dict[str, Any]
+# Measures of an operation at a concurrency level.
+Measures = Dict[str, float]
+# Arguments of `AsyncClient.build_request`.
+RequestSpec = Dict[str, Any]
+
+
+def request_spec(method: str, url: str, **options: Any) -> RequestSpec:
+    """
+    Describe a request, the client builds it later.
+
+    :param method: HTTP method.
+    :param url: path of the endpoint.
+    :param options: other arguments of `AsyncClient.build_request`.
+    :return: the description of the request.
+    """
+    return {"method": method, "url": url, **options}
+
+
+@dataclass
+class Workload:
+    """State shared by the clients of a run."""
+
+    rng: random.Random
+    restaurant_ids: List[str]
+    # Restaurants created by the run, the deletes only remove these.
+    created_ids: List[str] = field(default_factory=list)
+    # Cursors returned by the list, so following pages are requested too.
+    cursors: Deque[str] = field(
+        default_factory=functools.partial(deque, maxlen=KEPT_CURSORS),
+    )
+
+    def location(self, spread: float = 0.05) -> Dict[str, float]:
+        """Random point close to one of the cities."""
+        city = self.rng.choice(CITIES)
+        return {
+            "latitude": round(city.latitude + self.rng.gauss(0, spread), 6),
+            "longitude": round(city.longitude + self.rng.gauss(0, spread), 6),
+        }
+
+    def restaurant(self) -> Dict[str, Any]:
+        """Random valid body of a restaurant."""
+        city = self.rng.choice(CITIES)
+        number = self.rng.randrange(MAX_NUMBER)
+        street = number % STREETS
+        return {
+            "name": f"Restaurant {number}",
+            "site": f"https://restaurant-{number}.example.com",
+            "email": f"contact@restaurant-{number}.example.com",
+            "phone": f"+52 {number:010d}",
+            "street": f"Calle {street}",
+            "city": city.name,
+            "state": city.state,
+            "lat": city.latitude + self.rng.gauss(0, 0.1),
+            "lng": city.longitude + self.rng.gauss(0, 0.1),
+            "rating": self.rng.randint(0, 4),
+        }
+
+
+@dataclass(frozen=True)
+class Operation:
+    """
+    A kind of request sent by the clients.
+
+    `build` returns None when the request can't be sent yet, then
+    another operation is chosen. `after` keeps what the following
+    requests need from the response.
+    """
+
+    build: Callable[[Workload], Optional[RequestSpec]]
+    after: Optional[Callable[[Workload, Response], None]] = None
+    expected_statuses: Collection[int] = (200, 201, 204)
+
+
+def _keep_cursor(workload: Workload, response: Response) -> None:
+    cursor = response.headers.get("X-Next-Cursor")
+    if cursor:
+        workload.cursors.append(cursor)
+
+
+def _build_page(workload: Workload) -> RequestSpec:
+    params: Dict[str, Any] = {"limit": 50}
+    if workload.cursors and workload.rng.random() < FOLLOWING_PAGES_SHARE:
+        params["cursor"] = workload.rng.choice(workload.cursors)
+    return request_spec("GET", "/api/restaurants", params=params)
+
+
+def _build_page_by_rating(workload: Workload) -> RequestSpec:
+    return request_spec(
+        "GET",
+        "/api/restaurants",
+        params={"limit": 50, "order_by": "rating", "asc_or_desc": "DESC"},
+    )
+
+
+def _build_detail(workload: Workload) -> RequestSpec:
+    restaurant_id = workload.rng.choice(workload.restaurant_ids)
+    return request_spec("GET", f"/api/restaurants/{restaurant_id}")
+
+
+def _build_missing_detail(workload: Workload) -> RequestSpec:
+    number = workload.rng.randrange(MAX_NUMBER)
+    return request_spec("GET", f"/api/restaurants/missing-{number}")
+
+
+def _build_search(workload: Workload) -> RequestSpec:
+    return request_spec(
+        "GET",
+        "/api/restaurants/search",
+        params={"q": search_text(workload.rng)},
+    )
+
+
+def _build_nearest(workload: Workload) -> RequestSpec:
+    return request_spec(
+        "GET",
+        "/api/restaurants/nearest",
+        params={**workload.location(), "k": 20},
+    )
+
+
+def _build_statistics(workload: Workload) -> RequestSpec:
+    return request_spec(
+        "GET",
+        "/api/restaurants/statistics",
+        params={
+            **workload.location(),
+            "radius": workload.rng.choice(STATISTICS_RADII),
+        },
+    )
+
+
+def _build_statistics_batch(workload: Workload) -> RequestSpec:
+    points = [{**workload.location(), "radii": BATCH_RADII} for _ in range(10)]
+    return request_spec(
+        "POST",
+        "/api/restaurants/statistics/batch",
+        content=orjson.dumps({"points": points}),
+        headers={"content-type": "application/json"},
+    )
+
+
+def _bbox_around(workload: Workload, half_side: float) -> str:
+    location = workload.location()
+    bbox = (
+        location["longitude"] - half_side,
+        location["latitude"] - half_side,
+        location["longitude"] + half_side,
+        location["latitude"] + half_side,
+    )
+    return ",".join(f"{value:.6f}" for value in bbox)
+
+
+def _build_statistics_by_region(workload: Workload) -> RequestSpec:
+    return request_spec(
+        "GET",
+        "/api/restaurants/statistics/by-region",
+        params={"level": workload.rng.choice(("state", "city"))},
+    )
+
+
+def _build_clusters(workload: Workload) -> RequestSpec:
+    # About the viewport of a city map.
+    return request_spec(
+        "GET",
+        "/api/restaurants/clusters",
+        params={"bbox": _bbox_around(workload, CITY_HALF_SIDE), "zoom": 11},
+    )
+
+
+def _build_export(workload: Workload) -> RequestSpec:
+    return request_spec(
+        "GET",
+        "/api/restaurants/export",
+        params={"bbox": _bbox_around(workload, EXPORT_HALF_SIDE)},
+    )
+
+
+def _build_tile(workload: Workload) -> RequestSpec:
+    # Tiles of the city maps, the same ones are requested again and again.
+    location = workload.location()
+    tile = next(
+        tile
+        for tile in tiles_around(location["latitude"], location["longitude"], 0)
+        if tile.zoom == TILE_ZOOM
+    )
+    return request_spec(
+        "GET",
+        f"/api/restaurants/tiles/{TILE_ZOOM}/{tile.column}/{tile.row}.mvt",
+    )
+
+
+def _build_bulk(workload: Workload) -> RequestSpec:
+    restaurants = []
+    for _ in range(100):
+        restaurant = workload.restaurant()
+        number = workload.rng.randrange(BULK_IDS)
+        restaurant["id"] = f"{SEED_ID_PREFIX}bulk-{number}"
+        restaurants.append(orjson.dumps(restaurant))
+    return request_spec(
+        "POST",
+        "/api/restaurants/bulk",
+        params={"on_conflict": "upsert"},
+        content=b"\n".join(restaurants),
+        headers={"content-type": "application/x-ndjson"},
+    )
+
+
+def _build_create(workload: Workload) -> RequestSpec:
+    return request_spec(
+        "POST",
+        "/api/restaurants",
+        content=orjson.dumps(workload.restaurant()),
+        headers={"content-type": "application/json"},
+    )
+
+
+def _keep_created(workload: Workload, response: Response) -> None:
+    workload.created_ids.append(response.json()["id"])
+
+
+def _build_delete(workload: Workload) -> Optional[RequestSpec]:
+    if not workload.created_ids:
+        return None
+    restaurant_id = workload.created_ids.pop(
+        workload.rng.randrange(len(workload.created_ids)),
+    )
+    return request_spec("DELETE", f"/api/restaurants/{restaurant_id}")
+
+
+def _build_update(workload: Workload) -> RequestSpec:
+    restaurant_id = workload.rng.choice(workload.restaurant_ids)
+    return request_spec(
+        "PATCH",
+        f"/api/restaurants/{restaurant_id}",
+        content=orjson.dumps({"rating": workload.rng.randint(0, 4)}),
+        headers={"content-type": "application/json"},
+    )
+
+
+OPERATIONS: Dict[str, Operation] = {
+    "list": Operation(build=_build_page, after=_keep_cursor),
+    "list_by_rating": Operation(build=_build_page_by_rating),
+    "detail": Operation(build=_build_detail),
+    "detail_missing": Operation(
+        build=_build_missing_detail,
+        expected_statuses=(404,),
+    ),
+    "search": Operation(build=_build_search),
+    "nearest": Operation(build=_build_nearest),
+    "clusters": Operation(build=_build_clusters),
+    "tile": Operation(build=_build_tile),
+    "statistics": Operation(build=_build_statistics),
+    "statistics_batch": Operation(build=_build_statistics_batch),
+    "statistics_by_region": Operation(build=_build_statistics_by_region),
+    "export": Operation(build=_build_export),
+    "create": Operation(build=_build_create, after=_keep_created),
+    "bulk": Operation(build=_build_bulk),
+    "update": Operation(build=_build_update),
+    "delete": Operation(build=_build_delete),
+}
+
+
+@dataclass(frozen=True)
+class Scenario:
+    """Mix of operations, by the weight of each one in the traffic."""
+
+    description: str
+    mix: Dict[str, float]
+
+    def choose(self, rng: random.Random) -> str:
+        """Random operation, by their weights."""
+        operations, weights = zip(*self.mix.items())
+        return rng.choices(operations, weights)[0]
+
+
+SCENARIOS: Dict[str, Scenario] = {
+    "reads": Scenario(
+        description="Only the read endpoints, evenly",
+        mix={
+            "list": 1,
+            "list_by_rating": 1,
+            "detail": 1,
+            "detail_missing": 1,
+            "search": 1,
+            "nearest": 1,
+            "clusters": 1,
+            "tile": 1,
+            "statistics": 1,
+            "statistics_batch": 1,
+            "statistics_by_region": 1,
+            "export": 1,
+        },
+    ),
+    "mixed": Scenario(
+        description="Mostly lookups and statistics, with a few writes",
+        mix={
+            "list": 15,
+            "detail": 40,
+            "detail_missing": 5,
+            "statistics": 25,
+            "statistics_batch": 3,
+            "export": 1,
+            "create": 4,
+            "update": 4,
+            "delete": 3,
+        },
+    ),
+    "writes": Scenario(
+        description="Only the write endpoints",
+        mix={"create": 4, "update": 4, "delete": 3, "bulk": 1},
+    ),
+}
+
+
+def percentile(sorted_values: Sequence[float], rank: float) -> float:
+    """
+    Nearest rank percentile of sorted values.
+
+    :param sorted_values: the values, in ascending order.
+    :param rank: the percentile, from 0 to 100.
+    :return: the value of the percentile, 0 when there are no values.
+    """
+    if not sorted_values:
+        return 0
+    position = math.ceil(rank / 100 * len(sorted_values)) - 1
+    return sorted_values[min(max(position, 0), len(sorted_values) - 1)]
+
+
+def measure(latencies: List[float], errors: int, elapsed: float) -> Measures:
+    """
+    Measure the requests of an operation.
+
+    :param latencies: milliseconds taken by every request.
+    :param errors: requests answered with an unexpected status.
+    :param elapsed: seconds the level lasted.
+    :return: the measures of the operation.
+    """
+    sorted_latencies = sorted(latencies)
+    measures = {
+        "requests": len(latencies),
+        "errors": errors,
+        "throughput": len(latencies) / elapsed,
+        "mean_ms": sum(latencies) / len(latencies) if latencies else 0,
+        "max_ms": sorted_latencies[-1] if latencies else 0,
+    }
+    for rank in PERCENTILES:
+        measures[f"p{rank}_ms"] = percentile(sorted_latencies, rank)
+    return measures
+
+
+def summarize(
+    latencies: Dict[str, List[float]],
+    errors: Dict[str, int],
+    elapsed: float,
+) -> Dict[str, Measures]:
+    """
+    Build the report of a concurrency level.
+
+    :param latencies: milliseconds taken by every request, by operation.
+    :param errors: requests answered with an unexpected status, by operation.
+    :param elapsed: seconds the level lasted.
+    :return: the measures of every operation, and of all of them as `total`.
+    """
+    summary = {
+        name: measure(values, errors.get(name, 0), elapsed)
+        for name, values in latencies.items()
+    }
+    every_latency = [latency for values in latencies.values() for latency in values]
+    summary["total"] = measure(every_latency, sum(errors.values()), elapsed)
+    return summary
+
+
+def paired_measures(
+    report: Report,
+    baseline: Report,
+) -> Iterator[Tuple[str, Measures, Measures]]:
+    """
+    Pair the measures of the operations present in both reports.
+
+    :param report: the current report.
+    :param baseline: the report to compare with.
+    :yield: the operation and level, its measures and the baseline ones.
+    """
+    for level, operations in report["levels"].items():
+        for name, measures in operations.items():
+            expected = baseline["levels"].get(level, {}).get(name)
+            if expected is not None:
+                yield f"{name} at concurrency {level}", measures, expected
+
+
+def describe_regression(
+    key: str, current: float, comparison: str, previous: float
+) -> str:
+    """
+    Describe a measure that got worse.
+
+    :return: the description.
+    """
+    worse = f"{key} {current:.1f}"
+    return f"{worse} {comparison} {previous:.1f}"
+
+
+def regressed_measures(
+    measures: Measures,
+    expected: Measures,
+    tolerance: float,
+) -> List[str]:
+    """
+    Find the measures of an operation that got worse than the baseline.
+
+    :param measures: the current measures.
+    :param expected: the measures of the baseline.
+    :param tolerance: fraction that a measure may get worse, like 0.1.
+    :return: a description of every regression.
+    """
+    regressions = []
+    for rank in PERCENTILES:
+        key = f"p{rank}_ms"
+        limit = max(
+            expected[key] * (1 + tolerance),
+            expected[key] + MIN_LATENCY_DELTA_MS,
+        )
+        if measures[key] > limit:
+            regressions.append(
+                describe_regression(key, measures[key], ">", expected[key]),
+            )
+    min_throughput = expected["throughput"] * (1 - tolerance)
+    if measures["throughput"] < min_throughput:
+        regressions.append(
+            describe_regression(
+                "throughput",
+                measures["throughput"],
+                "<",
+                expected["throughput"],
+            ),
+        )
+    return regressions
+
+
+def compare(report: Report, baseline: Report, tolerance: float) -> List[str]:
+    """
+    Find the measures that got worse than a baseline.
+
+    Only the levels and operations present in both reports are compared.
+
+    :param report: the current report.
+    :param baseline: the report to compare with.
+    :param tolerance: fraction that a measure may get worse, like 0.1.
+    :return: a description of every regression.
+    """
+    regressions = []
+    for operation, measures, expected in paired_measures(report, baseline):
+        regressions.extend(
+            f"{operation}: {regression}"
+            for regression in regressed_measures(measures, expected, tolerance)
+        )
+    return regressions
+
+
+async def _seeded_restaurants(
+    count: int,
+    rng: random.Random,
+) -> AsyncIterator[Restaurant]:
+    workload = Workload(rng=rng, restaurant_ids=[])
+    for position in range(count):
+        yield Restaurant(
+            **workload.restaurant(),
+            id=f"{SEED_ID_PREFIX}{position:08d}",
+        )
+
+
+async def seed(count: int, seed_value: int) -> List[str]:
+    """
+    Store the synthetic restaurants, the same ones for the same seed.
+
+    Restaurants from previous runs are replaced.
+
+    :param count: amount of restaurants.
+    :param seed_value: seed of the random values.
+    :return: identifiers of the restaurants.
+    """
+    pool = AsyncConnectionPool(
+        conninfo=str(settings.db_url),
+        kwargs={"row_factory": dict_row},
+        open=False,
+    )
+    await pool.open(wait=True)
+    try:  # noqa: WPS501
+        async with pool.connection() as conn:
+            await conn.execute(
+                "DELETE FROM restaurants WHERE id LIKE %(prefix)s",
+                params={"prefix": f"{SEED_ID_PREFIX}%"},
+            )
+        await PsycopgRestaurantRepository(pool).bulk_add(
+            _seeded_restaurants(count, random.Random(seed_value)),  # noqa: S311
+            ImportConflictPolicy.UPSERT,
+            settings.bulk_import_batch_size,
+        )
+    finally:
+        await pool.close()
+    return [f"{SEED_ID_PREFIX}{position:08d}" for position in range(count)]
+
+
+@dataclass
+class LevelMeasures:
+    """Measures of the requests of a concurrency level, by operation."""
+
+    latencies: Dict[str, List[float]]
+    errors: Dict[str, int] = field(default_factory=dict)
+
+
+async def timed_send(client: AsyncClient, spec: RequestSpec) -> Tuple[Response, float]:
+    """
+    Send a request and read its whole response.
+
+    :return: the response and the milliseconds it took.
+    """
+    start = time.perf_counter()
+    response = await client.send(client.build_request(**spec), stream=True)
+    try:  # noqa: WPS501
+        await response.aread()
+    finally:
+        await response.aclose()
+    return response, (time.perf_counter() - start) * 1000
+
+
+async def client_loop(
+    client: AsyncClient,
+    scenario: Scenario,
+    workload: Workload,
+    deadline: float,
+    measures: LevelMeasures,
+) -> None:
+    """Send the requests of a scenario one after the other until the deadline."""
+    while time.perf_counter() < deadline:
+        name = scenario.choose(workload.rng)
+        operation = OPERATIONS[name]
+        spec = operation.build(workload)
+        if spec is None:
+            await asyncio.sleep(0)
+            continue
+        response, latency = await timed_send(client, spec)
+        measures.latencies[name].append(latency)
+        if response.status_code not in operation.expected_statuses:
+            measures.errors[name] = measures.errors.get(name, 0) + 1
+        elif operation.after is not None:
+            operation.after(workload, response)
+
+
+async def run_level(
+    client: AsyncClient,
+    scenario: Scenario,
+    workload: Workload,
+    concurrency: int,
+    duration: float,
+) -> Dict[str, Measures]:
+    """
+    Send the requests of a scenario from many clients for a while.
+
+    :return: the measures of every operation.
+    """
+    measures = LevelMeasures(latencies={name: [] for name in scenario.mix})
+    start = time.perf_counter()
+    await asyncio.gather(
+        *(
+            client_loop(client, scenario, workload, start + duration, measures)
+            for _ in range(concurrency)
+        ),
+    )
+    return summarize(
+        {name: values for name, values in measures.latencies.items() if values},
+        measures.errors,
+        time.perf_counter() - start,
+    )
+
+
+@asynccontextmanager
+async def client_options(base_url: Optional[str]) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Point the clients to the server, or to the application run in process.
+
+    :param base_url: URL of a server already running, if any.
+    :yield: arguments of the clients.
+    """
+    if base_url is not None:
+        yield {"base_url": base_url}
+        return
+
+    from test_project_edt.web.application import get_app  # noqa: WPS433
+
+    app = get_app()
+    await app.router.startup()
+    try:
+        yield {"app": app, "base_url": "http://benchmark"}
+    finally:
+        await app.router.shutdown()
+
+
+async def measure_level(
+    options: Dict[str, Any],
+    workload: Workload,
+    concurrency: int,
+    args: argparse.Namespace,
+) -> Dict[str, Measures]:
+    """
+    Warm up and measure a concurrency level.
+
+    :return: the measures of every operation.
+    """
+    scenario = SCENARIOS[args.scenario]
+    async with AsyncClient(
+        limits=Limits(max_connections=concurrency),
+        timeout=60,
+        **options,
+    ) as client:
+        # Warms up the pools and the caches, its measures are dropped.
+        await run_level(client, scenario, workload, concurrency, args.warmup)
+        return await run_level(client, scenario, workload, concurrency, args.duration)
+
+
+async def run(args: argparse.Namespace) -> Report:
+    """
+    Seed the restaurants and measure every concurrency level.
+
+    :return: the report.
+    """
+    restaurant_ids = await seed(args.restaurants, args.seed)
+    if not restaurant_ids:
+        raise SystemExit("at least one restaurant must be seeded")
+    workload = Workload(
+        rng=random.Random(args.seed),  # noqa: S311
+        restaurant_ids=restaurant_ids,
+    )
+    levels = {}
+    async with client_options(args.base_url) as options:
+        for concurrency in args.concurrency:
+            levels[str(concurrency)] = await measure_level(
+                options,
+                workload,
+                concurrency,
+                args,
+            )
+    return {
+        "scenario": args.scenario,
+        "restaurants": args.restaurants,
+        "duration": args.duration,
+        "levels": levels,
+    }
+
+
+def parse_args() -> argparse.Namespace:
+    """
+    Parse the arguments of the command line.
+
+    :return: the arguments.
+    """
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    _add_workload_arguments(parser)
+    _add_report_arguments(parser)
+    return parser.parse_args()
+
+
+def _add_workload_arguments(parser: argparse.ArgumentParser) -> None:
+    group = parser.add_argument_group("workload")
+    group.add_argument("--scenario", choices=sorted(SCENARIOS), default="mixed")
+    group.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32])
+    group.add_argument("--duration", type=float, default=10)
+    group.add_argument("--warmup", type=float, default=2)
+    group.add_argument("--restaurants", type=int, default=DEFAULT_RESTAURANTS)
+    group.add_argument("--seed", type=int, default=0)
+
+
+def _add_report_arguments(parser: argparse.ArgumentParser) -> None:
+    group = parser.add_argument_group("report")
+    group.add_argument("--base-url", default=None)
+    group.add_argument("--output", default=None)
+    group.add_argument("--baseline", default=None)
+    group.add_argument("--tolerance", type=float, default=0.1)
+
+
+def write_report(report: Report, output: Optional[str]) -> None:
+    """
+    Write a report as JSON.
+
+    :param report: the report.
+    :param output: path of the file, the standard output when None.
+    """
+    rendered = orjson.dumps(report, option=orjson.OPT_INDENT_2)
+    if output is None:
+        print(rendered.decode())  # noqa: WPS421
+        return
+    with open(output, "wb") as output_file:
+        output_file.write(rendered)
+
+
+def read_report(path: str) -> Report:
+    """
+    Read a report written by a previous run.
+
+    :param path: path of the file.
+    :return: the report.
+    """
+    with open(path, "rb") as report_file:
+        return orjson.loads(report_file.read())
+
+
+def main() -> None:
+    """Entrypoint of the benchmark."""
+    args = parse_args()
+    report = asyncio.run(run(args))
+    write_report(report, args.output)
+
+    if args.baseline is not None:
+        regressions = compare(report, read_report(args.baseline), args.tolerance)
+        for regression in regressions:
+            print(regression, file=sys.stderr)  # noqa: WPS421
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
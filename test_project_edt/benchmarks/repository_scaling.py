@@ -0,0 +1,705 @@
+"""
+Time the repository methods over growing datasets and check their plans.
+
+For every size a synthetic dataset is loaded into the database of the
+settings, replacing its restaurants, then every case calls the repository
+many times::
+
+    python -m test_project_edt.benchmarks.repository_scaling \
+        --sizes 100000 1000000 10000000 --output report.json
+
+The statements run by each case are captured and explained with
+`EXPLAIN (ANALYZE, BUFFERS)`. The exit code is 1 when any of them scans
+the restaurants table sequentially instead of using an index.
+"""
+import argparse
+import asyncio
+import random
+import sys
+import time
+from contextvars import ContextVar
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, Iterator, List, Optional, Tuple
+
+import orjson
+from psycopg import AsyncConnection, AsyncCursor, AsyncServerCursor
+from psycopg.rows import dict_row
+from psycopg_pool import AsyncConnectionPool
+
+from test_project_edt.benchmarks.dataset import (
+    CITIES,
+    city_spread,
+    load_dataset,
+    search_text,
+)
+from test_project_edt.db.models.restaurant import Restaurant
+from test_project_edt.entities.common import (
+    AscOrDesc,
+    ClusterParams,
+    ExportParams,
+    NearestParams,
+    PageCursor,
+    PaginationParams,
+    SearchParams,
+)
+from test_project_edt.entities.statistics import RegionLevel, StatisticsPoint
+from test_project_edt.repository.pyscopg_restaurant_repository import (
+    PsycopgRestaurantRepository,
+)
+from test_project_edt.repository.tile_cache_repository import tiles_around
+from test_project_edt.settings import settings
+
+# Statements run through the repository while recording, with their parameters.
+Statement = Tuple[str, Any]
+Recording = Optional[List[Statement]]
+recorded_statements: ContextVar[Recording] = ContextVar(
+    "recorded_statements",
+    default=None,
+)
+
+EXPLAINED_STATEMENTS = ("SELECT", "WITH", "INSERT", "UPDATE", "DELETE")
+# Tables that must always be read through an index.
+INDEXED_TABLES = ("restaurants",)
+# Deepest offset requested by the offset pagination case.
+MAX_OFFSET = 1000000
+# Side in degrees of the boxes exported, listed and clustered.
+EXPORT_SIDE = 0.01
+LIST_SIDE = 0.05
+CITY_SIDE = 0.5
+COUNTRY_BBOX = "-118.5,14.5,-86.7,32.7"
+CITY_ZOOM = 11
+COUNTRY_ZOOM = 5
+TILE_ZOOM = 13
+# Radii in meters of the statistics cases.
+NEAR_RADIUS = 500
+CITY_RADIUS = 5000
+AREA_RADIUS = 50000
+NEAREST_RADIUS = 2000
+# Points looked up by the batch of statistics.
+BATCH_POINTS = 10
+# Characters of a statement kept in the report.
+STATEMENT_LENGTH = 200
+TAIL_PERCENTILE = 0.95
+MILLISECONDS = 1000
+DEFAULT_SIZES = (100000, 1000000)
+DEFAULT_REPEAT = 20
+SAMPLE_QUERY = """
+    SELECT id, rating, lat, lng, city FROM restaurants
+    TABLESAMPLE SYSTEM (1) REPEATABLE (%(seed)s)
+    LIMIT 1000
+"""  # noqa: WPS323
+
+
+class RecordingCursor(AsyncCursor[Any]):
+    """Cursor that records the statements it runs while recording."""
+
+    async def execute(self, query: Any, params: Any = None, **kwargs: Any) -> Any:
+        recorded = recorded_statements.get()
+        if recorded is not None:
+            recorded.append((query, params))
+        return await super().execute(query, params, **kwargs)
+
+
+class RecordingServerCursor(AsyncServerCursor[Any]):
+    """Server side cursor that records the statements it runs while recording."""
+
+    async def execute(self, query: Any, params: Any = None, **kwargs: Any) -> Any:
+        recorded = recorded_statements.get()
+        if recorded is not None:
+            recorded.append((query, params))
+        return await super().execute(query, params, **kwargs)
+
+
+@dataclass
+class Sample:
+    """Restaurants of the dataset that the cases look up."""
+
+    rng: random.Random
+    # Restaurants of the dataset.
+    size: int
+    restaurants: List[Dict[str, Any]]
+    # Restaurants added by the cases, the deletes remove these.
+    added_ids: List[str]
+
+    def restaurant(self) -> Dict[str, Any]:
+        """Random restaurant of the dataset."""
+        return self.rng.choice(self.restaurants)
+
+    def location(self) -> Tuple[float, float]:
+        """Random point where the restaurants are."""
+        city = self.rng.choice(CITIES)
+        spread = city_spread(city)
+        return (
+            self.rng.gauss(city.latitude, spread),
+            self.rng.gauss(city.longitude, spread),
+        )
+
+
+Case = Callable[[PsycopgRestaurantRepository, Sample], Awaitable[Any]]
+
+
+def _nearest_params(sample: Sample, **filters: Any) -> NearestParams:
+    latitude, longitude = sample.location()
+    return NearestParams(latitude=latitude, longitude=longitude, **filters)
+
+
+async def _consume_export(
+    repository: PsycopgRestaurantRepository,
+    params: ExportParams,
+) -> int:
+    chunks = repository.export(params, settings.export_chunk_size)
+    return sum([len(chunk) async for chunk in chunks])
+
+
+def _seek_cursor(restaurant: Dict[str, Any], order_by: str) -> str:
+    return PageCursor(
+        order_by=order_by,
+        asc_or_desc=AscOrDesc.DESC,
+        value=restaurant[order_by],
+        id=restaurant["id"],
+    ).encode()
+
+
+def _bbox(latitude: float, longitude: float, size: float) -> str:
+    east = longitude + size
+    north = latitude + size
+    return f"{longitude},{latitude},{east},{north}"
+
+
+def _export_city_around(sample: Sample) -> ExportParams:
+    restaurant = sample.restaurant()
+    return ExportParams(
+        city=restaurant["city"],
+        bbox=_bbox(restaurant["lat"], restaurant["lng"], EXPORT_SIDE),
+    )
+
+
+async def _add(repository: PsycopgRestaurantRepository, sample: Sample) -> None:
+    latitude, longitude = sample.location()
+    restaurant = await repository.add(
+        Restaurant(name="Benchmark", lat=latitude, lng=longitude, rating=3),
+    )
+    sample.added_ids.append(restaurant.id)
+
+
+async def _delete(repository: PsycopgRestaurantRepository, sample: Sample) -> None:
+    if sample.added_ids:
+        await repository.delete(sample.added_ids.pop())
+    else:
+        await repository.delete("missing")
+
+
+async def _get_statistics_many(
+    repository: PsycopgRestaurantRepository,
+    sample: Sample,
+) -> Any:
+    points = []
+    for _ in range(BATCH_POINTS):
+        latitude, longitude = sample.location()
+        points.append(
+            StatisticsPoint(
+                latitude=latitude,
+                longitude=longitude,
+                radii=[NEAR_RADIUS, 1000, CITY_RADIUS],
+            ),
+        )
+    return await repository.get_statistics_many(points)
+
+
+async def _get_all(
+    repository: PsycopgRestaurantRepository,
+    sample: Sample,
+) -> Any:
+    return await repository.get_all(PaginationParams())
+
+
+async def _get_all_offset(
+    repository: PsycopgRestaurantRepository,
+    sample: Sample,
+) -> Any:
+    deepest = min(sample.size // 2, MAX_OFFSET)
+    params = PaginationParams(offset=sample.rng.randrange(deepest + 1))
+    return await repository.get_all(params)
+
+
+async def _get_all_cursor(
+    repository: PsycopgRestaurantRepository,
+    sample: Sample,
+) -> Any:
+    cursor = _seek_cursor(sample.restaurant(), "id")
+    return await repository.get_all(PaginationParams(cursor=cursor))
+
+
+async def _get_all_by_rating_cursor(
+    repository: PsycopgRestaurantRepository,
+    sample: Sample,
+) -> Any:
+    cursor = _seek_cursor(sample.restaurant(), "rating")
+    return await repository.get_all(
+        PaginationParams(order_by="rating", cursor=cursor),
+    )
+
+
+async def _get_all_bbox(
+    repository: PsycopgRestaurantRepository,
+    sample: Sample,
+) -> Any:
+    bbox = _bbox(*sample.location(), LIST_SIDE)
+    return await repository.get_all(PaginationParams(bbox=bbox))
+
+
+async def _get_all_json(
+    repository: PsycopgRestaurantRepository,
+    sample: Sample,
+) -> Any:
+    cursor = _seek_cursor(sample.restaurant(), "id")
+    return await repository.get_all_json(PaginationParams(cursor=cursor))
+
+
+async def _search(
+    repository: PsycopgRestaurantRepository,
+    sample: Sample,
+) -> Any:
+    return await repository.search(SearchParams(q=search_text(sample.rng)))
+
+
+async def _get(
+    repository: PsycopgRestaurantRepository,
+    sample: Sample,
+) -> Any:
+    return await repository.get(sample.restaurant()["id"])
+
+
+async def _get_json(
+    repository: PsycopgRestaurantRepository,
+    sample: Sample,
+) -> Any:
+    return await repository.get_json(sample.restaurant()["id"])
+
+
+async def _nearest(
+    repository: PsycopgRestaurantRepository,
+    sample: Sample,
+) -> Any:
+    return await repository.nearest(_nearest_params(sample))
+
+
+async def _nearest_within_radius(
+    repository: PsycopgRestaurantRepository,
+    sample: Sample,
+) -> Any:
+    params = _nearest_params(sample, max_radius=NEAREST_RADIUS)
+    return await repository.nearest(params)
+
+
+async def _clusters_city(
+    repository: PsycopgRestaurantRepository,
+    sample: Sample,
+) -> Any:
+    bbox = _bbox(*sample.location(), CITY_SIDE)
+    return await repository.clusters(
+        ClusterParams(bbox=bbox, zoom=CITY_ZOOM),
+        settings.cluster_restaurants_threshold,
+    )
+
+
+async def _clusters_country(
+    repository: PsycopgRestaurantRepository,
+    sample: Sample,
+) -> Any:
+    return await repository.clusters(
+        ClusterParams(bbox=COUNTRY_BBOX, zoom=COUNTRY_ZOOM),
+        settings.cluster_restaurants_threshold,
+    )
+
+
+async def _tile(
+    repository: PsycopgRestaurantRepository,
+    sample: Sample,
+) -> Any:
+    tiles = tiles_around(*sample.location(), margin=0)
+    return await repository.tile(
+        next(tile for tile in tiles if tile.zoom == TILE_ZOOM),
+    )
+
+
+async def _get_near_statistics(
+    repository: PsycopgRestaurantRepository,
+    sample: Sample,
+) -> Any:
+    return await repository.get_statistics(*sample.location(), NEAR_RADIUS)
+
+
+async def _get_city_statistics(
+    repository: PsycopgRestaurantRepository,
+    sample: Sample,
+) -> Any:
+    return await repository.get_statistics(*sample.location(), CITY_RADIUS)
+
+
+async def _get_area_statistics(
+    repository: PsycopgRestaurantRepository,
+    sample: Sample,
+) -> Any:
+    return await repository.get_statistics(*sample.location(), AREA_RADIUS)
+
+
+async def _region_statistics_state(
+    repository: PsycopgRestaurantRepository,
+    sample: Sample,
+) -> Any:
+    return await repository.get_region_statistics(RegionLevel.STATE)
+
+
+async def _region_statistics_city(
+    repository: PsycopgRestaurantRepository,
+    sample: Sample,
+) -> Any:
+    return await repository.get_region_statistics(RegionLevel.CITY)
+
+
+async def _export_bbox(
+    repository: PsycopgRestaurantRepository,
+    sample: Sample,
+) -> Any:
+    bbox = _bbox(*sample.location(), EXPORT_SIDE)
+    return await _consume_export(repository, ExportParams(bbox=bbox))
+
+
+async def _export_city_bbox(
+    repository: PsycopgRestaurantRepository,
+    sample: Sample,
+) -> Any:
+    return await _consume_export(repository, _export_city_around(sample))
+
+
+async def _update(
+    repository: PsycopgRestaurantRepository,
+    sample: Sample,
+) -> Any:
+    rating = sample.rng.randint(0, 4)
+    return await repository.update(
+        sample.restaurant()["id"],
+        Restaurant(rating=rating),
+    )
+
+
+CASES: Dict[str, Case] = {
+    "get_all": _get_all,
+    "get_all_offset": _get_all_offset,
+    "get_all_cursor": _get_all_cursor,
+    "get_all_by_rating_cursor": _get_all_by_rating_cursor,
+    "get_all_bbox": _get_all_bbox,
+    "get_all_json": _get_all_json,
+    "search": _search,
+    "get": _get,
+    "get_json": _get_json,
+    "nearest": _nearest,
+    "nearest_within_2km": _nearest_within_radius,
+    "clusters_city": _clusters_city,
+    "clusters_country": _clusters_country,
+    "tile": _tile,
+    "get_statistics_500m": _get_near_statistics,
+    "get_statistics_5km": _get_city_statistics,
+    "get_statistics_50km": _get_area_statistics,
+    "get_statistics_many": _get_statistics_many,
+    "region_statistics_state": _region_statistics_state,
+    "region_statistics_city": _region_statistics_city,
+    "export_bbox": _export_bbox,
+    "export_city_bbox": _export_city_bbox,
+    "add": _add,
+    "update": _update,
+    "delete": _delete,
+}
+
+
+def plan_nodes(plan: Dict[str, Any]) -> Iterator[Dict[str, Any]]:
+    """
+    Walk the nodes of a plan of `EXPLAIN (FORMAT JSON)`.
+
+    :param plan: the root node.
+    :yield: the node and every node below it.
+    """
+    yield plan
+    for child in plan.get("Plans", []):
+        yield from plan_nodes(child)
+
+
+def sequential_scans(plan: Dict[str, Any]) -> List[str]:
+    """
+    Find the sequential scans over the tables that must use an index.
+
+    :param plan: the root node of the plan.
+    :return: the tables scanned sequentially.
+    """
+    return [
+        node["Relation Name"]
+        for node in plan_nodes(plan)
+        if node["Node Type"] == "Seq Scan"
+        and node.get("Relation Name") in INDEXED_TABLES
+    ]
+
+
+def _scan(node: Dict[str, Any]) -> str:
+    scan = f"{node['Node Type']} on {node['Relation Name']}"
+    index = node.get("Index Name")
+    if index is None:
+        return scan
+    return f"{scan} using {index}"
+
+
+def plan_summary(query: str, explained: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Summarize the output of `EXPLAIN (FORMAT JSON)` for a statement.
+
+    :param query: the statement explained.
+    :param explained: the explained plan.
+    :return: the scans, the time taken and the blocks read.
+    """
+    plan = explained["Plan"]
+    scans = {_scan(node) for node in plan_nodes(plan) if "Relation Name" in node}
+    return {
+        "statement": " ".join(query.split())[:STATEMENT_LENGTH],
+        "scans": sorted(scans),
+        "sequential_scans": sequential_scans(plan),
+        "execution_ms": explained.get("Execution Time"),
+        "shared_hit_blocks": plan.get("Shared Hit Blocks"),
+        "shared_read_blocks": plan.get("Shared Read Blocks"),
+    }
+
+
+def _explained(statement: Statement) -> bool:
+    query = str(statement[0]).lstrip().upper()
+    return query.startswith(EXPLAINED_STATEMENTS)
+
+
+async def explain(conn: AsyncConnection[Any], statement: Statement) -> Dict[str, Any]:
+    """
+    Explain a statement run by the repository.
+
+    The statement really runs, in a transaction that is rolled back.
+    Inserts aren't run, since they would conflict with the row that
+    the repository already inserted.
+
+    :param conn: connection without recording.
+    :param statement: the statement and its parameters.
+    :return: summary of the plan.
+    """
+    query, params = statement
+    query = str(query).strip().rstrip(";")
+    options = "FORMAT JSON"
+    if not query.upper().startswith("INSERT"):
+        options = f"ANALYZE, BUFFERS, {options}"
+    async with conn.transaction(force_rollback=True):
+        res = await conn.execute(f"EXPLAIN ({options}) {query}", params)
+        explained = (await res.fetchone())["QUERY PLAN"][0]
+    return plan_summary(query, explained)
+
+
+async def _record(
+    repository: PsycopgRestaurantRepository,
+    case: Case,
+    sample: Sample,
+) -> List[Statement]:
+    statements: List[Statement] = []
+    token = recorded_statements.set(statements)
+    try:  # noqa: WPS501
+        await case(repository, sample)
+    finally:
+        recorded_statements.reset(token)
+    return statements
+
+
+async def _timings(
+    repository: PsycopgRestaurantRepository,
+    case: Case,
+    sample: Sample,
+    repeat: int,
+) -> List[float]:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        await case(repository, sample)
+        timings.append((time.perf_counter() - start) * MILLISECONDS)
+    return sorted(timings)
+
+
+def _percentiles(timings: List[float]) -> Dict[str, float]:
+    count = len(timings)
+    tail = min(count - 1, int(count * TAIL_PERCENTILE))
+    return {
+        "median_ms": timings[count // 2],
+        "p95_ms": timings[tail],
+        "max_ms": timings[-1],
+    }
+
+
+async def measure(
+    repository: PsycopgRestaurantRepository,
+    explain_conn: AsyncConnection[Any],
+    case: Case,
+    sample: Sample,
+    repeat: int,
+) -> Dict[str, Any]:
+    """
+    Time a case and explain the statements it runs.
+
+    :return: the timings in milliseconds and the plans.
+    """
+    statements = await _record(repository, case, sample)
+    plans = [
+        await explain(explain_conn, statement)
+        for statement in statements
+        if _explained(statement)
+    ]
+    timings = await _timings(repository, case, sample, repeat)
+    return {**_percentiles(timings), "plans": plans}
+
+
+async def _configure(conn: AsyncConnection[Any]) -> None:
+    conn.server_cursor_factory = RecordingServerCursor
+
+
+async def _open_pool() -> AsyncConnectionPool:
+    pool = AsyncConnectionPool(
+        conninfo=str(settings.db_url),
+        kwargs={"row_factory": dict_row, "cursor_factory": RecordingCursor},
+        configure=_configure,
+        open=False,
+    )
+    await pool.open(wait=True)
+    return pool
+
+
+async def _load_sample(
+    pool: AsyncConnectionPool,
+    size: int,
+    seed: int,
+) -> Tuple[float, Sample]:
+    async with pool.connection() as conn:
+        load_seconds = await load_dataset(conn, size, seed)
+        res = await conn.execute(SAMPLE_QUERY, {"seed": seed})
+        restaurants = await res.fetchall()
+    rng = random.Random(seed)  # noqa: S311
+    return load_seconds, Sample(rng, size, restaurants, [])
+
+
+async def measure_size(
+    pool: AsyncConnectionPool,
+    explain_conn: AsyncConnection[Any],
+    size: int,
+    args: argparse.Namespace,
+) -> Dict[str, Any]:
+    """
+    Load a dataset of a size and measure the cases over it.
+
+    :return: the seconds taken by the load and the measures by case.
+    """
+    load_seconds, sample = await _load_sample(pool, size, args.seed)
+    repository = PsycopgRestaurantRepository(pool)
+    results: Dict[str, Any] = {"load_seconds": load_seconds}
+    for name in args.cases or CASES:
+        results[name] = await measure(
+            repository,
+            explain_conn,
+            CASES[name],
+            sample,
+            args.repeat,
+        )
+    return results
+
+
+async def run(args: argparse.Namespace) -> Dict[str, Any]:
+    """
+    Load every dataset size and measure every case over it.
+
+    :return: the report, by size and case.
+    """
+    pool = await _open_pool()
+    explain_conn = await AsyncConnection.connect(
+        str(settings.db_url),
+        row_factory=dict_row,
+    )
+    sizes: Dict[str, Any] = {}
+    try:  # noqa: WPS501
+        for size in args.sizes:
+            sizes[str(size)] = await measure_size(pool, explain_conn, size, args)
+    finally:
+        await explain_conn.close()
+        await pool.close()
+    return {"seed": args.seed, "sizes": sizes}
+
+
+def _case_regressions(
+    size: str,
+    name: str,
+    plans: List[Dict[str, Any]],
+) -> List[str]:
+    return [
+        f"{name} with {size} restaurants scans {table} "
+        f"sequentially: {plan['statement']}"
+        for plan in plans
+        for table in plan["sequential_scans"]
+    ]
+
+
+def regressions(report: Dict[str, Any]) -> List[str]:
+    """
+    Describe the statements that scan an indexed table sequentially.
+
+    :param report: the report of `run`.
+    :return: a description of every sequential scan.
+    """
+    found = []
+    for size, results in report["sizes"].items():
+        for name, measures in results.items():
+            if isinstance(measures, dict):
+                found.extend(_case_regressions(size, name, measures["plans"]))
+    return found
+
+
+def parse_args() -> argparse.Namespace:
+    """
+    Parse the arguments of the command line.
+
+    :return: the arguments.
+    """
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=list(DEFAULT_SIZES))
+    parser.add_argument("--cases", nargs="+", choices=sorted(CASES), default=None)
+    parser.add_argument("--repeat", type=int, default=DEFAULT_REPEAT)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default=None)
+    return parser.parse_args()
+
+
+def write_report(report: Dict[str, Any], output: Optional[str]) -> None:
+    """
+    Write a report as JSON.
+
+    :param report: the report.
+    :param output: path of the file, the standard output when None.
+    """
+    rendered = orjson.dumps(report, option=orjson.OPT_INDENT_2)
+    if output is None:
+        print(rendered.decode())  # noqa: WPS421
+        return
+    with open(output, "wb") as output_file:
+        output_file.write(rendered)
+
+
+def main() -> None:
+    """Entrypoint of the benchmark."""
+    args = parse_args()
+    report = asyncio.run(run(args))
+    write_report(report, args.output)
+
+    found = regressions(report)
+    for regression in found:
+        print(regression, file=sys.stderr)  # noqa: WPS421
+    if found:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
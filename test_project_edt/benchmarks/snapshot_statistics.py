@@ -0,0 +1,129 @@
+"""
+Measure the statistics of the restaurants snapshot over synthetic data.
+
+The restaurants are spread around a few cities, like the real ones::
+
+    python -m test_project_edt.benchmarks.snapshot_statistics --points 1000000 10000000
+
+No database is needed, the snapshot is loaded straight from arrays.
+"""
+import argparse
+import time
+from typing import Dict, List
+
+import numpy as np
+import orjson
+
+from test_project_edt.repository.restaurant_snapshot import RestaurantSnapshot
+
+CITIES = (
+    (19.4326, -99.1332),
+    (20.6597, -103.3496),
+    (25.6866, -100.3161),
+    (17.0732, -96.7266),
+    (21.1619, -86.8515),
+)
+RADII = (500, 2000, 10000)
+# Degrees of spread around every city, about 10km for the restaurants.
+RESTAURANTS_SPREAD = 0.1
+QUERIES_SPREAD = 0.05
+DEFAULT_POINTS = (1000000, 10000000)
+DEFAULT_QUERIES = 200
+DEFAULT_CELL_SIZE = 0.05
+
+
+def around_cities(
+    generator: np.random.Generator,
+    size: int,
+    spread: float,
+) -> np.ndarray:
+    """
+    Random points around the cities.
+
+    :return: the latitude and longitude of every point.
+    """
+    cities = generator.integers(len(CITIES), size=size)
+    centers = np.array(CITIES)[cities]
+    return centers + generator.normal(scale=spread, size=(size, 2))
+
+
+def build(points: int, cell_size: float, seed: int) -> RestaurantSnapshot:
+    """
+    Load a snapshot with restaurants clustered around the cities.
+
+    :return: the loaded snapshot.
+    """
+    generator = np.random.default_rng(seed)
+    locations = around_cities(generator, points, RESTAURANTS_SPREAD)
+    snapshot = RestaurantSnapshot(cell_size=cell_size)
+    snapshot.load(
+        [str(position) for position in range(points)],
+        locations[:, 0],
+        locations[:, 1],
+        generator.integers(0, 5, size=points).astype(np.float64),
+    )
+    return snapshot
+
+
+def time_statistics(
+    snapshot: RestaurantSnapshot,
+    centers: np.ndarray,
+    radius: float,
+) -> float:
+    """
+    Time the statistics of circles of the same radius.
+
+    :return: milliseconds per circle.
+    """
+    start = time.perf_counter()
+    for latitude, longitude in centers:
+        snapshot.statistics(float(latitude), float(longitude), radius)
+    return (time.perf_counter() - start) * 1000 / len(centers)
+
+
+def measure(points: int, queries: int, cell_size: float) -> Dict[str, float]:
+    """
+    Time the load and the statistics of random circles near the cities.
+
+    :return: the measures in milliseconds.
+    """
+    start = time.perf_counter()
+    snapshot = build(points, cell_size, seed=points)
+    results: Dict[str, float] = {"load_ms": (time.perf_counter() - start) * 1000}
+
+    generator = np.random.default_rng(0)
+    for radius in RADII:
+        results[f"radius_{radius}_ms"] = time_statistics(
+            snapshot,
+            around_cities(generator, queries, QUERIES_SPREAD),
+            radius,
+        )
+    return results
+
+
+def main() -> None:
+    """Entrypoint of the benchmark."""
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument(
+        "--points",
+        type=int,
+        nargs="+",
+        default=list(DEFAULT_POINTS),
+    )
+    parser.add_argument("--queries", type=int, default=DEFAULT_QUERIES)
+    parser.add_argument("--cell-size", type=float, default=DEFAULT_CELL_SIZE)
+    args = parser.parse_args()
+    results: Dict[int, Dict[str, float]] = {}
+    sizes: List[int] = args.points
+    for points in sizes:
+        results[points] = measure(points, args.queries, args.cell_size)
+    print(  # noqa: WPS421
+        orjson.dumps(
+            results,
+            option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS,
+        ).decode(),
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,11 +1,12 @@
 import os
 from pathlib import Path
-from typing import Any, AsyncGenerator
+from typing import Any, AsyncGenerator, Generator
 
 import pytest
 from fastapi import FastAPI
 from httpx import AsyncClient
 from psycopg import AsyncConnection
+from psycopg.rows import dict_row
 from psycopg_pool import AsyncConnectionPool
 
 from test_project_edt.db.dependencies import get_db_pool
@@ -97,7 +98,10 @@ async def dbpool() -> AsyncGenerator[AsyncConnectionPool, None]:
     :yield: database connections pool.
     """
     await create_db()
-    pool = AsyncConnectionPool(conninfo=str(settings.db_url))
+    pool = AsyncConnectionPool(
+        conninfo=str(settings.db_url),
+        kwargs={"row_factory": dict_row},
+    )
     await pool.wait()
 
     async with pool.connection() as create_conn:
@@ -113,15 +117,17 @@ async def dbpool() -> AsyncGenerator[AsyncConnectionPool, None]:
 @pytest.fixture
 def fastapi_app(
     dbpool: AsyncConnectionPool,
-) -> FastAPI:
+) -> Generator[FastAPI, None, None]:
     """
     Fixture for creating FastAPI app.
 
-    :return: fastapi app with mocked dependencies.
+    :yield: fastapi app with mocked dependencies.
     """
     application = get_app()
     application.dependency_overrides[get_db_pool] = lambda: dbpool
-    return application  # noqa: WPS331
+    yield application
+    if application.state.tile_cache is not None:
+        application.state.tile_cache.close()
 
 
 @pytest.fixture
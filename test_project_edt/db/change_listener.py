@@ -0,0 +1,206 @@
+import asyncio
+import logging
+import time
+from collections import deque
+from typing import Any, Callable, Deque, List, Optional, Set
+
+from psycopg import AsyncConnection, Error
+from psycopg.rows import dict_row
+from pydantic import ValidationError
+
+from test_project_edt.entities.restaurant import ChangeOperation, RestaurantChange
+
+logger = logging.getLogger(__name__)
+
+CHANGES_CHANNEL = "restaurant_changes"
+# Changes older than the last one received that a catch up reads again.
+CATCH_UP_WINDOW = 1000
+# Most changes delivered one by one by a catch up, more become a bulk change.
+MAX_CATCH_UP = 10000
+
+CATCH_UP_QUERY = """
+    SELECT seq, restaurant_id AS id, operation AS op,
+        lat, lng, rating, old_lat, old_lng
+    FROM restaurant_changes
+    WHERE seq > %(since)s
+    ORDER BY seq
+    LIMIT %(limit)s;
+"""  # noqa: WPS323
+
+PRUNE_QUERY = """
+    DELETE FROM restaurant_changes
+    WHERE changed_at < now() - make_interval(secs => %(retention)s);
+"""  # noqa: WPS323
+
+ChangeSubscriber = Callable[[RestaurantChange], None]
+
+
+class RestaurantChangeListener:
+    """
+    Receives the changes of the restaurants published by the database.
+
+    A dedicated connection listens to the notifications sent by the
+    triggers of the restaurants table and every change is passed to
+    the subscribers. When the connection is lost, the listener reconnects
+    and reads the changes it missed from the change log. If too many
+    were missed, or they may have been pruned from the log already,
+    the subscribers receive a bulk change instead.
+
+    Sequence numbers are assigned before the transactions commit, so
+    the catch up also reads a window of changes older than the last
+    one received and skips the ones that were already delivered.
+    """
+
+    def __init__(
+        self,
+        conninfo: str,
+        reconnect_delay: float = 1,
+        retention: float = 3600,
+        catch_up_window: int = CATCH_UP_WINDOW,
+    ):
+        self.connected = asyncio.Event()
+        self._conninfo = conninfo
+        self._reconnect_delay = reconnect_delay
+        self._retention = retention
+        self._catch_up_window = catch_up_window
+        self._subscribers: List[ChangeSubscriber] = []
+        self._last_seq: Optional[int] = None
+        self._disconnected_at: Optional[float] = None
+        self._delivered: Set[int] = set()
+        self._delivered_order: Deque[int] = deque()
+        self._tasks: List["asyncio.Task[None]"] = []
+
+    def subscribe(self, subscriber: ChangeSubscriber) -> Callable[[], None]:
+        """
+        Register a function called with every change.
+
+        Subscribers run on the event loop, they must not block.
+
+        :param subscriber: the function.
+        :return: function that cancels the subscription.
+        """
+        self._subscribers.append(subscriber)
+        return lambda: self._subscribers.remove(subscriber)
+
+    async def start(self) -> None:
+        """Start listening, waiting until the first connection is ready."""
+        self._tasks = [
+            asyncio.create_task(self._listen()),
+            asyncio.create_task(self._prune()),
+        ]
+        await self.connected.wait()
+
+    async def stop(self) -> None:
+        """Stop listening."""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        self.connected.clear()
+
+    def dispatch(self, change: RestaurantChange) -> None:
+        """
+        Pass a change to every subscriber, unless it was already delivered.
+
+        :param change: the change.
+        """
+        if change.op != ChangeOperation.BULK and change.seq in self._delivered:
+            return
+        self._remember(change.seq)
+        if self._last_seq is None or change.seq > self._last_seq:
+            self._last_seq = change.seq
+        for subscriber in list(self._subscribers):
+            try:
+                subscriber(change)
+            except Exception:
+                logger.exception(
+                    "A subscriber failed to apply %s",  # noqa: WPS323
+                    change,
+                )
+
+    async def _listen(self) -> None:
+        while True:
+            try:
+                await self._listen_connection()
+            except Error:
+                logger.warning("Lost the connection listening to the changes")
+            if self._disconnected_at is None:
+                self._disconnected_at = time.monotonic()
+            self.connected.clear()
+            await asyncio.sleep(self._reconnect_delay)
+
+    async def _listen_connection(self) -> None:
+        """Deliver the changes received by a connection, until it is lost."""
+        conn = await AsyncConnection.connect(
+            self._conninfo,
+            autocommit=True,
+            row_factory=dict_row,
+        )
+        async with conn:
+            await conn.execute(f"LISTEN {CHANGES_CHANNEL}")
+            await self._catch_up(conn)
+            self._disconnected_at = None
+            self.connected.set()
+            async for notify in conn.notifies():
+                self._receive(notify.payload)
+
+    async def _catch_up(self, conn: AsyncConnection[Any]) -> None:
+        """Deliver the changes missed while there was no connection."""
+        if self._last_seq is None:
+            # Nothing was cached before the first connection.
+            res = await conn.execute(
+                "SELECT coalesce(max(seq), 0) AS seq FROM restaurant_changes",
+            )
+            self._last_seq = (await res.fetchone())["seq"]
+            return
+
+        since = max(0, self._last_seq - self._catch_up_window)
+        res = await conn.execute(
+            CATCH_UP_QUERY,
+            params={"since": since, "limit": MAX_CATCH_UP + 1},
+        )
+        rows = await res.fetchall()
+        # Half of the retention leaves a margin for the clock of the database.
+        pruned = (
+            self._disconnected_at is not None
+            and time.monotonic() - self._disconnected_at > self._retention / 2
+        )
+        if pruned or len(rows) > MAX_CATCH_UP:
+            self.dispatch(
+                RestaurantChange(
+                    seq=rows[-1]["seq"] if rows else self._last_seq,
+                    op=ChangeOperation.BULK,
+                ),
+            )
+            return
+        for row in rows:
+            self.dispatch(RestaurantChange(**row))
+
+    async def _prune(self) -> None:
+        """Remove the old entries of the change log."""
+        while True:
+            await asyncio.sleep(self._retention / 4)
+            try:
+                conn = await AsyncConnection.connect(self._conninfo, autocommit=True)
+                async with conn:
+                    await conn.execute(
+                        PRUNE_QUERY,
+                        params={"retention": self._retention},
+                    )
+            except Error:
+                logger.warning("Couldn't prune the change log")
+
+    def _receive(self, payload: str) -> None:
+        try:
+            change = RestaurantChange.model_validate_json(payload)
+        except ValidationError:
+            logger.warning("Ignoring the invalid change %s", payload)  # noqa: WPS323
+            return
+        self.dispatch(change)
+
+    def _remember(self, seq: int) -> None:
+        self._delivered.add(seq)
+        self._delivered_order.append(seq)
+        # Only the changes that a catch up may read again are kept.
+        while len(self._delivered_order) > self._catch_up_window * 2:
+            self._delivered.discard(self._delivered_order.popleft())
@@ -1,14 +1,47 @@
-from fastapi import Depends
+from typing import TYPE_CHECKING, Optional
+
+from fastapi import Depends, HTTPException, status
 from psycopg_pool import AsyncConnectionPool
 from starlette.requests import Request
 
+from test_project_edt.db.replicas import (
+    READ_AFTER_LSN_HEADER,
+    ReadPosition,
+    ReplicaPools,
+    parse_lsn,
+)
+from test_project_edt.repository.metrics_restaurant_repository import (
+    MetricsRestaurantRepository,
+)
 from test_project_edt.repository.pyscopg_restaurant_repository import (
     PsycopgRestaurantRepository,
 )
+from test_project_edt.repository.restaurant_cache_repository import (
+    RestaurantCache,
+    RestaurantCacheRepository,
+)
 from test_project_edt.repository.resturant_repository_protocol import (
     RestaurantRepository,
 )
-from test_project_edt.web.lifetime import retrieve_db_pool
+from test_project_edt.repository.single_flight_repository import (
+    SingleFlight,
+    SingleFlightRepository,
+)
+from test_project_edt.repository.snapshot_restaurant_repository import (
+    SnapshotRestaurantRepository,
+)
+from test_project_edt.repository.statistics_cache_repository import (
+    StatisticsCache,
+    StatisticsCacheRepository,
+)
+from test_project_edt.repository.tile_cache_repository import (
+    TileCache,
+    TileCacheRepository,
+)
+from test_project_edt.settings import settings
+
+if TYPE_CHECKING:
+    from test_project_edt.repository.restaurant_snapshot import RestaurantSnapshot
 
 
 async def get_db_pool(request: Request) -> AsyncConnectionPool:
@@ -21,7 +54,163 @@ async def get_db_pool(request: Request) -> AsyncConnectionPool:
     return request.app.state.db_pool
 
 
+def get_db_replicas(request: Request) -> Optional[ReplicaPools]:
+    """
+    Return the connection pools of the read replicas.
+
+    :param request: current request.
+    :returns: the pools or None when there are no replicas.
+    """
+    return request.app.state.db_replicas
+
+
+def get_read_position(request: Request) -> ReadPosition:
+    """
+    Return the read position of the request.
+
+    The header is read from the request instead of being declared as
+    a parameter, it is a concern of the deployment and not of the API.
+    The position is kept in the state of the request, so the position
+    of its writes can be sent back to the client.
+
+    :param request: current request.
+    :returns: the read position.
+    :raises HTTPException: when the position isn't valid.
+    """
+    min_lsn = None
+    header = request.headers.get(READ_AFTER_LSN_HEADER)
+    if header:
+        try:
+            min_lsn = parse_lsn(header)
+        except ValueError:
+            raise HTTPException(
+                status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                detail=f"the {READ_AFTER_LSN_HEADER} header is not valid",
+            )
+    read_position = ReadPosition(min_lsn)
+    request.state.read_position = read_position
+    return read_position
+
+
+def get_statistics_cache(request: Request) -> Optional[StatisticsCache]:
+    """
+    Return the statistics cache of the worker.
+
+    :param request: current request.
+    :returns: the cache or None when it is disabled.
+    """
+    return request.app.state.statistics_cache
+
+
+def get_restaurant_snapshot(request: Request) -> Optional["RestaurantSnapshot"]:
+    """
+    Return the restaurants snapshot of the worker.
+
+    :param request: current request.
+    :returns: the snapshot or None when it is disabled.
+    """
+    return request.app.state.restaurant_snapshot
+
+
+def get_restaurant_cache(request: Request) -> Optional[RestaurantCache]:
+    """
+    Return the restaurant cache of the worker.
+
+    :param request: current request.
+    :returns: the cache or None when it is disabled.
+    """
+    return request.app.state.restaurant_cache
+
+
+def get_tile_cache(request: Request) -> Optional[TileCache]:
+    """
+    Return the tile cache of the worker.
+
+    :param request: current request.
+    :returns: the cache or None when it is disabled.
+    """
+    return request.app.state.tile_cache
+
+
+def get_single_flight(request: Request) -> Optional[SingleFlight]:
+    """
+    Return the reads in progress of the worker.
+
+    :param request: current request.
+    :returns: the reads or None when they aren't coalesced.
+    """
+    return request.app.state.single_flight
+
+
 def inject_repository(
-    connection_pool: AsyncConnectionPool = Depends(retrieve_db_pool),
+    request: Request,
+    connection_pool: AsyncConnectionPool = Depends(get_db_pool),
+    replicas: Optional[ReplicaPools] = Depends(get_db_replicas),
+    read_position: ReadPosition = Depends(get_read_position),
+) -> RestaurantRepository:
+    """
+    Return the restaurant repository backed by the application pool.
+
+    :param request: current request.
+    :param connection_pool: database connections pool of the worker.
+    :param replicas: connection pools of the read replicas.
+    :param read_position: read position of the request.
+    :returns: restaurant repository.
+    """
+    repository: RestaurantRepository = PsycopgRestaurantRepository(
+        connection_pool,
+        replicas=replicas,
+        read_position=read_position,
+        timed_connections=settings.db_queries_instrumented,
+    )
+    if settings.opentelemetry_endpoint:
+        # Imported only when tracing, like the rest of opentelemetry.
+        from test_project_edt.repository import (  # noqa: WPS433
+            tracing_restaurant_repository,
+        )
+
+        repository = tracing_restaurant_repository.TracingRestaurantRepository(
+            repository,
+        )
+    repository = MetricsRestaurantRepository(repository)
+    return cached_repository(repository, request, read_position)
+
+
+def cached_repository(
+    repository: RestaurantRepository,
+    request: Request,
+    read_position: ReadPosition,
+) -> RestaurantRepository:
+    """
+    Wrap a repository with the caches of the worker that are enabled.
+
+    :param repository: the repository.
+    :param request: current request.
+    :param read_position: read position of the request.
+    :returns: the repository answering from the caches first.
+    """
+    repository = _coalesced_repository(repository, request, read_position)
+    statistics_cache = get_statistics_cache(request)
+    if statistics_cache is not None:
+        repository = StatisticsCacheRepository(repository, statistics_cache)
+    tile_cache = get_tile_cache(request)
+    if tile_cache is not None:
+        repository = TileCacheRepository(repository, tile_cache)
+    restaurant_cache = get_restaurant_cache(request)
+    if restaurant_cache is not None:
+        repository = RestaurantCacheRepository(repository, restaurant_cache)
+    return repository
+
+
+def _coalesced_repository(
+    repository: RestaurantRepository,
+    request: Request,
+    read_position: ReadPosition,
 ) -> RestaurantRepository:
-    return PsycopgRestaurantRepository(connection_pool)
+    single_flight = get_single_flight(request)
+    if single_flight is not None:
+        repository = SingleFlightRepository(repository, single_flight, read_position)
+    snapshot = get_restaurant_snapshot(request)
+    if snapshot is not None:
+        repository = SnapshotRestaurantRepository(repository, snapshot)
+    return repository
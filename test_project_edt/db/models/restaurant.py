@@ -17,3 +17,10 @@ class Restaurant:
     lng: float | None = None
     rating: int | None = Field(default=None, gte=0, lte=4)
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+
+
+@dataclass
+class UpdatedRestaurant(Restaurant):
+    # Location before the update, returned by the same statement
+    old_lat: float | None = None
+    old_lng: float | None = None
@@ -1,4 +1,4 @@
-from typing import Annotated
+from typing import Annotated, List, Optional
 
 from pydantic import BeforeValidator, Field
 from pydantic.dataclasses import dataclass
@@ -9,5 +9,16 @@ class Statistics:
     count: int = Field(gte=0)
     avg: Annotated[float, BeforeValidator(lambda value: value or 0)] = Field(gte=0)
     std: Annotated[float, BeforeValidator(lambda value: value or 0)] = Field(
-        gte=0, alias="stddev",
+        gte=0,
+        alias="stddev",
     )
+
+
+@dataclass
+class RegionStatistics(Statistics):
+    # Region of the restaurants, the city is null for the states. The
+    # restaurants without a state or a city are counted under a null one.
+    state: Optional[str] = None
+    city: Optional[str] = None
+    # Restaurants with each rating, from 0 to 4
+    histogram: List[int] = Field(default_factory=list)
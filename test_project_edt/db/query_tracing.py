@@ -0,0 +1,312 @@
+"""
+Timing of the queries sent by the repository.
+
+Connections of the pools are configured with cursors that add the time
+taken by their statements to the trace of the current repository call,
+and log the slow statements along with their plan. Nothing is installed
+unless tracing or the slow query log are enabled.
+"""
+import functools
+import itertools
+import logging
+import random
+import re
+import time
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from typing import (
+    Any,
+    AsyncContextManager,
+    AsyncIterator,
+    Callable,
+    ClassVar,
+    Dict,
+    List,
+    Optional,
+)
+
+from psycopg import AsyncConnection, AsyncCursor, AsyncServerCursor, Error
+from psycopg.abc import Params, Query
+from psycopg.rows import Row, tuple_row
+
+# Statements that EXPLAIN accepts, the plan of any other one isn't logged.
+EXPLAINABLE_STATEMENTS = frozenset(
+    ("SELECT", "INSERT", "UPDATE", "DELETE", "WITH", "VALUES"),
+)
+# Longest statement stored in a span or written to the log.
+MAX_STATEMENT_LENGTH = 2000
+# Distinct statements whose normalized form is kept.
+NORMALIZED_STATEMENTS = 256
+MILLISECONDS = 1000
+
+_WHITESPACE = re.compile(r"\s+")
+_LITERALS = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+
+
+@functools.lru_cache(maxsize=NORMALIZED_STATEMENTS)
+def normalize_statement(query: str) -> str:
+    """
+    Normalize a statement, so the ones differing in their values match.
+
+    :param query: the statement as sent to the database.
+    :return: the statement on a single line, with its literals as `?`.
+    """
+    statement = _LITERALS.sub("?", _WHITESPACE.sub(" ", query).strip())
+    return statement[:MAX_STATEMENT_LENGTH]
+
+
+def params_shape(params: Optional[Params]) -> str:
+    """
+    Describe the parameters of a statement without their values.
+
+    :param params: the parameters.
+    :return: the type of each parameter, and the length of the sequences.
+    """
+    if not params:
+        return "none"
+    if isinstance(params, dict):
+        items = params.items()
+    else:
+        items = enumerate(params)  # type: ignore
+    return ", ".join(itertools.starmap(_shape, items))
+
+
+def _shape(name: Any, value: Any) -> str:
+    shape = type(value).__name__
+    if isinstance(value, (list, tuple)):
+        length = len(value)
+        shape = f"{shape}[{length}]"
+    return f"{name}: {shape}"
+
+
+def _statement_text(query: Query) -> str:
+    if isinstance(query, bytes):
+        return query.decode()
+    return str(query)
+
+
+class QueryTrace:
+    """Time taken by the statements of a repository call, in seconds."""
+
+    __slots__ = ("wait", "execute", "fetch", "rows", "statements")
+
+    def __init__(self) -> None:
+        self.wait: float = 0
+        self.execute: float = 0
+        self.fetch: float = 0
+        self.rows = 0
+        # Normalized statements, in the order they were first run.
+        self.statements: Dict[str, None] = {}
+
+    def attributes(self) -> Dict[str, Any]:
+        """
+        Attributes of the span of the repository call.
+
+        :return: the attributes.
+        """
+        return {
+            "db.system": "postgresql",
+            "db.statement": ";\n".join(self.statements)[:MAX_STATEMENT_LENGTH],
+            "db.pool.wait_ms": self.wait * MILLISECONDS,
+            "db.execute_ms": self.execute * MILLISECONDS,
+            "db.fetch_ms": self.fetch * MILLISECONDS,
+            "db.rows": self.rows,
+        }
+
+
+# Trace of the repository call in progress, if it is traced.
+current_trace: ContextVar[Optional[QueryTrace]] = ContextVar(
+    "current_trace",
+    default=None,
+)
+
+
+class SlowQueryLog:
+    """
+    Logs a sample of the statements slower than a threshold.
+
+    The plan is obtained with a plain EXPLAIN on the same connection,
+    inside a savepoint, so the statement isn't run again.
+    """
+
+    def __init__(
+        self,
+        threshold: float,
+        sample_rate: float,
+        sample: Callable[[], float] = random.random,
+    ):
+        self.threshold = threshold
+        self.sample_rate = sample_rate
+        self._sample = sample
+
+    def should_log(self, elapsed: float) -> bool:
+        """
+        Whether a statement must be logged.
+
+        :param elapsed: seconds taken by the statement.
+        :return: True for the sampled statements above the threshold.
+        """
+        return elapsed >= self.threshold and self._sample() < self.sample_rate
+
+    async def log(
+        self,
+        conn: AsyncConnection[Any],
+        query: Query,
+        params: Optional[Params],
+        elapsed: float,
+    ) -> None:
+        """
+        Log a slow statement along with its plan.
+
+        :param conn: connection that ran the statement.
+        :param query: the statement.
+        :param params: parameters of the statement.
+        :param elapsed: seconds taken by the statement.
+        """
+        statement = normalize_statement(_statement_text(query))
+        plan = "not available"
+        if statement.split(" ", 1)[0].upper() in EXPLAINABLE_STATEMENTS:
+            try:
+                plan = await self._explain(conn, query, params)
+            except Error as error:
+                plan = f"not available: {error}"
+        logging.warning(
+            "Slow query took %.1fms: %s\nParameters: %s\nPlan:\n%s",  # noqa: WPS323
+            elapsed * MILLISECONDS,
+            statement,
+            params_shape(params),
+            plan,
+        )
+
+    async def _explain(
+        self,
+        conn: AsyncConnection[Any],
+        query: Query,
+        params: Optional[Params],
+    ) -> str:
+        statement = _statement_text(query)
+        async with conn.transaction():
+            async with AsyncCursor(conn, row_factory=tuple_row) as cursor:
+                await cursor.execute(f"EXPLAIN {statement}", params)
+                rows: List[tuple] = await cursor.fetchall()
+        return "\n".join(row[0] for row in rows)
+
+
+class TracingCursor(AsyncCursor[Row]):
+    """Cursor that times its statements and fetches."""
+
+    # Slow query log of the connections, None when it is disabled.
+    slow_query_log: ClassVar[Optional[SlowQueryLog]] = None
+
+    async def execute(
+        self,
+        query: Query,
+        params: Optional[Params] = None,
+        **kwargs: Any,
+    ) -> "TracingCursor[Row]":
+        start = time.perf_counter()
+        await super().execute(query, params, **kwargs)
+        elapsed = time.perf_counter() - start
+        query_trace = current_trace.get()
+        if query_trace is not None:
+            query_trace.execute += elapsed
+            query_trace.statements[normalize_statement(_statement_text(query))] = None
+        slow_query_log = self.slow_query_log
+        if slow_query_log is not None and slow_query_log.should_log(elapsed):
+            await slow_query_log.log(self.connection, query, params, elapsed)
+        return self
+
+    async def fetchone(self) -> Optional[Row]:
+        start = time.perf_counter()
+        row = await super().fetchone()
+        _record_fetch(start, row is not None)
+        return row
+
+    async def fetchmany(self, size: int = 0) -> List[Row]:
+        start = time.perf_counter()
+        rows = await super().fetchmany(size)
+        _record_fetch(start, len(rows))
+        return rows
+
+    async def fetchall(self) -> List[Row]:
+        start = time.perf_counter()
+        rows = await super().fetchall()
+        _record_fetch(start, len(rows))
+        return rows
+
+    async def __aiter__(self) -> AsyncIterator[Row]:
+        # Only the rows are counted, the time between them is the caller's.
+        query_trace = current_trace.get()
+        async for row in super().__aiter__():
+            if query_trace is not None:
+                query_trace.rows += 1
+            yield row
+
+
+class TracingServerCursor(AsyncServerCursor[Row]):
+    """Server side cursor that times its statements and fetches."""
+
+    async def execute(
+        self,
+        query: Query,
+        params: Optional[Params] = None,
+        **kwargs: Any,
+    ) -> "TracingServerCursor[Row]":
+        # Declaring the cursor only plans the statement, it is never logged.
+        start = time.perf_counter()
+        await super().execute(query, params, **kwargs)
+        query_trace = current_trace.get()
+        if query_trace is not None:
+            query_trace.execute += time.perf_counter() - start
+            query_trace.statements[normalize_statement(_statement_text(query))] = None
+        return self
+
+    async def fetchmany(self, size: int = 0) -> List[Row]:
+        start = time.perf_counter()
+        rows = await super().fetchmany(size)
+        _record_fetch(start, len(rows))
+        return rows
+
+
+def _record_fetch(start: float, rows: int) -> None:
+    query_trace = current_trace.get()
+    if query_trace is not None:
+        query_trace.fetch += time.perf_counter() - start
+        query_trace.rows += rows
+
+
+def enable_slow_query_log(slow_query_log: Optional[SlowQueryLog]) -> None:
+    """
+    Set the slow query log of the instrumented connections.
+
+    :param slow_query_log: the log, or None to disable it.
+    """
+    TracingCursor.slow_query_log = slow_query_log
+
+
+async def instrument_connection(conn: AsyncConnection[Any]) -> None:
+    """
+    Configure a connection of a pool to use the tracing cursors.
+
+    :param conn: the connection.
+    """
+    conn.cursor_factory = TracingCursor
+    conn.server_cursor_factory = TracingServerCursor
+
+
+@asynccontextmanager
+async def timed_connection(
+    connection: AsyncContextManager[AsyncConnection[Any]],
+) -> AsyncIterator[AsyncConnection[Any]]:
+    """
+    Connection of a pool that adds the time waited for it to the trace.
+
+    :param connection: the connection of the pool, not entered yet.
+    :yield: the connection.
+    """
+    start = time.perf_counter()
+    async with connection as conn:
+        query_trace = current_trace.get()
+        if query_trace is not None:
+            query_trace.wait += time.perf_counter() - start
+        yield conn
@@ -0,0 +1,60 @@
+"""
+Rebuild the rating aggregates of the states and cities from the restaurants.
+
+The database keeps them up to date on every write, they only need to be
+rebuilt after the restaurants are truncated, which skips the triggers,
+or after they were modified with the triggers disabled::
+
+    python -m test_project_edt.db.region_statistics
+
+The writes of the restaurants wait until the rebuild is committed.
+"""
+import argparse
+import asyncio
+import time
+from typing import Tuple
+
+from psycopg import AsyncConnection
+from psycopg.rows import tuple_row
+
+from test_project_edt.settings import settings
+
+
+async def rebuild_region_statistics(conn: AsyncConnection) -> int:
+    """
+    Recompute the aggregates of every city, in a transaction of its own.
+
+    :param conn: connection to the database.
+    :return: amount of cities with restaurants.
+    """
+    async with conn.transaction():
+        res = await conn.cursor(row_factory=tuple_row).execute(
+            "SELECT rebuild_restaurant_region_statistics()",
+        )
+        row = await res.fetchone()
+    return row[0]  # type: ignore
+
+
+async def run() -> Tuple[int, float]:
+    """
+    Rebuild the aggregates in the database of the settings.
+
+    :return: amount of cities and seconds taken to rebuild them.
+    """
+    start = time.perf_counter()
+    conn = await AsyncConnection.connect(str(settings.db_url))
+    async with conn:
+        regions = await rebuild_region_statistics(conn)
+    return regions, time.perf_counter() - start
+
+
+def main() -> None:
+    """Entrypoint of the rebuild."""
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.parse_args()
+    regions, elapsed = asyncio.run(run())
+    print(f"{regions} cities rebuilt in {elapsed:.1f}s")  # noqa: WPS421
+
+
+if __name__ == "__main__":
+    main()
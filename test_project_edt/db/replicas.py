@@ -0,0 +1,228 @@
+import asyncio
+import enum
+import itertools
+import logging
+from typing import Any, Dict, List, Optional
+
+from psycopg import AsyncConnection, Error
+from psycopg_pool import AsyncConnectionPool
+
+logger = logging.getLogger(__name__)
+
+# Header with the position of the last write of a client, its reads
+# are only answered by replicas that have already replayed it.
+READ_AFTER_LSN_HEADER = "X-Read-After-LSN"
+# Header with the position of the write done by the request.
+WRITE_LSN_HEADER = "X-Write-LSN"
+
+# Bits of each of the two hexadecimal halves of a WAL position.
+LSN_HALF_BITS = 32
+LSN_LOW_MASK = (1 << LSN_HALF_BITS) - 1
+HEXADECIMAL = 16
+
+CURRENT_LSN_QUERY = "SELECT pg_current_wal_lsn()::TEXT AS lsn"
+
+REPLICA_STATUS_QUERY = """
+    SELECT
+        CASE WHEN pg_is_in_recovery()
+            THEN pg_last_wal_replay_lsn()
+            ELSE pg_current_wal_lsn()
+        END::TEXT AS lsn,
+        CASE WHEN NOT pg_is_in_recovery()
+            OR pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn()
+            THEN 0
+            ELSE coalesce(
+                extract(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0
+            )
+        END::FLOAT AS lag;
+"""
+
+
+class ReplicaRouting(str, enum.Enum):  # noqa: WPS600
+    """Ways of choosing the replica of a read."""
+
+    ROUND_ROBIN = "round_robin"
+    LEAST_BUSY = "least_busy"
+
+
+def parse_lsn(lsn: str) -> int:
+    """
+    Convert a WAL position like `16/B374D848` into a number.
+
+    :param lsn: the position as shown by PostgreSQL.
+    :return: the position as a number that can be compared.
+    :raises ValueError: when the position isn't valid.
+    """
+    high, separator, low = lsn.partition("/")
+    if not separator:
+        raise ValueError(f"Invalid WAL position: {lsn}")
+    return (int(high, HEXADECIMAL) << LSN_HALF_BITS) | int(low, HEXADECIMAL)
+
+
+def format_lsn(lsn: int) -> str:
+    """
+    Convert a WAL position into the format used by PostgreSQL.
+
+    :param lsn: the position as a number.
+    :return: the position as shown by PostgreSQL.
+    """
+    high = lsn >> LSN_HALF_BITS
+    low = lsn & LSN_LOW_MASK
+    return f"{high:X}/{low:X}"
+
+
+def pool_load(pool: AsyncConnectionPool) -> int:
+    """
+    Connections in use of a pool plus the requests waiting for one.
+
+    :param pool: the pool.
+    :return: the load of the pool.
+    """
+    stats = pool.get_stats()
+    in_use = stats.get("pool_size", 0) - stats.get("pool_available", 0)
+    return in_use + stats.get("requests_waiting", 0)
+
+
+class ReadPosition:
+    """
+    Positions of the WAL that matter to the reads and writes of a request.
+
+    :param min_lsn: position that the server answering the reads
+        must have replayed, None when any replica can answer.
+    """
+
+    def __init__(self, min_lsn: Optional[int] = None):
+        self.min_lsn = min_lsn
+        # Set by the writes, sent to the client to read them back.
+        self.write_lsn: Optional[int] = None
+
+
+class Replica:
+    """A read replica along with its last known status."""
+
+    def __init__(self, pool: AsyncConnectionPool):
+        self.pool = pool
+        self.healthy = False
+        self.lag: float = 0
+        self.lsn = 0
+
+
+class ReplicaPools:
+    """
+    Connection pools of the read replicas.
+
+    The replicas are checked periodically, the ones that don't answer
+    or lag more than `max_lag` seconds behind the primary aren't used
+    until they catch up again. When no replica can answer a read,
+    it is sent to the primary.
+    """
+
+    def __init__(
+        self,
+        primary: AsyncConnectionPool,
+        replicas: List[AsyncConnectionPool],
+        routing: ReplicaRouting = ReplicaRouting.ROUND_ROBIN,
+        max_lag: float = 5,
+    ):
+        self.primary = primary
+        self.replicas = [Replica(pool) for pool in replicas]
+        self._routing = routing
+        self._max_lag = max_lag
+        self._turns = itertools.count()
+        self._checker: Optional["asyncio.Task[None]"] = None
+
+    def reader(self, min_lsn: Optional[int] = None) -> AsyncConnectionPool:
+        """
+        Choose the pool that answers a read.
+
+        :param min_lsn: position the server must have replayed.
+        :return: the pool of a healthy replica or the primary one.
+        """
+        candidates = [
+            replica
+            for replica in self.replicas
+            if replica.healthy and (min_lsn is None or replica.lsn >= min_lsn)
+        ]
+        if not candidates:
+            return self.primary
+        if self._routing == ReplicaRouting.LEAST_BUSY:
+            return min(candidates, key=lambda replica: pool_load(replica.pool)).pool
+        return candidates[next(self._turns) % len(candidates)].pool
+
+    async def check(self, timeout: float) -> None:
+        """
+        Refresh the status of every replica.
+
+        :param timeout: seconds to wait for the connections.
+        """
+        await asyncio.gather(
+            *(self._check(replica, timeout) for replica in self.replicas),
+        )
+
+    async def open(self, timeout: float, check_interval: float = 2) -> None:
+        """
+        Open the pools of the replicas and start checking them.
+
+        The pools keep connecting in the background, so the replicas
+        that aren't available yet are used once a check reaches them.
+
+        :param timeout: seconds to wait for the connections.
+        :param check_interval: seconds between the checks of the replicas.
+        """
+        for replica in self.replicas:
+            await replica.pool.open(wait=False)
+        await self.check(timeout)
+        self._checker = asyncio.create_task(self._check_periodically(check_interval))
+
+    async def close(self) -> None:
+        """Stop checking the replicas and close their pools."""
+        if self._checker is not None:
+            self._checker.cancel()
+        for replica in self.replicas:
+            await replica.pool.close()
+
+    def stats(self) -> List[Dict[str, Any]]:
+        """
+        Status of every replica, to monitor them.
+
+        :return: the status of the replicas, in the configured order.
+        """
+        return [
+            {
+                "healthy": replica.healthy,
+                "lag": replica.lag,
+                "lsn": format_lsn(replica.lsn),
+                "load": pool_load(replica.pool),
+            }
+            for replica in self.replicas
+        ]
+
+    async def _check(self, replica: Replica, timeout: float) -> None:
+        conn: AsyncConnection[Any]
+        try:
+            async with replica.pool.connection(timeout=timeout) as conn:
+                res = await conn.execute(REPLICA_STATUS_QUERY)
+                status = await res.fetchone()
+        except (Error, asyncio.TimeoutError):
+            if replica.healthy:
+                logger.warning("Ejecting a replica that doesn't answer")
+            replica.healthy = False
+            return
+
+        replica.lag = status["lag"]
+        replica.lsn = parse_lsn(status["lsn"])
+        healthy = replica.lag <= self._max_lag
+        if replica.healthy and not healthy:
+            logger.warning(
+                "Ejecting a replica %.1f seconds behind",  # noqa: WPS323
+                replica.lag,
+            )
+        replica.healthy = healthy
+
+    async def _check_periodically(self, interval: float) -> None:
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await self.check(interval)
+            except Exception:
+                logger.exception("The replicas couldn't be checked")
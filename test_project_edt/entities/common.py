@@ -1,10 +1,21 @@
+import base64
 from enum import Enum
-from typing import Annotated
+from typing import Annotated, Any, NamedTuple, Optional
 
+import orjson
 from fastapi import HTTPException, Query, status
-from pydantic import BaseModel, BeforeValidator
+from pydantic import (
+    BaseModel,
+    BeforeValidator,
+    Field,
+    TypeAdapter,
+    ValidationError,
+    model_validator,
+)
 
 from test_project_edt.db.models.restaurant import Restaurant
+from test_project_edt.entities.restaurant import FeedFormat
+from test_project_edt.entities.statistics import MAX_LATITUDE, MAX_LONGITUDE
 
 
 def validate_order_by_argument(orderby_argument: str) -> str:
@@ -17,12 +28,131 @@ def validate_order_by_argument(orderby_argument: str) -> str:
     return orderby_argument
 
 
+# Ordering of the search results, stored in their cursors.
+SEARCH_RANK = "search_rank"
+# Texts shorter than a trigram can't be looked up in the indexes.
+MIN_SEARCH_LENGTH = 3
+MAX_SEARCH_LENGTH = 100
+MAX_SEARCH_LIMIT = 100
+DEFAULT_SEARCH_LIMIT = 20
+# Ordering of the nearest restaurants, stored in their cursors.
+NEAREST_DISTANCE = "distance"
+MAX_NEAREST_K = 100
+DEFAULT_NEAREST_K = 20
+# Half of the circumference of the earth, in meters.
+MAX_NEAREST_RADIUS = 20037509
+# Cells of the restaurant clusters across the width of a map tile.
+CLUSTER_CELLS_PER_TILE = 8
+MAX_CLUSTER_CELLS_PER_SIDE = 64
+MAX_CLUSTER_ZOOM = 22
+MAX_TILE_ZOOM = 22
+# Values of the cursors compared with computed numbers, like search ranks
+# and distances.
+CURSOR_NUMBER = TypeAdapter(Annotated[float, Field(allow_inf_nan=False)])
+
+
 class AscOrDesc(Enum):
     DESC: str = "DESC"
     ASC: str = "ASC"
 
 
+class PageCursor(BaseModel):
+    """Position of the last element of a page, used to seek the next one."""
+
+    order_by: str
+    asc_or_desc: AscOrDesc
+    value: Any
+    id: str
+
+    def encode(self) -> str:
+        """Serialize the cursor into an opaque url-safe token."""
+        payload = orjson.dumps(
+            [self.order_by, self.asc_or_desc.value, self.value, self.id],
+        )
+        return base64.urlsafe_b64encode(payload).decode().rstrip("=")
+
+    @classmethod
+    def decode(cls, token: str) -> "PageCursor":
+        """Rebuild a cursor from a token created by `encode`."""
+        try:
+            padding = "=" * (-len(token) % 4)
+            order_by, asc_or_desc, value, identifier = orjson.loads(
+                base64.urlsafe_b64decode(token + padding),
+            )
+            return cls(
+                order_by=order_by,
+                asc_or_desc=asc_or_desc,
+                value=value,
+                id=identifier,
+            )
+        except (orjson.JSONDecodeError, TypeError, ValueError):
+            raise HTTPException(
+                status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                detail="the cursor is not valid",
+            )
+
+
+def validate_cursor_number(value: Any) -> None:
+    """Check that the value of a cursor is a finite number."""
+    try:
+        CURSOR_NUMBER.validate_python(value, strict=True)
+    except ValidationError:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail="the cursor is not valid",
+        )
+
+
+class BoundingBox(BaseModel):
+    min_lng: float = Field(ge=-MAX_LONGITUDE, le=MAX_LONGITUDE)
+    min_lat: float = Field(ge=-MAX_LATITUDE, le=MAX_LATITUDE)
+    max_lng: float = Field(ge=-MAX_LONGITUDE, le=MAX_LONGITUDE)
+    max_lat: float = Field(ge=-MAX_LATITUDE, le=MAX_LATITUDE)
+
+    @classmethod
+    def parse(cls, bbox_argument: str) -> "BoundingBox":
+        """Build a bounding box from `min_lng,min_lat,max_lng,max_lat`."""
+        try:
+            min_lng, min_lat, max_lng, max_lat = bbox_argument.split(",")
+            bounding_box = cls(
+                min_lng=min_lng,
+                min_lat=min_lat,
+                max_lng=max_lng,
+                max_lat=max_lat,
+            )
+        except ValueError:
+            bounding_box = None
+        if bounding_box is None or not bounding_box.ordered:
+            raise HTTPException(
+                status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                detail=f"the bounding box {bbox_argument} is not valid",
+            )
+        return bounding_box
+
+    @property
+    def ordered(self) -> bool:
+        """Whether the minimums aren't above the maximums."""
+        return self.min_lng <= self.max_lng and self.min_lat <= self.max_lat
+
+
+def validate_bbox_argument(bbox_argument: Optional[str]) -> Optional[str]:
+    if bbox_argument is not None:
+        BoundingBox.parse(bbox_argument)
+    return bbox_argument
+
+
+BboxArgument = Annotated[Optional[str], BeforeValidator(validate_bbox_argument)]
+
+
 class PaginationParams(BaseModel):
+    """
+    Pagination of the restaurants list.
+
+    The offset is kept for backward compatibility, when a cursor
+    is provided the offset is ignored and the page starts right after
+    the element the cursor points to.
+    """
+
     limit: int = Query(default=100, ge=1, le=1000)
     offset: int = Query(default=0, ge=0)
     order_by: Annotated[
@@ -30,3 +160,295 @@ class PaginationParams(BaseModel):
         BeforeValidator(validate_order_by_argument),
     ] = Query(default="id")
     asc_or_desc: AscOrDesc = Query(default=AscOrDesc.DESC)
+    cursor: Optional[str] = Query(default=None)
+    bbox: BboxArgument = Query(
+        default=None,
+        description="Bounding box as min_lng,min_lat,max_lng,max_lat",
+    )
+
+    @model_validator(mode="after")
+    def validate_cursor(self) -> "PaginationParams":
+        """Check that the cursor was created for the same ordering."""
+        if self.cursor is None:
+            return self
+        page_cursor = PageCursor.decode(self.cursor)
+        ordering = (self.order_by, self.asc_or_desc)
+        if ordering != (page_cursor.order_by, page_cursor.asc_or_desc):
+            raise HTTPException(
+                status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                detail="the cursor belongs to a different ordering",
+            )
+        # The value is compared with the column, it must have its type.
+        value_type = TypeAdapter(Restaurant.__annotations__[self.order_by])
+        try:
+            value_type.validate_python(page_cursor.value, strict=True)
+        except ValidationError:
+            raise HTTPException(
+                status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                detail="the cursor is not valid",
+            )
+        return self
+
+    @property
+    def page_cursor(self) -> Optional[PageCursor]:
+        """Decoded cursor of the page, if any."""
+        if self.cursor is None:
+            return None
+        return PageCursor.decode(self.cursor)
+
+    @property
+    def bounding_box(self) -> Optional[BoundingBox]:
+        """Parsed bounding box filter, if any."""
+        if self.bbox is None:
+            return None
+        return BoundingBox.parse(self.bbox)
+
+    def next_cursor(self, last_element: Any) -> str:
+        """
+        Create the cursor of the page following the given element.
+
+        :param last_element: last element of the current page.
+        :return: token of the next page.
+        """
+        return PageCursor(
+            order_by=self.order_by,
+            asc_or_desc=self.asc_or_desc,
+            value=getattr(last_element, self.order_by),
+            id=last_element.id,
+        ).encode()
+
+
+def validate_search_text(text: str) -> str:
+    length = len(text)
+    if length < MIN_SEARCH_LENGTH or length > MAX_SEARCH_LENGTH:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail=(
+                f"the text must have between {MIN_SEARCH_LENGTH} "
+                f"and {MAX_SEARCH_LENGTH} characters"
+            ),
+        )
+    return text
+
+
+def bounded(argument: str, minimum: float, maximum: float) -> BeforeValidator:
+    """
+    Validator of an argument that must be inside of a range.
+
+    :param argument: name of the argument, for the error.
+    :param minimum: lowest value allowed.
+    :param maximum: highest value allowed.
+    :return: the validator, values out of range are answered with a 422.
+    """
+
+    def validate(argument_value: Any) -> Any:  # noqa: WPS430
+        if argument_value is None:
+            return argument_value
+        if argument_value < minimum or argument_value > maximum:
+            raise HTTPException(
+                status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                detail=f"the {argument} must be between {minimum} and {maximum}",
+            )
+        return argument_value
+
+    return BeforeValidator(validate)
+
+
+class SearchParams(BaseModel):
+    """
+    Text searched over the name, city and state of the restaurants.
+
+    The results are sorted from the best match, the cursor points to the
+    last result of the previous page.
+    """
+
+    # Named as the query parameter of the API.
+    q: Annotated[  # noqa: WPS111
+        str,
+        BeforeValidator(validate_search_text),
+    ] = Query(min_length=MIN_SEARCH_LENGTH, max_length=MAX_SEARCH_LENGTH)
+    limit: Annotated[int, bounded("limit", 1, MAX_SEARCH_LIMIT)] = Query(
+        default=DEFAULT_SEARCH_LIMIT,
+        ge=1,
+        le=MAX_SEARCH_LIMIT,
+    )
+    cursor: Optional[str] = Query(default=None)
+
+    @model_validator(mode="after")
+    def validate_cursor(self) -> "SearchParams":
+        """Check that the cursor was created for a search."""
+        if self.cursor is None:
+            return self
+        page_cursor = PageCursor.decode(self.cursor)
+        if page_cursor.order_by != SEARCH_RANK:
+            raise HTTPException(
+                status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                detail="the cursor doesn't belong to a search",
+            )
+        # The value is compared with the rank of the results.
+        validate_cursor_number(page_cursor.value)
+        return self
+
+    @property
+    def page_cursor(self) -> Optional[PageCursor]:
+        """Decoded cursor of the page, if any."""
+        if self.cursor is None:
+            return None
+        return PageCursor.decode(self.cursor)
+
+    def next_cursor(self, rank: float, restaurant_id: str) -> str:
+        """
+        Create the cursor of the page following a result.
+
+        :param rank: rank of the last result of the current page.
+        :param restaurant_id: restaurant of the last result.
+        :return: token of the next page.
+        """
+        return PageCursor(
+            order_by=SEARCH_RANK,
+            asc_or_desc=AscOrDesc.DESC,
+            value=rank,
+            id=restaurant_id,
+        ).encode()
+
+
+class NearestParams(BaseModel):
+    """
+    Point around which the closest restaurants are searched.
+
+    The results are sorted from the closest one, the cursor points to
+    the last result of the previous page.
+    """
+
+    latitude: Annotated[
+        float,
+        bounded("latitude", -MAX_LATITUDE, MAX_LATITUDE),
+    ] = Query()
+    longitude: Annotated[
+        float,
+        bounded("longitude", -MAX_LONGITUDE, MAX_LONGITUDE),
+    ] = Query()
+    # Named as the query parameter of the API.
+    k: Annotated[int, bounded("k", 1, MAX_NEAREST_K)] = Query(  # noqa: WPS111
+        default=DEFAULT_NEAREST_K,
+        ge=1,
+        le=MAX_NEAREST_K,
+    )
+    max_radius: Annotated[
+        Optional[float],
+        bounded("max_radius", 0, MAX_NEAREST_RADIUS),
+    ] = Query(default=None, description="Farthest distance in meters")
+    min_rating: Annotated[Optional[int], bounded("min_rating", 0, 4)] = Query(
+        default=None,
+    )
+    cursor: Optional[str] = Query(default=None)
+
+    @model_validator(mode="after")
+    def validate_cursor(self) -> "NearestParams":
+        """Check that the cursor was created for a nearest search."""
+        if self.cursor is None:
+            return self
+        page_cursor = PageCursor.decode(self.cursor)
+        if page_cursor.order_by != NEAREST_DISTANCE:
+            raise HTTPException(
+                status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                detail="the cursor doesn't belong to a nearest search",
+            )
+        # The value is compared with the distance of the results.
+        validate_cursor_number(page_cursor.value)
+        return self
+
+    @property
+    def page_cursor(self) -> Optional[PageCursor]:
+        """Decoded cursor of the page, if any."""
+        if self.cursor is None:
+            return None
+        return PageCursor.decode(self.cursor)
+
+    def next_cursor(self, distance: float, restaurant_id: str) -> str:
+        """
+        Create the cursor of the page following a result.
+
+        :param distance: distance of the last result of the current page.
+        :param restaurant_id: restaurant of the last result.
+        :return: token of the next page.
+        """
+        return PageCursor(
+            order_by=NEAREST_DISTANCE,
+            asc_or_desc=AscOrDesc.ASC,
+            value=distance,
+            id=restaurant_id,
+        ).encode()
+
+
+class ClusterParams(BaseModel):
+    """
+    Viewport of a map whose restaurants are grouped in cells.
+
+    The cells are a fraction of the tiles of the zoom level, they only
+    grow when the viewport is too large for the zoom, so the amount of
+    cells stays bounded.
+    """
+
+    bbox: Annotated[str, BeforeValidator(validate_bbox_argument)] = Query(
+        description="Bounding box as min_lng,min_lat,max_lng,max_lat",
+    )
+    zoom: Annotated[int, bounded("zoom", 0, MAX_CLUSTER_ZOOM)] = Query(
+        ge=0,
+        le=MAX_CLUSTER_ZOOM,
+    )
+
+    @property
+    def bounding_box(self) -> BoundingBox:
+        """Parsed bounding box of the viewport."""
+        return BoundingBox.parse(self.bbox)
+
+    @property
+    def cell_size(self) -> float:
+        """Side in degrees of the grid cells."""
+        bounding_box = self.bounding_box
+        widest_side = max(
+            bounding_box.max_lng - bounding_box.min_lng,
+            bounding_box.max_lat - bounding_box.min_lat,
+        )
+        return max(
+            2 * MAX_LONGITUDE / 2**self.zoom / CLUSTER_CELLS_PER_TILE,
+            widest_side / MAX_CLUSTER_CELLS_PER_SIDE,
+        )
+
+
+class Tile(NamedTuple):
+    """Tile of a web map, in the XYZ scheme of the Web Mercator tiles."""
+
+    zoom: int
+    column: int
+    row: int
+
+    @property
+    def exists(self) -> bool:
+        """Whether the tile is inside of the map of its zoom level."""
+        side = 2**self.zoom
+        return (
+            0 <= self.zoom <= MAX_TILE_ZOOM
+            and 0 <= self.column < side
+            and 0 <= self.row < side
+        )
+
+
+class ExportParams(BaseModel):
+    """Format and filters of the restaurants export."""
+
+    format: FeedFormat = Query(default=FeedFormat.NDJSON)
+    state: Optional[str] = Query(default=None)
+    city: Optional[str] = Query(default=None)
+    bbox: BboxArgument = Query(
+        default=None,
+        description="Bounding box as min_lng,min_lat,max_lng,max_lat",
+    )
+
+    @property
+    def bounding_box(self) -> Optional[BoundingBox]:
+        """Parsed bounding box filter, if any."""
+        if self.bbox is None:
+            return None
+        return BoundingBox.parse(self.bbox)
@@ -12,6 +12,7 @@ class ClientErrorType(Enum):
     UNAUTHORIZED = 2
     FORBIDDEN = 3
     NOT_FOUND = 4
+    CONFLICT = 5
 
 
 class ClientError(Exception):
@@ -1,5 +1,10 @@
+from enum import Enum
+from typing import Any, List, Optional, Tuple
+
 from pydantic import BaseModel, Field
 
+from test_project_edt.db.models.restaurant import Restaurant
+
 
 class CreateRestaurantValidator(BaseModel):
     name: str
@@ -25,3 +30,82 @@ class UpdateRestaurantValidator(BaseModel):
     lat: float | None = None
     lng: float | None = None
     rating: int | None = Field(default=None, gte=0, lte=4)
+
+
+class ImportRestaurantValidator(CreateRestaurantValidator):
+    id: str | None = Field(default=None, min_length=1)
+
+
+class FeedFormat(Enum):
+    CSV: str = "csv"
+    NDJSON: str = "ndjson"
+
+
+# Rows of the export, with the values in the order of the restaurant fields.
+ExportChunk = List[Tuple[Any, ...]]
+
+
+class ImportConflictPolicy(Enum):
+    FAIL: str = "fail"
+    UPSERT: str = "upsert"
+
+
+class ImportResult(BaseModel):
+    inserted: int = 0
+    # Rows whose identifier already existed or was repeated in the feed
+    duplicates: int = 0
+    rejected: int = 0
+    # First validation errors, with the line they were found at
+    errors: List[str] = []
+
+
+class RestaurantMatch(BaseModel):
+    # How well the restaurant matches the search, the higher the better
+    rank: float
+    restaurant: Restaurant
+
+
+class NearbyRestaurant(BaseModel):
+    # Distance in meters from the point searched around
+    distance: float
+    restaurant: Restaurant
+
+
+class RestaurantCluster(BaseModel):
+    # Centroid of the restaurants of the cell
+    lat: float
+    lng: float
+    count: int
+    avg: Optional[float]
+    # The restaurants themselves, only when the cell has a few of them
+    restaurants: Optional[List[Restaurant]] = None
+
+
+class RenderedPage(BaseModel):
+    # JSON array with the restaurants of the page, rendered by the database
+    body: bytes
+    count: int
+    # Last restaurant of the page, used to build the cursor of the next one
+    last: Optional[Restaurant] = None
+
+
+class ChangeOperation(Enum):
+    INSERT = "INSERT"
+    UPDATE = "UPDATE"
+    DELETE = "DELETE"
+    # Too many restaurants changed at once to publish them one by one
+    BULK = "BULK"
+
+
+class RestaurantChange(BaseModel):
+    # Position of the change in the change log
+    seq: int
+    op: ChangeOperation
+    id: Optional[str] = None
+    # Location and rating after the change
+    lat: Optional[float] = None
+    lng: Optional[float] = None
+    rating: Optional[int] = None
+    # Location before the change
+    old_lat: Optional[float] = None
+    old_lng: Optional[float] = None
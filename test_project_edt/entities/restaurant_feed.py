@@ -0,0 +1,223 @@
+import csv
+import io
+from typing import Any, AsyncIterable, AsyncIterator, Dict, List, Sequence, Tuple
+
+import orjson
+from pydantic import ValidationError
+
+from test_project_edt.db.models.restaurant import Restaurant
+from test_project_edt.entities.http_entities import ClientError, ClientErrorType
+from test_project_edt.entities.restaurant import (
+    ExportChunk,
+    FeedFormat,
+    ImportRestaurantValidator,
+)
+
+Record = Tuple[int, Dict[str, Any]]
+
+# Longest line accepted, 64 KiB.
+MAX_LINE_LENGTH = 65536
+
+
+def _csv_record(header: List[str], values: List[str]) -> Dict[str, Any]:
+    """
+    Name the values of a CSV row after the fields of the header.
+
+    :param header: names of the fields.
+    :param values: values of the row.
+    :return: the record, without the id when it is empty.
+    """
+    record = dict(zip(header, values))
+    if not record.get("id"):
+        record.pop("id", None)
+    return record
+
+
+class RestaurantFeed:
+    """
+    Restaurants of a CSV or NDJSON document validated as they are received.
+
+    Only the line being parsed is kept in memory, invalid rows are
+    counted as rejected and the first errors are kept to report them.
+    CSV documents must start with a header with the names of the fields.
+    """
+
+    def __init__(
+        self,
+        chunks: AsyncIterable[bytes],
+        feed_format: FeedFormat,
+        max_errors: int = 100,
+        max_line_length: int = MAX_LINE_LENGTH,
+    ):
+        self.rejected = 0
+        self.errors: List[str] = []
+        self._chunks = chunks
+        self._format = feed_format
+        self._max_errors = max_errors
+        self._max_line_length = max_line_length
+
+    async def restaurants(self) -> AsyncIterator[Restaurant]:
+        """
+        Iterate over the valid restaurants of the feed.
+
+        :yield: the restaurants, in the order of the feed.
+        """
+        if self._format == FeedFormat.CSV:
+            records = self._csv_records()
+        else:
+            records = self._ndjson_records()
+        async for line_number, record in records:
+            try:
+                validated = ImportRestaurantValidator.model_validate(record)
+            except ValidationError as error:
+                self._reject(line_number, str(error).replace("\n", " "))
+                continue
+
+            restaurant_data = validated.model_dump()
+            if restaurant_data["id"] is None:
+                del restaurant_data["id"]  # noqa: WPS420
+            yield Restaurant(**restaurant_data)
+
+    async def _lines(self) -> AsyncIterator[Tuple[int, str]]:
+        """
+        Number and decode the lines of the feed, refusing the ones too
+        long or that aren't valid UTF-8.
+
+        :yield: the number of every line and the line, without its line break.
+        """
+        line_number = 0
+        async for line in self._split_lines():
+            line_number += 1
+            if len(line) > self._max_line_length:
+                raise ClientError(
+                    ClientErrorType.INVALID_INPUT,
+                    f"line {line_number} is too long",
+                )
+            try:
+                text = line.decode()
+            except UnicodeDecodeError:
+                raise ClientError(
+                    ClientErrorType.INVALID_INPUT,
+                    f"line {line_number} is not valid UTF-8",
+                )
+            yield line_number, text.rstrip("\r")
+
+    async def _split_lines(self) -> AsyncIterator[bytes]:
+        """
+        Split the received chunks into lines.
+
+        The lines are split before they are decoded, in UTF-8 the
+        byte of a line break is never part of another character.
+        A line that grows too long before it ends is returned as it is,
+        the rest of the chunks isn't read.
+
+        :yield: the lines, without their line feed.
+        """
+        pending = b""
+        async for chunk in self._chunks:
+            pending += chunk
+            *lines, pending = pending.split(b"\n")
+            for line in lines:
+                yield line
+            if len(pending) > self._max_line_length:
+                yield pending
+                return
+
+        if pending.strip():
+            yield pending
+
+    async def _ndjson_records(self) -> AsyncIterator[Record]:
+        async for line_number, line in self._lines():
+            if line.strip():
+                record = self._ndjson_record(line_number, line)
+                if record is not None:
+                    yield line_number, record
+
+    def _ndjson_record(self, line_number: int, line: str) -> Dict[str, Any] | None:
+        try:
+            record = orjson.loads(line)
+        except orjson.JSONDecodeError as error:
+            self._reject(line_number, str(error))
+            return None
+        if not isinstance(record, dict):
+            self._reject(line_number, "the line must contain an object")
+            return None
+        return record
+
+    async def _csv_texts(self) -> AsyncIterator[Tuple[int, str]]:
+        """
+        Join the lines of the records whose quoted fields contain line breaks.
+
+        :yield: the number of the last line of every record and its text.
+        """
+        physical_lines: List[str] = []
+        async for line_number, line in self._lines():
+            physical_lines.append(line)
+            # The record is complete once every opened quote has been closed.
+            record_text = "\n".join(physical_lines)
+            if record_text.count('"') % 2 == 0:
+                physical_lines = []
+                yield line_number, record_text
+            elif len(record_text) > self._max_line_length:
+                raise ClientError(
+                    ClientErrorType.INVALID_INPUT,
+                    f"line {line_number} is too long",
+                )
+
+    async def _csv_records(self) -> AsyncIterator[Record]:
+        header: List[str] | None = None
+        async for line_number, record_text in self._csv_texts():
+            if not record_text.strip():
+                continue
+            values = next(csv.reader([record_text]))
+            if header is None:
+                header = values
+            elif len(values) == len(header):
+                yield line_number, _csv_record(header, values)
+            else:
+                self._reject(line_number, "the number of fields doesn't match")
+
+    def _reject(self, line_number: int, reason: str) -> None:
+        self.rejected += 1
+        if len(self.errors) < self._max_errors:
+            self.errors.append(f"line {line_number}: {reason}")
+
+
+async def ndjson_chunks(
+    rows_chunks: AsyncIterable[ExportChunk],
+    columns: Sequence[str],
+) -> AsyncIterator[bytes]:
+    """
+    Serialize chunks of rows as NDJSON.
+
+    :param rows_chunks: chunks of rows with the values in the order of `columns`.
+    :param columns: names of the values of the rows.
+    :yield: one encoded chunk of lines per chunk of rows.
+    """
+    async for rows in rows_chunks:
+        yield b"".join(
+            orjson.dumps(dict(zip(columns, row)), option=orjson.OPT_APPEND_NEWLINE)
+            for row in rows
+        )
+
+
+async def csv_chunks(
+    rows_chunks: AsyncIterable[ExportChunk],
+    columns: Sequence[str],
+) -> AsyncIterator[bytes]:
+    """
+    Serialize chunks of rows as CSV, starting with a header.
+
+    :param rows_chunks: chunks of rows with the values in the order of `columns`.
+    :param columns: names of the values of the rows.
+    :yield: one encoded chunk of lines per chunk of rows.
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    yield buffer.getvalue().encode()
+    async for rows in rows_chunks:
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerows(rows)
+        yield buffer.getvalue().encode()
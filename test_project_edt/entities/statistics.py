@@ -0,0 +1,26 @@
+from enum import Enum
+from typing import List
+
+from pydantic import BaseModel, Field
+
+MAX_LATITUDE = 90
+MAX_LONGITUDE = 180
+# Most circles and points of a batch of statistics.
+MAX_RADII = 16
+MAX_POINTS = 1000
+
+
+class StatisticsPoint(BaseModel):
+    latitude: float = Field(ge=-MAX_LATITUDE, le=MAX_LATITUDE)
+    longitude: float = Field(ge=-MAX_LONGITUDE, le=MAX_LONGITUDE)
+    # Radii in meters of the circles around the point
+    radii: List[float] = Field(min_length=1, max_length=MAX_RADII)
+
+
+class StatisticsBatchRequest(BaseModel):
+    points: List[StatisticsPoint] = Field(min_length=1, max_length=MAX_POINTS)
+
+
+class RegionLevel(Enum):
+    STATE: str = "state"
+    CITY: str = "city"
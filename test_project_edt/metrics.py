@@ -0,0 +1,174 @@
+"""
+Prometheus metrics of the application.
+
+When the PROMETHEUS_MULTIPROC_DIR environment variable points to a
+directory, every worker writes its values to files there and the
+metrics endpoint aggregates the files of all of them. The directory
+must be emptied before the workers start.
+"""
+import os
+from typing import Dict, Tuple
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+from psycopg_pool import AsyncConnectionPool
+
+MULTIPROCESS_DIR_VARIABLE = "PROMETHEUS_MULTIPROC_DIR"
+METRICS_CONTENT_TYPE = CONTENT_TYPE_LATEST
+
+# From half a millisecond, for the lookups served by the caches,
+# up to ten seconds, for the exports and imports.
+LATENCY_BUCKETS = (
+    0.0005,
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1,
+    2.5,
+    5,
+    10,
+)
+ROWS_BUCKETS = (0, 1, 10, 100, 1000, 10000, 100000, 1000000)
+LOOP_LAG_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5)
+
+HTTP_REQUEST_DURATION = Histogram(
+    "http_request_duration_seconds",
+    "Time taken to answer the requests, by route.",
+    ["method", "route", "status"],
+    buckets=LATENCY_BUCKETS,
+)
+HTTP_REQUESTS_IN_FLIGHT = Gauge(
+    "http_requests_in_flight",
+    "Requests being answered, by route.",
+    ["method", "route"],
+    multiprocess_mode="livesum",
+)
+REPOSITORY_QUERY_DURATION = Histogram(
+    "repository_query_duration_seconds",
+    "Time taken by the methods of the restaurants repository to query the database.",
+    ["method"],
+    buckets=LATENCY_BUCKETS,
+)
+REPOSITORY_QUERY_ROWS = Histogram(
+    "repository_query_rows",
+    "Rows returned or written by the methods of the restaurants repository.",
+    ["method"],
+    buckets=ROWS_BUCKETS,
+)
+REPOSITORY_COALESCED_CALLS = Counter(
+    "repository_coalesced_calls",
+    "Reads answered by an identical read in progress, so not queried again.",
+    ["method"],
+)
+DB_POOL_CONNECTIONS = Gauge(
+    "db_pool_connections",
+    "Connections of the pools, open ones as size and idle ones as available.",
+    ["pool", "state"],
+    multiprocess_mode="livesum",
+)
+DB_POOL_REQUESTS_WAITING = Gauge(
+    "db_pool_requests_waiting",
+    "Requests waiting for a connection of the pools.",
+    ["pool"],
+    multiprocess_mode="livesum",
+)
+DB_POOL_WAIT = Counter(
+    "db_pool_wait_seconds",
+    "Time spent by the requests waiting for a connection of the pools.",
+    ["pool"],
+)
+DB_POOL_TIMEOUTS = Counter(
+    "db_pool_timeouts",
+    "Requests for a connection of the pools that timed out or failed.",
+    ["pool"],
+)
+EVENT_LOOP_LAG = Histogram(
+    "event_loop_lag_seconds",
+    "Delay of the event loop of the workers to run a ready callback.",
+    buckets=LOOP_LAG_BUCKETS,
+)
+
+
+def record_pool_stats(name: str, pool: AsyncConnectionPool) -> None:
+    """
+    Copy the statistics of a pool into the metrics.
+
+    The counters of the pool are reset, so they are added only once.
+
+    :param name: name of the pool in the metrics.
+    :param pool: the pool.
+    """
+    stats = pool.pop_stats()
+    DB_POOL_CONNECTIONS.labels(name, "size").set(stats.get("pool_size", 0))
+    DB_POOL_CONNECTIONS.labels(name, "available").set(stats.get("pool_available", 0))
+    DB_POOL_REQUESTS_WAITING.labels(name).set(stats.get("requests_waiting", 0))
+    DB_POOL_WAIT.labels(name).inc(stats.get("requests_wait_ms", 0) / 1000)
+    DB_POOL_TIMEOUTS.labels(name).inc(stats.get("requests_errors", 0))
+
+
+def render_metrics() -> Tuple[bytes, str]:
+    """
+    Render the metrics in the Prometheus text format.
+
+    :return: the metrics and their content type.
+    """
+    registry = REGISTRY
+    if os.environ.get(MULTIPROCESS_DIR_VARIABLE):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    return generate_latest(registry), METRICS_CONTENT_TYPE
+
+
+def mark_worker_dead(pid: int) -> None:
+    """
+    Drop the live gauges of a worker that stops.
+
+    :param pid: process id of the worker.
+    """
+    if os.environ.get(MULTIPROCESS_DIR_VARIABLE):
+        multiprocess.mark_process_dead(pid)
+
+
+def clear_multiprocess_dir() -> None:
+    """Remove the values of the previous workers, before starting new ones."""
+    directory = os.environ.get(MULTIPROCESS_DIR_VARIABLE)
+    if not directory:
+        return
+    os.makedirs(directory, exist_ok=True)
+    for filename in os.listdir(directory):
+        if filename.endswith(".db"):
+            os.remove(os.path.join(directory, filename))
+
+
+class LabelCache:
+    """
+    Children of a metric by their label values.
+
+    Looking up the children of a metric by label values validates and
+    hashes them every time, requests reuse the child they already used.
+    """
+
+    def __init__(self, metric: Histogram | Gauge):
+        self._metric = metric
+        self._children: Dict[Tuple[str, ...], Histogram | Gauge] = {}
+
+    def __call__(self, *labels: str) -> Histogram | Gauge:
+        child = self._children.get(labels)
+        if child is None:
+            child = self._metric.labels(*labels)
+            self._children[labels] = child
+        return child
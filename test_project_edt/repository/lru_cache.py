@@ -0,0 +1,179 @@
+import sys
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, Generic, Hashable, Iterator, Optional, Tuple, TypeVar
+
+KeyT = TypeVar("KeyT", bound=Hashable)
+ValueT = TypeVar("ValueT")
+
+
+class LRUCache(Generic[KeyT, ValueT]):
+    """
+    Bounded in-memory cache with least recently used eviction.
+
+    Entries also expire once they are older than the time to live.
+    The cache isn't thread safe, it is meant to be used from the
+    event loop of a single worker.
+
+    The memory taken by the values is estimated with `sizeof`
+    when they are stored and kept up to date in `memory_size`.
+    """
+
+    def __init__(
+        self,
+        maxsize: int,
+        ttl: float,
+        clock: Callable[[], float] = time.monotonic,
+        sizeof: Callable[[ValueT], int] = sys.getsizeof,
+    ):
+        self._maxsize = maxsize
+        self._ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self.memory_size = 0
+        # Incremented on every invalidation, readers compare it before
+        # and after a query to avoid storing a value that is already stale.
+        self.generation = 0
+        self._clock = clock
+        self._sizeof = sizeof
+        self._entries: "OrderedDict[KeyT, Tuple[float, ValueT, int]]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, key: object) -> bool:
+        return key in self._entries
+
+    @property
+    def hit_ratio(self) -> float:
+        """Fraction of the lookups answered by the cache."""
+        lookups = self.hits + self.misses
+        if not lookups:
+            return 0
+        return self.hits / lookups
+
+    def lookup(self, key: KeyT) -> Tuple[bool, Optional[ValueT]]:
+        """
+        Search an entry of the cache.
+
+        A flag is returned along with the value, so `None`
+        can be stored as a regular value.
+
+        :param key: key of the entry.
+        :return: whether the entry was found and its value.
+        """
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return False, None
+
+        expires_at, value, _ = entry
+        if expires_at <= self._clock():
+            self._remove(key)
+            self.misses += 1
+            return False, None
+
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return True, value
+
+    def get(self, key: KeyT) -> Optional[ValueT]:
+        """
+        Return the value of an entry.
+
+        :param key: key of the entry.
+        :return: the value or None when it isn't cached.
+        """
+        return self.lookup(key)[1]
+
+    def set(
+        self,
+        key: KeyT,
+        value: ValueT,
+        generation: Optional[int] = None,
+        ttl: Optional[float] = None,
+    ) -> None:
+        """
+        Store an entry, evicting the least recently used ones if needed.
+
+        :param key: key of the entry.
+        :param value: value to store.
+        :param generation: generation observed before computing the value,
+            the value is discarded if there were invalidations since then.
+        :param ttl: time to live of this entry instead of the default one.
+        """
+        if self._maxsize <= 0:
+            return
+        if generation is not None and generation != self.generation:
+            return
+
+        if key in self._entries:
+            self._remove(key)
+        size = self._sizeof(value)
+        lifetime = self._ttl if ttl is None else ttl
+        self._entries[key] = (self._clock() + lifetime, value, size)
+        self.memory_size += size
+        while len(self._entries) > self._maxsize:
+            self._remove(next(iter(self._entries)))
+            self.evictions += 1
+
+    def discard_pending(self) -> None:
+        """Prevent the values computed before this call from being stored."""
+        self.generation += 1
+
+    def invalidate(self, key: KeyT) -> None:
+        """
+        Remove an entry from the cache.
+
+        :param key: key of the entry.
+        """
+        self.generation += 1
+        if key in self._entries:
+            self._remove(key)
+            self.invalidations += 1
+
+    def invalidate_where(self, predicate: Callable[[KeyT], bool]) -> None:
+        """
+        Remove every entry whose key matches the predicate.
+
+        :param predicate: function that tells if a key must be removed.
+        """
+        self.generation += 1
+        stale_keys = [key for key in self._entries if predicate(key)]
+        for key in stale_keys:
+            self._remove(key)
+        self.invalidations += len(stale_keys)
+
+    def clear(self) -> None:
+        """Remove every entry from the cache."""
+        self.generation += 1
+        self.invalidations += len(self._entries)
+        self._entries.clear()
+        self.memory_size = 0
+
+    def keys(self) -> Iterator[KeyT]:
+        """Iterate over the keys, from the least to the most recently used."""
+        return iter(list(self._entries))
+
+    def stats(self) -> Dict[str, float]:
+        """
+        Counters of the cache, to size it.
+
+        :return: the counters by name.
+        """
+        return {
+            "entries": len(self._entries),
+            "maxsize": self._maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hit_ratio,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+            "memory_size": self.memory_size,
+        }
+
+    def _remove(self, key: KeyT) -> None:
+        _, _, size = self._entries.pop(key)
+        self.memory_size -= size
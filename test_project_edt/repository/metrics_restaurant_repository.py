@@ -0,0 +1,214 @@
+import time
+from contextlib import contextmanager
+from typing import (
+    AsyncIterable,
+    AsyncIterator,
+    Callable,
+    Dict,
+    Iterator,
+    List,
+    Sequence,
+    Tuple,
+)
+
+from prometheus_client import Histogram
+
+from test_project_edt.db.models.restaurant import Restaurant, UpdatedRestaurant
+from test_project_edt.db.models.statistics import RegionStatistics, Statistics
+from test_project_edt.entities.common import (
+    ClusterParams,
+    ExportParams,
+    NearestParams,
+    PaginationParams,
+    SearchParams,
+    Tile,
+)
+from test_project_edt.entities.restaurant import (
+    ExportChunk,
+    ImportConflictPolicy,
+    ImportResult,
+    NearbyRestaurant,
+    RenderedPage,
+    RestaurantCluster,
+    RestaurantMatch,
+)
+from test_project_edt.entities.statistics import RegionLevel, StatisticsPoint
+from test_project_edt.metrics import REPOSITORY_QUERY_DURATION, REPOSITORY_QUERY_ROWS
+from test_project_edt.repository.restaurant_repository_decorator import (
+    RestaurantRepositoryDecorator,
+)
+
+# Children of the metrics by method, bound once instead of on every call.
+_children: Dict[str, Tuple[Histogram, Histogram]] = {}
+
+
+def _method_metrics(method: str) -> Tuple[Histogram, Histogram]:
+    children = _children.get(method)
+    if children is None:
+        children = (
+            REPOSITORY_QUERY_DURATION.labels(method),
+            REPOSITORY_QUERY_ROWS.labels(method),
+        )
+        _children[method] = children
+    return children
+
+
+class MetricsRestaurantRepository(RestaurantRepositoryDecorator):
+    """
+    Restaurant repository that measures the queries of another one.
+
+    It decorates the repository that queries the database, so the calls
+    answered by the caches aren't counted. Rows are the restaurants or
+    statistics returned, or the restaurants written.
+    """
+
+    async def get_all(self, pagination_params: PaginationParams) -> List[Restaurant]:
+        with self._measure("get_all") as rows:
+            restaurants = await self._repository.get_all(pagination_params)
+            rows(len(restaurants))
+        return restaurants
+
+    async def get(self, restaurant_id: str) -> Restaurant | None:
+        with self._measure("get") as rows:
+            restaurant = await self._repository.get(restaurant_id)
+            rows(restaurant is not None)
+        return restaurant
+
+    async def get_all_json(self, pagination_params: PaginationParams) -> RenderedPage:
+        with self._measure("get_all_json") as rows:
+            page = await self._repository.get_all_json(pagination_params)
+            rows(page.count)
+        return page
+
+    async def get_json(self, restaurant_id: str) -> bytes | None:
+        with self._measure("get_json") as rows:
+            body = await self._repository.get_json(restaurant_id)
+            rows(body is not None)
+        return body
+
+    async def delete(self, restaurant_id: str) -> Restaurant | None:
+        with self._measure("delete") as rows:
+            restaurant = await self._repository.delete(restaurant_id)
+            rows(restaurant is not None)
+        return restaurant
+
+    async def add(self, restaurant_data: Restaurant) -> Restaurant:
+        with self._measure("add") as rows:
+            restaurant = await self._repository.add(restaurant_data)
+            rows(1)
+        return restaurant
+
+    async def update(
+        self,
+        restaurant_id: str,
+        restaurant_data: Restaurant,
+    ) -> UpdatedRestaurant | None:
+        with self._measure("update") as rows:
+            restaurant = await self._repository.update(restaurant_id, restaurant_data)
+            rows(restaurant is not None)
+        return restaurant
+
+    async def search(self, search_params: SearchParams) -> List[RestaurantMatch]:
+        with self._measure("search") as rows:
+            matches = await self._repository.search(search_params)
+            rows(len(matches))
+        return matches
+
+    async def nearest(self, nearest_params: NearestParams) -> List[NearbyRestaurant]:
+        with self._measure("nearest") as rows:
+            restaurants = await self._repository.nearest(nearest_params)
+            rows(len(restaurants))
+        return restaurants
+
+    async def clusters(
+        self,
+        cluster_params: ClusterParams,
+        threshold: int,
+    ) -> List[RestaurantCluster]:
+        with self._measure("clusters") as rows:
+            clusters = await self._repository.clusters(cluster_params, threshold)
+            rows(len(clusters))
+        return clusters
+
+    async def tile(self, tile: Tile) -> bytes:
+        with self._measure("tile") as rows:
+            body = await self._repository.tile(tile)
+            rows(1)
+        return body
+
+    async def get_statistics(
+        self,
+        latitude: float,
+        longitude: float,
+        radius: float,
+    ) -> Statistics:
+        with self._measure("get_statistics") as rows:
+            statistics = await self._repository.get_statistics(
+                latitude,
+                longitude,
+                radius,
+            )
+            rows(1)
+        return statistics
+
+    async def get_region_statistics(
+        self,
+        level: RegionLevel,
+    ) -> List[RegionStatistics]:
+        with self._measure("get_region_statistics") as rows:
+            statistics = await self._repository.get_region_statistics(level)
+            rows(len(statistics))
+        return statistics
+
+    async def get_statistics_many(
+        self,
+        points: Sequence[StatisticsPoint],
+    ) -> List[List[Statistics]]:
+        with self._measure("get_statistics_many") as rows:
+            statistics = await self._repository.get_statistics_many(points)
+            rows(sum(len(circles) for circles in statistics))
+        return statistics
+
+    async def bulk_add(
+        self,
+        restaurants: AsyncIterable[Restaurant],
+        on_conflict: ImportConflictPolicy,
+        batch_size: int,
+    ) -> ImportResult:
+        # The time includes receiving the feed, which the import is paced by.
+        with self._measure("bulk_add") as rows:
+            result = await self._repository.bulk_add(
+                restaurants,
+                on_conflict,
+                batch_size,
+            )
+            rows(result.inserted + result.duplicates)
+        return result
+
+    async def export(
+        self,
+        params: ExportParams,
+        chunk_size: int,
+    ) -> AsyncIterator[ExportChunk]:
+        # The time includes sending the chunks, which the export is paced by.
+        with self._measure("export") as rows:
+            exported = 0
+            async for chunk in self._repository.export(params, chunk_size):
+                exported += len(chunk)
+                yield chunk
+            rows(exported)
+
+    @contextmanager
+    def _measure(self, method: str) -> Iterator[Callable[[int], None]]:
+        """
+        Time a call, the rows are observed only when it succeeds.
+
+        :param method: name of the method.
+        :yield: function to call with the amount of rows.
+        """
+        duration, rows = _method_metrics(method)
+        start = time.perf_counter()
+        try:
+            yield rows.observe
+        finally:
+            duration.observe(time.perf_counter() - start)
@@ -1,133 +1,1301 @@
-from typing import Dict, List, NoReturn
+import math
+from typing import (  # noqa: WPS235
+    Any,
+    AsyncContextManager,
+    AsyncIterable,
+    AsyncIterator,
+    Dict,
+    List,
+    Optional,
+    Sequence,
+    Tuple,
+    Type,
+    TypeVar,
+)
 
-from psycopg import AsyncConnection, AsyncCursor, AsyncServerCursor
+import orjson
+from psycopg import AsyncConnection, AsyncCursor, AsyncServerCursor, errors
+from psycopg.rows import tuple_row
 from psycopg_pool import AsyncConnectionPool
-from pydantic import TypeAdapter
 
-from test_project_edt.db.models.restaurant import Restaurant
-from test_project_edt.db.models.statistics import Statistics
-from test_project_edt.entities.common import PaginationParams
+from test_project_edt.db.models.restaurant import Restaurant, UpdatedRestaurant
+from test_project_edt.db.models.statistics import RegionStatistics, Statistics
+from test_project_edt.db.query_tracing import timed_connection
+from test_project_edt.db.replicas import (
+    CURRENT_LSN_QUERY,
+    ReadPosition,
+    ReplicaPools,
+    parse_lsn,
+)
+from test_project_edt.entities.common import (
+    AscOrDesc,
+    ClusterParams,
+    ExportParams,
+    NearestParams,
+    PageCursor,
+    PaginationParams,
+    SearchParams,
+    Tile,
+)
+from test_project_edt.entities.http_entities import ClientError, ClientErrorType
+from test_project_edt.entities.restaurant import (
+    ExportChunk,
+    ImportConflictPolicy,
+    ImportResult,
+    NearbyRestaurant,
+    RenderedPage,
+    RestaurantCluster,
+    RestaurantMatch,
+)
+from test_project_edt.entities.statistics import (
+    MAX_LATITUDE,
+    MAX_LONGITUDE,
+    RegionLevel,
+    StatisticsPoint,
+)
+
+# Public columns of the restaurants table, the generated
+# ones are only used by the database to answer queries.
+RESTAURANT_FIELDS = tuple(Restaurant.__annotations__)
+RESTAURANT_COLUMNS = ", ".join(RESTAURANT_FIELDS)
+RestaurantT = TypeVar("RestaurantT", bound=Restaurant)
+
+# Size in degrees of the grid cells, it must match the
+# cell_x and cell_y columns of the restaurants table.
+GRID_CELL_SIZE = 0.01
+# Longest length in meters of a degree of latitude or longitude.
+MAX_METERS_PER_DEGREE = 111700
+# Upper bound in meters of the diagonal of a grid cell.
+GRID_CELL_DIAGONAL = math.ceil(GRID_CELL_SIZE * MAX_METERS_PER_DEGREE * math.sqrt(2))
+# Shortest length in meters of a degree of latitude and of
+# a degree of longitude at the equator.
+METERS_PER_LATITUDE_DEGREE = 110574
+METERS_PER_LONGITUDE_DEGREE = 111319
+# Circles reaching further than this latitude consider every longitude.
+POLAR_LATITUDE = 89
+# The widest parallel of a circle is a little wider than the circle.
+LONGITUDE_DELTA_FACTOR = 1.01
+# Equatorial radius in meters of the WGS 84 spheroid.
+EARTH_EQUATORIAL_RADIUS = 6378137
+# The north and south sides of a cell follow parallels, which bulge toward
+# the equator from the geodesic between their corners. The bulge is the
+# largest halfway along a side at 45 degrees of latitude, about 12 mm.
+GRID_CELL_SIDE_BULGE = (
+    EARTH_EQUATORIAL_RADIUS * math.radians(GRID_CELL_SIZE / 2) ** 2 / 4
+)
+# A millimeter, so the rounding of the distances never counts
+# a cell crossed by the border of a circle as covered.
+DISTANCE_ROUNDING_MARGIN = 0.001
+# Distance in meters from the border of a circle that the corners
+# of a cell must be within for the whole cell to be inside of it.
+GRID_CELL_COVER_MARGIN = GRID_CELL_SIDE_BULGE + DISTANCE_ROUNDING_MARGIN
+
+# The statistics are combined from the aggregates of the grid cells
+# that are fully inside of the circle, only the restaurants of the
+# cells crossed by the border of the circle are checked one by one.
+# A cell is inside when its corners are closer than the radius minus
+# GRID_CELL_COVER_MARGIN, so the result is the same as checking every
+# restaurant, for any circle that isn't larger than a hemisphere.
+# The restaurants read grow with the perimeter of the circle, while the
+# aggregates read grow with the cells with restaurants of its bounding
+# box, a single row for each of them however many restaurants it has.
+STATISTICS_QUERY = """
+    WITH center AS (
+        SELECT ST_SetSRID(
+            ST_MakePoint(%(longitude)s, %(latitude)s), 4326
+        )::GEOGRAPHY AS geog
+    ),
+    cells AS (
+        SELECT cell.*, (
+            ST_DWithin(center.geog, ST_SetSRID(ST_MakePoint(
+                cell.cell_x * %(cell_size)s, cell.cell_y * %(cell_size)s
+            ), 4326)::GEOGRAPHY, %(inner_radius)s)
+            AND ST_DWithin(center.geog, ST_SetSRID(ST_MakePoint(
+                (cell.cell_x + 1) * %(cell_size)s, cell.cell_y * %(cell_size)s
+            ), 4326)::GEOGRAPHY, %(inner_radius)s)
+            AND ST_DWithin(center.geog, ST_SetSRID(ST_MakePoint(
+                cell.cell_x * %(cell_size)s, (cell.cell_y + 1) * %(cell_size)s
+            ), 4326)::GEOGRAPHY, %(inner_radius)s)
+            AND ST_DWithin(center.geog, ST_SetSRID(ST_MakePoint(
+                (cell.cell_x + 1) * %(cell_size)s, (cell.cell_y + 1) * %(cell_size)s
+            ), 4326)::GEOGRAPHY, %(inner_radius)s)
+        ) AS covered
+        FROM restaurant_cell_statistics AS cell, center
+        WHERE cell.cell_y BETWEEN %(min_cell_y)s AND %(max_cell_y)s
+            AND cell.cell_x BETWEEN %(min_cell_x)s AND %(max_cell_x)s
+            AND cell.restaurant_count > 0
+            -- Distance to the closest point of the cell, minus the
+            -- cell diagonal, discards the cells outside of the circle.
+            AND ST_DWithin(center.geog, ST_SetSRID(ST_MakePoint(
+                least(greatest(%(longitude)s, cell.cell_x * %(cell_size)s),
+                    (cell.cell_x + 1) * %(cell_size)s),
+                least(greatest(%(latitude)s, cell.cell_y * %(cell_size)s),
+                    (cell.cell_y + 1) * %(cell_size)s)
+            ), 4326)::GEOGRAPHY, %(outer_radius)s)
+    ),
+    totals AS (
+        SELECT restaurant_count, rating_count, rating_sum, rating_square_sum
+        FROM cells
+        WHERE covered
+        UNION ALL
+        SELECT count(*), count(restaurants.rating),
+            coalesce(sum(restaurants.rating), 0),
+            coalesce(sum(restaurants.rating * restaurants.rating), 0)
+        FROM cells
+        JOIN restaurants
+            ON restaurants.cell_y = cells.cell_y
+            AND restaurants.cell_x = cells.cell_x
+        CROSS JOIN center
+        WHERE NOT cells.covered
+            AND ST_DWithin(restaurants.geog, center.geog, %(radius)s)
+    ),
+    summary AS (
+        SELECT coalesce(sum(restaurant_count), 0)::NUMERIC AS n,
+            coalesce(sum(rating_count), 0)::NUMERIC AS rated,
+            coalesce(sum(rating_sum), 0)::NUMERIC AS total,
+            coalesce(sum(rating_square_sum), 0)::NUMERIC AS square_total
+        FROM totals
+    )
+    SELECT n::BIGINT AS count,
+        total / nullif(rated, 0) AS avg,
+        CASE WHEN rated > 1 THEN sqrt(
+            (rated * square_total - total * total) / (rated * (rated - 1))
+        ) END AS stddev
+    FROM summary;
+"""  # noqa: WPS323
+
+
+# Exact match of a point with a bounding box, answered
+# with the geometry index of the location.
+BOUNDING_BOX_FILTER = """
+    geog::GEOMETRY && ST_MakeEnvelope(
+        %(min_lng)s, %(min_lat)s, %(max_lng)s, %(max_lat)s, 4326
+    )
+"""  # noqa: WPS323
+
+
+# The restaurants of the bounding box are grouped by the point of the grid
+# they snap to. The restaurants of the sparse cells are looked up again
+# through the index of the location, only within the cell.
+CLUSTERS_QUERY = f"""
+    WITH cells AS (
+        SELECT ST_SnapToGrid(geog::GEOMETRY, %(cell_size)s) AS cell,
+            count(*) AS count,
+            avg(rating)::FLOAT8 AS avg,
+            avg(lat) AS lat,
+            avg(lng) AS lng
+        FROM restaurants
+        WHERE {BOUNDING_BOX_FILTER}
+        GROUP BY cell
+    )
+    SELECT count, avg, lat, lng, CASE WHEN count <= %(threshold)s THEN (
+        SELECT json_agg(restaurant ORDER BY restaurant.id) FROM (
+            SELECT {RESTAURANT_COLUMNS} FROM restaurants
+            WHERE geog::GEOMETRY && ST_Expand(cell, %(cell_size)s / 2)
+                AND ST_SnapToGrid(geog::GEOMETRY, %(cell_size)s) = cell
+                AND {BOUNDING_BOX_FILTER}
+        ) AS restaurant
+    ) END AS restaurants
+    FROM cells
+    ORDER BY count DESC, lat, lng;
+"""  # noqa: S608, WPS323
+
+
+# Vector tiles have a single layer of restaurants. Their coordinates go
+# from 0 to the extent, and the features a little outside of the tile,
+# up to the buffer, are included so the markers aren't cut at the borders.
+TILE_LAYER = "restaurants"
+MVT_EXTENT = 4096
+MVT_BUFFER = 64
+TILE_MARGIN = MVT_BUFFER / MVT_EXTENT
+TILE_QUERY = f"""
+    SELECT ST_AsMVT(features, '{TILE_LAYER}', {MVT_EXTENT}, 'geom') AS body
+    FROM (
+        SELECT id, name, rating, ST_AsMVTGeom(
+            ST_Transform(geog::GEOMETRY, 3857),
+            ST_TileEnvelope(%(zoom)s, %(column)s, %(row)s),
+            {MVT_EXTENT},
+            {MVT_BUFFER}
+        ) AS geom
+        FROM restaurants
+        WHERE geog::GEOMETRY && ST_Transform(
+            ST_TileEnvelope(
+                %(zoom)s,
+                %(column)s,
+                %(row)s,
+                margin => {TILE_MARGIN}
+            ),
+            4326
+        )
+    ) AS features;
+"""  # noqa: S608, WPS323
+
+
+# Rows of a bulk import are copied into this table and moved
+# to the restaurants table in batches.
+IMPORT_STAGING_TABLE = """
+    CREATE TEMPORARY TABLE restaurants_import (
+        position BIGINT NOT NULL,
+        id TEXT NOT NULL,
+        rating INTEGER,
+        name TEXT,
+        site TEXT,
+        email TEXT,
+        phone TEXT,
+        street TEXT,
+        city TEXT,
+        state TEXT,
+        lat FLOAT,
+        lng FLOAT
+    ) ON COMMIT DROP;
+"""
+
+IMPORT_COPY = f"COPY restaurants_import (position, {RESTAURANT_COLUMNS}) FROM STDIN"
+
+IMPORT_INSERT = f"""
+    INSERT INTO restaurants ({RESTAURANT_COLUMNS})
+    SELECT {RESTAURANT_COLUMNS} FROM restaurants_import;
+"""  # noqa: S608
+
+_UPSERT_ASSIGNMENTS = ", ".join(
+    f"{column} = excluded.{column}" for column in RESTAURANT_FIELDS if column != "id"
+)
+
+# The last occurrence of an identifier in the feed wins,
+# xmax is only set for the rows that already existed.
+IMPORT_UPSERT = f"""
+    WITH upserted AS (
+        INSERT INTO restaurants ({RESTAURANT_COLUMNS})
+        SELECT DISTINCT ON (id) {RESTAURANT_COLUMNS}
+        FROM restaurants_import
+        ORDER BY id, position DESC
+        ON CONFLICT (id) DO UPDATE SET {_UPSERT_ASSIGNMENTS}
+        RETURNING xmax = 0 AS inserted
+    )
+    SELECT count(*) FILTER (WHERE inserted) AS inserted,
+        (SELECT count(*) FROM restaurants_import) AS staged
+    FROM upserted;
+"""  # noqa: S608
+
+
+# Every neighborhood is scanned once with the largest radius of its
+# point, then each restaurant found is matched against every radius.
+STATISTICS_MANY_QUERY = """
+    WITH points AS (
+        SELECT point_index, max_radius, ST_SetSRID(
+            ST_MakePoint(longitude, latitude), 4326
+        )::GEOGRAPHY AS center
+        FROM unnest(
+            %(latitudes)s::FLOAT8[],
+            %(longitudes)s::FLOAT8[],
+            %(max_radii)s::FLOAT8[]
+        ) WITH ORDINALITY AS point(latitude, longitude, max_radius, point_index)
+    ),
+    circles AS (
+        SELECT point_index, radius, circle_index
+        FROM unnest(
+            %(circle_points)s::BIGINT[],
+            %(radii)s::FLOAT8[]
+        ) WITH ORDINALITY AS circle(point_index, radius, circle_index)
+    ),
+    neighbors AS (
+        SELECT points.point_index, points.center, nearby.geog, nearby.rating
+        FROM points
+        CROSS JOIN LATERAL (
+            SELECT geog, rating
+            FROM restaurants
+            WHERE ST_DWithin(geog, points.center, points.max_radius)
+        ) AS nearby
+    )
+    SELECT circles.point_index,
+        count(neighbors.geog) AS count,
+        avg(neighbors.rating) AS avg,
+        stddev(neighbors.rating) AS stddev
+    FROM circles
+    LEFT JOIN neighbors
+        ON neighbors.point_index = circles.point_index
+        AND ST_DWithin(neighbors.geog, neighbors.center, circles.radius)
+    GROUP BY circles.circle_index, circles.point_index
+    ORDER BY circles.circle_index;
+"""  # noqa: WPS323
+
+
+def export_filter(params: ExportParams) -> Tuple[str, Dict[str, Any]]:
+    """
+    Build the WHERE clause of the export.
+
+    :param params: filters of the export.
+    :return: the clause, empty without filters, and its parameters.
+    """
+    conditions = []
+    query_params: Dict[str, Any] = {}
+    if params.state is not None:
+        conditions.append("state = %(state)s")  # noqa: WPS323
+        query_params["state"] = params.state
+    if params.city is not None:
+        conditions.append("city = %(city)s")  # noqa: WPS323
+        query_params["city"] = params.city
+    bounding_box = params.bounding_box
+    if bounding_box is not None:
+        conditions.append(BOUNDING_BOX_FILTER)
+        query_params.update(bounding_box.model_dump())
+    if not conditions:
+        return "", query_params
+    where_condition = " AND ".join(conditions)
+    return f"WHERE {where_condition}", query_params
+
+
+def import_row(position: int, restaurant: Restaurant) -> Tuple[Any, ...]:
+    """
+    Build the row of a restaurant in the staging table of the imports.
+
+    :param position: position of the restaurant in the feed.
+    :param restaurant: the restaurant.
+    :return: the values of the row.
+    """
+    return (
+        position,
+        *(getattr(restaurant, column) for column in RESTAURANT_FIELDS),
+    )
+
+
+def statistics_query_params(
+    latitude: float,
+    longitude: float,
+    radius: float,
+) -> Dict[str, float]:
+    """
+    Build the parameters of the statistics query.
+
+    The range of grid cells is the bounding box of the circle,
+    widened a little so it always contains the whole circle.
+    When the circle reaches a pole or the antimeridian every
+    longitude is considered.
+
+    :param latitude: latitude of the center of the circle.
+    :param longitude: longitude of the center of the circle.
+    :param radius: radius of the circle in meters.
+    :return: parameters of STATISTICS_QUERY.
+    """
+    latitude_delta = radius / METERS_PER_LATITUDE_DEGREE + GRID_CELL_SIZE
+    min_latitude = max(-MAX_LATITUDE, latitude - latitude_delta)
+    max_latitude = min(MAX_LATITUDE, latitude + latitude_delta)
+    min_longitude, max_longitude = _longitude_range(
+        longitude,
+        radius,
+        max(abs(min_latitude), abs(max_latitude)),
+    )
+
+    return {
+        "latitude": latitude,
+        "longitude": longitude,
+        "radius": radius,
+        "inner_radius": radius - GRID_CELL_COVER_MARGIN,
+        "outer_radius": radius + GRID_CELL_DIAGONAL,
+        "cell_size": GRID_CELL_SIZE,
+        "min_cell_x": math.floor(min_longitude / GRID_CELL_SIZE) - 1,
+        "max_cell_x": math.floor(max_longitude / GRID_CELL_SIZE) + 1,
+        "min_cell_y": math.floor(min_latitude / GRID_CELL_SIZE) - 1,
+        "max_cell_y": math.floor(max_latitude / GRID_CELL_SIZE) + 1,
+    }
+
+
+def _longitude_range(
+    longitude: float,
+    radius: float,
+    widest_latitude: float,
+) -> Tuple[float, float]:
+    """
+    Range of longitudes of the bounding box of a circle.
+
+    :param longitude: longitude of the center of the circle.
+    :param radius: radius of the circle in meters.
+    :param widest_latitude: latitude furthest from the equator of the circle.
+    :return: the smallest and the largest longitude.
+    """
+    if widest_latitude >= POLAR_LATITUDE:
+        return -MAX_LONGITUDE, MAX_LONGITUDE
+    longitude_delta = radius / (
+        METERS_PER_LONGITUDE_DEGREE * math.cos(math.radians(widest_latitude))
+    )
+    longitude_delta = longitude_delta * LONGITUDE_DELTA_FACTOR + GRID_CELL_SIZE
+    min_longitude = longitude - longitude_delta
+    max_longitude = longitude + longitude_delta
+    if min_longitude < -MAX_LONGITUDE or max_longitude > MAX_LONGITUDE:
+        return -MAX_LONGITUDE, MAX_LONGITUDE
+    return min_longitude, max_longitude
+
+
+def statistics_many_params(
+    points: Sequence[StatisticsPoint],
+) -> Dict[str, List[float]]:
+    """
+    Build the parameters of the statistics query of many circles.
+
+    :param points: centers of the circles with their radii.
+    :return: parameters of STATISTICS_MANY_QUERY.
+    """
+    return {
+        "latitudes": [point.latitude for point in points],
+        "longitudes": [point.longitude for point in points],
+        "max_radii": [max(point.radii) for point in points],
+        "circle_points": [
+            point_index
+            for point_index, point in enumerate(points, start=1)
+            for _ in point.radii
+        ],
+        "radii": [radius for point in points for radius in point.radii],
+    }
+
+
+def statistics_by_point(
+    rows: Sequence[Dict[str, Any]],
+    points_count: int,
+) -> List[List[Statistics]]:
+    """
+    Group the rows of the statistics query of many circles by their point.
+
+    :param rows: statistics of every circle, numbered by their point.
+    :param points_count: amount of points requested.
+    :return: statistics of every radius of every point.
+    """
+    statistics: List[List[Statistics]] = [[] for _ in range(points_count)]
+    for row in rows:
+        point_index = row.pop("point_index")
+        statistics[point_index - 1].append(Statistics(**row))
+    return statistics
+
+
+def region_statistics_query(level: RegionLevel) -> str:
+    """
+    Build the query of the rating statistics of every region of a level.
+
+    The aggregates of the cities, kept up to date by the database, are
+    added up, so the rows read don't grow with the restaurants.
+
+    :param level: whether the regions are the states or the cities.
+    :return: the query.
+    """
+    region_columns = "state" if level == RegionLevel.STATE else "state, city"
+    city = "NULL" if level == RegionLevel.STATE else "nullif(city, '')"
+    sums = (f"sum(rating_{rating}_count)" for rating in range(5))
+    histogram = ", ".join(sums)
+    return f"""
+        WITH regions AS (
+            SELECT nullif(state, '') AS state, {city}::TEXT AS city,
+                sum(restaurant_count) AS n,
+                sum(rating_count) AS rated,
+                sum(rating_sum) AS total,
+                sum(rating_square_sum) AS square_total,
+                ARRAY[{histogram}]::BIGINT[] AS histogram
+            FROM restaurant_region_statistics
+            GROUP BY {region_columns}
+        )
+        SELECT state, city, histogram, n::BIGINT AS count,
+            total / nullif(rated, 0) AS avg,
+            CASE WHEN rated > 1 THEN sqrt(
+                (rated * square_total - total * total) / (rated * (rated - 1))
+            ) END AS stddev
+        FROM regions
+        WHERE n > 0
+        ORDER BY state NULLS LAST, city NULLS LAST;
+    """  # noqa: S608
+
+
+# The restaurants with a word similar to the text, or starting with it, are
+# found through the trigram indexes. Prefix matches rank above the rest,
+# and the rank along with the id is the position of the keyset pagination.
+SEARCH_QUERY = f"""
+    SELECT {RESTAURANT_COLUMNS}, search_rank FROM (
+        SELECT {RESTAURANT_COLUMNS}, (
+            GREATEST(
+                word_similarity(%(text)s, name),
+                word_similarity(%(text)s, city),
+                word_similarity(%(text)s, state)
+            ) + CASE
+                WHEN name ILIKE %(prefix)s OR city ILIKE %(prefix)s
+                    OR state ILIKE %(prefix)s THEN 1
+                ELSE 0
+            END
+        )::FLOAT8 AS search_rank
+        FROM restaurants
+        WHERE %(text)s <%% name OR %(text)s <%% city OR %(text)s <%% state
+            OR name ILIKE %(prefix)s OR city ILIKE %(prefix)s
+            OR state ILIKE %(prefix)s
+    ) AS matches
+    WHERE %(cursor_rank)s::FLOAT8 IS NULL
+        OR (search_rank, id) < (%(cursor_rank)s::FLOAT8, %(cursor_id)s::TEXT)
+    ORDER BY search_rank DESC, id DESC
+    LIMIT %(limit)s;
+"""  # noqa: S608, WPS323
+
+
+# Escapes of the wildcards of LIKE, and of its escape character.
+LIKE_ESCAPES = str.maketrans({"\\": r"\\", "%": r"\%", "_": r"\_"})
+
+
+def like_prefix(text: str) -> str:
+    """
+    Pattern of LIKE that matches the values starting with a text.
+
+    :param text: the text, its wildcards are matched literally.
+    :return: the pattern.
+    """
+    escaped = text.translate(LIKE_ESCAPES)
+    return f"{escaped}%"
+
+
+def search_query_params(search_params: SearchParams) -> Dict[str, Any]:
+    """
+    Parameters of the search statement.
+
+    :param search_params: the text searched and the page.
+    :return: the parameters.
+    """
+    page_cursor = search_params.page_cursor
+    return {
+        "text": search_params.q,
+        "prefix": like_prefix(search_params.q),
+        "limit": search_params.limit,
+        "cursor_rank": page_cursor and page_cursor.value,
+        "cursor_id": page_cursor and page_cursor.id,
+    }
+
+
+# Center of the nearest restaurants search. It is repeated instead of being
+# selected once so the planner sees a constant, which the GiST index of the
+# locations needs to scan them by distance.
+_NEAREST_CENTER = (
+    "ST_SetSRID(ST_MakePoint(%(longitude)s, %(latitude)s), 4326)"  # noqa: WPS323
+    "::GEOGRAPHY"
+)
+
+
+def nearest_query(within_radius: bool) -> str:
+    """
+    Build the query of the restaurants closest to a point.
+
+    The restaurants are walked through the index from the closest one,
+    the distance along with the id is the position of the pagination.
+
+    :param within_radius: whether the restaurants farther than the
+        max_radius parameter are left out. The condition is only added
+        when needed so the index can use it to stop the walk.
+    :return: the query.
+    """
+    radius_condition = (
+        f"ST_DWithin(geog, {_NEAREST_CENTER}, %(max_radius)s) AND"  # noqa: WPS323
+        if within_radius
+        else ""
+    )
+    return f"""
+        SELECT {RESTAURANT_COLUMNS}, geog <-> {_NEAREST_CENTER} AS distance
+        FROM restaurants
+        WHERE {radius_condition}
+            (%(min_rating)s::INTEGER IS NULL OR rating >= %(min_rating)s)
+            AND (%(cursor_distance)s::FLOAT8 IS NULL OR (
+                geog <-> {_NEAREST_CENTER}, id
+            ) > (%(cursor_distance)s::FLOAT8, %(cursor_id)s::TEXT))
+        ORDER BY distance, id
+        LIMIT %(k)s;
+    """  # noqa: S608, WPS323
+
+
+def nearest_query_params(nearest_params: NearestParams) -> Dict[str, Any]:
+    """
+    Parameters of the nearest restaurants statements.
+
+    :param nearest_params: the point, the filters and the page.
+    :return: the parameters.
+    """
+    page_cursor = nearest_params.page_cursor
+    return {
+        "latitude": nearest_params.latitude,
+        "longitude": nearest_params.longitude,
+        "max_radius": nearest_params.max_radius,
+        "min_rating": nearest_params.min_rating,
+        "k": nearest_params.k,
+        "cursor_distance": page_cursor and page_cursor.value,
+        "cursor_id": page_cursor and page_cursor.id,
+    }
+
+
+def seek_conditions(page_cursor: PageCursor) -> List[str]:
+    """
+    Build the conditions of the rows that follow the cursor of a page.
+
+    Row comparisons never match nulls, so the rows without a value
+    in the ordering column are sought on their own. Every condition
+    is a single range of the (column, id) index of the ordering.
+
+    :param page_cursor: position of the last row of the previous page.
+    :return: the conditions, in the order of their rows, over the
+        cursor_value and cursor_id parameters.
+    """
+    order_by = page_cursor.order_by
+    ascending = page_cursor.asc_or_desc == AscOrDesc.ASC
+    comparison = ">" if ascending else "<"
+    if order_by == "id":
+        return [f"id {comparison} %(cursor_id)s"]  # noqa: WPS323
+    if page_cursor.value is None:
+        # Only the rest of the nulls follow them in ascending order,
+        # while every row with a value does in descending order.
+        nulls = f"{order_by} IS NULL AND id {comparison} %(cursor_id)s"  # noqa: WPS323
+        if ascending:
+            return [nulls]
+        return [nulls, f"{order_by} IS NOT NULL"]
+    seek = (
+        f"({order_by}, id) {comparison} "  # noqa: WPS323
+        "(%(cursor_value)s, %(cursor_id)s)"
+    )
+    if ascending:
+        return [seek, f"{order_by} IS NULL"]
+    return [seek]
+
+
+def page_order(order_by: str, asc_or_desc: str) -> str:
+    """
+    Build the ORDER BY clause of a page.
+
+    The id breaks the ties so every row has a unique position,
+    which is what makes the keyset pagination possible. The nulls
+    go last in ascending order and first in descending order, the
+    same as scanning the indexes of the columns in either direction.
+
+    :param order_by: column the restaurants are sorted by.
+    :param asc_or_desc: direction of the sorting.
+    :return: the clause.
+    """
+    if order_by == "id":
+        return f"ORDER BY id {asc_or_desc}"
+    nulls = "LAST" if asc_or_desc == AscOrDesc.ASC.value else "FIRST"
+    return f"ORDER BY {order_by} {asc_or_desc} NULLS {nulls}, id {asc_or_desc}"
+
+
+def page_filter(
+    pagination_params: PaginationParams,
+) -> Tuple[List[str], Dict[str, Any]]:
+    """
+    Build the WHERE clauses of a page.
+
+    The rows following a cursor may be in several ranges of the
+    index, each of them is read by a part of the page with its own clause.
+
+    :param pagination_params: position and filters of the page.
+    :return: the clause of every part, empty without conditions,
+        and their parameters.
+    """
+    filters = []
+    query_params: Dict[str, Any] = {}
+    bounding_box = pagination_params.bounding_box
+    if bounding_box is not None:
+        filters.append(BOUNDING_BOX_FILTER)
+        query_params.update(bounding_box.model_dump())
+    page_cursor = pagination_params.page_cursor
+    if page_cursor is None:
+        return [where_all(filters)], query_params
+    query_params.update(
+        offset=0,
+        cursor_value=page_cursor.value,
+        cursor_id=page_cursor.id,
+    )
+    seeks = seek_conditions(page_cursor)
+    return [where_all([seek, *filters]) for seek in seeks], query_params
+
+
+def where_all(conditions: Sequence[str]) -> str:
+    """
+    Build a WHERE clause matching every condition.
+
+    :param conditions: the conditions.
+    :return: the clause, empty without conditions.
+    """
+    if not conditions:
+        return ""
+    where_condition = " AND ".join(conditions)
+    return f"WHERE {where_condition}"
+
+
+def page_statement(where_clauses: Sequence[str], order_clause: str) -> str:
+    """
+    Build the query of a page of restaurants.
+
+    When the page has several parts, each of them reads at most a page of
+    rows from its range of the index and their union is sorted again.
+
+    :param where_clauses: the clause of every part of the page.
+    :param order_clause: ORDER BY clause of the page.
+    :return: the query.
+    """
+    if len(where_clauses) == 1:
+        return f"""SELECT {RESTAURANT_COLUMNS} FROM restaurants
+            {where_clauses[0]}
+            {order_clause}
+            LIMIT %(limit)s
+            OFFSET %(offset)s
+        """  # noqa: S608, WPS323
+    parts = " UNION ALL ".join(
+        f"""(SELECT {RESTAURANT_COLUMNS} FROM restaurants
+            {where}
+            {order_clause}
+            LIMIT %(limit)s)"""  # noqa: S608, WPS323
+        for where in where_clauses
+    )
+    return f"""{parts}
+        {order_clause}
+        LIMIT %(limit)s
+        OFFSET %(offset)s
+    """  # noqa: WPS323
+
+
+def rendered_page(row: Dict[str, Any]) -> RenderedPage:
+    """
+    Build a page rendered by the database.
+
+    :param row: row of RENDERED_PAGE_QUERY.
+    :return: the page, with the last restaurant parsed for its cursor.
+    """
+    last = None
+    if row["last"] is not None:
+        last = Restaurant(**orjson.loads(row["last"]))
+    return RenderedPage(
+        body=row["body"].encode(),
+        count=row["count"],
+        last=last,
+    )
+
+
+# Wraps the query of a page so the database renders it as a JSON array,
+# the subquery keeps its ordering since the rows are aggregated in order.
+RENDERED_PAGE_QUERY = """
+    SELECT rendered.body::TEXT AS body,
+        json_array_length(rendered.body) AS count,
+        (rendered.body -> -1)::TEXT AS last
+    FROM (
+        SELECT coalesce(json_agg(page), '[]'::JSON) AS body
+        FROM ({page_query}) AS page
+    ) AS rendered;
+"""
+
+_INSERT_VALUES = ", ".join(f"%({field})s" for field in RESTAURANT_FIELDS)
+_UPDATE_ASSIGNMENTS = ", ".join(
+    f"{field} = COALESCE(%({field})s, {field})"
+    for field in RESTAURANT_FIELDS
+    if field != "id"
+)
+
+# Statements run on most of the requests. They are executed as prepared
+# statements, so every connection parses and plans each of them only once.
+# Their text must not change between calls, the values go in the parameters.
+PREPARED_STATEMENTS: Dict[str, str] = {
+    "get": f"""
+        SELECT {RESTAURANT_COLUMNS} FROM restaurants WHERE id = %(id)s;
+    """,  # noqa: S608, WPS323
+    "get_json": f"""
+        SELECT row_to_json(restaurant)::TEXT AS body FROM (
+            SELECT {RESTAURANT_COLUMNS} FROM restaurants WHERE id = %(id)s
+        ) AS restaurant;
+    """,  # noqa: S608, WPS323
+    "add": f"""
+        INSERT INTO restaurants ({RESTAURANT_COLUMNS})
+        VALUES ({_INSERT_VALUES})
+        RETURNING {RESTAURANT_COLUMNS};
+    """,  # noqa: S608
+    # Fields without a value keep the stored one. The row is locked while
+    # its previous location is read, so it is the one replaced.
+    "update": f"""
+        UPDATE restaurants SET {_UPDATE_ASSIGNMENTS}
+        FROM (
+            SELECT id AS old_id, lat AS old_lat, lng AS old_lng
+            FROM restaurants
+            WHERE id = %(id)s
+            FOR UPDATE
+        ) AS old
+        WHERE id = old.old_id
+        RETURNING {RESTAURANT_COLUMNS}, old.old_lat, old.old_lng;
+    """,  # noqa: S608, WPS323
+    "delete": f"""
+        DELETE FROM restaurants WHERE id = %(id)s
+        RETURNING {RESTAURANT_COLUMNS};
+    """,  # noqa: S608, WPS323
+    "statistics": STATISTICS_QUERY,
+    "statistics_many": STATISTICS_MANY_QUERY,
+    "search": SEARCH_QUERY,
+    "nearest": nearest_query(within_radius=False),
+    "nearest_within": nearest_query(within_radius=True),
+    "clusters": CLUSTERS_QUERY,
+    "tile": TILE_QUERY,
+    "region_statistics_state": region_statistics_query(RegionLevel.STATE),
+    "region_statistics_city": region_statistics_query(RegionLevel.CITY),
+}
+
+
+def restaurant_params(restaurant: Restaurant) -> Dict[str, Any]:
+    """
+    Parameters of a restaurant for the prepared statements.
+
+    :param restaurant: the restaurant.
+    :return: the value of every field by name.
+    """
+    return {field: getattr(restaurant, field) for field in RESTAURANT_FIELDS}
 
 
 class PsycopgRestaurantRepository:
-    """Restaurant repository using Postgresql with psycopg."""
+    """
+    Restaurant repository using Postgresql with psycopg.
+
+    Writes always go to the primary pool. When there are replicas the reads
+    go to one of them, unless the read position of the request requires
+    a write that they haven't replayed yet. The position of every write
+    is stored in the read position, so the client can read it back.
+
+    When the connections are timed, the time waited for them is added
+    to the trace of the call in progress.
+    """
 
-    def __init__(self, connection: AsyncConnectionPool):
-        self._connection = connection.connection
+    def __init__(
+        self,
+        connection: AsyncConnectionPool,
+        replicas: Optional[ReplicaPools] = None,
+        read_position: Optional[ReadPosition] = None,
+        timed_connections: bool = False,
+    ):
+        self._pool = connection
+        self._replicas = replicas
+        self._read_position = read_position
+        self._timed_connections = timed_connections
 
     async def get_all(self, pagination_params: PaginationParams) -> List[Restaurant]:
         """Retrieve all the restaurant using pagination parameters."""
 
-        params_dict = pagination_params.model_dump(mode="json")
+        page_query, params_dict = self._page_query(pagination_params)
         conn: AsyncConnection[Restaurant]
         conn_check: AsyncCursor | AsyncServerCursor
-        async with self._connection() as conn:
+        async with self._read_connection() as conn:
+            async with conn.cursor() as conn_check:
+                res = await conn_check.execute(page_query, params=params_dict)
+                return [Restaurant(**row) for row in await res.fetchall()]
+
+    async def get_all_json(self, pagination_params: PaginationParams) -> RenderedPage:
+        """
+        Retrieve a page of restaurants as a JSON array rendered by the database.
+
+        The rows are never turned into python objects, only
+        the last one is parsed to build the cursor of the next page.
+        """
+        page_query, params_dict = self._page_query(pagination_params)
+        conn: AsyncConnection
+        conn_check: AsyncCursor | AsyncServerCursor
+        async with self._read_connection() as conn:
             async with conn.cursor() as conn_check:
                 res = await conn_check.execute(
-                    f"""SELECT * FROM restaurants
-                        ORDER BY {params_dict['order_by']} {params_dict['asc_or_desc']}
-                        LIMIT %(limit)s
-                        OFFSET %(offset)s;
-                    """,
+                    RENDERED_PAGE_QUERY.format(page_query=page_query),
                     params=params_dict,
                 )
-                rows = await res.fetchall()
-                return [Restaurant(**row) for row in rows]
+                return rendered_page(await res.fetchone())  # type: ignore
 
     async def get(self, restaurant_id: str) -> Restaurant | None:
         """Retrieve a restaurant by their unique identifier."""
+        return await self._execute_prepared("get", {"id": restaurant_id})
 
+    async def get_json(self, restaurant_id: str) -> bytes | None:
+        """Retrieve a restaurant as a JSON object rendered by the database."""
         conn: AsyncConnection
         conn_check: AsyncCursor | AsyncServerCursor
-
-        async with self._connection() as conn:
+        async with self._read_connection() as conn:
             async with conn.cursor() as conn_check:
                 res = await conn_check.execute(
-                    "SELECT * FROM restaurants where id = %(id)s",
+                    PREPARED_STATEMENTS["get_json"],
                     params={"id": restaurant_id},
+                    prepare=True,
                 )
-                row: Dict[str, str | int | float] | None = await res.fetchone()
+                row: Dict[str, str] | None = await res.fetchone()
                 if not row:
                     return None
-                return Restaurant(**row)
-
-    async def delete(self, restaurant_id: str) -> NoReturn:
+                return row["body"].encode()
 
+    async def delete(self, restaurant_id: str) -> Restaurant | None:
         """
         Delete a restaurant record using their unique identifier.
+
+        :return: the deleted restaurant or None when it didn't exist.
         """
-        async with self._connection() as conn:
+        return await self._execute_prepared(
+            "delete",
+            {"id": restaurant_id},
+            write=True,
+        )
+
+    async def add(self, restaurant_data: Restaurant) -> Restaurant:
+        """Insert a restaurant and return it as it was stored."""
+        restaurant = await self._execute_prepared(
+            "add",
+            restaurant_params(restaurant_data),
+            write=True,
+        )
+        return restaurant or restaurant_data
+
+    async def update(
+        self, restaurant_id: str, restaurant_data: Restaurant
+    ) -> UpdatedRestaurant | None:
+        """
+        Update the fields of a restaurant that have a value.
+
+        :return: the updated restaurant, along with its previous location,
+            or None when it doesn't exist.
+        """
+        return await self._execute_prepared(
+            "update",
+            {**restaurant_params(restaurant_data), "id": restaurant_id},
+            write=True,
+            model=UpdatedRestaurant,
+        )
+
+    async def search(self, search_params: SearchParams) -> List[RestaurantMatch]:
+        """
+        Find the restaurants whose name, city or state match a text.
+
+        :return: a page of the matches, from the best one.
+        """
+        conn: AsyncConnection
+        conn_check: AsyncCursor | AsyncServerCursor
+        async with self._read_connection() as conn:
             async with conn.cursor() as conn_check:
-                await conn_check.execute(
-                    "DELETE FROM restaurants where id = %(id)s;",
-                    params={"id": restaurant_id},
+                res = await conn_check.execute(
+                    PREPARED_STATEMENTS["search"],
+                    params=search_query_params(search_params),
+                    prepare=True,
                 )
+                rows = await res.fetchall()
+        return [
+            RestaurantMatch(rank=row.pop("search_rank"), restaurant=Restaurant(**row))
+            for row in rows
+        ]
 
-    async def add(self, restaurant_data: Restaurant) -> Restaurant:
-        async with self._connection() as conn:
+    async def nearest(self, nearest_params: NearestParams) -> List[NearbyRestaurant]:
+        """
+        Find the restaurants closest to a point.
+
+        :return: a page of the restaurants, from the closest one.
+        """
+        statement = "nearest_within"
+        if nearest_params.max_radius is None:
+            statement = "nearest"
+        conn: AsyncConnection
+        conn_check: AsyncCursor | AsyncServerCursor
+        async with self._read_connection() as conn:
             async with conn.cursor() as conn_check:
-                await conn_check.execute(
-                    """
-                        INSERT INTO Restaurants (
-                        id, rating, name,
-                        site, email, phone,
-                        street, city, state, lat, lng
-                        ) VALUES
-                        (%(id)s, %(rating)s, %(name)s,
-                        %(site)s, %(email)s, %(phone)s,
-                        %(street)s, %(city)s, %(state)s, %(lat)s, %(lng)s);
-                    """,
-                    params=TypeAdapter(Restaurant).dump_python(restaurant_data),
+                res = await conn_check.execute(
+                    PREPARED_STATEMENTS[statement],
+                    params=nearest_query_params(nearest_params),
+                    prepare=True,
                 )
+                rows = await res.fetchall()
+        return [
+            NearbyRestaurant(distance=row.pop("distance"), restaurant=Restaurant(**row))
+            for row in rows
+        ]
 
-                return restaurant_data
+    async def clusters(
+        self,
+        cluster_params: ClusterParams,
+        threshold: int,
+    ) -> List[RestaurantCluster]:
+        """
+        Group the restaurants of a bounding box in the cells of a grid.
 
-    async def update(
+        :param threshold: the cells with at most this many restaurants
+            list them as well.
+        :return: every cell with restaurants, from the densest one.
+        """
+        params = {
+            **cluster_params.bounding_box.model_dump(),
+            "cell_size": cluster_params.cell_size,
+            "threshold": threshold,
+        }
+        conn: AsyncConnection
+        conn_check: AsyncCursor | AsyncServerCursor
+        async with self._read_connection() as conn:
+            async with conn.cursor() as conn_check:
+                res = await conn_check.execute(
+                    PREPARED_STATEMENTS["clusters"],
+                    params=params,
+                    prepare=True,
+                )
+                rows = await res.fetchall()
+        return [RestaurantCluster(**row) for row in rows]
+
+    async def tile(self, tile: Tile) -> bytes:
+        """
+        Render the restaurants of a tile as a Mapbox Vector Tile.
+
+        :return: the tile, empty when it has no restaurants.
+        """
+        conn: AsyncConnection
+        conn_check: AsyncCursor | AsyncServerCursor
+        async with self._read_connection() as conn:
+            async with conn.cursor() as conn_check:
+                res = await conn_check.execute(
+                    PREPARED_STATEMENTS["tile"],
+                    params={"zoom": tile.zoom, "column": tile.column, "row": tile.row},
+                    prepare=True,
+                )
+                row: Dict[str, bytes] = await res.fetchone()
+        return row["body"]
+
+    async def get_region_statistics(
         self,
-        restaurant_id: str,
-        restaurant_data: Restaurant
-    ) -> Restaurant | None:
+        level: RegionLevel,
+    ) -> List[RegionStatistics]:
+        """
+        Rating statistics of every state or city with restaurants.
 
-        if not await self.get(restaurant_id):
-            return None
+        :return: the statistics of the regions, ordered by their names.
+        """
+        conn: AsyncConnection
+        conn_check: AsyncCursor | AsyncServerCursor
+        async with self._read_connection() as conn:
+            async with conn.cursor() as conn_check:
+                res = await conn_check.execute(
+                    PREPARED_STATEMENTS[f"region_statistics_{level.value}"],
+                    prepare=True,
+                )
+                rows = await res.fetchall()
+        return [RegionStatistics(**row) for row in rows]
 
-        async with self._connection() as conn:
+    async def get_statistics_many(
+        self,
+        points: Sequence[StatisticsPoint],
+    ) -> List[List[Statistics]]:
+        """
+        Compute the statistics of many circles in a single query.
+
+        :return: statistics of every radius of every point, in the
+            same order as they were requested.
+        """
+        async with self._read_connection() as conn:
             async with conn.cursor() as conn_check:
-                temp_data: Dict[str, str | int | float] = TypeAdapter(
-                    Restaurant
-                ).dump_python(restaurant_data, exclude_none=True, exclude={"id"})
-                set_arguments: str = f",".join(
-                    f"{key} = %({key})s" for key, _ in temp_data.items()
+                res = await conn_check.execute(
+                    PREPARED_STATEMENTS["statistics_many"],
+                    params=statistics_many_params(points),
+                    prepare=True,
                 )
+                rows = await res.fetchall()
+        return statistics_by_point(rows, len(points))
+
+    async def export(
+        self,
+        params: ExportParams,
+        chunk_size: int,
+    ) -> AsyncIterator[ExportChunk]:
+        """
+        Stream the restaurants matching the filters.
+
+        The rows are read from a server side cursor and yielded in
+        chunks, with the values in the order of `RESTAURANT_COLUMNS`.
+        The connection is held until the iteration finishes.
 
+        :yield: the chunks of rows.
+        """
+        where_clause, query_params = export_filter(params)
+        async with self._read_connection() as conn:
+            async with conn.cursor(
+                name="restaurants_export",
+                row_factory=tuple_row,
+            ) as conn_check:
                 await conn_check.execute(
-                    f"""
-                        UPDATE Restaurants
-                            SET {set_arguments}
-                        WHERE id = %(id)s;
-                    """,
-                    params={"id": restaurant_id, **temp_data},
+                    f"SELECT {RESTAURANT_COLUMNS} FROM restaurants "  # noqa: S608
+                    f"{where_clause}",
+                    params=query_params,
                 )
+                rows = await conn_check.fetchmany(chunk_size)
+                while rows:
+                    yield rows
+                    rows = await conn_check.fetchmany(chunk_size)
+
+    async def bulk_add(
+        self,
+        restaurants: AsyncIterable[Restaurant],
+        on_conflict: ImportConflictPolicy,
+        batch_size: int,
+    ) -> ImportResult:
+        """
+        Insert many restaurants using COPY.
 
-                return restaurant_data
+        The restaurants are streamed into a staging table and moved to
+        the restaurants table every `batch_size` rows, so the memory used
+        doesn't depend on the amount of restaurants. Everything is imported
+        in a single transaction, when existing identifiers are not
+        upserted the first conflict aborts the whole import.
+        """
+        async with self._connection() as conn:
+            async with conn.transaction():
+                await conn.execute(IMPORT_STAGING_TABLE)
+                result = await self._import_restaurants(
+                    conn,
+                    restaurants,
+                    on_conflict,
+                    batch_size,
+                )
+            await self._record_write(conn)
+        return result
 
     async def get_statistics(
         self, latitude: float, longitude: float, radius: float
     ) -> Statistics:
-        async with self._connection() as conn:
+        async with self._read_connection() as conn:
             async with conn.cursor() as conn_check:
                 res = await conn_check.execute(
-                    """
-                       SELECT count(*), avg(rating), stddev(rating)
-                        FROM restaurants
-                        WHERE ST_DWithin(
-                            ST_SetSRID(ST_MakePoint(lng, lat),4326)::GEOGRAPHY,
-                            ST_SetSRID(
-                                ST_MakePoint(%(longitude)s, %(latitude)s),
-                                4326)::GEOGRAPHY,
-                            %(radius)s);
-                    """,
-                    params={"latitude": latitude, "longitude": longitude, "radius": radius},
+                    PREPARED_STATEMENTS["statistics"],
+                    params=statistics_query_params(latitude, longitude, radius),
+                    prepare=True,
                 )
                 row: Dict[str, float] | None = await res.fetchone()
                 return Statistics(**row)
+
+    async def _import_restaurants(
+        self,
+        conn: AsyncConnection,
+        restaurants: AsyncIterable[Restaurant],
+        on_conflict: ImportConflictPolicy,
+        batch_size: int,
+    ) -> ImportResult:
+        """Stage the restaurants and move them every `batch_size` rows."""
+        result = ImportResult()
+        position = 0
+        batch: List[tuple] = []
+        async for restaurant in restaurants:
+            position += 1
+            batch.append(import_row(position, restaurant))
+            if len(batch) >= batch_size:
+                await self._import_batch(conn, batch, on_conflict, result)
+                batch = []
+        if batch:
+            await self._import_batch(conn, batch, on_conflict, result)
+        return result
+
+    async def _import_batch(
+        self,
+        conn: AsyncConnection,
+        batch: List[tuple],
+        on_conflict: ImportConflictPolicy,
+        result: ImportResult,
+    ) -> None:
+        async with conn.cursor() as conn_check:
+            async with conn_check.copy(IMPORT_COPY) as copy:
+                for row in batch:
+                    await copy.write_row(row)
+            await self._move_import_batch(conn_check, on_conflict, result)
+            await conn_check.execute("TRUNCATE restaurants_import")
+
+    async def _move_import_batch(
+        self,
+        conn_check: AsyncCursor,
+        on_conflict: ImportConflictPolicy,
+        result: ImportResult,
+    ) -> None:
+        """Move the staged restaurants to the restaurants table."""
+        if on_conflict == ImportConflictPolicy.UPSERT:
+            res = await conn_check.execute(IMPORT_UPSERT)
+            counts: Dict[str, int] = await res.fetchone()
+            result.inserted += counts["inserted"]
+            result.duplicates += counts["staged"] - counts["inserted"]
+            return
+        try:
+            await conn_check.execute(IMPORT_INSERT)
+        except errors.UniqueViolation as error:
+            detail = error.diag.message_detail
+            raise ClientError(
+                ClientErrorType.CONFLICT,
+                f"duplicated restaurant: {detail}",
+            )
+        result.inserted += conn_check.rowcount
+
+    def _page_query(
+        self,
+        pagination_params: PaginationParams,
+    ) -> Tuple[str, Dict[str, Any]]:
+        """
+        Build the query of a page of restaurants.
+
+        :return: the query and its parameters.
+        """
+        params_dict = pagination_params.model_dump(mode="json")
+        where_clauses, filter_params = page_filter(pagination_params)
+        params_dict.update(filter_params)
+        order_clause = page_order(
+            params_dict["order_by"],
+            params_dict["asc_or_desc"],
+        )
+        return page_statement(where_clauses, order_clause), params_dict
+
+    async def _execute_prepared(
+        self,
+        statement: str,
+        params: Dict[str, Any],
+        write: bool = False,
+        model: Type[RestaurantT] = Restaurant,  # type: ignore
+    ) -> Optional[RestaurantT]:
+        """
+        Run a prepared statement that returns at most one restaurant.
+
+        :param statement: name of the statement in PREPARED_STATEMENTS.
+        :param params: parameters of the statement.
+        :param write: whether the statement modifies the restaurants.
+        :param model: class of the restaurant returned.
+        :return: the restaurant returned by the statement, if any.
+        """
+        conn: AsyncConnection
+        conn_check: AsyncCursor | AsyncServerCursor
+        connection = self._connection() if write else self._read_connection()
+        async with connection as conn:
+            async with conn.cursor() as conn_check:
+                res = await conn_check.execute(
+                    PREPARED_STATEMENTS[statement],
+                    params=params,
+                    prepare=True,
+                )
+                row: Dict[str, Any] | None = await res.fetchone()
+            if write:
+                await self._record_write(conn)
+        if not row:
+            return None
+        return model(**row)
+
+    def _connection(self) -> AsyncContextManager[AsyncConnection]:
+        """Connection of the primary pool."""
+        return self._acquire(self._pool)
+
+    def _read_connection(self) -> AsyncContextManager[AsyncConnection]:
+        """Connection of the pool that answers the reads of the request."""
+        if self._replicas is None:
+            return self._connection()
+        min_lsn = None
+        if self._read_position is not None:
+            min_lsn = self._read_position.min_lsn
+        return self._acquire(self._replicas.reader(min_lsn))
+
+    def _acquire(
+        self,
+        pool: AsyncConnectionPool,
+    ) -> AsyncContextManager[AsyncConnection]:
+        connection = pool.connection()
+        if self._timed_connections:
+            return timed_connection(connection)
+        return connection
+
+    async def _record_write(self, conn: AsyncConnection) -> None:
+        """
+        Commit a write and store its position in the read position.
+
+        The position is only read when there are replicas, the following
+        reads of the request are answered by servers that replayed it.
+        """
+        if self._replicas is None or self._read_position is None:
+            return
+        # The position must be read after the commit is in the WAL.
+        await conn.commit()
+        res = await conn.execute(CURRENT_LSN_QUERY)
+        row: Dict[str, str] = await res.fetchone()
+        self._read_position.write_lsn = parse_lsn(row["lsn"])
+        self._read_position.min_lsn = self._read_position.write_lsn
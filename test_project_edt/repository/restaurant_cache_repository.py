@@ -0,0 +1,147 @@
+import sys
+from dataclasses import fields
+from typing import AsyncIterable, Optional
+
+import orjson
+
+from test_project_edt.db.models.restaurant import Restaurant, UpdatedRestaurant
+from test_project_edt.entities.restaurant import (
+    ChangeOperation,
+    ImportConflictPolicy,
+    ImportResult,
+    RestaurantChange,
+)
+from test_project_edt.repository.lru_cache import LRUCache
+from test_project_edt.repository.restaurant_repository_decorator import (
+    RestaurantRepositoryDecorator,
+)
+from test_project_edt.repository.resturant_repository_protocol import (
+    RestaurantRepository,
+)
+
+
+def restaurant_size(restaurant: Optional[Restaurant]) -> int:
+    """
+    Estimate the memory taken by a restaurant and its values.
+
+    :param restaurant: the restaurant, None for the negative entries.
+    :return: the size in bytes.
+    """
+    size = sys.getsizeof(restaurant)
+    if restaurant is not None:
+        size += sys.getsizeof(restaurant.__dict__)
+        size += sum(
+            sys.getsizeof(getattr(restaurant, field.name))
+            for field in fields(restaurant)
+        )
+    return size
+
+
+class RestaurantCache:
+    """
+    Cache of the restaurants by id.
+
+    Restaurants that don't exist are cached as well,
+    with their own and usually shorter time to live.
+    """
+
+    def __init__(
+        self,
+        cache: LRUCache[str, Optional[Restaurant]],
+        negative_ttl: float,
+    ):
+        self.cache = cache
+        self.negative_ttl = negative_ttl
+
+    def apply_change(self, change: RestaurantChange) -> None:
+        """
+        Remove the entry of a restaurant changed in the database.
+
+        :param change: the change.
+        """
+        if change.op == ChangeOperation.BULK or change.id is None:
+            self.cache.clear()
+        else:
+            self.cache.invalidate(change.id)
+
+
+class RestaurantCacheRepository(RestaurantRepositoryDecorator):
+    """
+    Restaurant repository that reads the restaurants through a cache.
+
+    Writes done through the repository remove the entries of the
+    restaurants they modify. The writes of other workers reach the
+    cache through the change listener, which receives them over
+    LISTEN/NOTIFY and reads the ones it missed while disconnected
+    from the change log. Without the listener, they are only noticed
+    once the entries expire.
+    """
+
+    def __init__(
+        self,
+        repository: RestaurantRepository,
+        restaurant_cache: RestaurantCache,
+    ):
+        super().__init__(repository)
+        self._restaurant_cache = restaurant_cache
+
+    async def get(self, restaurant_id: str) -> Restaurant | None:
+        cache = self._restaurant_cache.cache
+        found, restaurant = cache.lookup(restaurant_id)
+        if found:
+            return restaurant
+
+        generation = cache.generation
+        restaurant = await self._repository.get(restaurant_id)
+        cache.set(
+            restaurant_id,
+            restaurant,
+            generation=generation,
+            ttl=self._restaurant_cache.negative_ttl if restaurant is None else None,
+        )
+        return restaurant
+
+    async def get_json(self, restaurant_id: str) -> bytes | None:
+        # Serializing a cached restaurant is cheaper than any query, the
+        # misses are read as restaurants to fill the cache.
+        restaurant = await self.get(restaurant_id)
+        if restaurant is None:
+            return None
+        return orjson.dumps(restaurant)
+
+    async def add(self, restaurant_data: Restaurant) -> Restaurant:
+        restaurant = await self._repository.add(restaurant_data)
+        # The id may have been cached as missing.
+        self._restaurant_cache.cache.invalidate(restaurant.id)
+        return restaurant
+
+    async def update(
+        self,
+        restaurant_id: str,
+        restaurant_data: Restaurant,
+    ) -> UpdatedRestaurant | None:
+        try:  # noqa: WPS501
+            return await self._repository.update(restaurant_id, restaurant_data)
+        finally:
+            self._restaurant_cache.cache.invalidate(restaurant_id)
+
+    async def delete(self, restaurant_id: str) -> Restaurant | None:
+        try:  # noqa: WPS501
+            return await self._repository.delete(restaurant_id)
+        finally:
+            self._restaurant_cache.cache.invalidate(restaurant_id)
+
+    async def bulk_add(
+        self,
+        restaurants: AsyncIterable[Restaurant],
+        on_conflict: ImportConflictPolicy,
+        batch_size: int,
+    ) -> ImportResult:
+        try:  # noqa: WPS501
+            return await self._repository.bulk_add(
+                restaurants,
+                on_conflict,
+                batch_size,
+            )
+        finally:
+            self._restaurant_cache.cache.clear()
@@ -0,0 +1,113 @@
+from typing import AsyncIterable, AsyncIterator, List, Sequence
+
+from test_project_edt.db.models.restaurant import Restaurant, UpdatedRestaurant
+from test_project_edt.db.models.statistics import RegionStatistics, Statistics
+from test_project_edt.entities.common import (
+    ClusterParams,
+    ExportParams,
+    NearestParams,
+    PaginationParams,
+    SearchParams,
+    Tile,
+)
+from test_project_edt.entities.restaurant import (
+    ExportChunk,
+    ImportConflictPolicy,
+    ImportResult,
+    NearbyRestaurant,
+    RenderedPage,
+    RestaurantCluster,
+    RestaurantMatch,
+)
+from test_project_edt.entities.statistics import RegionLevel, StatisticsPoint
+from test_project_edt.repository.resturant_repository_protocol import (
+    RestaurantRepository,
+)
+
+
+class RestaurantRepositoryDecorator:
+    """
+    Restaurant repository that forwards every call to another one.
+
+    Subclasses override only the methods they add behaviour to,
+    so decorators can be stacked over the real repository.
+    """
+
+    def __init__(self, repository: RestaurantRepository):
+        self._repository = repository
+
+    async def get_all(self, pagination_params: PaginationParams) -> List[Restaurant]:
+        return await self._repository.get_all(pagination_params)
+
+    async def get(self, restaurant_id: str) -> Restaurant | None:
+        return await self._repository.get(restaurant_id)
+
+    async def get_all_json(self, pagination_params: PaginationParams) -> RenderedPage:
+        return await self._repository.get_all_json(pagination_params)
+
+    async def get_json(self, restaurant_id: str) -> bytes | None:
+        return await self._repository.get_json(restaurant_id)
+
+    async def delete(self, restaurant_id: str) -> Restaurant | None:
+        return await self._repository.delete(restaurant_id)
+
+    async def add(self, restaurant_data: Restaurant) -> Restaurant:
+        return await self._repository.add(restaurant_data)
+
+    async def update(
+        self,
+        restaurant_id: str,
+        restaurant_data: Restaurant,
+    ) -> UpdatedRestaurant | None:
+        return await self._repository.update(restaurant_id, restaurant_data)
+
+    async def search(self, search_params: SearchParams) -> List[RestaurantMatch]:
+        return await self._repository.search(search_params)
+
+    async def nearest(self, nearest_params: NearestParams) -> List[NearbyRestaurant]:
+        return await self._repository.nearest(nearest_params)
+
+    async def clusters(
+        self,
+        cluster_params: ClusterParams,
+        threshold: int,
+    ) -> List[RestaurantCluster]:
+        return await self._repository.clusters(cluster_params, threshold)
+
+    async def tile(self, tile: Tile) -> bytes:
+        return await self._repository.tile(tile)
+
+    async def get_statistics(
+        self,
+        latitude: float,
+        longitude: float,
+        radius: float,
+    ) -> Statistics:
+        return await self._repository.get_statistics(latitude, longitude, radius)
+
+    async def get_region_statistics(
+        self,
+        level: RegionLevel,
+    ) -> List[RegionStatistics]:
+        return await self._repository.get_region_statistics(level)
+
+    async def get_statistics_many(
+        self,
+        points: Sequence[StatisticsPoint],
+    ) -> List[List[Statistics]]:
+        return await self._repository.get_statistics_many(points)
+
+    async def bulk_add(
+        self,
+        restaurants: AsyncIterable[Restaurant],
+        on_conflict: ImportConflictPolicy,
+        batch_size: int,
+    ) -> ImportResult:
+        return await self._repository.bulk_add(restaurants, on_conflict, batch_size)
+
+    def export(
+        self,
+        params: ExportParams,
+        chunk_size: int,
+    ) -> AsyncIterator[ExportChunk]:
+        return self._repository.export(params, chunk_size)
@@ -0,0 +1,479 @@
+import asyncio
+import itertools
+import logging
+import math
+import time
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from psycopg.rows import tuple_row
+from psycopg_pool import AsyncConnectionPool
+
+from test_project_edt.db.models.restaurant import Restaurant
+from test_project_edt.db.models.statistics import Statistics
+from test_project_edt.entities.restaurant import ChangeOperation, RestaurantChange
+from test_project_edt.entities.statistics import MAX_LATITUDE, MAX_LONGITUDE
+from test_project_edt.repository.pyscopg_restaurant_repository import (
+    METERS_PER_LATITUDE_DEGREE,
+    METERS_PER_LONGITUDE_DEGREE,
+    POLAR_LATITUDE,
+)
+from test_project_edt.repository.statistics_cache_repository import (
+    EARTH_RADIUS,
+    SPHEROID_TOLERANCE,
+)
+
+Cell = Tuple[int, int]
+# Writes received while the snapshot is reloaded, the id along
+# with the restaurant stored or None when it was deleted.
+JournalEntry = Tuple[str, Optional[Restaurant]]
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_QUERY = "SELECT id, lat, lng, rating FROM restaurants"
+# Rows fetched at once while the snapshot is loaded.
+SNAPSHOT_CHUNK_SIZE = 50000
+# Unused slots tolerated before compacting, on top of one per restaurant.
+MIN_COMPACTED_SLOTS = 1000
+# Slots of the arrays the first time they grow.
+MIN_CAPACITY = 16
+# Margin of the bounding box of a circle for the spheroid.
+SPHEROID_FACTOR = 1 + SPHEROID_TOLERANCE
+
+
+def haversine_distances(
+    latitude: float,
+    longitude: float,
+    latitudes: np.ndarray,
+    longitudes: np.ndarray,
+) -> np.ndarray:
+    """
+    Distances in meters from a point to many points over a spherical earth.
+
+    :return: an array with the distance to each point.
+    """
+    latitude_radians = math.radians(latitude)
+    latitudes_radians = np.radians(latitudes)
+    chord = np.minimum(
+        1,
+        np.sin((latitudes_radians - latitude_radians) / 2) ** 2
+        + math.cos(latitude_radians)
+        * np.cos(latitudes_radians)
+        * np.sin(np.radians(longitudes - longitude) / 2) ** 2,
+    )
+    central_angles = 2 * np.arcsin(np.sqrt(chord))
+    return EARTH_RADIUS * central_angles
+
+
+def latitude_range(latitude: float, radius: float) -> Tuple[float, float]:
+    """
+    Latitudes of the bounding box of a circle.
+
+    :param latitude: latitude of the center of the circle.
+    :param radius: radius of the circle in meters.
+    :return: the southernmost and northernmost latitudes.
+    """
+    latitude_delta = radius / METERS_PER_LATITUDE_DEGREE * SPHEROID_FACTOR
+    return (
+        max(-MAX_LATITUDE, latitude - latitude_delta),
+        min(MAX_LATITUDE, latitude + latitude_delta),
+    )
+
+
+def longitude_range(
+    longitude: float,
+    radius: float,
+    widest_latitude: float,
+) -> Optional[Tuple[float, float]]:
+    """
+    Longitudes of the bounding box of a circle.
+
+    :param longitude: longitude of the center of the circle.
+    :param radius: radius of the circle in meters.
+    :param widest_latitude: latitude of the widest parallel of the box.
+    :return: the westernmost and easternmost longitudes, None when the
+        circle reaches a pole or the antimeridian.
+    """
+    if widest_latitude >= POLAR_LATITUDE:
+        return None
+    parallel_length = METERS_PER_LONGITUDE_DEGREE * math.cos(
+        math.radians(widest_latitude),
+    )
+    longitude_delta = radius / parallel_length * SPHEROID_FACTOR
+    min_longitude = longitude - longitude_delta
+    max_longitude = longitude + longitude_delta
+    if min_longitude < -MAX_LONGITUDE or max_longitude > MAX_LONGITUDE:
+        return None
+    return min_longitude, max_longitude
+
+
+def grid_cells(
+    latitudes: np.ndarray,
+    longitudes: np.ndarray,
+    cell_size: float,
+) -> Dict[Cell, np.ndarray]:
+    """
+    Group the slots of the located restaurants by grid cell.
+
+    :param latitudes: latitude of every slot, NaN when missing.
+    :param longitudes: longitude of every slot, NaN when missing.
+    :param cell_size: side in degrees of the cells.
+    :return: slots of every populated cell.
+    """
+    located = np.flatnonzero(
+        np.logical_and(~np.isnan(latitudes), ~np.isnan(longitudes)),
+    )
+    cell_ys = np.floor(latitudes[located] / cell_size).astype(np.int64)
+    cell_xs = np.floor(longitudes[located] / cell_size).astype(np.int64)
+    order = np.lexsort((cell_xs, cell_ys))
+    return split_cells(located[order], cell_ys[order], cell_xs[order])
+
+
+def split_cells(
+    slots: np.ndarray,
+    cell_ys: np.ndarray,
+    cell_xs: np.ndarray,
+) -> Dict[Cell, np.ndarray]:
+    """
+    Split the slots sorted by cell at every change of cell.
+
+    :param slots: the sorted slots.
+    :param cell_ys: row of the cell of every slot.
+    :param cell_xs: column of the cell of every slot.
+    :return: slots of every cell.
+    """
+    boundaries = np.flatnonzero(
+        np.logical_or(np.diff(cell_ys), np.diff(cell_xs)),
+    )
+    boundaries += 1
+    starts = np.concatenate(([0], boundaries)) if slots.size else []
+    return {
+        (int(cell_ys[start]), int(cell_xs[start])): cell_slots
+        for start, cell_slots in zip(starts, np.split(slots, boundaries))
+    }
+
+
+async def read_restaurants(
+    pool: AsyncConnectionPool,
+    chunk_size: int,
+) -> Tuple[List[str], np.ndarray]:
+    """
+    Read the location and rating of every restaurant.
+
+    :param pool: database connections pool.
+    :param chunk_size: rows fetched at once.
+    :return: the identifiers and an array with a row of latitudes,
+        one of longitudes and one of ratings, missing values are NaN.
+    """
+    ids: List[str] = []
+    chunks: List[np.ndarray] = [np.empty((0, 3))]
+    async with pool.connection() as conn:
+        async with conn.cursor(
+            name="restaurants_snapshot",
+            row_factory=tuple_row,
+        ) as cursor:
+            await cursor.execute(SNAPSHOT_QUERY)
+            rows = await cursor.fetchmany(chunk_size)
+            while rows:
+                ids.extend(row[0] for row in rows)
+                chunks.append(chunk_values(rows))
+                rows = await cursor.fetchmany(chunk_size)
+    return ids, np.concatenate(chunks).T
+
+
+def chunk_values(rows: Sequence[Tuple[Any, ...]]) -> np.ndarray:
+    """
+    Gather the values of a chunk of the snapshot query.
+
+    :param rows: rows of SNAPSHOT_QUERY.
+    :return: the location and rating of every row, None values become NaN.
+    """
+    return np.array([row[1:] for row in rows], dtype=np.float64)
+
+
+class RestaurantSnapshot:
+    """
+    Copy in memory of the location and rating of every restaurant.
+
+    The values are kept in contiguous arrays, one slot per restaurant,
+    and a uniform grid maps every cell to the slots of the restaurants
+    inside of it. Statistics only measure the distance to the restaurants
+    of the cells that overlap the bounding box of the circle.
+
+    Distances are measured over a sphere while PostGIS measures them over
+    the WGS84 spheroid. Both differ in less than SPHEROID_TOLERANCE (1%)
+    of the distance, so only the restaurants closer to the border of the
+    circle than 1% of its radius may be counted differently than by
+    `ST_DWithin`.
+
+    Updated and deleted restaurants leave their old slot behind, the
+    arrays are compacted once half of the slots are unused.
+    """
+
+    def __init__(self, cell_size: float = 0.05):
+        self.cell_size = cell_size
+        # Set while the snapshot may miss some writes, until it is reloaded.
+        self.stale = True
+        self._latitudes = np.empty(0)
+        self._longitudes = np.empty(0)
+        self._ratings = np.empty(0)
+        self._alive = np.empty(0, dtype=bool)
+        self._ids: List[str] = []
+        self._slots: Dict[str, int] = {}
+        self._cells: Dict[Cell, np.ndarray] = {}
+        self._journal: Optional[List[JournalEntry]] = None
+
+    def __len__(self) -> int:
+        return len(self._slots)
+
+    def load(
+        self,
+        ids: Sequence[str],
+        latitudes: np.ndarray,
+        longitudes: np.ndarray,
+        ratings: np.ndarray,
+    ) -> None:
+        """
+        Replace the content of the snapshot.
+
+        Missing coordinates and ratings are NaN.
+
+        :param ids: identifiers of the restaurants.
+        :param latitudes: latitude of every restaurant.
+        :param longitudes: longitude of every restaurant.
+        :param ratings: rating of every restaurant.
+        """
+        self._build(ids, latitudes, longitudes, ratings)
+        self.stale = False
+
+    async def reload(
+        self,
+        pool: AsyncConnectionPool,
+        chunk_size: int = SNAPSHOT_CHUNK_SIZE,
+    ) -> None:
+        """
+        Load the snapshot from the database.
+
+        Writes applied while the restaurants are read are
+        replayed over the new content once it is loaded.
+
+        :param pool: database connections pool.
+        :param chunk_size: rows fetched at once.
+        """
+        self._journal = []
+        try:  # noqa: WPS501
+            ids, columns = await read_restaurants(pool, chunk_size)
+            journal = self._journal
+        finally:
+            self._journal = None
+
+        self.load(ids, *columns)
+        for restaurant_id, restaurant in journal:
+            self._apply(restaurant_id, restaurant)
+
+    async def refresh(self, pool: AsyncConnectionPool, interval: float) -> None:
+        """
+        Reload the snapshot once it is stale or too old, until cancelled.
+
+        :param pool: database connections pool.
+        :param interval: seconds after which the snapshot is reloaded.
+        """
+        loaded_at = time.monotonic()
+        while True:
+            await asyncio.sleep(1)
+            if self.stale or time.monotonic() - loaded_at >= interval:
+                try:
+                    await self.reload(pool)
+                except Exception:
+                    logger.exception("The restaurants snapshot couldn't be reloaded")
+                loaded_at = time.monotonic()
+
+    def upsert(self, restaurant: Restaurant) -> None:
+        """
+        Store the current version of a restaurant.
+
+        :param restaurant: the restaurant as it was stored.
+        """
+        self._apply(restaurant.id, restaurant)
+
+    def remove(self, restaurant_id: str) -> None:
+        """
+        Remove a restaurant.
+
+        :param restaurant_id: identifier of the restaurant.
+        """
+        self._apply(restaurant_id, None)
+
+    def apply_change(self, change: RestaurantChange) -> None:
+        """
+        Apply a change published by the database.
+
+        :param change: the change.
+        """
+        if change.op == ChangeOperation.BULK or change.id is None:
+            self.stale = True
+        elif change.op == ChangeOperation.DELETE:
+            self.remove(change.id)
+        else:
+            self.upsert(
+                Restaurant(
+                    id=change.id,
+                    lat=change.lat,
+                    lng=change.lng,
+                    rating=change.rating,
+                ),
+            )
+
+    def statistics(
+        self,
+        latitude: float,
+        longitude: float,
+        radius: float,
+    ) -> Statistics:
+        """
+        Compute the statistics of the restaurants inside of a circle.
+
+        :param latitude: latitude of the center of the circle.
+        :param longitude: longitude of the center of the circle.
+        :param radius: radius of the circle in meters.
+        :return: the statistics of the circle.
+        """
+        slots = self._candidates(latitude, longitude, radius)
+        slots = slots[self._alive[slots]]
+        distances = haversine_distances(
+            latitude,
+            longitude,
+            self._latitudes[slots],
+            self._longitudes[slots],
+        )
+        slots = slots[distances <= radius]
+        ratings = self._ratings[slots]
+        ratings = ratings[~np.isnan(ratings)]
+        avg = ratings.mean() if ratings.size else 0
+        std = ratings.std(ddof=1) if ratings.size > 1 else 0
+        return Statistics(
+            count=int(slots.size),
+            avg=float(avg),
+            stddev=float(std),
+        )
+
+    def _apply(self, restaurant_id: str, restaurant: Optional[Restaurant]) -> None:
+        if self._journal is not None:
+            self._journal.append((restaurant_id, restaurant))
+
+        slot = self._slots.pop(restaurant_id, None)
+        if slot is not None:
+            self._alive[slot] = False
+        if restaurant is not None:
+            self._append(restaurant)
+        unused_slots = len(self._ids) - len(self._slots)
+        if unused_slots > max(len(self._slots), MIN_COMPACTED_SLOTS):
+            self._compact()
+
+    def _append(self, restaurant: Restaurant) -> None:
+        slot = len(self._ids)
+        if slot == self._alive.size:
+            capacity = max(MIN_CAPACITY, slot * 2)
+            self._latitudes = np.resize(self._latitudes, capacity)
+            self._longitudes = np.resize(self._longitudes, capacity)
+            self._ratings = np.resize(self._ratings, capacity)
+            unused = np.zeros(capacity - slot, dtype=bool)
+            self._alive = np.append(self._alive, unused)
+
+        self._ids.append(restaurant.id)
+        self._slots[restaurant.id] = slot
+        self._latitudes[slot] = np.nan if restaurant.lat is None else restaurant.lat
+        self._longitudes[slot] = np.nan if restaurant.lng is None else restaurant.lng
+        self._ratings[slot] = np.nan if restaurant.rating is None else restaurant.rating
+        self._alive[slot] = True
+        if restaurant.lat is not None and restaurant.lng is not None:
+            cell = (
+                math.floor(restaurant.lat / self.cell_size),
+                math.floor(restaurant.lng / self.cell_size),
+            )
+            slots = self._cells.get(cell)
+            if slots is None:
+                self._cells[cell] = np.array([slot])
+            else:
+                self._cells[cell] = np.append(slots, slot)
+
+    def _compact(self) -> None:
+        """Drop the unused slots and rebuild the grid."""
+        slots = np.array(sorted(self._slots.values()), dtype=np.int64)
+        self._build(
+            [self._ids[slot] for slot in slots],
+            self._latitudes[slots],
+            self._longitudes[slots],
+            self._ratings[slots],
+        )
+
+    def _build(
+        self,
+        ids: Sequence[str],
+        latitudes: np.ndarray,
+        longitudes: np.ndarray,
+        ratings: np.ndarray,
+    ) -> None:
+        self._ids = list(ids)
+        self._slots = {restaurant_id: slot for slot, restaurant_id in enumerate(ids)}
+        self._latitudes = np.asarray(latitudes, dtype=np.float64)
+        self._longitudes = np.asarray(longitudes, dtype=np.float64)
+        self._ratings = np.asarray(ratings, dtype=np.float64)
+        self._alive = np.ones(len(self._ids), dtype=bool)
+        self._index()
+
+    def _index(self) -> None:
+        """Group the slots of the restaurants by grid cell."""
+        self._cells = grid_cells(self._latitudes, self._longitudes, self.cell_size)
+
+    def _candidates(
+        self,
+        latitude: float,
+        longitude: float,
+        radius: float,
+    ) -> np.ndarray:
+        """Slots of the cells that overlap the bounding box of a circle."""
+        min_latitude, max_latitude = latitude_range(latitude, radius)
+        longitudes = longitude_range(
+            longitude,
+            radius,
+            max(abs(min_latitude), abs(max_latitude)),
+        )
+        cell_xs = None if longitudes is None else self._cell_range(*longitudes)
+        chosen = self._cells_slots(
+            self._cell_range(min_latitude, max_latitude),
+            cell_xs,
+        )
+        if not chosen:
+            return np.empty(0, dtype=np.int64)
+        return np.concatenate(chosen)
+
+    def _cell_range(self, minimum: float, maximum: float) -> range:
+        """Rows or columns of the cells between two coordinates."""
+        return range(
+            math.floor(minimum / self.cell_size),
+            math.floor(maximum / self.cell_size) + 1,
+        )
+
+    def _cells_slots(
+        self,
+        cell_ys: range,
+        cell_xs: Optional[range],
+    ) -> List[np.ndarray]:
+        """Slots of the populated cells in the ranges, every column without cell_xs."""
+        if cell_xs is None:
+            return [
+                slots for (cell_y, _), slots in self._cells.items() if cell_y in cell_ys
+            ]
+        if len(cell_ys) * len(cell_xs) > len(self._cells):
+            # Walking the populated cells is cheaper than the range.
+            return [
+                slots
+                for (cell_y, cell_x), slots in self._cells.items()
+                if cell_y in cell_ys and cell_x in cell_xs
+            ]
+        return [
+            self._cells[cell]
+            for cell in itertools.product(cell_ys, cell_xs)
+            if cell in self._cells
+        ]
@@ -1,8 +1,32 @@
-from typing import List, NoReturn, Protocol, runtime_checkable
+from typing import (
+    AsyncIterable,
+    AsyncIterator,
+    List,
+    Protocol,
+    Sequence,
+    runtime_checkable,
+)
 
-from test_project_edt.db.models.restaurant import Restaurant
-from test_project_edt.db.models.statistics import Statistics
-from test_project_edt.entities.common import PaginationParams
+from test_project_edt.db.models.restaurant import Restaurant, UpdatedRestaurant
+from test_project_edt.db.models.statistics import RegionStatistics, Statistics
+from test_project_edt.entities.common import (
+    ClusterParams,
+    ExportParams,
+    NearestParams,
+    PaginationParams,
+    SearchParams,
+    Tile,
+)
+from test_project_edt.entities.restaurant import (
+    ExportChunk,
+    ImportConflictPolicy,
+    ImportResult,
+    NearbyRestaurant,
+    RenderedPage,
+    RestaurantCluster,
+    RestaurantMatch,
+)
+from test_project_edt.entities.statistics import RegionLevel, StatisticsPoint
 
 
 @runtime_checkable
@@ -13,7 +37,13 @@ class RestaurantRepository(Protocol):
     async def get(self, restaurant_id: str) -> Restaurant | None:
         ...
 
-    async def delete(self, restaurant_id: str) -> NoReturn:
+    async def get_all_json(self, pagination_param: PaginationParams) -> RenderedPage:
+        ...
+
+    async def get_json(self, restaurant_id: str) -> bytes | None:
+        ...
+
+    async def delete(self, restaurant_id: str) -> Restaurant | None:
         ...
 
     async def add(self, restaurant_data: Restaurant) -> Restaurant:
@@ -21,7 +51,23 @@ class RestaurantRepository(Protocol):
 
     async def update(
         self, restaurant_id: str, restaurant_data: Restaurant
-    ) -> Restaurant | None:
+    ) -> UpdatedRestaurant | None:
+        ...
+
+    async def search(self, search_params: SearchParams) -> List[RestaurantMatch]:
+        ...
+
+    async def nearest(self, nearest_params: NearestParams) -> List[NearbyRestaurant]:
+        ...
+
+    async def clusters(
+        self,
+        cluster_params: ClusterParams,
+        threshold: int,
+    ) -> List[RestaurantCluster]:
+        ...
+
+    async def tile(self, tile: Tile) -> bytes:
         ...
 
     async def get_statistics(
@@ -31,3 +77,30 @@ class RestaurantRepository(Protocol):
         radius: float,
     ) -> Statistics:
         ...
+
+    async def get_region_statistics(
+        self,
+        level: RegionLevel,
+    ) -> List[RegionStatistics]:
+        ...
+
+    async def get_statistics_many(
+        self,
+        points: Sequence[StatisticsPoint],
+    ) -> List[List[Statistics]]:
+        ...
+
+    async def bulk_add(
+        self,
+        restaurants: AsyncIterable[Restaurant],
+        on_conflict: ImportConflictPolicy,
+        batch_size: int,
+    ) -> ImportResult:
+        ...
+
+    def export(
+        self,
+        params: ExportParams,
+        chunk_size: int,
+    ) -> AsyncIterator[ExportChunk]:
+        ...
@@ -0,0 +1,296 @@
+import asyncio
+import functools
+from typing import (  # noqa: WPS235
+    Any,
+    AsyncIterable,
+    Awaitable,
+    Callable,
+    Dict,
+    Hashable,
+    List,
+    Optional,
+    Sequence,
+    TypeVar,
+)
+
+from test_project_edt.db.models.restaurant import Restaurant, UpdatedRestaurant
+from test_project_edt.db.models.statistics import RegionStatistics, Statistics
+from test_project_edt.db.replicas import ReadPosition
+from test_project_edt.entities.common import (
+    ClusterParams,
+    NearestParams,
+    PaginationParams,
+    SearchParams,
+    Tile,
+)
+from test_project_edt.entities.restaurant import (
+    ImportConflictPolicy,
+    ImportResult,
+    NearbyRestaurant,
+    RenderedPage,
+    RestaurantChange,
+    RestaurantCluster,
+    RestaurantMatch,
+)
+from test_project_edt.entities.statistics import RegionLevel, StatisticsPoint
+from test_project_edt.metrics import REPOSITORY_COALESCED_CALLS
+from test_project_edt.repository.restaurant_repository_decorator import (
+    RestaurantRepositoryDecorator,
+)
+from test_project_edt.repository.resturant_repository_protocol import (
+    RestaurantRepository,
+)
+
+ResultT = TypeVar("ResultT")
+
+
+class _Flight:
+    """A call in progress and the amount of callers waiting for it."""
+
+    __slots__ = ("task", "waiters")
+
+    def __init__(self, task: "asyncio.Task[Any]"):
+        self.task = task
+        self.waiters = 0
+
+
+class SingleFlight:
+    """
+    Calls in progress in the worker, by method and arguments.
+
+    Callers of a call already in progress wait for its result instead
+    of running it again. The call runs in a task of its own, so it goes
+    on when the caller that started it is cancelled, and it is only
+    cancelled once every caller waiting for it is.
+    """
+
+    def __init__(self) -> None:
+        self._flights: Dict[Hashable, _Flight] = {}
+        self.calls = 0
+        self.coalesced = 0
+
+    async def run(
+        self,
+        method: str,
+        arguments: Hashable,
+        call: Callable[[], Awaitable[ResultT]],
+    ) -> ResultT:
+        """
+        Run a call, or wait for the one in progress with the same arguments.
+
+        :param method: name of the method called.
+        :param arguments: arguments of the call.
+        :param call: function that runs the call.
+        :return: the result of the call.
+        """
+        key = (method, arguments)
+        flight = self._flights.get(key)
+        if flight is None:
+            self.calls += 1
+            flight = _Flight(asyncio.ensure_future(call()))
+            self._flights[key] = flight
+            flight.task.add_done_callback(functools.partial(self._land, key, flight))
+        else:
+            self.coalesced += 1
+            REPOSITORY_COALESCED_CALLS.labels(method).inc()
+
+        flight.waiters += 1
+        try:
+            return await asyncio.shield(flight.task)
+        except asyncio.CancelledError:
+            if not flight.task.done() and flight.waiters == 1:
+                # Callers coming later start a new call instead of this one.
+                self._land(key, flight, flight.task)
+                flight.task.cancel()
+            raise
+        finally:
+            flight.waiters -= 1
+
+    def forget(self) -> None:
+        """Start new calls for the callers that come after a write."""
+        self._flights.clear()
+
+    def apply_change(self, change: RestaurantChange) -> None:
+        """
+        Forget the calls in progress once the restaurants change.
+
+        :param change: the change.
+        """
+        self.forget()
+
+    def stats(self) -> Dict[str, float]:
+        """
+        Counters of the calls, to see how many queries were saved.
+
+        :return: the counters by name.
+        """
+        requested = self.calls + self.coalesced
+        return {
+            "in_flight": len(self._flights),
+            "calls": self.calls,
+            "coalesced": self.coalesced,
+            "coalesced_ratio": self.coalesced / requested if requested else 0,
+        }
+
+    def _land(
+        self,
+        key: Hashable,
+        flight: _Flight,
+        task: "asyncio.Task[Any]",
+    ) -> None:
+        if self._flights.get(key) is flight:
+            del self._flights[key]  # noqa: WPS420
+
+
+class SingleFlightRepository(RestaurantRepositoryDecorator):
+    """
+    Restaurant repository that coalesces identical concurrent reads.
+
+    The reads after a write done through the repository never wait
+    for a read started before it, and neither do the reads that
+    require a different position of the replicas.
+    """
+
+    def __init__(
+        self,
+        repository: RestaurantRepository,
+        single_flight: SingleFlight,
+        read_position: Optional[ReadPosition] = None,
+    ):
+        super().__init__(repository)
+        self._single_flight = single_flight
+        self._read_position = read_position
+
+    async def get_all(self, pagination_params: PaginationParams) -> List[Restaurant]:
+        return await self._single_flight.run(
+            "get_all",
+            self._arguments(pagination_params.model_dump_json()),
+            lambda: self._repository.get_all(pagination_params),
+        )
+
+    async def get(self, restaurant_id: str) -> Restaurant | None:
+        return await self._single_flight.run(
+            "get",
+            self._arguments(restaurant_id),
+            lambda: self._repository.get(restaurant_id),
+        )
+
+    async def get_all_json(self, pagination_params: PaginationParams) -> RenderedPage:
+        return await self._single_flight.run(
+            "get_all_json",
+            self._arguments(pagination_params.model_dump_json()),
+            lambda: self._repository.get_all_json(pagination_params),
+        )
+
+    async def get_json(self, restaurant_id: str) -> bytes | None:
+        return await self._single_flight.run(
+            "get_json",
+            self._arguments(restaurant_id),
+            lambda: self._repository.get_json(restaurant_id),
+        )
+
+    async def delete(self, restaurant_id: str) -> Restaurant | None:
+        restaurant = await self._repository.delete(restaurant_id)
+        self._single_flight.forget()
+        return restaurant
+
+    async def add(self, restaurant_data: Restaurant) -> Restaurant:
+        restaurant = await self._repository.add(restaurant_data)
+        self._single_flight.forget()
+        return restaurant
+
+    async def update(
+        self,
+        restaurant_id: str,
+        restaurant_data: Restaurant,
+    ) -> UpdatedRestaurant | None:
+        restaurant = await self._repository.update(restaurant_id, restaurant_data)
+        self._single_flight.forget()
+        return restaurant
+
+    async def search(self, search_params: SearchParams) -> List[RestaurantMatch]:
+        return await self._single_flight.run(
+            "search",
+            self._arguments(search_params.model_dump_json()),
+            lambda: self._repository.search(search_params),
+        )
+
+    async def nearest(self, nearest_params: NearestParams) -> List[NearbyRestaurant]:
+        return await self._single_flight.run(
+            "nearest",
+            self._arguments(nearest_params.model_dump_json()),
+            lambda: self._repository.nearest(nearest_params),
+        )
+
+    async def clusters(
+        self,
+        cluster_params: ClusterParams,
+        threshold: int,
+    ) -> List[RestaurantCluster]:
+        return await self._single_flight.run(
+            "clusters",
+            self._arguments(cluster_params.model_dump_json(), threshold),
+            lambda: self._repository.clusters(cluster_params, threshold),
+        )
+
+    async def tile(self, tile: Tile) -> bytes:
+        return await self._single_flight.run(
+            "tile",
+            self._arguments(tile),
+            lambda: self._repository.tile(tile),
+        )
+
+    async def get_statistics(
+        self,
+        latitude: float,
+        longitude: float,
+        radius: float,
+    ) -> Statistics:
+        return await self._single_flight.run(
+            "get_statistics",
+            self._arguments(latitude, longitude, radius),
+            lambda: self._repository.get_statistics(latitude, longitude, radius),
+        )
+
+    async def get_region_statistics(
+        self,
+        level: RegionLevel,
+    ) -> List[RegionStatistics]:
+        return await self._single_flight.run(
+            "get_region_statistics",
+            self._arguments(level),
+            lambda: self._repository.get_region_statistics(level),
+        )
+
+    async def get_statistics_many(
+        self,
+        points: Sequence[StatisticsPoint],
+    ) -> List[List[Statistics]]:
+        circles = tuple(
+            (point.latitude, point.longitude, tuple(point.radii)) for point in points
+        )
+        return await self._single_flight.run(
+            "get_statistics_many",
+            self._arguments(circles),
+            lambda: self._repository.get_statistics_many(points),
+        )
+
+    async def bulk_add(
+        self,
+        restaurants: AsyncIterable[Restaurant],
+        on_conflict: ImportConflictPolicy,
+        batch_size: int,
+    ) -> ImportResult:
+        result = await self._repository.bulk_add(
+            restaurants,
+            on_conflict,
+            batch_size,
+        )
+        self._single_flight.forget()
+        return result
+
+    def _arguments(self, *arguments: Hashable) -> Hashable:
+        """Arguments of a read and the position the replicas must have replayed."""
+        if self._read_position is None:
+            return (None, *arguments)
+        return (self._read_position.min_lsn, *arguments)
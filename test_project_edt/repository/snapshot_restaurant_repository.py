@@ -0,0 +1,95 @@
+from typing import TYPE_CHECKING, AsyncIterable, List, Sequence
+
+from test_project_edt.db.models.restaurant import Restaurant, UpdatedRestaurant
+from test_project_edt.db.models.statistics import Statistics
+from test_project_edt.entities.restaurant import ImportConflictPolicy, ImportResult
+from test_project_edt.entities.statistics import StatisticsPoint
+from test_project_edt.repository.restaurant_repository_decorator import (
+    RestaurantRepositoryDecorator,
+)
+from test_project_edt.repository.resturant_repository_protocol import (
+    RestaurantRepository,
+)
+
+if TYPE_CHECKING:
+    # NumPy is an optional dependency, only needed once the snapshot is enabled.
+    from test_project_edt.repository.restaurant_snapshot import RestaurantSnapshot
+
+
+class SnapshotRestaurantRepository(RestaurantRepositoryDecorator):
+    """
+    Restaurant repository that answers the statistics from a snapshot.
+
+    Writes go to the decorated repository and are then applied to the
+    snapshot. While the snapshot is stale the statistics are queried
+    from the decorated repository.
+    """
+
+    def __init__(
+        self,
+        repository: RestaurantRepository,
+        snapshot: "RestaurantSnapshot",
+    ):
+        super().__init__(repository)
+        self._snapshot = snapshot
+
+    async def get_statistics(
+        self,
+        latitude: float,
+        longitude: float,
+        radius: float,
+    ) -> Statistics:
+        if self._snapshot.stale:
+            return await self._repository.get_statistics(latitude, longitude, radius)
+        return self._snapshot.statistics(latitude, longitude, radius)
+
+    async def get_statistics_many(
+        self,
+        points: Sequence[StatisticsPoint],
+    ) -> List[List[Statistics]]:
+        if self._snapshot.stale:
+            return await self._repository.get_statistics_many(points)
+        return [
+            [
+                self._snapshot.statistics(point.latitude, point.longitude, radius)
+                for radius in point.radii
+            ]
+            for point in points
+        ]
+
+    async def add(self, restaurant_data: Restaurant) -> Restaurant:
+        restaurant = await self._repository.add(restaurant_data)
+        self._snapshot.upsert(restaurant)
+        return restaurant
+
+    async def update(
+        self,
+        restaurant_id: str,
+        restaurant_data: Restaurant,
+    ) -> UpdatedRestaurant | None:
+        restaurant = await self._repository.update(restaurant_id, restaurant_data)
+        if restaurant is not None:
+            self._snapshot.upsert(restaurant)
+        return restaurant
+
+    async def delete(self, restaurant_id: str) -> Restaurant | None:
+        restaurant = await self._repository.delete(restaurant_id)
+        if restaurant is not None:
+            self._snapshot.remove(restaurant_id)
+        return restaurant
+
+    async def bulk_add(
+        self,
+        restaurants: AsyncIterable[Restaurant],
+        on_conflict: ImportConflictPolicy,
+        batch_size: int,
+    ) -> ImportResult:
+        try:  # noqa: WPS501
+            return await self._repository.bulk_add(
+                restaurants,
+                on_conflict,
+                batch_size,
+            )
+        finally:
+            # Reloading is cheaper than applying the imported rows one by one.
+            self._snapshot.stale = True
@@ -0,0 +1,301 @@
+import itertools
+import math
+from typing import AsyncIterable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from test_project_edt.db.models.restaurant import Restaurant, UpdatedRestaurant
+from test_project_edt.db.models.statistics import Statistics
+from test_project_edt.entities.restaurant import (
+    ChangeOperation,
+    ImportConflictPolicy,
+    ImportResult,
+    RestaurantChange,
+)
+from test_project_edt.entities.statistics import StatisticsPoint
+from test_project_edt.repository.lru_cache import LRUCache
+from test_project_edt.repository.restaurant_repository_decorator import (
+    RestaurantRepositoryDecorator,
+)
+from test_project_edt.repository.resturant_repository_protocol import (
+    RestaurantRepository,
+)
+
+EARTH_RADIUS = 6371008.8
+# A degree of latitude is never shorter than 110km.
+MIN_METERS_PER_LATITUDE_DEGREE = 110000
+# The cache measures distances over a sphere while the database uses
+# the spheroid, the relative difference between both stays below 1%.
+SPHEROID_TOLERANCE = 0.01
+
+StatisticsKey = Tuple[float, float, float]
+
+
+def haversine_distance(
+    latitude: float,
+    longitude: float,
+    other_latitude: float,
+    other_longitude: float,
+) -> float:
+    """
+    Distance in meters between two points over a spherical earth.
+
+    :return: the distance in meters.
+    """
+    latitude_delta = math.radians(other_latitude - latitude)
+    longitude_delta = math.radians(other_longitude - longitude)
+    chord = (
+        math.sin(latitude_delta / 2) ** 2
+        + math.cos(math.radians(latitude))
+        * math.cos(math.radians(other_latitude))
+        * math.sin(longitude_delta / 2) ** 2
+    )
+    central_angle = 2 * math.asin(min(1, math.sqrt(chord)))
+    return EARTH_RADIUS * central_angle
+
+
+def missing_points(
+    keys: Iterable[StatisticsKey],
+    found: Dict[StatisticsKey, Statistics],
+) -> List[StatisticsPoint]:
+    """
+    Group the circles missing from the cache by their center.
+
+    :param keys: rounded circles requested.
+    :param found: statistics of the circles found in the cache.
+    :return: points with their missing radii, to be queried all at once.
+    """
+    missing: Dict[Tuple[float, float], List[float]] = {}
+    for key in keys:
+        if key in found:
+            continue
+        radii = missing.setdefault(key[:2], [])
+        if key[2] not in radii:
+            radii.append(key[2])
+    return [
+        StatisticsPoint(latitude=latitude, longitude=longitude, radii=radii)
+        for (latitude, longitude), radii in missing.items()
+    ]
+
+
+def circle_statistics(
+    points: Iterable[StatisticsPoint],
+    results: Iterable[List[Statistics]],
+) -> Dict[StatisticsKey, Statistics]:
+    """
+    Key the statistics of many points by their circles.
+
+    :param points: points with their radii.
+    :param results: statistics of every radius of every point.
+    :return: statistics of every circle.
+    """
+    return {
+        (point.latitude, point.longitude, radius): statistics
+        for point, point_statistics in zip(points, results)
+        for radius, statistics in zip(point.radii, point_statistics)
+    }
+
+
+class StatisticsCache:
+    """
+    Cache of the statistics of circles.
+
+    The coordinates and the radius are rounded, so nearly identical
+    circles share the same entry, and the statistics are always
+    computed for the rounded circle.
+    """
+
+    def __init__(
+        self,
+        cache: LRUCache[StatisticsKey, Statistics],
+        coordinates_precision: int,
+        radius_step: float,
+    ):
+        self.cache = cache
+        self._coordinates_precision = coordinates_precision
+        self._radius_step = radius_step
+
+    def key(self, latitude: float, longitude: float, radius: float) -> StatisticsKey:
+        """
+        Round a circle into the key of its cache entry.
+
+        :return: latitude, longitude and radius of the rounded circle.
+        """
+        return (
+            round(latitude, self._coordinates_precision),
+            round(longitude, self._coordinates_precision),
+            round(radius / self._radius_step) * self._radius_step,
+        )
+
+    def invalidate_point(
+        self,
+        latitude: Optional[float],
+        longitude: Optional[float],
+    ) -> None:
+        """
+        Remove the entries of the circles that may contain a point.
+
+        :param latitude: latitude of the point.
+        :param longitude: longitude of the point.
+        """
+        if latitude is None or longitude is None:
+            self.cache.discard_pending()
+            return
+
+        def _may_contain(key: StatisticsKey) -> bool:  # noqa: WPS430
+            key_latitude, key_longitude, radius = key
+            reach = radius * (1 + SPHEROID_TOLERANCE) + 1
+            # Most of the circles are discarded without trigonometry.
+            if abs(key_latitude - latitude) * MIN_METERS_PER_LATITUDE_DEGREE > reach:
+                return False
+            distance = haversine_distance(
+                key_latitude,
+                key_longitude,
+                latitude,
+                longitude,
+            )
+            return distance <= reach
+
+        self.cache.invalidate_where(_may_contain)
+
+    def apply_change(self, change: RestaurantChange) -> None:
+        """
+        Remove the entries affected by a change published by the database.
+
+        :param change: the change.
+        """
+        if change.op == ChangeOperation.BULK:
+            self.cache.clear()
+            return
+        if change.op != ChangeOperation.INSERT:
+            self.invalidate_point(change.old_lat, change.old_lng)
+        if change.op != ChangeOperation.DELETE:
+            self.invalidate_point(change.lat, change.lng)
+
+
+class StatisticsCacheRepository(RestaurantRepositoryDecorator):
+    """
+    Restaurant repository that caches the statistics of the circles.
+
+    Writes done through the repository only remove the entries
+    of the circles that could contain the modified restaurants.
+    """
+
+    def __init__(
+        self,
+        repository: RestaurantRepository,
+        statistics_cache: StatisticsCache,
+    ):
+        super().__init__(repository)
+        self._statistics_cache = statistics_cache
+
+    async def get_statistics(
+        self,
+        latitude: float,
+        longitude: float,
+        radius: float,
+    ) -> Statistics:
+        cache = self._statistics_cache.cache
+        key = self._statistics_cache.key(latitude, longitude, radius)
+        found, statistics = cache.lookup(key)
+        if found and statistics is not None:
+            return statistics
+
+        generation = cache.generation
+        statistics = await self._repository.get_statistics(*key)
+        cache.set(key, statistics, generation=generation)
+        return statistics
+
+    async def get_statistics_many(
+        self,
+        points: Sequence[StatisticsPoint],
+    ) -> List[List[Statistics]]:
+        keys = [
+            [
+                self._statistics_cache.key(point.latitude, point.longitude, radius)
+                for radius in point.radii
+            ]
+            for point in points
+        ]
+        found = self._cached_statistics(keys)
+        missing = missing_points(itertools.chain.from_iterable(keys), found)
+        if missing:
+            found.update(await self._query_statistics(missing))
+        return [[found[key] for key in point_keys] for point_keys in keys]
+
+    async def add(self, restaurant_data: Restaurant) -> Restaurant:
+        restaurant = await self._repository.add(restaurant_data)
+        self._statistics_cache.invalidate_point(restaurant.lat, restaurant.lng)
+        return restaurant
+
+    async def update(
+        self,
+        restaurant_id: str,
+        restaurant_data: Restaurant,
+    ) -> UpdatedRestaurant | None:
+        restaurant = await self._repository.update(restaurant_id, restaurant_data)
+        self._statistics_cache.cache.discard_pending()
+        if restaurant is not None:
+            self._statistics_cache.invalidate_point(
+                restaurant.old_lat,
+                restaurant.old_lng,
+            )
+            self._statistics_cache.invalidate_point(restaurant.lat, restaurant.lng)
+        return restaurant
+
+    async def delete(self, restaurant_id: str) -> Restaurant | None:
+        restaurant = await self._repository.delete(restaurant_id)
+        self._statistics_cache.cache.discard_pending()
+        if restaurant is not None:
+            self._statistics_cache.invalidate_point(restaurant.lat, restaurant.lng)
+        return restaurant
+
+    async def bulk_add(
+        self,
+        restaurants: AsyncIterable[Restaurant],
+        on_conflict: ImportConflictPolicy,
+        batch_size: int,
+    ) -> ImportResult:
+        try:  # noqa: WPS501
+            return await self._repository.bulk_add(
+                restaurants,
+                on_conflict,
+                batch_size,
+            )
+        finally:
+            # Imports touch restaurants all over the map.
+            self._statistics_cache.cache.clear()
+
+    def _cached_statistics(
+        self,
+        keys: Iterable[Iterable[StatisticsKey]],
+    ) -> Dict[StatisticsKey, Statistics]:
+        """
+        Look up the circles in the cache.
+
+        :param keys: rounded circles of every point.
+        :return: statistics of the circles found in the cache.
+        """
+        found: Dict[StatisticsKey, Statistics] = {}
+        for key in itertools.chain.from_iterable(keys):
+            if key in found:
+                continue
+            is_cached, statistics = self._statistics_cache.cache.lookup(key)
+            if is_cached and statistics is not None:
+                found[key] = statistics
+        return found
+
+    async def _query_statistics(
+        self,
+        points: List[StatisticsPoint],
+    ) -> Dict[StatisticsKey, Statistics]:
+        """
+        Query the circles missing from the cache all at once and cache them.
+
+        :param points: rounded points with their missing radii.
+        :return: statistics of the queried circles.
+        """
+        generation = self._statistics_cache.cache.generation
+        results = await self._repository.get_statistics_many(points)
+        queried = circle_statistics(points, results)
+        for key, statistics in queried.items():
+            self._statistics_cache.cache.set(key, statistics, generation=generation)
+        return queried
@@ -0,0 +1,346 @@
+import asyncio
+import functools
+import hashlib
+import itertools
+import math
+import os
+import shutil
+import tempfile
+from collections import OrderedDict
+from pathlib import Path
+from typing import AsyncIterable, Dict, Iterator, NamedTuple, Optional, Tuple
+
+import anyio
+
+from test_project_edt.db.models.restaurant import Restaurant, UpdatedRestaurant
+from test_project_edt.entities.common import MAX_TILE_ZOOM, Tile
+from test_project_edt.entities.restaurant import (
+    ChangeOperation,
+    ImportConflictPolicy,
+    ImportResult,
+    RestaurantChange,
+)
+from test_project_edt.entities.statistics import MAX_LONGITUDE
+from test_project_edt.repository.pyscopg_restaurant_repository import (
+    MVT_BUFFER,
+    MVT_EXTENT,
+)
+from test_project_edt.repository.restaurant_repository_decorator import (
+    RestaurantRepositoryDecorator,
+)
+from test_project_edt.repository.resturant_repository_protocol import (
+    RestaurantRepository,
+)
+
+# Highest latitude of the Web Mercator map, the tiles don't go farther.
+MAX_MERCATOR_LATITUDE = 85.0511287798
+# Fraction of a tile around it whose restaurants may be in the tile. It is
+# twice the buffer of the features, so rounding never keeps a stale tile.
+INVALIDATION_MARGIN = 2 * MVT_BUFFER / MVT_EXTENT
+# Seconds a removed tile stays on disk, so the responses that
+# were about to send it can still open it.
+REMOVED_FILE_GRACE = 10
+# Bytes of the hash of the entity tags.
+ETAG_DIGEST_SIZE = 16
+
+
+def map_position(latitude: float, longitude: float) -> Tuple[float, float]:
+    """
+    Position of a point in the Web Mercator map.
+
+    :param latitude: latitude of the point.
+    :param longitude: longitude of the point.
+    :return: its horizontal and vertical position, from 0 to 1.
+    """
+    latitude = max(-MAX_MERCATOR_LATITUDE, min(MAX_MERCATOR_LATITUDE, latitude))
+    mercator_y = math.asinh(math.tan(math.radians(latitude)))
+    return (longitude + MAX_LONGITUDE) / (2 * MAX_LONGITUDE), (
+        1 - mercator_y / math.pi
+    ) / 2
+
+
+def _tiles_range(position: float, side: int, margin: float) -> range:
+    first = max(0, math.floor(position - margin))
+    last = min(side - 1, math.floor(position + margin))
+    return range(first, last + 1)
+
+
+def _zoom_tiles(zoom: int, map_x: float, map_y: float, margin: float) -> Iterator[Tile]:
+    side = 2**zoom
+    columns = _tiles_range(map_x * side, side, margin)
+    rows = _tiles_range(map_y * side, side, margin)
+    return itertools.starmap(
+        functools.partial(Tile, zoom),
+        itertools.product(columns, rows),
+    )
+
+
+def tiles_around(
+    latitude: float,
+    longitude: float,
+    margin: float = INVALIDATION_MARGIN,
+) -> Iterator[Tile]:
+    """
+    Tiles of every zoom level that may show a point.
+
+    :param latitude: latitude of the point.
+    :param longitude: longitude of the point.
+    :param margin: fraction of a tile around it that it shows as well.
+    :yield: the tiles, up to four of every zoom level.
+    """
+    map_x, map_y = map_position(latitude, longitude)
+    for zoom in range(MAX_TILE_ZOOM + 1):
+        yield from _zoom_tiles(zoom, map_x, map_y, margin)
+
+
+def tile_etag(body: bytes) -> str:
+    """
+    Strong entity tag of a tile.
+
+    :param body: the rendered tile.
+    :return: the quoted hash of its content.
+    """
+    digest = hashlib.blake2b(body, digest_size=ETAG_DIGEST_SIZE).hexdigest()
+    return f'"{digest}"'
+
+
+class CachedTile(NamedTuple):
+    """File of a rendered tile."""
+
+    path: Path
+    etag: str
+    stat_result: os.stat_result
+
+
+def _write_tile(path: Path, body: bytes) -> os.stat_result:
+    # Written aside and renamed, so the file is never read half written.
+    partial_path = path.with_suffix(".partial")
+    partial_path.write_bytes(body)
+    partial_path.replace(path)
+    return path.stat()
+
+
+class TileCache:
+    """
+    Cache of the rendered vector tiles of the worker, on disk.
+
+    The tiles are files of a directory of the worker, created along with
+    the first tile and removed when the cache is closed. Once the files
+    take more than `max_size` bytes the least recently used are removed.
+    """
+
+    def __init__(self, max_size: int, directory: Optional[str] = None):
+        self._max_size = max_size
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        # Incremented on every invalidation, like the one of LRUCache.
+        self.generation = 0
+        self._parent_directory = directory
+        self._directory: Optional[Path] = None
+        self._serial = itertools.count()
+        self._tiles: "OrderedDict[Tile, CachedTile]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._tiles)
+
+    def lookup(self, tile: Tile) -> Optional[CachedTile]:
+        """
+        Search the file of a tile.
+
+        :param tile: the tile.
+        :return: the file or None when the tile isn't cached.
+        """
+        cached_tile = self._tiles.get(tile)
+        if cached_tile is None:
+            self.misses += 1
+            return None
+        self._tiles.move_to_end(tile)
+        self.hits += 1
+        return cached_tile
+
+    async def store(
+        self,
+        tile: Tile,
+        body: bytes,
+        generation: int,
+    ) -> Optional[CachedTile]:
+        """
+        Write a rendered tile, evicting the least recently used ones if needed.
+
+        :param tile: the tile.
+        :param body: the rendered tile.
+        :param generation: generation observed before rendering the tile,
+            the tile is discarded if there were invalidations since then.
+        :return: the file of the tile or None when it wasn't stored.
+        """
+        if len(body) > self._max_size or generation != self.generation:
+            return None
+
+        if self._directory is None:
+            self._directory = Path(
+                tempfile.mkdtemp(prefix="tiles-", dir=self._parent_directory),
+            )
+        # Every version of a tile gets a file of its own, the previous
+        # one may still be read by a response.
+        serial = next(self._serial)
+        position = "-".join(map(str, tile))
+        path = self._directory / f"{position}.{serial}.mvt"
+        stat_result = await anyio.to_thread.run_sync(_write_tile, path, body)
+        if generation != self.generation:
+            path.unlink(missing_ok=True)
+            return None
+
+        if tile in self._tiles:
+            self._remove(tile)
+        cached_tile = CachedTile(path, tile_etag(body), stat_result)
+        self._tiles[tile] = cached_tile
+        self.size += len(body)
+        while self.size > self._max_size:
+            self._remove(next(iter(self._tiles)))
+            self.evictions += 1
+        return cached_tile
+
+    def discard_pending(self) -> None:
+        """Prevent the tiles rendered before this call from being stored."""
+        self.generation += 1
+
+    def invalidate_point(
+        self,
+        latitude: Optional[float],
+        longitude: Optional[float],
+    ) -> None:
+        """
+        Remove the tiles that may show a point.
+
+        :param latitude: latitude of the point.
+        :param longitude: longitude of the point.
+        """
+        self.generation += 1
+        if latitude is None or longitude is None:
+            return
+        for tile in tiles_around(latitude, longitude):
+            if tile in self._tiles:
+                self._remove(tile)
+                self.invalidations += 1
+
+    def clear(self) -> None:
+        """Remove every tile."""
+        self.generation += 1
+        self.invalidations += len(self._tiles)
+        for tile in list(self._tiles):
+            self._remove(tile)
+
+    def apply_change(self, change: RestaurantChange) -> None:
+        """
+        Remove the tiles affected by a change published by the database.
+
+        :param change: the change.
+        """
+        if change.op == ChangeOperation.BULK:
+            self.clear()
+            return
+        if change.op != ChangeOperation.INSERT:
+            self.invalidate_point(change.old_lat, change.old_lng)
+        if change.op != ChangeOperation.DELETE:
+            self.invalidate_point(change.lat, change.lng)
+
+    def close(self) -> None:
+        """Remove the directory of the tiles."""
+        self.generation += 1
+        self._tiles.clear()
+        self.size = 0
+        if self._directory is not None:
+            shutil.rmtree(self._directory, ignore_errors=True)
+            self._directory = None
+
+    def stats(self) -> Dict[str, float]:
+        """
+        Counters of the cache, to size it.
+
+        :return: the counters by name.
+        """
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._tiles),
+            "size": self.size,
+            "max_size": self._max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else 0,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+        }
+
+    def _remove(self, tile: Tile) -> None:
+        cached_tile = self._tiles.pop(tile)
+        self.size -= cached_tile.stat_result.st_size
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            cached_tile.path.unlink(missing_ok=True)
+        else:
+            loop.call_later(
+                REMOVED_FILE_GRACE,
+                functools.partial(cached_tile.path.unlink, missing_ok=True),
+            )
+
+
+class TileCacheRepository(RestaurantRepositoryDecorator):
+    """
+    Restaurant repository that removes the cached tiles of its writes.
+
+    The tiles are read through the cache by the tiles endpoint, since it
+    sends the files of the cache. The writes of other workers are noticed
+    through the changes published by the database.
+    """
+
+    def __init__(
+        self,
+        repository: RestaurantRepository,
+        tile_cache: TileCache,
+    ):
+        super().__init__(repository)
+        self._tile_cache = tile_cache
+
+    async def add(self, restaurant_data: Restaurant) -> Restaurant:
+        restaurant = await self._repository.add(restaurant_data)
+        self._tile_cache.invalidate_point(restaurant.lat, restaurant.lng)
+        return restaurant
+
+    async def update(
+        self,
+        restaurant_id: str,
+        restaurant_data: Restaurant,
+    ) -> UpdatedRestaurant | None:
+        restaurant = await self._repository.update(restaurant_id, restaurant_data)
+        self._tile_cache.discard_pending()
+        if restaurant is not None:
+            self._tile_cache.invalidate_point(restaurant.old_lat, restaurant.old_lng)
+            self._tile_cache.invalidate_point(restaurant.lat, restaurant.lng)
+        return restaurant
+
+    async def delete(self, restaurant_id: str) -> Restaurant | None:
+        restaurant = await self._repository.delete(restaurant_id)
+        self._tile_cache.discard_pending()
+        if restaurant is not None:
+            self._tile_cache.invalidate_point(restaurant.lat, restaurant.lng)
+        return restaurant
+
+    async def bulk_add(
+        self,
+        restaurants: AsyncIterable[Restaurant],
+        on_conflict: ImportConflictPolicy,
+        batch_size: int,
+    ) -> ImportResult:
+        try:  # noqa: WPS501
+            return await self._repository.bulk_add(
+                restaurants,
+                on_conflict,
+                batch_size,
+            )
+        finally:
+            # Imports touch restaurants all over the map.
+            self._tile_cache.clear()
@@ -0,0 +1,182 @@
+from contextlib import contextmanager
+from typing import AsyncIterable, AsyncIterator, Iterator, List, Optional, Sequence
+
+from opentelemetry import trace
+
+from test_project_edt.db.models.restaurant import Restaurant, UpdatedRestaurant
+from test_project_edt.db.models.statistics import RegionStatistics, Statistics
+from test_project_edt.db.query_tracing import QueryTrace, current_trace
+from test_project_edt.entities.common import (
+    ClusterParams,
+    ExportParams,
+    NearestParams,
+    PaginationParams,
+    SearchParams,
+    Tile,
+)
+from test_project_edt.entities.restaurant import (
+    ExportChunk,
+    ImportConflictPolicy,
+    ImportResult,
+    NearbyRestaurant,
+    RenderedPage,
+    RestaurantCluster,
+    RestaurantMatch,
+)
+from test_project_edt.entities.statistics import RegionLevel, StatisticsPoint
+from test_project_edt.repository.restaurant_repository_decorator import (
+    RestaurantRepositoryDecorator,
+)
+from test_project_edt.repository.resturant_repository_protocol import (
+    RestaurantRepository,
+)
+
+
+class TracingRestaurantRepository(RestaurantRepositoryDecorator):
+    """
+    Restaurant repository that traces the queries of another one.
+
+    Every call gets a span of its own, with the time waited for a
+    connection, the time taken to execute the statements and to fetch
+    their rows, the amount of rows and the statements normalized. The
+    decorated repository must use connections of instrumented pools.
+    """
+
+    def __init__(
+        self,
+        repository: RestaurantRepository,
+        tracer: Optional[trace.Tracer] = None,
+    ):
+        super().__init__(repository)
+        self._tracer = tracer or trace.get_tracer(__name__)
+
+    async def get_all(self, pagination_params: PaginationParams) -> List[Restaurant]:
+        with self._span("get_all"):
+            return await self._repository.get_all(pagination_params)
+
+    async def get(self, restaurant_id: str) -> Restaurant | None:
+        with self._span("get"):
+            return await self._repository.get(restaurant_id)
+
+    async def get_all_json(self, pagination_params: PaginationParams) -> RenderedPage:
+        with self._span("get_all_json"):
+            return await self._repository.get_all_json(pagination_params)
+
+    async def get_json(self, restaurant_id: str) -> bytes | None:
+        with self._span("get_json"):
+            return await self._repository.get_json(restaurant_id)
+
+    async def delete(self, restaurant_id: str) -> Restaurant | None:
+        with self._span("delete"):
+            return await self._repository.delete(restaurant_id)
+
+    async def add(self, restaurant_data: Restaurant) -> Restaurant:
+        with self._span("add"):
+            return await self._repository.add(restaurant_data)
+
+    async def update(
+        self,
+        restaurant_id: str,
+        restaurant_data: Restaurant,
+    ) -> UpdatedRestaurant | None:
+        with self._span("update"):
+            return await self._repository.update(restaurant_id, restaurant_data)
+
+    async def search(self, search_params: SearchParams) -> List[RestaurantMatch]:
+        with self._span("search"):
+            return await self._repository.search(search_params)
+
+    async def nearest(self, nearest_params: NearestParams) -> List[NearbyRestaurant]:
+        with self._span("nearest"):
+            return await self._repository.nearest(nearest_params)
+
+    async def clusters(
+        self,
+        cluster_params: ClusterParams,
+        threshold: int,
+    ) -> List[RestaurantCluster]:
+        with self._span("clusters"):
+            return await self._repository.clusters(cluster_params, threshold)
+
+    async def tile(self, tile: Tile) -> bytes:
+        with self._span("tile"):
+            return await self._repository.tile(tile)
+
+    async def get_statistics(
+        self,
+        latitude: float,
+        longitude: float,
+        radius: float,
+    ) -> Statistics:
+        with self._span("get_statistics"):
+            return await self._repository.get_statistics(latitude, longitude, radius)
+
+    async def get_region_statistics(
+        self,
+        level: RegionLevel,
+    ) -> List[RegionStatistics]:
+        with self._span("get_region_statistics"):
+            return await self._repository.get_region_statistics(level)
+
+    async def get_statistics_many(
+        self,
+        points: Sequence[StatisticsPoint],
+    ) -> List[List[Statistics]]:
+        with self._span("get_statistics_many"):
+            return await self._repository.get_statistics_many(points)
+
+    async def bulk_add(
+        self,
+        restaurants: AsyncIterable[Restaurant],
+        on_conflict: ImportConflictPolicy,
+        batch_size: int,
+    ) -> ImportResult:
+        with self._span("bulk_add"):
+            return await self._repository.bulk_add(
+                restaurants,
+                on_conflict,
+                batch_size,
+            )
+
+    async def export(
+        self,
+        params: ExportParams,
+        chunk_size: int,
+    ) -> AsyncIterator[ExportChunk]:
+        # The span stays open across the chunks, so it isn't made the current
+        # one, and the trace is restored by value since the iteration may
+        # finish in another context.
+        query_trace = QueryTrace()
+        previous = current_trace.get()
+        span = self._tracer.start_span(
+            "repository.export",
+            kind=trace.SpanKind.CLIENT,
+        )
+        try:  # noqa: WPS501
+            current_trace.set(query_trace)
+            async for chunk in self._repository.export(params, chunk_size):
+                yield chunk
+        finally:
+            current_trace.set(previous)
+            span.set_attributes(query_trace.attributes())
+            span.end()
+
+    @contextmanager
+    def _span(self, method: str) -> Iterator[None]:
+        """
+        Trace a call in a span of its own.
+
+        :param method: name of the method.
+        :yield: while the call runs.
+        """
+        query_trace = QueryTrace()
+        with self._tracer.start_as_current_span(
+            f"repository.{method}",
+            kind=trace.SpanKind.CLIENT,
+        ) as span:
+            token = current_trace.set(query_trace)
+            try:
+                yield
+            finally:
+                current_trace.reset(token)
+                span.set_attributes(query_trace.attributes())
@@ -1,11 +1,13 @@
 import enum
 from pathlib import Path
 from tempfile import gettempdir
-from typing import Optional
+from typing import List, Optional
 
 from pydantic_settings import BaseSettings, SettingsConfigDict
 from yarl import URL
 
+from test_project_edt.db.replicas import ReplicaRouting
+
 TEMP_DIR = Path(gettempdir())
 
 
@@ -47,10 +49,113 @@ class Settings(BaseSettings):
     db_base: str = "test_project_edt"
     db_echo: bool = False
 
+    # Total amount of connections the application may open,
+    # it is split evenly between the uvicorn workers.
+    db_pool_connections_budget: int = 20
+    # Connections each worker opens on startup and keeps warm.
+    db_pool_min_size: int = 2
+    # Upper bound of connections per worker,
+    # the share of the budget is used when it is not set.
+    db_pool_max_size: Optional[int] = None
+    # Seconds an idle connection above min size is kept open.
+    db_pool_max_idle: float = 600
+    # Seconds after which a connection is recycled.
+    db_pool_max_lifetime: float = 3600
+    # Seconds a request waits for a free connection before failing.
+    db_pool_timeout: float = 30
+
+    # Connection strings of the read replicas, reads go to the primary
+    # when there are none.
+    db_replica_urls: List[str] = []
+    # How the replica of every read is chosen.
+    db_replica_routing: ReplicaRouting = ReplicaRouting.ROUND_ROBIN
+    # Seconds of lag after which a replica stops receiving reads.
+    db_replica_max_lag: float = 5
+    # Seconds between the checks of the lag of the replicas.
+    db_replica_check_interval: float = 2
+
+    # Seconds between the samples of the event loop lag and of the pools.
+    metrics_sample_interval: float = 1
+
+    # Identical reads in progress at once in a worker share a single query.
+    single_flight_enabled: bool = False
+
+    # Entries of the statistics cache of every worker, 0 disables it.
+    # The circles are rounded to the precision and the step below, so
+    # a cached result may belong to a slightly different circle.
+    statistics_cache_size: int = 0
+    # Seconds an entry of the statistics cache is valid.
+    statistics_cache_ttl: float = 30
+    # Decimals kept of the coordinates of the cached circles.
+    statistics_cache_coordinates_precision: int = 5
+    # Meters to which the radius of the cached circles is rounded.
+    statistics_cache_radius_step: float = 1
+
+    # Restaurants kept in the cache of every worker, 0 disables it.
+    restaurant_cache_size: int = 0
+    # Seconds a restaurant of the cache is valid.
+    restaurant_cache_ttl: float = 60
+    # Seconds an id that doesn't exist is remembered as missing.
+    restaurant_cache_negative_ttl: float = 5
+
+    # Bytes of rendered vector tiles kept on disk by every worker,
+    # 0 disables the tile cache.
+    tile_cache_size: int = 0
+    # Directory where every worker creates the directory of its tiles,
+    # the temporary directory of the system by default.
+    tile_cache_dir: Optional[str] = None
+    # Seconds the clients and the CDNs may reuse a tile without checking it.
+    tile_max_age: int = 60
+
+    # Answer the statistics from an in-memory snapshot, requires NumPy.
+    statistics_snapshot_enabled: bool = False
+    # Size in degrees of the cells of the grid index of the snapshot.
+    statistics_snapshot_cell_size: float = 0.05
+    # Seconds between reloads of the snapshot, writes of the other
+    # workers aren't seen until then.
+    statistics_snapshot_refresh_interval: float = 300
+
+    # Listen to the changes published by the database to keep the
+    # caches and the snapshot of every worker up to date. Without it
+    # the changes of the other workers are only seen once they expire.
+    change_listener_enabled: bool = False
+    # Seconds to wait before reconnecting the listener.
+    change_listener_reconnect_delay: float = 1
+    # Seconds the changes are kept in the log for the listeners to catch up.
+    change_log_retention: float = 3600
+
+    # Let the database render the JSON of the restaurants list endpoint.
+    restaurants_list_json_passthrough: bool = False
+    # Let the database render the JSON of the restaurant detail endpoint.
+    restaurant_detail_json_passthrough: bool = False
+
+    # Rows copied to the database at once by the bulk import.
+    bulk_import_batch_size: int = 5000
+    # Rows fetched from the database at once by the export.
+    export_chunk_size: int = 2000
+    # Cells of the clusters endpoint with at most these restaurants
+    # list them instead of only counting them.
+    cluster_restaurants_threshold: int = 5
+
+    # Statements slower than these seconds are logged along with their
+    # plan, the log is disabled when it is 0.
+    db_slow_query_threshold: float = 0
+    # Share of the slow statements that are logged.
+    db_slow_query_sample_rate: float = 0.1
+
     # Grpc endpoint for opentelemetry.
     # E.G. http://localhost:4317
     opentelemetry_endpoint: Optional[str] = None
 
+    @property
+    def db_queries_instrumented(self) -> bool:
+        """
+        Whether the statements of the pools are timed.
+
+        :return: True when they are traced or slow ones are logged.
+        """
+        return bool(self.opentelemetry_endpoint) or self.db_slow_query_threshold > 0
+
     @property
     def db_url(self) -> URL:
         """
@@ -67,6 +172,27 @@ class Settings(BaseSettings):
             path=f"/{self.db_base}",
         )
 
+    @property
+    def db_pool_worker_max_size(self) -> int:
+        """
+        Maximum size of the connection pool of a single worker.
+
+        :return: connections allowed for one worker.
+        """
+        worker_share = max(1, self.db_pool_connections_budget // self.workers_count)
+        if self.db_pool_max_size is None:
+            return worker_share
+        return max(1, min(self.db_pool_max_size, worker_share))
+
+    @property
+    def db_pool_worker_min_size(self) -> int:
+        """
+        Minimum size of the connection pool of a single worker.
+
+        :return: connections opened by a worker on startup.
+        """
+        return min(self.db_pool_min_size, self.db_pool_worker_max_size)
+
     model_config = SettingsConfigDict(
         env_file=".env",
         env_prefix="TEST_PROJECT_EDT_",
@@ -1,4 +1,5 @@
 CREATE EXTENSION postgis;
+CREATE EXTENSION pg_trgm;
 
 CREATE TABLE Restaurants (
 id TEXT PRIMARY KEY, -- Unique Identifier of Restaurant
@@ -11,9 +12,304 @@ street TEXT,
 city TEXT,
 state TEXT,
 lat FLOAT, -- Latitude
-lng FLOAT
+lng FLOAT,
+-- Location of the restaurant, kept in sync with lat and lng by the database
+geog GEOGRAPHY(Point, 4326) GENERATED ALWAYS AS (
+    ST_SetSRID(ST_MakePoint(lng, lat), 4326)::GEOGRAPHY
+) STORED,
+-- Cell of the 0.01 degrees grid used to aggregate the statistics
+cell_x INTEGER GENERATED ALWAYS AS (floor(lng / 0.01)::INTEGER) STORED,
+cell_y INTEGER GENERATED ALWAYS AS (floor(lat / 0.01)::INTEGER) STORED
 );
 
+-- Spatial index used by the radius searches over the location
+CREATE INDEX restaurants_geog_idx ON Restaurants USING GIST (geog);
+
+-- Spatial index used by the bounding box filters
+CREATE INDEX restaurants_geom_idx ON Restaurants USING GIST ((geog::GEOMETRY));
+
+CREATE INDEX restaurants_cell_idx ON Restaurants (cell_y, cell_x);
+
+-- Trigram indexes used by the prefix and fuzzy searches
+CREATE INDEX restaurants_name_trgm_idx ON Restaurants USING GIN (name gin_trgm_ops);
+CREATE INDEX restaurants_city_trgm_idx ON Restaurants USING GIN (city gin_trgm_ops);
+CREATE INDEX restaurants_state_trgm_idx ON Restaurants USING GIN (state gin_trgm_ops);
+
+-- Rating aggregates of every grid cell, maintained by the triggers below
+CREATE TABLE restaurant_cell_statistics (
+cell_x INTEGER NOT NULL,
+cell_y INTEGER NOT NULL,
+restaurant_count BIGINT NOT NULL, -- Restaurants inside the cell
+rating_count BIGINT NOT NULL, -- Restaurants inside the cell with a rating
+rating_sum BIGINT NOT NULL,
+rating_square_sum BIGINT NOT NULL,
+PRIMARY KEY (cell_y, cell_x)
+);
+
+CREATE FUNCTION track_restaurant_cell_statistics() RETURNS TRIGGER AS $$
+DECLARE
+    changes TEXT;
+BEGIN
+    -- Rows leaving a cell are subtracted and rows entering one are added,
+    -- the whole statement is applied at once so bulk loads stay cheap.
+    changes := CASE TG_OP
+        WHEN 'INSERT' THEN
+            'SELECT cell_x, cell_y, rating, 1 AS sign FROM new_rows'
+        WHEN 'DELETE' THEN
+            'SELECT cell_x, cell_y, rating, -1 AS sign FROM old_rows'
+        ELSE
+            'SELECT cell_x, cell_y, rating, 1 AS sign FROM new_rows
+             UNION ALL
+             SELECT cell_x, cell_y, rating, -1 AS sign FROM old_rows'
+    END;
+    EXECUTE format($query$
+        INSERT INTO restaurant_cell_statistics AS cell (
+            cell_x, cell_y, restaurant_count,
+            rating_count, rating_sum, rating_square_sum
+        )
+        SELECT cell_x, cell_y, sum(sign),
+            coalesce(sum(sign) FILTER (WHERE rating IS NOT NULL), 0),
+            coalesce(sum(sign * rating), 0),
+            coalesce(sum(sign * rating * rating), 0)
+        FROM (%s) AS changes
+        WHERE cell_x IS NOT NULL AND cell_y IS NOT NULL
+        GROUP BY cell_y, cell_x
+        ORDER BY cell_y, cell_x
+        ON CONFLICT (cell_y, cell_x) DO UPDATE SET
+            restaurant_count = cell.restaurant_count + excluded.restaurant_count,
+            rating_count = cell.rating_count + excluded.rating_count,
+            rating_sum = cell.rating_sum + excluded.rating_sum,
+            rating_square_sum = cell.rating_square_sum + excluded.rating_square_sum
+    $query$, changes);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER restaurants_cell_statistics_insert
+AFTER INSERT ON Restaurants
+REFERENCING NEW TABLE AS new_rows
+FOR EACH STATEMENT EXECUTE FUNCTION track_restaurant_cell_statistics();
+
+CREATE TRIGGER restaurants_cell_statistics_update
+AFTER UPDATE ON Restaurants
+REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+FOR EACH STATEMENT EXECUTE FUNCTION track_restaurant_cell_statistics();
+
+CREATE TRIGGER restaurants_cell_statistics_delete
+AFTER DELETE ON Restaurants
+REFERENCING OLD TABLE AS old_rows
+FOR EACH STATEMENT EXECUTE FUNCTION track_restaurant_cell_statistics();
+
+-- Rating aggregates of every city, maintained by the triggers below. The
+-- restaurants without a state or a city are counted under an empty one.
+CREATE TABLE restaurant_region_statistics (
+state TEXT NOT NULL,
+city TEXT NOT NULL,
+restaurant_count BIGINT NOT NULL, -- Restaurants of the city
+rating_count BIGINT NOT NULL, -- Restaurants of the city with a rating
+rating_sum BIGINT NOT NULL,
+rating_square_sum BIGINT NOT NULL,
+rating_0_count BIGINT NOT NULL, -- Restaurants of the city with each rating
+rating_1_count BIGINT NOT NULL,
+rating_2_count BIGINT NOT NULL,
+rating_3_count BIGINT NOT NULL,
+rating_4_count BIGINT NOT NULL,
+PRIMARY KEY (state, city)
+);
+
+CREATE FUNCTION track_restaurant_region_statistics() RETURNS TRIGGER AS $$
+DECLARE
+    changes TEXT;
+BEGIN
+    -- Same as the cells, rows leaving a city are subtracted and rows
+    -- entering one are added, once per statement.
+    changes := CASE TG_OP
+        WHEN 'INSERT' THEN
+            'SELECT state, city, rating, 1 AS sign FROM new_rows'
+        WHEN 'DELETE' THEN
+            'SELECT state, city, rating, -1 AS sign FROM old_rows'
+        ELSE
+            'SELECT state, city, rating, 1 AS sign FROM new_rows
+             UNION ALL
+             SELECT state, city, rating, -1 AS sign FROM old_rows'
+    END;
+    EXECUTE format($query$
+        INSERT INTO restaurant_region_statistics AS region (
+            state, city, restaurant_count,
+            rating_count, rating_sum, rating_square_sum,
+            rating_0_count, rating_1_count, rating_2_count,
+            rating_3_count, rating_4_count
+        )
+        SELECT coalesce(state, ''), coalesce(city, ''), sum(sign),
+            coalesce(sum(sign) FILTER (WHERE rating IS NOT NULL), 0),
+            coalesce(sum(sign * rating), 0),
+            coalesce(sum(sign * rating * rating), 0),
+            coalesce(sum(sign) FILTER (WHERE rating = 0), 0),
+            coalesce(sum(sign) FILTER (WHERE rating = 1), 0),
+            coalesce(sum(sign) FILTER (WHERE rating = 2), 0),
+            coalesce(sum(sign) FILTER (WHERE rating = 3), 0),
+            coalesce(sum(sign) FILTER (WHERE rating = 4), 0)
+        FROM (%s) AS changes
+        GROUP BY 1, 2
+        ORDER BY 1, 2
+        ON CONFLICT (state, city) DO UPDATE SET
+            restaurant_count = region.restaurant_count + excluded.restaurant_count,
+            rating_count = region.rating_count + excluded.rating_count,
+            rating_sum = region.rating_sum + excluded.rating_sum,
+            rating_square_sum = region.rating_square_sum + excluded.rating_square_sum,
+            rating_0_count = region.rating_0_count + excluded.rating_0_count,
+            rating_1_count = region.rating_1_count + excluded.rating_1_count,
+            rating_2_count = region.rating_2_count + excluded.rating_2_count,
+            rating_3_count = region.rating_3_count + excluded.rating_3_count,
+            rating_4_count = region.rating_4_count + excluded.rating_4_count
+    $query$, changes);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER restaurants_region_statistics_insert
+AFTER INSERT ON Restaurants
+REFERENCING NEW TABLE AS new_rows
+FOR EACH STATEMENT EXECUTE FUNCTION track_restaurant_region_statistics();
+
+CREATE TRIGGER restaurants_region_statistics_update
+AFTER UPDATE ON Restaurants
+REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+FOR EACH STATEMENT EXECUTE FUNCTION track_restaurant_region_statistics();
+
+CREATE TRIGGER restaurants_region_statistics_delete
+AFTER DELETE ON Restaurants
+REFERENCING OLD TABLE AS old_rows
+FOR EACH STATEMENT EXECUTE FUNCTION track_restaurant_region_statistics();
+
+-- Recompute the aggregates of every city from the restaurants, to recover
+-- them after a TRUNCATE, which skips the triggers, or any other mismatch.
+-- The writes of the restaurants wait for it, so none is counted twice.
+CREATE FUNCTION rebuild_restaurant_region_statistics() RETURNS BIGINT AS $$
+DECLARE
+    regions BIGINT;
+BEGIN
+    LOCK TABLE restaurants IN SHARE MODE;
+    DELETE FROM restaurant_region_statistics;
+    INSERT INTO restaurant_region_statistics (
+        state, city, restaurant_count,
+        rating_count, rating_sum, rating_square_sum,
+        rating_0_count, rating_1_count, rating_2_count,
+        rating_3_count, rating_4_count
+    )
+    SELECT coalesce(state, ''), coalesce(city, ''), count(*),
+        count(rating),
+        coalesce(sum(rating), 0),
+        coalesce(sum(rating * rating), 0),
+        count(*) FILTER (WHERE rating = 0),
+        count(*) FILTER (WHERE rating = 1),
+        count(*) FILTER (WHERE rating = 2),
+        count(*) FILTER (WHERE rating = 3),
+        count(*) FILTER (WHERE rating = 4)
+    FROM restaurants
+    GROUP BY 1, 2;
+    GET DIAGNOSTICS regions = ROW_COUNT;
+    RETURN regions;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Writes of the restaurants, read by the workers that missed their
+-- notifications to catch up. Old entries are pruned by the workers.
+CREATE TABLE restaurant_changes (
+seq BIGSERIAL PRIMARY KEY,
+restaurant_id TEXT, -- NULL for the bulk changes
+operation TEXT NOT NULL, -- INSERT, UPDATE, DELETE or BULK
+lat FLOAT, -- Location after the change
+lng FLOAT,
+rating INTEGER, -- Rating after the change
+old_lat FLOAT, -- Location before the change
+old_lng FLOAT,
+changed_at TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+
+CREATE INDEX restaurant_changes_changed_at_idx ON restaurant_changes (changed_at);
+
+CREATE FUNCTION publish_restaurant_changes() RETURNS TRIGGER AS $$
+DECLARE
+    changes TEXT;
+    changed_rows BIGINT;
+    last_seq BIGINT;
+    payloads TEXT[];
+BEGIN
+    changes := CASE TG_OP
+        WHEN 'INSERT' THEN
+            'SELECT id, lat, lng, rating,
+                NULL::FLOAT AS old_lat, NULL::FLOAT AS old_lng
+             FROM new_rows'
+        WHEN 'DELETE' THEN
+            'SELECT id, NULL::FLOAT AS lat, NULL::FLOAT AS lng,
+                NULL::INTEGER AS rating, lat AS old_lat, lng AS old_lng
+             FROM old_rows'
+        ELSE
+            'SELECT new_rows.id, new_rows.lat, new_rows.lng, new_rows.rating,
+                old_rows.lat AS old_lat, old_rows.lng AS old_lng
+             FROM new_rows JOIN old_rows USING (id)'
+    END;
+    EXECUTE format('SELECT count(*) FROM (%s) AS changes', changes) INTO changed_rows;
+    -- Every change is logged and published on its own unless the statement
+    -- changed too many rows, then a single bulk change tells to drop everything.
+    IF changed_rows > 100 THEN
+        INSERT INTO restaurant_changes (operation) VALUES ('BULK')
+        RETURNING seq INTO last_seq;
+        PERFORM pg_notify(
+            'restaurant_changes',
+            json_build_object('seq', last_seq, 'op', 'BULK')::TEXT
+        );
+        RETURN NULL;
+    END IF;
+    EXECUTE format($query$
+        WITH logged AS (
+            INSERT INTO restaurant_changes (
+                restaurant_id, operation, lat, lng, rating, old_lat, old_lng
+            )
+            SELECT id, %L, lat, lng, rating, old_lat, old_lng
+            FROM (%s) AS changes
+            ORDER BY id
+            RETURNING seq, restaurant_id AS id, operation AS op,
+                lat, lng, rating, old_lat, old_lng
+        )
+        SELECT array_agg(row_to_json(logged)::TEXT ORDER BY seq)
+        FROM logged
+    $query$, TG_OP, changes) INTO payloads;
+
+    PERFORM pg_notify('restaurant_changes', payload)
+    FROM unnest(payloads) AS payload;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER restaurants_changes_insert
+AFTER INSERT ON Restaurants
+REFERENCING NEW TABLE AS new_rows
+FOR EACH STATEMENT EXECUTE FUNCTION publish_restaurant_changes();
+
+CREATE TRIGGER restaurants_changes_update
+AFTER UPDATE ON Restaurants
+REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+FOR EACH STATEMENT EXECUTE FUNCTION publish_restaurant_changes();
+
+CREATE TRIGGER restaurants_changes_delete
+AFTER DELETE ON Restaurants
+REFERENCING OLD TABLE AS old_rows
+FOR EACH STATEMENT EXECUTE FUNCTION publish_restaurant_changes();
+
+-- Composite indexes matching the ORDER BY <column>, id used by the keyset pagination
+CREATE INDEX restaurants_rating_id_idx ON Restaurants (rating, id);
+CREATE INDEX restaurants_name_id_idx ON Restaurants (name, id);
+CREATE INDEX restaurants_site_id_idx ON Restaurants (site, id);
+CREATE INDEX restaurants_email_id_idx ON Restaurants (email, id);
+CREATE INDEX restaurants_phone_id_idx ON Restaurants (phone, id);
+CREATE INDEX restaurants_street_id_idx ON Restaurants (street, id);
+CREATE INDEX restaurants_city_id_idx ON Restaurants (city, id);
+CREATE INDEX restaurants_state_id_idx ON Restaurants (state, id);
+CREATE INDEX restaurants_lat_id_idx ON Restaurants (lat, id);
+CREATE INDEX restaurants_lng_id_idx ON Restaurants (lng, id);
+
 
 INSERT INTO Restaurants (id, rating, name, site, email, phone, street, city, state, lat, lng) VALUES
 ('851f799f-0852-439e-b9b2-df92c43e7672','1','Barajas, Bahena and Kano','https://federico.com','Anita_Mata71@hotmail.com','534 814 204','82247 Mariano Entrada','Mérida Alfredotown','Durango',19.4400570537131, -99.1270470974249),
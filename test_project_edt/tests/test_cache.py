@@ -0,0 +1,238 @@
+from dataclasses import asdict
+from typing import List, Sequence
+
+import orjson
+import pytest
+
+from test_project_edt.db.models.restaurant import Restaurant, UpdatedRestaurant
+from test_project_edt.db.models.statistics import Statistics
+from test_project_edt.entities.statistics import StatisticsPoint
+from test_project_edt.repository.lru_cache import LRUCache
+from test_project_edt.repository.restaurant_cache_repository import (
+    RestaurantCache,
+    RestaurantCacheRepository,
+    restaurant_size,
+)
+from test_project_edt.repository.restaurant_repository_decorator import (
+    RestaurantRepositoryDecorator,
+)
+from test_project_edt.repository.statistics_cache_repository import (
+    StatisticsCache,
+    StatisticsCacheRepository,
+)
+
+
+class FakeClock:
+    def __init__(self) -> None:
+        self.now: float = 0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class CountingRepository(RestaurantRepositoryDecorator):
+    """Repository that records the statistics queries it receives."""
+
+    def __init__(self) -> None:
+        super().__init__(None)  # type: ignore
+        self.statistics_calls: List[tuple] = []
+        self.batch_calls: List[List[StatisticsPoint]] = []
+        self.get_calls: List[str] = []
+        self.restaurants = {
+            "near": Restaurant(id="near", lat=19.4373, lng=-99.1278, rating=1),
+            "far": Restaurant(id="far", lat=20.5, lng=-100.5, rating=2),
+        }
+
+    async def get(self, restaurant_id: str) -> Restaurant | None:
+        self.get_calls.append(restaurant_id)
+        return self.restaurants.get(restaurant_id)
+
+    async def update(
+        self,
+        restaurant_id: str,
+        restaurant_data: Restaurant,
+    ) -> UpdatedRestaurant | None:
+        restaurant = self.restaurants[restaurant_id]
+        return UpdatedRestaurant(
+            **asdict(restaurant),
+            old_lat=restaurant.lat,
+            old_lng=restaurant.lng,
+        )
+
+    async def get_statistics(
+        self,
+        latitude: float,
+        longitude: float,
+        radius: float,
+    ) -> Statistics:
+        self.statistics_calls.append((latitude, longitude, radius))
+        return Statistics(count=len(self.statistics_calls), avg=0, stddev=0)
+
+    async def get_statistics_many(
+        self,
+        points: Sequence[StatisticsPoint],
+    ) -> List[List[Statistics]]:
+        self.batch_calls.append(list(points))
+        return [
+            [
+                await self.get_statistics(point.latitude, point.longitude, radius)
+                for radius in point.radii
+            ]
+            for point in points
+        ]
+
+
+def test_lru_cache_eviction_and_ttl() -> None:  # noqa: WPS218
+    """Checks the least recently used eviction and the expiration."""
+    clock = FakeClock()
+    cache: LRUCache[str, int] = LRUCache(maxsize=2, ttl=10, clock=clock)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1
+    cache.set("c", 3)
+
+    assert "b" not in cache
+    assert cache.get("a") == 1
+    assert cache.evictions == 1
+
+    clock.now = 11
+    assert cache.get("a") is None
+    assert cache.hits == 2
+    assert cache.misses == 1
+
+
+def test_lru_cache_memory_size() -> None:
+    """Checks that the estimated memory follows the stored values."""
+    cache: LRUCache[str, str] = LRUCache(maxsize=2, ttl=10, sizeof=len)
+    cache.set("a", "xx")
+    cache.set("b", "yyy")
+    cache.set("a", "z")
+    assert cache.memory_size == 4
+    cache.set("c", "wwww")
+    assert cache.memory_size == 5
+    cache.invalidate("a")
+    assert cache.memory_size == 4
+    assert cache.stats()["entries"] == 1
+
+
+def test_lru_cache_discards_stale_values() -> None:
+    """Checks that values computed before an invalidation aren't stored."""
+    cache: LRUCache[str, int] = LRUCache(maxsize=2, ttl=10)
+    generation = cache.generation
+    cache.invalidate("a")
+    cache.set("a", 1, generation=generation)
+    assert "a" not in cache
+
+
+@pytest.mark.anyio
+async def test_statistics_cache_invalidation() -> None:
+    """
+    Checks that statistics are cached by rounded circle, and that
+    a write only invalidates the circles that could contain it.
+    """
+    repository = CountingRepository()
+    statistics_cache = StatisticsCache(
+        LRUCache(maxsize=100, ttl=60),
+        coordinates_precision=4,
+        radius_step=10,
+    )
+    cached_repository = StatisticsCacheRepository(repository, statistics_cache)
+
+    await cached_repository.get_statistics(19.43731, -99.12781, 501)
+    await cached_repository.get_statistics(19.43729, -99.12779, 498)
+    await cached_repository.get_statistics(40.0, -3.0, 1000)
+    assert repository.statistics_calls == [
+        (19.4373, -99.1278, 500),
+        (40.0, -3.0, 1000),
+    ]
+
+    await cached_repository.update("near", Restaurant())
+    assert statistics_cache.key(19.4373, -99.1278, 500) not in statistics_cache.cache
+    assert statistics_cache.key(40.0, -3.0, 1000) in statistics_cache.cache
+
+
+@pytest.mark.anyio
+async def test_statistics_cache_batch() -> None:
+    """
+    Checks that a batch only queries the circles missing from the cache,
+    in a single call, and returns the statistics in the requested order.
+    """
+    repository = CountingRepository()
+    statistics_cache = StatisticsCache(
+        LRUCache(maxsize=100, ttl=60),
+        coordinates_precision=4,
+        radius_step=10,
+    )
+    cached_repository = StatisticsCacheRepository(repository, statistics_cache)
+    cached = await cached_repository.get_statistics(19.4373, -99.1278, 500)
+
+    batch = await cached_repository.get_statistics_many(
+        [
+            StatisticsPoint(latitude=19.43731, longitude=-99.1278, radii=[1000, 501]),
+            StatisticsPoint(latitude=40.0, longitude=-3.0, radii=[100, 98]),
+        ],
+    )
+
+    assert len(repository.batch_calls) == 1
+    assert repository.statistics_calls[1:] == [
+        (19.4373, -99.1278, 1000),
+        (40.0, -3.0, 100),
+    ]
+    assert batch[0][1] == cached
+    assert batch[1][0] == batch[1][1]
+
+    await cached_repository.get_statistics_many(
+        [StatisticsPoint(latitude=40.0, longitude=-3.0, radii=[100])],
+    )
+    assert len(repository.batch_calls) == 1
+
+
+@pytest.mark.anyio
+async def test_restaurant_cache() -> None:  # noqa: WPS217, WPS218
+    """
+    Checks that restaurants, existing or not, are read once,
+    and that the writes remove them from the cache.
+    """
+    repository = CountingRepository()
+    clock = FakeClock()
+    restaurant_cache = RestaurantCache(
+        LRUCache(maxsize=100, ttl=60, clock=clock, sizeof=restaurant_size),
+        negative_ttl=5,
+    )
+    cached_repository = RestaurantCacheRepository(repository, restaurant_cache)
+
+    for _ in range(3):
+        assert await cached_repository.get("near") == repository.restaurants["near"]
+        assert await cached_repository.get("missing") is None
+    assert repository.get_calls == ["near", "missing"]
+    assert restaurant_cache.cache.hit_ratio == pytest.approx(4 / 6)
+    assert restaurant_cache.cache.memory_size > 0
+
+    clock.now = 10
+    await cached_repository.get("near")
+    await cached_repository.get("missing")
+    assert repository.get_calls == ["near", "missing", "missing"]
+
+    await cached_repository.update("near", Restaurant())
+    await cached_repository.get("near")
+    assert repository.get_calls[-1] == "near"
+
+
+@pytest.mark.anyio
+async def test_restaurant_cache_json() -> None:
+    """
+    Checks that the restaurants rendered as JSON are read once,
+    the first read fills the cache.
+    """
+    repository = CountingRepository()
+    restaurant_cache = RestaurantCache(
+        LRUCache(maxsize=100, ttl=60, sizeof=restaurant_size),
+        negative_ttl=5,
+    )
+    cached_repository = RestaurantCacheRepository(repository, restaurant_cache)
+
+    for _ in range(2):
+        rendered = await cached_repository.get_json("near")
+        assert rendered == orjson.dumps(repository.restaurants["near"])
+        assert await cached_repository.get_json("missing") is None
+    assert repository.get_calls == ["near", "missing"]
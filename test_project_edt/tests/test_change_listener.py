@@ -0,0 +1,59 @@
+from typing import List
+
+from test_project_edt.db.change_listener import RestaurantChangeListener
+from test_project_edt.entities.restaurant import ChangeOperation, RestaurantChange
+from test_project_edt.repository.lru_cache import LRUCache
+from test_project_edt.repository.restaurant_cache_repository import RestaurantCache
+from test_project_edt.repository.statistics_cache_repository import StatisticsCache
+
+
+def test_dispatch_skips_delivered_changes() -> None:
+    """Checks that changes read again while catching up are delivered once."""
+    listener = RestaurantChangeListener("", catch_up_window=2)
+    received: List[int] = []
+    unsubscribe = listener.subscribe(lambda change: received.append(change.seq))
+
+    for seq in (1, 2, 2, 3, 1):
+        listener.dispatch(
+            RestaurantChange(seq=seq, op=ChangeOperation.INSERT, id=str(seq)),
+        )
+    listener.dispatch(RestaurantChange(seq=3, op=ChangeOperation.BULK))
+    unsubscribe()
+    listener.dispatch(RestaurantChange(seq=4, op=ChangeOperation.DELETE, id="4"))
+
+    assert received == [1, 2, 3, 3]
+
+
+def test_caches_apply_changes() -> None:
+    """Checks that the changes of other workers invalidate the caches."""
+    restaurant_cache = RestaurantCache(LRUCache(maxsize=10, ttl=60), negative_ttl=5)
+    restaurant_cache.cache.set("moved", None)
+    restaurant_cache.cache.set("other", None)
+    statistics_cache = StatisticsCache(
+        LRUCache(maxsize=10, ttl=60),
+        coordinates_precision=4,
+        radius_step=10,
+    )
+    statistics_cache.cache.set((19.4373, -99.1278, 500), None)
+    statistics_cache.cache.set((40.0, -3.0, 500), None)
+
+    change = RestaurantChange(
+        seq=1,
+        op=ChangeOperation.UPDATE,
+        id="moved",
+        lat=10,
+        lng=10,
+        old_lat=19.4373,
+        old_lng=-99.1278,
+    )
+    restaurant_cache.apply_change(change)
+    statistics_cache.apply_change(change)
+
+    assert list(restaurant_cache.cache.keys()) == ["other"]
+    assert list(statistics_cache.cache.keys()) == [(40.0, -3.0, 500)]
+
+    bulk = RestaurantChange(seq=2, op=ChangeOperation.BULK)
+    restaurant_cache.apply_change(bulk)
+    statistics_cache.apply_change(bulk)
+    assert not len(restaurant_cache.cache)
+    assert not len(statistics_cache.cache)
@@ -0,0 +1,44 @@
+from typing import List
+
+from test_project_edt.benchmarks.load import compare, percentile, summarize
+
+
+def repeated(latency: float, count: int) -> List[float]:
+    return [latency for _ in range(count)]
+
+
+def test_percentiles() -> None:
+    """Checks the nearest rank percentiles of the latencies."""
+    latencies = [float(value) for value in range(1, 101)]
+
+    assert percentile(latencies, 50) == 50
+    assert percentile(latencies, 99) == 99
+    assert percentile(latencies, 100) == 100
+    assert percentile([], 95) == 0
+
+
+def test_compare_flags_regressions() -> None:
+    """Checks that only the measures worse than the tolerance are reported."""
+    baseline = {
+        "levels": {"8": summarize({"detail": repeated(10.0, 100)}, {}, elapsed=1)},
+    }
+    similar = {
+        "levels": {"8": summarize({"detail": repeated(10.5, 100)}, {}, elapsed=1)},
+    }
+    slower = {
+        "levels": {
+            "8": summarize(
+                {"detail": [*repeated(10.0, 90), *repeated(30.0, 10)]},
+                {},
+                elapsed=2,
+            ),
+            "32": summarize({"detail": repeated(90.0, 100)}, {}, elapsed=1),
+        },
+    }
+
+    assert not compare(similar, baseline, tolerance=0.1)
+    regressions = compare(slower, baseline, tolerance=0.1)
+    assert any("p99_ms" in regression for regression in regressions)
+    assert any("throughput" in regression for regression in regressions)
+    assert not any("p50_ms" in regression for regression in regressions)
+    assert not any("concurrency 32" in regression for regression in regressions)
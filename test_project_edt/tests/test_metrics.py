@@ -0,0 +1,108 @@
+from typing import AsyncIterator
+
+import pytest
+from fastapi import FastAPI, HTTPException
+from httpx import AsyncClient
+from prometheus_client import REGISTRY
+
+from test_project_edt.db.models.restaurant import Restaurant
+from test_project_edt.entities.common import ExportParams
+from test_project_edt.entities.restaurant import ExportChunk
+from test_project_edt.repository.metrics_restaurant_repository import (
+    MetricsRestaurantRepository,
+)
+from test_project_edt.repository.restaurant_repository_decorator import (
+    RestaurantRepositoryDecorator,
+)
+from test_project_edt.web.route_metrics import instrument_routes
+
+EXPORTED_CHUNKS = ([("one",), ("two",)], [("three",)])
+
+
+class FakeRepository(RestaurantRepositoryDecorator):
+    """Repository that answers from a dictionary."""
+
+    def __init__(self) -> None:
+        super().__init__(None)  # type: ignore
+        self.restaurants = {
+            "one": Restaurant(id="one", lat=19.4, lng=-99.1, rating=1),
+        }
+
+    async def get(self, restaurant_id: str) -> Restaurant | None:
+        return self.restaurants.get(restaurant_id)
+
+    async def export(
+        self,
+        params: ExportParams,
+        chunk_size: int,
+    ) -> AsyncIterator[ExportChunk]:
+        for chunk in EXPORTED_CHUNKS:
+            yield chunk
+
+
+def sample(name: str, **labels: str) -> float:
+    return REGISTRY.get_sample_value(name, labels) or 0
+
+
+@pytest.mark.anyio
+async def test_repository_metrics() -> None:
+    repository = MetricsRestaurantRepository(FakeRepository())
+    calls = sample("repository_query_duration_seconds_count", method="get")
+    rows = sample("repository_query_rows_sum", method="get")
+
+    assert await repository.get("one") is not None
+    assert await repository.get("missing") is None
+
+    assert sample("repository_query_duration_seconds_count", method="get") == (
+        calls + 2
+    )
+    assert sample("repository_query_rows_sum", method="get") == rows + 1
+
+
+@pytest.mark.anyio
+async def test_repository_metrics_export() -> None:
+    repository = MetricsRestaurantRepository(FakeRepository())
+    rows = sample("repository_query_rows_sum", method="export")
+
+    chunks = [chunk async for chunk in repository.export(ExportParams(), 2)]
+
+    assert len(chunks) == 2
+    assert sample("repository_query_rows_sum", method="export") == rows + 3
+
+
+@pytest.mark.anyio
+async def test_route_metrics() -> None:
+    app = FastAPI()
+
+    @app.get("/metrics-test/{item}")
+    async def item(item: int) -> int:  # noqa: WPS430
+        if item < 0:
+            raise HTTPException(status_code=404)
+        return item
+
+    instrument_routes(app)
+    route = "/metrics-test/{item}"
+    counts = {
+        status: sample(
+            "http_request_duration_seconds_count",
+            method="GET",
+            route=route,
+            status=status,
+        )
+        for status in ("200", "404", "422")
+    }
+
+    async with AsyncClient(app=app, base_url="http://test") as client:
+        assert (await client.get("/metrics-test/1")).status_code == 200
+        assert (await client.get("/metrics-test/-1")).status_code == 404
+        assert (await client.get("/metrics-test/one")).status_code == 422
+
+    for status, count in counts.items():
+        requests = sample(
+            "http_request_duration_seconds_count",
+            method="GET",
+            route=route,
+            status=status,
+        )
+        assert requests == count + 1
+    assert sample("http_requests_in_flight", method="GET", route=route) == 0
@@ -0,0 +1,125 @@
+from typing import AsyncIterator
+
+import pytest
+from opentelemetry.sdk.trace import TracerProvider
+from opentelemetry.sdk.trace.export import SimpleSpanProcessor
+from opentelemetry.sdk.trace.export.in_memory_span_exporter import InMemorySpanExporter
+
+from test_project_edt.db.models.restaurant import Restaurant
+from test_project_edt.db.query_tracing import (
+    SlowQueryLog,
+    current_trace,
+    normalize_statement,
+    params_shape,
+)
+from test_project_edt.entities.common import ExportParams
+from test_project_edt.entities.restaurant import ExportChunk
+from test_project_edt.repository.restaurant_repository_decorator import (
+    RestaurantRepositoryDecorator,
+)
+from test_project_edt.repository.tracing_restaurant_repository import (
+    TracingRestaurantRepository,
+)
+
+
+class QueryingRepository(RestaurantRepositoryDecorator):
+    """Repository that records in the trace what its cursors would."""
+
+    def __init__(self) -> None:
+        super().__init__(None)  # type: ignore
+
+    async def get(self, restaurant_id: str) -> Restaurant | None:
+        query_trace = current_trace.get()
+        assert query_trace is not None
+        query_trace.wait += 0.001
+        query_trace.execute += 0.002
+        query_trace.statements["SELECT * FROM restaurants WHERE id = ?"] = None
+        query_trace.rows += 1
+        return Restaurant(id=restaurant_id, lat=19.4, lng=-99.1, rating=1)
+
+    async def export(
+        self,
+        params: ExportParams,
+        chunk_size: int,
+    ) -> AsyncIterator[ExportChunk]:
+        for chunk in ([("one",), ("two",)], [("three",)]):
+            query_trace = current_trace.get()
+            assert query_trace is not None
+            query_trace.rows += len(chunk)
+            yield chunk
+
+
+@pytest.fixture
+def spans() -> InMemorySpanExporter:
+    return InMemorySpanExporter()
+
+
+@pytest.fixture
+def repository(spans: InMemorySpanExporter) -> TracingRestaurantRepository:
+    provider = TracerProvider()
+    provider.add_span_processor(SimpleSpanProcessor(spans))
+    return TracingRestaurantRepository(
+        QueryingRepository(),
+        tracer=provider.get_tracer(__name__),
+    )
+
+
+def test_normalize_statement() -> None:
+    statement = """SELECT id FROM restaurants
+            WHERE state = 'Jalisco' AND rating > 2
+            LIMIT %(limit)s"""  # noqa: WPS323
+    expected = (
+        "SELECT id FROM restaurants WHERE state = ? AND rating > ? "  # noqa: WPS323
+        "LIMIT %(limit)s"
+    )
+    assert normalize_statement(statement) == expected
+
+
+def test_params_shape() -> None:
+    assert params_shape(None) == "none"
+    assert params_shape({"id": "one", "radii": [1.0, 2.0]}) == (
+        "id: str, radii: list[2]"
+    )
+    assert params_shape((1, None)) == "0: int, 1: NoneType"
+
+
+def test_slow_query_sampling() -> None:
+    samples = iter((0.05, 0.5))
+    slow_query_log = SlowQueryLog(0.1, 0.1, sample=lambda: next(samples))
+    assert not slow_query_log.should_log(0.05)
+    assert slow_query_log.should_log(0.2)
+    assert not slow_query_log.should_log(0.2)
+
+
+@pytest.mark.anyio
+async def test_repository_spans(  # noqa: WPS218
+    repository: TracingRestaurantRepository,
+    spans: InMemorySpanExporter,
+) -> None:
+    assert await repository.get("one") is not None
+    assert current_trace.get() is None
+
+    finished = spans.get_finished_spans()
+    assert len(finished) == 1
+    span = finished[0]
+    assert span.name == "repository.get"
+    assert span.attributes["db.statement"] == "SELECT * FROM restaurants WHERE id = ?"
+    assert span.attributes["db.pool.wait_ms"] == pytest.approx(1)
+    assert span.attributes["db.execute_ms"] == pytest.approx(2)
+    assert span.attributes["db.rows"] == 1
+
+
+@pytest.mark.anyio
+async def test_export_span(
+    repository: TracingRestaurantRepository,
+    spans: InMemorySpanExporter,
+) -> None:
+    chunks = [chunk async for chunk in repository.export(ExportParams(), 2)]
+
+    assert len(chunks) == 2
+    assert current_trace.get() is None
+    finished = spans.get_finished_spans()
+    assert len(finished) == 1
+    span = finished[0]
+    assert span.name == "repository.export"
+    assert span.attributes["db.rows"] == 3
@@ -0,0 +1,130 @@
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict
+
+import pytest
+from psycopg import OperationalError
+
+from test_project_edt.db.replicas import (
+    ReplicaPools,
+    ReplicaRouting,
+    format_lsn,
+    parse_lsn,
+)
+
+
+class FakePool:
+    """Pool that only reports its usage."""
+
+    def __init__(self, name: str, in_use: int = 0):
+        self.name = name
+        self.in_use = in_use
+
+    def get_stats(self) -> Dict[str, int]:
+        return {"pool_size": 4, "pool_available": 4 - self.in_use}
+
+
+class FakeStatus:
+    """Result of the status query of a replica."""
+
+    async def fetchone(self) -> Dict[str, Any]:
+        return {"lsn": "0/100", "lag": 0}
+
+
+class FakeConnection:
+    """Connection that answers the status query of a replica."""
+
+    async def execute(self, query: str) -> FakeStatus:
+        return FakeStatus()
+
+
+class UnreachablePool(FakePool):
+    """Pool of a replica that only answers once it is reachable."""
+
+    def __init__(self, name: str):
+        super().__init__(name)
+        self.reachable = False
+        self.waited = True
+
+    async def open(self, wait: bool = False, timeout: float = 30) -> None:
+        self.waited = wait
+
+    @asynccontextmanager
+    async def connection(self, timeout: float) -> AsyncIterator[FakeConnection]:
+        if not self.reachable:
+            raise OperationalError("connection refused")
+        yield FakeConnection()
+
+    async def close(self) -> None:
+        self.reachable = False
+
+
+def test_lsn_round_trip() -> None:
+    """Checks that WAL positions are compared as numbers."""
+    assert parse_lsn("16/B374D848") == 0x16B374D848
+    assert format_lsn(parse_lsn("16/B374D848")) == "16/B374D848"
+    assert parse_lsn("0/FFFFFFFF") < parse_lsn("1/0")
+
+
+def test_round_robin_skips_ejected_replicas() -> None:
+    """Checks that reads rotate over the healthy replicas only."""
+    primary = FakePool("primary")
+    replicas = ReplicaPools(
+        primary,  # type: ignore
+        [FakePool("first"), FakePool("second"), FakePool("third")],  # type: ignore
+    )
+    for replica in replicas.replicas:
+        replica.healthy = True
+    replicas.replicas[1].healthy = False
+
+    chosen = [replicas.reader().name for _ in range(4)]  # type: ignore
+
+    assert chosen == ["first", "third", "first", "third"]
+
+
+def test_least_busy_routing() -> None:
+    """Checks that reads go to the replica with the fewest connections in use."""
+    replicas = ReplicaPools(
+        FakePool("primary"),  # type: ignore
+        [FakePool("busy", in_use=3), FakePool("idle", in_use=1)],  # type: ignore
+        routing=ReplicaRouting.LEAST_BUSY,
+    )
+    for replica in replicas.replicas:
+        replica.healthy = True
+
+    assert replicas.reader().name == "idle"  # type: ignore
+
+
+def test_reads_after_write_wait_for_replicas() -> None:
+    """Checks that replicas behind a write don't answer the reads after it."""
+    replicas = ReplicaPools(
+        FakePool("primary"),  # type: ignore
+        [FakePool("behind"), FakePool("ahead")],  # type: ignore
+    )
+    for replica, lsn in zip(replicas.replicas, ("0/100", "0/200")):
+        replica.healthy = True
+        replica.lsn = parse_lsn(lsn)
+
+    assert replicas.reader(parse_lsn("0/180")).name == "ahead"  # type: ignore
+    assert replicas.reader(parse_lsn("0/300")).name == "primary"  # type: ignore
+
+    for ejected in replicas.replicas:
+        ejected.healthy = False
+    assert replicas.reader().name == "primary"  # type: ignore
+
+
+@pytest.mark.anyio
+async def test_replica_reachable_after_startup() -> None:
+    """Checks that a replica down at startup answers reads once it is up."""
+    pool = UnreachablePool("late")
+    replicas = ReplicaPools(FakePool("primary"), [pool])  # type: ignore
+    await replicas.open(timeout=1, check_interval=60)
+    try:
+        assert not pool.waited
+        assert replicas.reader().name == "primary"  # type: ignore
+
+        pool.reachable = True
+        await replicas.check(timeout=1)
+
+        assert replicas.reader().name == "late"  # type: ignore
+    finally:
+        await replicas.close()
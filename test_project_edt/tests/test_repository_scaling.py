@@ -0,0 +1,37 @@
+from test_project_edt.benchmarks.dataset import restaurant_chunk, restaurant_chunks
+from test_project_edt.benchmarks.repository_scaling import sequential_scans
+from test_project_edt.repository.pyscopg_restaurant_repository import RESTAURANT_FIELDS
+
+
+def test_dataset_is_deterministic() -> None:  # noqa: WPS218
+    """Checks that the same seed always generates the same restaurants."""
+    first = next(restaurant_chunks(1000, seed=7))
+    second = next(restaurant_chunks(1000, seed=7))
+
+    assert len(first) == 1000
+    assert first == second
+    assert restaurant_chunk(8, 0, 10) != first[:10]
+    # Chunks don't depend on the ones before them.
+    assert restaurant_chunk(7, 3, 10) == restaurant_chunk(7, 3, 10)
+    assert restaurant_chunk(7, 3, 10) != first[:10]
+    identifiers = [row[RESTAURANT_FIELDS.index("id")] for row in first]
+    assert len(set(identifiers)) == len(first)
+
+
+def test_sequential_scans_of_indexed_tables() -> None:
+    """Checks that only the sequential scans of indexed tables are reported."""
+    plan = {
+        "Node Type": "Limit",
+        "Plans": [
+            {
+                "Node Type": "Index Scan",
+                "Relation Name": "restaurants",
+                "Index Name": "restaurants_pkey",
+            },
+            {"Node Type": "Seq Scan", "Relation Name": "restaurant_cell_statistics"},
+        ],
+    }
+    assert not sequential_scans(plan)
+
+    plan["Plans"].append({"Node Type": "Seq Scan", "Relation Name": "restaurants"})
+    assert sequential_scans(plan) == ["restaurants"]
@@ -0,0 +1,67 @@
+from typing import AsyncIterator, List
+
+import pytest
+
+from test_project_edt.entities.http_entities import ClientError
+from test_project_edt.entities.restaurant import FeedFormat
+from test_project_edt.entities.restaurant_feed import RestaurantFeed
+
+
+async def split_chunks(document: bytes, size: int) -> AsyncIterator[bytes]:
+    for start in range(0, len(document), size):
+        yield document[start : start + size]
+
+
+@pytest.mark.anyio
+@pytest.mark.parametrize("chunk_size", [1, 7, 1024])
+async def test_csv_feed(chunk_size: int) -> None:  # noqa: WPS218
+    """Checks that CSV records are parsed even when split between chunks."""
+    document = (
+        "id,name,site,email,phone,street,city,state,lat,lng,rating\r\n"
+        'a1,"Tacos, ""El Güero""",s,e,p,"line one\nline two",c,st,19.4,-99.1,3\r\n'
+        ",No id,s,e,p,st,c,st,19.5,-99.2,2\r\n"
+        "a3,Bad latitude,s,e,p,st,c,st,north,-99.2,2\r\n"
+        "a4,Missing fields\r\n"
+    ).encode()
+    feed = RestaurantFeed(split_chunks(document, chunk_size), FeedFormat.CSV)
+    restaurants = [restaurant async for restaurant in feed.restaurants()]
+
+    assert [restaurant.name for restaurant in restaurants] == [
+        'Tacos, "El Güero"',
+        "No id",
+    ]
+    assert restaurants[0].id == "a1"
+    assert restaurants[0].street == "line one\nline two"
+    assert restaurants[1].id
+    assert feed.rejected == 2
+    assert feed.errors[1] == "line 6: the number of fields doesn't match"
+
+
+@pytest.mark.anyio
+async def test_ndjson_feed() -> None:
+    """Checks that NDJSON lines are validated one by one."""
+    lines: List[bytes] = [
+        b'{"name": "n", "site": "s", "email": "e", "phone": "p", "street": "s",'
+        b' "city": "c", "state": "s", "lat": 1, "lng": 2, "rating": 1}',
+        b"",
+        b"[1, 2]",
+        b"{not json",
+        b'{"name": "missing fields"}',
+    ]
+    feed = RestaurantFeed(split_chunks(b"\n".join(lines), 5), FeedFormat.NDJSON)
+    restaurants = [restaurant async for restaurant in feed.restaurants()]
+
+    assert len(restaurants) == 1
+    assert restaurants[0].lat == 1
+    assert feed.rejected == 3
+
+
+@pytest.mark.anyio
+@pytest.mark.parametrize("feed_format", list(FeedFormat))
+async def test_feed_not_utf8(feed_format: FeedFormat) -> None:
+    """Checks that a line that isn't valid UTF-8 refuses the feed."""
+    # The second line is valid UTF-8, the third one is Latin-1.
+    document = b"id,name\r\na1,Caf\xc3\xa9\r\na2,Caf\xe9\r\n"
+    feed = RestaurantFeed(split_chunks(document, 3), feed_format)
+    with pytest.raises(ClientError, match="line 3 is not valid UTF-8"):
+        await feed.restaurants().asend(None)
@@ -0,0 +1,168 @@
+import asyncio
+from dataclasses import asdict
+from typing import List
+
+import pytest
+
+from test_project_edt.db.models.restaurant import Restaurant, UpdatedRestaurant
+from test_project_edt.db.replicas import ReadPosition
+from test_project_edt.repository.restaurant_repository_decorator import (
+    RestaurantRepositoryDecorator,
+)
+from test_project_edt.repository.single_flight_repository import (
+    SingleFlight,
+    SingleFlightRepository,
+)
+
+
+class SlowRepository(RestaurantRepositoryDecorator):
+    """Repository whose reads wait until they are released."""
+
+    def __init__(self) -> None:
+        super().__init__(None)  # type: ignore
+        self.released = asyncio.Event()
+        self.get_calls: List[str] = []
+        self.cancelled = 0
+
+    async def get(self, restaurant_id: str) -> Restaurant | None:
+        self.get_calls.append(restaurant_id)
+        try:
+            await self.released.wait()
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+        return Restaurant(id=restaurant_id, lat=19.4, lng=-99.1, rating=1)
+
+    async def update(
+        self,
+        restaurant_id: str,
+        restaurant_data: Restaurant,
+    ) -> UpdatedRestaurant | None:
+        return UpdatedRestaurant(**asdict(restaurant_data))
+
+
+@pytest.fixture
+def slow_repository() -> SlowRepository:
+    return SlowRepository()
+
+
+@pytest.fixture
+def single_flight() -> SingleFlight:
+    return SingleFlight()
+
+
+def coalescing(
+    slow_repository: SlowRepository,
+    single_flight: SingleFlight,
+    read_position: ReadPosition | None = None,
+) -> SingleFlightRepository:
+    return SingleFlightRepository(slow_repository, single_flight, read_position)
+
+
+@pytest.mark.anyio
+async def test_identical_reads_share_a_query(
+    slow_repository: SlowRepository,
+    single_flight: SingleFlight,
+) -> None:
+    reads = [
+        asyncio.ensure_future(coalescing(slow_repository, single_flight).get(key))
+        for key in ("one", "one", "one", "two")
+    ]
+    await asyncio.sleep(0)
+    slow_repository.released.set()
+    restaurants = await asyncio.gather(*reads)
+
+    assert [restaurant.id for restaurant in restaurants] == [  # type: ignore
+        "one",
+        "one",
+        "one",
+        "two",
+    ]
+    assert slow_repository.get_calls == ["one", "two"]
+    assert single_flight.stats() == {
+        "in_flight": 0,
+        "calls": 2,
+        "coalesced": 2,
+        "coalesced_ratio": 0.5,
+    }
+
+
+@pytest.mark.anyio
+async def test_cancelled_leader(
+    slow_repository: SlowRepository,
+    single_flight: SingleFlight,
+) -> None:
+    leader = asyncio.ensure_future(
+        coalescing(slow_repository, single_flight).get("one"),
+    )
+    follower = asyncio.ensure_future(
+        coalescing(slow_repository, single_flight).get("one"),
+    )
+    await asyncio.sleep(0)
+    leader.cancel()
+    await asyncio.sleep(0)
+    slow_repository.released.set()
+
+    assert (await follower).id == "one"  # type: ignore
+    assert leader.cancelled()
+    assert slow_repository.cancelled == 0
+
+
+@pytest.mark.anyio
+async def test_every_caller_cancelled(
+    slow_repository: SlowRepository,
+    single_flight: SingleFlight,
+) -> None:
+    reads = [
+        asyncio.ensure_future(coalescing(slow_repository, single_flight).get("one"))
+        for _ in range(2)
+    ]
+    await asyncio.sleep(0)
+    for read in reads:
+        read.cancel()
+    await asyncio.gather(*reads, return_exceptions=True)
+    # The query is cancelled on the following iteration of the loop.
+    await asyncio.sleep(0)
+
+    assert slow_repository.cancelled == 1
+    assert single_flight.stats()["in_flight"] == 0
+
+
+@pytest.mark.anyio
+async def test_reads_after_a_write_query_again(
+    slow_repository: SlowRepository,
+    single_flight: SingleFlight,
+) -> None:
+    repository = coalescing(slow_repository, single_flight)
+    before = asyncio.ensure_future(repository.get("one"))
+    await asyncio.sleep(0)
+    await repository.update(
+        "one",
+        Restaurant(id="one", lat=19.4, lng=-99.1, rating=2),
+    )
+    after = asyncio.ensure_future(repository.get("one"))
+    await asyncio.sleep(0)
+    slow_repository.released.set()
+    await asyncio.gather(before, after)
+
+    assert slow_repository.get_calls == ["one", "one"]
+
+
+@pytest.mark.anyio
+async def test_reads_of_other_positions_query_again(
+    slow_repository: SlowRepository,
+    single_flight: SingleFlight,
+) -> None:
+    reads = [
+        asyncio.ensure_future(
+            coalescing(slow_repository, single_flight, ReadPosition(min_lsn)).get(
+                "one",
+            ),
+        )
+        for min_lsn in (None, 100, 100)
+    ]
+    await asyncio.sleep(0)
+    slow_repository.released.set()
+    await asyncio.gather(*reads)
+
+    assert slow_repository.get_calls == ["one", "one"]
@@ -0,0 +1,103 @@
+import random
+import statistics
+from typing import List
+
+import pytest
+
+from test_project_edt.db.models.restaurant import Restaurant
+from test_project_edt.repository.statistics_cache_repository import haversine_distance
+
+np = pytest.importorskip("numpy")
+
+from test_project_edt.repository.restaurant_snapshot import (  # noqa: E402
+    RestaurantSnapshot,
+)
+
+
+def random_restaurants(count: int) -> List[Restaurant]:
+    generator = random.Random(7)  # noqa: S311
+    restaurants = []
+    for position in range(count):
+        # Every tenth restaurant is by the antimeridian.
+        longitude = -99.1 + generator.uniform(-0.2, 0.2)
+        if position % 10 == 0:
+            longitude = 179.9
+        rating = None if position % 7 == 0 else generator.randint(0, 4)
+        restaurants.append(
+            Restaurant(
+                id=f"restaurant-{position}",
+                lat=19.4 + generator.uniform(-0.2, 0.2),
+                lng=longitude,
+                rating=rating,
+            ),
+        )
+    return restaurants
+
+
+def load(snapshot: RestaurantSnapshot, restaurants: List[Restaurant]) -> None:
+    snapshot.load(
+        [restaurant.id for restaurant in restaurants],
+        np.array([restaurant.lat for restaurant in restaurants], dtype=float),
+        np.array([restaurant.lng for restaurant in restaurants], dtype=float),
+        np.array([restaurant.rating for restaurant in restaurants], dtype=float),
+    )
+
+
+def assert_matches(
+    snapshot: RestaurantSnapshot,
+    restaurants: List[Restaurant],
+    latitude: float,
+    longitude: float,
+    radius: float,
+) -> None:
+    inside = [
+        restaurant
+        for restaurant in restaurants
+        if haversine_distance(latitude, longitude, restaurant.lat, restaurant.lng)
+        <= radius
+    ]
+    ratings = [
+        restaurant.rating for restaurant in inside if restaurant.rating is not None
+    ]
+    avg = statistics.mean(ratings) if ratings else 0
+    stddev = statistics.stdev(ratings) if len(ratings) > 1 else 0
+    result = snapshot.statistics(latitude, longitude, radius)
+    assert result.count == len(inside)
+    assert result.avg == pytest.approx(avg)
+    assert result.std == pytest.approx(stddev)
+
+
+@pytest.mark.parametrize("radius", [0, 500, 5000, 30000, 3000000])
+def test_snapshot_statistics(radius: float) -> None:
+    """Checks the vectorized statistics against a point by point filter."""
+    restaurants = random_restaurants(2000)
+    snapshot = RestaurantSnapshot(cell_size=0.05)
+    load(snapshot, restaurants)
+
+    assert_matches(snapshot, restaurants, 19.4, -99.1, radius)
+    assert_matches(snapshot, restaurants, 19.4, -179.95, radius)
+
+
+def test_snapshot_writes() -> None:
+    """Checks that the writes are applied, also over many compactions."""
+    restaurants = random_restaurants(200)
+    snapshot = RestaurantSnapshot(cell_size=0.05)
+    load(snapshot, restaurants[:100])
+
+    for restaurant in restaurants[100:]:
+        snapshot.upsert(restaurant)
+    for removed in restaurants[:50]:
+        snapshot.remove(removed.id)
+    moved = Restaurant(
+        id=restaurants[60].id,
+        lat=19.41,
+        lng=-99.11,
+        rating=4,
+    )
+    for _ in range(3000):
+        snapshot.upsert(moved)
+    remaining = [moved, *restaurants[50:60]]
+    remaining.extend(restaurants[61:])
+
+    assert len(snapshot) == len(remaining)
+    assert_matches(snapshot, remaining, 19.4, -99.1, 10000)
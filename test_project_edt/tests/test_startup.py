@@ -0,0 +1,70 @@
+import os
+import re
+import subprocess  # noqa: S404
+import sys
+from pathlib import Path
+from typing import Dict
+
+import pytest
+
+# Seconds the application may take to import in a new worker.
+IMPORT_TIME_BUDGET = 1.0
+# Modules imported only when opentelemetry is enabled.
+TELEMETRY_MODULES = (
+    "grpc",
+    "opentelemetry.exporter",
+    "opentelemetry.instrumentation",
+    "opentelemetry.sdk",
+    "test_project_edt.repository.tracing_restaurant_repository",
+)
+
+MICROSECONDS = 1000000
+
+_IMPORT_TIME_LINE = re.compile(r"import time:\s+\d+ \|\s+(\d+) \| ( *)(\S+)")
+
+
+@pytest.fixture(scope="module")
+def import_times() -> Dict[str, float]:
+    """
+    Import the application in a new interpreter, as a worker does.
+
+    :return: seconds taken to import every module, including its imports.
+    """
+    env = {**os.environ, "TEST_PROJECT_EDT_OPENTELEMETRY_ENDPOINT": ""}
+    completed = subprocess.run(  # noqa: S603
+        [
+            sys.executable,
+            "-X",
+            "importtime",
+            "-c",
+            "from test_project_edt.web.application import get_app",
+        ],
+        env=env,
+        cwd=Path(__file__).parents[2],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    times = {}
+    for line in completed.stderr.splitlines():
+        match = _IMPORT_TIME_LINE.match(line)
+        if match:
+            microseconds = int(match.group(1))
+            times[match.group(3)] = microseconds / MICROSECONDS
+    return times
+
+
+def test_import_time_budget(import_times: Dict[str, float]) -> None:
+    assert import_times["test_project_edt.web.application"] < IMPORT_TIME_BUDGET
+
+
+def test_telemetry_imported_lazily(import_times: Dict[str, float]) -> None:
+    imported = [
+        module
+        for module in import_times
+        if any(
+            module == telemetry or module.startswith(f"{telemetry}.")
+            for telemetry in TELEMETRY_MODULES
+        )
+    ]
+    assert not imported
@@ -1,11 +1,52 @@
-from typing import Dict
+import asyncio
+import logging
+from typing import Any, Dict, List, Optional
 
+import orjson
 import pytest
 from fastapi import FastAPI
 from httpx import AsyncClient
+from psycopg.rows import dict_row
 from psycopg_pool import AsyncConnectionPool
 from starlette import status
 
+from test_project_edt.db.change_listener import RestaurantChangeListener
+from test_project_edt.db.models.statistics import RegionStatistics, Statistics
+from test_project_edt.db.query_tracing import (
+    QueryTrace,
+    SlowQueryLog,
+    current_trace,
+    enable_slow_query_log,
+    instrument_connection,
+)
+from test_project_edt.db.region_statistics import rebuild_region_statistics
+from test_project_edt.db.replicas import READ_AFTER_LSN_HEADER, WRITE_LSN_HEADER
+from test_project_edt.entities.common import (
+    NEAREST_DISTANCE,
+    SEARCH_RANK,
+    AscOrDesc,
+    PageCursor,
+    PaginationParams,
+)
+from test_project_edt.entities.restaurant import ChangeOperation, RestaurantChange
+from test_project_edt.entities.statistics import RegionLevel
+from test_project_edt.repository.pyscopg_restaurant_repository import (  # noqa: WPS235
+    CLUSTERS_QUERY,
+    SEARCH_QUERY,
+    STATISTICS_QUERY,
+    TILE_QUERY,
+    PsycopgRestaurantRepository,
+    like_prefix,
+    nearest_query,
+    page_filter,
+    page_order,
+    page_statement,
+    statistics_query_params,
+)
+from test_project_edt.repository.tile_cache_repository import tiles_around
+from test_project_edt.settings import Settings, settings
+from test_project_edt.web.lifetime import setup_caches
+
 
 @pytest.mark.anyio
 async def test_health(client: AsyncClient, fastapi_app: FastAPI) -> None:
@@ -66,6 +107,146 @@ async def test_restaurant_retrievals(
     assert elements == comparison
 
 
+@pytest.mark.anyio
+@pytest.mark.parametrize("order_by", ["id", "rating", "name", "lat"])
+@pytest.mark.parametrize("asc_or_desc", ["ASC", "DESC"])
+async def test_restaurant_cursor_pagination(
+    client: AsyncClient, fastapi_app: FastAPI, order_by: str, asc_or_desc: str
+) -> None:
+    """
+    Walks the restaurants with the cursor and checks that the pages
+    are the same as the ones obtained with a single request.
+    """
+    url = fastapi_app.url_path_for("get_all_restaurants")
+    ordering = {"order_by": order_by, "asc_or_desc": asc_or_desc}
+    response = await client.get(url, params={"limit": 1000, **ordering})
+    expected = response.json()
+
+    walked = []
+    params = {"limit": 7, **ordering}
+    while True:
+        response = await client.get(url, params=params)
+        assert response.status_code == status.HTTP_200_OK
+        walked.extend(response.json())
+        next_cursor = response.headers.get("X-Next-Cursor")
+        if next_cursor is None:
+            break
+        params["cursor"] = next_cursor
+
+    assert walked == expected
+
+
+@pytest.mark.anyio
+@pytest.mark.parametrize("order_by", ["rating", "city"])
+@pytest.mark.parametrize("asc_or_desc", ["ASC", "DESC"])
+async def test_restaurant_cursor_pagination_over_nulls(
+    client: AsyncClient, fastapi_app: FastAPI, order_by: str, asc_or_desc: str
+) -> None:
+    """Checks that the cursor walks the restaurants without a value as well."""
+    for position in range(10):
+        restaurant = {"name": f"Without {order_by} {position}", "lat": 19.4}
+        response = await client.post(
+            fastapi_app.url_path_for("add_restaurant"),
+            json=restaurant,
+        )
+        assert response.status_code == status.HTTP_201_CREATED
+
+    url = fastapi_app.url_path_for("get_all_restaurants")
+    ordering = {"order_by": order_by, "asc_or_desc": asc_or_desc}
+    response = await client.get(url, params={"limit": 1000, **ordering})
+    expected = response.json()
+
+    walked = []
+    params = {"limit": 3, **ordering}
+    while True:
+        response = await client.get(url, params=params)
+        assert response.status_code == status.HTTP_200_OK
+        walked.extend(response.json())
+        next_cursor = response.headers.get("X-Next-Cursor")
+        if next_cursor is None:
+            break
+        params["cursor"] = next_cursor
+
+    assert walked == expected
+    assert sum(restaurant[order_by] is None for restaurant in walked) >= 10
+
+
+@pytest.mark.anyio
+async def test_restaurant_forged_cursor(
+    client: AsyncClient, fastapi_app: FastAPI
+) -> None:
+    """Checks that a cursor with a value of another type is rejected."""
+    forged_cursor = PageCursor(
+        order_by="rating",
+        asc_or_desc=AscOrDesc.DESC,
+        value="four",
+        id="forged",
+    ).encode()
+    response = await client.get(
+        fastapi_app.url_path_for("get_all_restaurants"),
+        params={"order_by": "rating", "cursor": forged_cursor},
+    )
+    assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+
+
+@pytest.mark.anyio
+async def test_restaurant_cursor_of_other_ordering(
+    client: AsyncClient, fastapi_app: FastAPI
+) -> None:
+    """Checks that a cursor can't be reused with a different ordering."""
+    url = fastapi_app.url_path_for("get_all_restaurants")
+    response = await client.get(url, params={"limit": 5, "order_by": "name"})
+    next_cursor = response.headers["X-Next-Cursor"]
+
+    response = await client.get(
+        url,
+        params={"limit": 5, "order_by": "city", "cursor": next_cursor},
+    )
+    assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+
+
+@pytest.mark.parametrize("cursor_value", [2, None])
+@pytest.mark.parametrize("asc_or_desc", [AscOrDesc.ASC, AscOrDesc.DESC])
+@pytest.mark.anyio
+async def test_cursor_page_uses_index_conditions(
+    dbpool: AsyncConnectionPool,
+    asc_or_desc: AscOrDesc,
+    cursor_value: Optional[int],
+) -> None:
+    """Checks that every part of a page after a cursor is a range of the index."""
+    pagination_params = PaginationParams(
+        limit=20,
+        order_by="rating",
+        asc_or_desc=asc_or_desc,
+        cursor=PageCursor(
+            order_by="rating",
+            asc_or_desc=asc_or_desc,
+            value=cursor_value,
+            id="cursor",
+        ).encode(),
+    )
+    where_clauses, query_params = page_filter(pagination_params)
+    query = page_statement(
+        where_clauses,
+        page_order("rating", asc_or_desc.value),
+    )
+    async with dbpool.connection() as conn:
+        async with conn.transaction():
+            await conn.execute("SET LOCAL enable_seqscan = off")
+            await conn.execute("SET LOCAL enable_bitmapscan = off")
+            res = await conn.execute(
+                f"EXPLAIN {query}",
+                params={"limit": 20, **query_params},
+            )
+            plan = "\n".join(row["QUERY PLAN"] for row in await res.fetchall())
+
+    assert "Index Scan" in plan
+    assert "restaurants_rating_id_idx" in plan
+    assert plan.count("Index Cond:") == len(where_clauses)
+    assert "Filter:" not in plan
+    assert "Seq Scan" not in plan
+
+
 @pytest.mark.anyio
 async def test_restaurant_creation(client: AsyncClient, fastapi_app: FastAPI) -> None:
     """
@@ -102,7 +283,9 @@ async def test_restaurant_creation(client: AsyncClient, fastapi_app: FastAPI) ->
 
 
 @pytest.mark.anyio
-async def test_restaurant_deletion(client: AsyncClient, fastapi_app: FastAPI) -> None:
+async def test_restaurant_deletion(  # noqa: WPS218
+    client: AsyncClient, fastapi_app: FastAPI
+) -> None:
     """
     Create a restaurant record, check that exist calling the endpoint with the
     identifier, and finally it delete the resource and review if still exist
@@ -142,9 +325,15 @@ async def test_restaurant_deletion(client: AsyncClient, fastapi_app: FastAPI) ->
         "detail": f"Restaurant {restaurant_id} not found"
     }
 
+    url = fastapi_app.url_path_for("delete_restaurant", restaurant_id=restaurant_id)
+    response_delete_restaurant = await client.delete(url)
+    assert response_delete_restaurant.status_code == status.HTTP_404_NOT_FOUND
+
 
 @pytest.mark.anyio
-async def test_restaurant_update(client: AsyncClient, fastapi_app: FastAPI) -> None:
+async def test_restaurant_update(  # noqa: WPS218
+    client: AsyncClient, fastapi_app: FastAPI
+) -> None:
     """
     Create a restaurant record, check that exist calling the endpoint with the
     identifier, and finally it delete the resource and review if still exist
@@ -187,6 +376,825 @@ async def test_restaurant_update(client: AsyncClient, fastapi_app: FastAPI) -> N
     assert response_get_restaurant.status_code == status.HTTP_200_OK
     assert response_get_restaurant.json() == {'id': restaurant_id, **restaurant_data}
 
+    url = fastapi_app.url_path_for("update_restaurant", restaurant_id="missing")
+    response_update_restaurant = await client.patch(url, json={"name": "Nobody"})
+    assert response_update_restaurant.status_code == status.HTTP_404_NOT_FOUND
+
+
+@pytest.mark.anyio
+async def test_json_passthrough(
+    client: AsyncClient, fastapi_app: FastAPI, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    """
+    Checks that the bodies rendered by the database are
+    the same as the ones serialized from the models.
+    """
+    list_url = fastapi_app.url_path_for("get_all_restaurants")
+    params = {"limit": 7, "order_by": "rating", "asc_or_desc": "desc"}
+    detail_url = fastapi_app.url_path_for(
+        "get_restaurants_by_id",
+        restaurant_id="851f799f-0852-439e-b9b2-df92c43e7672",
+    )
+    missing_url = fastapi_app.url_path_for(
+        "get_restaurants_by_id",
+        restaurant_id="missing",
+    )
+
+    responses = {}
+    for passthrough in (False, True):
+        monkeypatch.setattr(settings, "restaurants_list_json_passthrough", passthrough)
+        monkeypatch.setattr(settings, "restaurant_detail_json_passthrough", passthrough)
+        responses[passthrough] = [
+            await client.get(list_url, params=params),
+            await client.get(detail_url),
+            await client.get(missing_url),
+        ]
+
+    for model_response, rendered_response in zip(responses[False], responses[True]):
+        assert rendered_response.status_code == model_response.status_code
+        assert rendered_response.json() == model_response.json()
+    assert (
+        responses[True][0].headers["X-Next-Cursor"]
+        == responses[False][0].headers["X-Next-Cursor"]
+    )
+
+
+@pytest.mark.anyio
+async def test_restaurant_bulk_import(  # noqa: WPS218
+    client: AsyncClient, fastapi_app: FastAPI
+) -> None:
+    """
+    Imports restaurants in both conflict modes and checks the counts
+    reported for new, duplicated and invalid rows.
+    """
+    existing_id = "851f799f-0852-439e-b9b2-df92c43e7672"
+    document = "\n".join(
+        [
+            "id,name,site,email,phone,street,city,state,lat,lng,rating",
+            "bulk-1,First,s,e,p,st,Oaxaca,Oaxaca,17.06,-96.72,3",
+            f"{existing_id},Renamed,s,e,p,st,Oaxaca,Oaxaca,17.06,-96.72,2",
+            "bulk-2,Second,s,e,p,st,Oaxaca,Oaxaca,17.07,-96.73,1",
+            "bulk-2,Second again,s,e,p,st,Oaxaca,Oaxaca,17.07,-96.73,4",
+            "bulk-3,Invalid,s,e,p,st,Oaxaca,Oaxaca,north,-96.73,1",
+        ],
+    )
+    url = fastapi_app.url_path_for("bulk_add_restaurants")
+
+    response = await client.post(
+        url,
+        content=document,
+        headers={"content-type": "text/csv"},
+    )
+    assert response.status_code == status.HTTP_409_CONFLICT
+
+    response = await client.post(
+        url,
+        params={"on_conflict": "upsert"},
+        content=document,
+        headers={"content-type": "text/csv"},
+    )
+    assert response.status_code == status.HTTP_200_OK
+    result = response.json()
+    assert result["inserted"] == 2
+    assert result["duplicates"] == 2
+    assert result["rejected"] == 1
+
+    url = fastapi_app.url_path_for("get_restaurants_by_id", restaurant_id="bulk-2")
+    response = await client.get(url)
+    assert response.json()["name"] == "Second again"
+
+
+@pytest.mark.anyio
+async def test_restaurant_export(
+    client: AsyncClient, fastapi_app: FastAPI, dbpool: AsyncConnectionPool
+) -> None:
+    """Checks that the export contains the rows matching the filters."""
+    async with dbpool.connection() as conn:
+        res = await conn.execute(
+            "SELECT count(*) FROM restaurants "
+            "WHERE state = 'Oaxaca' AND lat BETWEEN 19.435 AND 19.44 "
+            "AND lng BETWEEN -99.13 AND -99.125",
+        )
+        expected_count = (await res.fetchone())["count"]
+
+    url = fastapi_app.url_path_for("export_restaurants")
+    filters = {"state": "Oaxaca", "bbox": "-99.13,19.435,-99.125,19.44"}
+    response = await client.get(url, params=filters)
+    assert response.status_code == status.HTTP_200_OK
+    lines = response.text.splitlines()
+    assert len(lines) == expected_count
+    assert all(orjson.loads(line)["state"] == "Oaxaca" for line in lines)
+
+    response = await client.get(url, params={"format": "csv"})
+    lines = response.text.splitlines()
+    assert lines[0].split(",")[-1] == "id"
+    assert (
+        len(lines)
+        == len(
+            (await client.get(url)).text.splitlines(),
+        )
+        + 1
+    )
+
+
+@pytest.mark.anyio
+async def test_restaurant_search(  # noqa: WPS217, WPS218
+    client: AsyncClient, fastapi_app: FastAPI
+) -> None:
+    """Checks that the search finds prefixes and typos, and pages the results."""
+    document = "\n".join(
+        [
+            "id,name,site,email,phone,street,city,state,lat,lng,rating",
+            "search-1,Tacos Zamorano,s,e,p,st,Oaxaca,Oaxaca,17.06,-96.72,3",
+            "search-2,Zamorano Grill,s,e,p,st,Oaxaca,Oaxaca,17.06,-96.72,2",
+            "search-3,Taqueria Zamora,s,e,p,st,Oaxaca,Oaxaca,17.07,-96.73,1",
+            "search-4,Zamorano 100%,s,e,p,st,Oaxaca,Oaxaca,17.07,-96.73,4",
+        ],
+    )
+    response = await client.post(
+        fastapi_app.url_path_for("bulk_add_restaurants"),
+        content=document,
+        headers={"content-type": "text/csv"},
+    )
+    assert response.status_code == status.HTTP_200_OK
+
+    url = fastapi_app.url_path_for("search_restaurants")
+    response = await client.get(url, params={"q": "zamorano"})
+    assert response.status_code == status.HTTP_200_OK
+    matches = response.json()
+    expected_ids = [match["restaurant"]["id"] for match in matches]
+    # The names starting with the text rank first.
+    assert set(expected_ids[:2]) == {"search-2", "search-4"}
+    assert "search-1" in expected_ids
+    ranks = [match["rank"] for match in matches]
+    assert ranks == sorted(ranks, reverse=True)
+
+    response = await client.get(url, params={"q": "zamorno"})
+    ids = [match["restaurant"]["id"] for match in response.json()]
+    assert "search-1" in ids
+
+    response = await client.get(url, params={"q": "zamorano 100%"})
+    ids = [match["restaurant"]["id"] for match in response.json()]
+    assert ids[0] == "search-4"
+
+    pages = []
+    params = {"q": "zamorano", "limit": 1}
+    while True:
+        response = await client.get(url, params=params)
+        pages.extend(match["restaurant"]["id"] for match in response.json())
+        if "X-Next-Cursor" not in response.headers:
+            break
+        params["cursor"] = response.headers["X-Next-Cursor"]
+    assert pages == expected_ids
+
+    response = await client.get(url, params={"q": "za"})
+    assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+
+    list_url = fastapi_app.url_path_for("get_all_restaurants")
+    list_cursor = (await client.get(list_url, params={"limit": 1})).headers[
+        "X-Next-Cursor"
+    ]
+    response = await client.get(url, params={"q": "zamorano", "cursor": list_cursor})
+    assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+
+
+@pytest.mark.anyio
+async def test_search_forged_cursor(client: AsyncClient, fastapi_app: FastAPI) -> None:
+    """Checks that a search cursor with a rank that isn't a number is rejected."""
+    forged_cursor = PageCursor(
+        order_by=SEARCH_RANK,
+        asc_or_desc=AscOrDesc.DESC,
+        value="four",
+        id="forged",
+    ).encode()
+    response = await client.get(
+        fastapi_app.url_path_for("search_restaurants"),
+        params={"q": "zamorano", "cursor": forged_cursor},
+    )
+    assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+
+
+@pytest.mark.anyio
+async def test_search_uses_trigram_indexes(dbpool: AsyncConnectionPool) -> None:
+    """Checks that the search is answered with the trigram indexes."""
+    async with dbpool.connection() as conn:
+        async with conn.transaction():
+            await conn.execute("SET LOCAL enable_seqscan = off")
+            res = await conn.execute(
+                f"EXPLAIN {SEARCH_QUERY}",
+                params={
+                    "text": "zamorano",
+                    "prefix": like_prefix("zamorano"),
+                    "limit": 20,
+                    "cursor_rank": None,
+                    "cursor_id": None,
+                },
+            )
+            plan = "\n".join(row["QUERY PLAN"] for row in await res.fetchall())
+
+    assert "restaurants_name_trgm_idx" in plan
+    assert "Seq Scan" not in plan
+
+
+def test_like_prefix() -> None:
+    assert like_prefix("100%_\\") == r"100\%\_\\%"
+
+
+@pytest.mark.anyio
+async def test_nearest_restaurants(  # noqa: WPS217, WPS218
+    client: AsyncClient, fastapi_app: FastAPI
+) -> None:
+    """Checks that the closest restaurants are found, filtered and paged."""
+    document = "\n".join(
+        [
+            "id,name,site,email,phone,street,city,state,lat,lng,rating",
+            "nearest-1,One,s,e,p,st,Merida,Yucatan,20.9670,-89.6240,1",
+            "nearest-2,Two,s,e,p,st,Merida,Yucatan,20.9700,-89.6240,4",
+            "nearest-3,Three,s,e,p,st,Merida,Yucatan,20.9800,-89.6240,2",
+            "nearest-4,Four,s,e,p,st,Merida,Yucatan,21.0500,-89.6240,4",
+        ],
+    )
+    response = await client.post(
+        fastapi_app.url_path_for("bulk_add_restaurants"),
+        content=document,
+        headers={"content-type": "text/csv"},
+    )
+    assert response.status_code == status.HTTP_200_OK
+
+    url = fastapi_app.url_path_for("get_nearest_restaurants")
+    center = {"latitude": 20.967, "longitude": -89.624}
+    response = await client.get(url, params={**center, "k": 4})
+    assert response.status_code == status.HTTP_200_OK
+    results = response.json()
+    assert [result["restaurant"]["id"] for result in results] == [
+        "nearest-1",
+        "nearest-2",
+        "nearest-3",
+        "nearest-4",
+    ]
+    assert results[0]["distance"] == pytest.approx(0, abs=0.01)
+    # A thousandth of a degree of latitude is about 111 meters.
+    assert results[1]["distance"] == pytest.approx(332, rel=0.01)
+    assert "X-Next-Cursor" in response.headers
+
+    response = await client.get(url, params={**center, "max_radius": 2000})
+    assert [result["restaurant"]["id"] for result in response.json()] == [
+        "nearest-1",
+        "nearest-2",
+        "nearest-3",
+    ]
+    assert "X-Next-Cursor" not in response.headers
+
+    response = await client.get(url, params={**center, "k": 4, "min_rating": 4})
+    assert [result["restaurant"]["id"] for result in response.json()] == [
+        "nearest-2",
+        "nearest-4",
+    ]
+
+    pages = []
+    params = {**center, "k": 1}
+    while len(pages) < 4:
+        response = await client.get(url, params=params)
+        pages.extend(result["restaurant"]["id"] for result in response.json())
+        params["cursor"] = response.headers["X-Next-Cursor"]
+    assert pages == [result["restaurant"]["id"] for result in results]
+
+    response = await client.get(url, params={**center, "k": 0})
+    assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+    response = await client.get(url, params={"latitude": 91, "longitude": 0})
+    assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+
+
+@pytest.mark.anyio
+async def test_nearest_forged_cursor(client: AsyncClient, fastapi_app: FastAPI) -> None:
+    """Checks that a nearest cursor with a distance that isn't a number is rejected."""
+    forged_cursor = PageCursor(
+        order_by=NEAREST_DISTANCE,
+        asc_or_desc=AscOrDesc.ASC,
+        value="four",
+        id="forged",
+    ).encode()
+    response = await client.get(
+        fastapi_app.url_path_for("get_nearest_restaurants"),
+        params={"latitude": 20.967, "longitude": -89.624, "cursor": forged_cursor},
+    )
+    assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+
+
+@pytest.mark.parametrize("within_radius", [False, True])
+@pytest.mark.anyio
+async def test_nearest_uses_spatial_index(
+    dbpool: AsyncConnectionPool,
+    within_radius: bool,
+) -> None:
+    """Checks that the closest restaurants are walked through the GiST index."""
+    async with dbpool.connection() as conn:
+        async with conn.transaction():
+            await conn.execute("SET LOCAL enable_seqscan = off")
+            query = nearest_query(within_radius)
+            res = await conn.execute(
+                f"EXPLAIN {query}",
+                params={
+                    "latitude": 20.967,
+                    "longitude": -89.624,
+                    "max_radius": 2000,
+                    "min_rating": None,
+                    "k": 20,
+                    "cursor_distance": None,
+                    "cursor_id": None,
+                },
+            )
+            plan = "\n".join(row["QUERY PLAN"] for row in await res.fetchall())
+
+    assert "restaurants_geog_idx" in plan
+    assert "Seq Scan" not in plan
+    assert "Order By: (geog <->" in plan
+
+
+@pytest.mark.anyio
+async def test_restaurant_bounding_box_page(
+    client: AsyncClient,
+    fastapi_app: FastAPI,
+    dbpool: AsyncConnectionPool,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    """Checks that the list only has the restaurants of the bounding box."""
+    async with dbpool.connection() as conn:
+        res = await conn.execute(
+            "SELECT id FROM restaurants "
+            "WHERE lat BETWEEN 19.435 AND 19.44 AND lng BETWEEN -99.13 AND -99.125 "
+            "ORDER BY id DESC",
+        )
+        expected_ids = [row["id"] for row in await res.fetchall()]
+
+    url = fastapi_app.url_path_for("get_all_restaurants")
+    params = {"bbox": "-99.13,19.435,-99.125,19.44", "limit": 1000}
+    for passthrough in (False, True):
+        monkeypatch.setattr(settings, "restaurants_list_json_passthrough", passthrough)
+        response = await client.get(url, params=params)
+        assert response.status_code == status.HTTP_200_OK
+        ids = [restaurant["id"] for restaurant in response.json()]
+        assert ids == expected_ids
+
+    response = await client.get(url, params={"bbox": "-99.13,19.44,-99.125,19.435"})
+    assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+
+
+@pytest.mark.anyio
+async def test_restaurant_clusters(  # noqa: WPS218
+    client: AsyncClient,
+    fastapi_app: FastAPI,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    """Checks that the restaurants are counted by cell, listing the sparse ones."""
+    document = "\n".join(
+        [
+            "id,name,site,email,phone,street,city,state,lat,lng,rating",
+            "cluster-1,One,s,e,p,st,Isla,Pacifico,10.0000,-140.0000,1",
+            "cluster-2,Two,s,e,p,st,Isla,Pacifico,10.0010,-140.0010,2",
+            "cluster-3,Three,s,e,p,st,Isla,Pacifico,10.0020,-139.9990,3",
+            "cluster-4,Four,s,e,p,st,Isla,Pacifico,10.3000,-139.7000,4",
+        ],
+    )
+    response = await client.post(
+        fastapi_app.url_path_for("bulk_add_restaurants"),
+        content=document,
+        headers={"content-type": "text/csv"},
+    )
+    assert response.status_code == status.HTTP_200_OK
+
+    monkeypatch.setattr(settings, "cluster_restaurants_threshold", 2)
+    url = fastapi_app.url_path_for("get_restaurant_clusters")
+    response = await client.get(
+        url,
+        params={"bbox": "-140.5,9.5,-139.5,10.5", "zoom": 10},
+    )
+    assert response.status_code == status.HTTP_200_OK
+    dense, sparse = response.json()
+    assert dense["count"] == 3
+    assert dense["avg"] == pytest.approx(2)
+    assert dense["lat"] == pytest.approx(10.001)
+    assert dense["lng"] == pytest.approx(-140.0)
+    assert dense["restaurants"] is None
+    assert sparse["count"] == 1
+    assert [restaurant["id"] for restaurant in sparse["restaurants"]] == [
+        "cluster-4",
+    ]
+
+    # Zoomed out, every restaurant falls in the same cell.
+    response = await client.get(
+        url,
+        params={"bbox": "-140.5,9.5,-139.5,10.5", "zoom": 2},
+    )
+    assert [cluster["count"] for cluster in response.json()] == [4]
+
+    response = await client.get(url, params={"bbox": "-140.5,9.5,-139.5,10.5"})
+    assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+
+
+@pytest.mark.anyio
+async def test_clusters_use_spatial_index(dbpool: AsyncConnectionPool) -> None:
+    """Checks that the cells are counted from the index of the location."""
+    async with dbpool.connection() as conn:
+        async with conn.transaction():
+            await conn.execute("SET LOCAL enable_seqscan = off")
+            res = await conn.execute(
+                f"EXPLAIN {CLUSTERS_QUERY}",
+                params={
+                    "min_lng": -99.2,
+                    "min_lat": 19.3,
+                    "max_lng": -99.0,
+                    "max_lat": 19.5,
+                    "cell_size": 0.01,
+                    "threshold": 5,
+                },
+            )
+            plan = "\n".join(row["QUERY PLAN"] for row in await res.fetchall())
+
+    assert "restaurants_geom_idx" in plan
+    assert "Seq Scan" not in plan
+
+
+@pytest.mark.anyio
+async def test_restaurant_tiles(  # noqa: WPS217, WPS218
+    client: AsyncClient, fastapi_app: FastAPI, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    """Checks that the tiles show the restaurants, even after they change."""
+    monkeypatch.setattr(settings, "tile_cache_size", 1048576)
+    setup_caches(fastapi_app)
+    response = await client.post(
+        fastapi_app.url_path_for("add_restaurant"),
+        json={
+            "name": "Taqueria del Mosaico",
+            "site": "s",
+            "email": "e",
+            "phone": "p",
+            "street": "st",
+            "city": "Isla",
+            "state": "Pacifico",
+            "lat": 10.0,
+            "lng": -140.0,
+            "rating": 3,
+        },
+    )
+    restaurant_id = response.json()["id"]
+    tiles = tiles_around(10.0, -140.0, 0)
+    tile = next(tile for tile in tiles if tile.zoom == 10)
+    url = fastapi_app.url_path_for(
+        "get_restaurant_tile",
+        zoom=str(tile.zoom),
+        column=str(tile.column),
+        row=str(tile.row),
+    )
+
+    response = await client.get(url)
+    assert response.status_code == status.HTTP_200_OK
+    assert response.headers["content-type"] == "application/vnd.mapbox-vector-tile"
+    assert b"Taqueria del Mosaico" in response.content
+    etag = response.headers["ETag"]
+
+    response = await client.get(url, headers={"If-None-Match": etag})
+    assert response.status_code == status.HTTP_304_NOT_MODIFIED
+    assert fastapi_app.state.tile_cache.stats()["hits"] == 1
+
+    await client.patch(
+        fastapi_app.url_path_for("update_restaurant", restaurant_id=restaurant_id),
+        json={"name": "Taqueria Renovada"},
+    )
+    response = await client.get(url, headers={"If-None-Match": etag})
+    assert response.status_code == status.HTTP_200_OK
+    assert b"Taqueria Renovada" in response.content
+    assert response.headers["ETag"] != etag
+
+    response = await client.get(
+        fastapi_app.url_path_for("get_restaurant_tile", zoom="1", column="2", row="0"),
+    )
+    assert response.status_code == status.HTTP_404_NOT_FOUND
+
+
+@pytest.mark.anyio
+async def test_tiles_use_spatial_index(dbpool: AsyncConnectionPool) -> None:
+    """Checks that the restaurants of a tile are found with the geometry index."""
+    async with dbpool.connection() as conn:
+        async with conn.transaction():
+            await conn.execute("SET LOCAL enable_seqscan = off")
+            res = await conn.execute(
+                f"EXPLAIN {TILE_QUERY}",
+                params={"zoom": 12, "column": 920, "row": 1823},
+            )
+            plan = "\n".join(row["QUERY PLAN"] for row in await res.fetchall())
+
+    assert "restaurants_geom_idx" in plan
+    assert "Seq Scan" not in plan
+
+
+@pytest.mark.anyio
+async def test_statistics_uses_spatial_index(dbpool: AsyncConnectionPool) -> None:
+    """
+    Checks that the statistics query can be answered with the
+    indexes instead of scanning the whole table.
+    """
+    async with dbpool.connection() as conn:
+        async with conn.transaction():
+            # The test table is tiny, the planner must be
+            # forced to consider the indexes.
+            await conn.execute("SET LOCAL enable_seqscan = off")
+            res = await conn.execute(
+                f"EXPLAIN {STATISTICS_QUERY}",
+                params=statistics_query_params(19.4373, -99.1278, 500),
+            )
+            plan = "\n".join(row["QUERY PLAN"] for row in await res.fetchall())
+
+    assert "restaurants_cell_idx" in plan
+    assert "Seq Scan" not in plan
+
+
+@pytest.mark.anyio
+@pytest.mark.parametrize("radius", [0, 50, 300, 700, 2000, 50000, 30000000])
+async def test_statistics_match_raw_rows(
+    dbpool: AsyncConnectionPool, radius: float
+) -> None:
+    """
+    Checks that the statistics combined from the grid aggregates are
+    the same as the ones computed over every restaurant of the circle.
+    """
+    latitude, longitude = 19.4373, -99.1278
+    async with dbpool.connection() as conn:
+        # Moves some restaurants around so the aggregates of
+        # the cells must follow the updates and deletions.
+        await conn.execute(
+            "UPDATE restaurants SET lat = lat + 0.005, rating = 4 " "WHERE rating = 0",
+        )
+        await conn.execute("DELETE FROM restaurants WHERE rating = 1")
+        raw_query = """
+            SELECT count(*), avg(rating), stddev(rating)
+            FROM restaurants
+            WHERE ST_DWithin(
+                ST_SetSRID(ST_MakePoint(lng, lat), 4326)::GEOGRAPHY,
+                ST_SetSRID(
+                    ST_MakePoint(%(longitude)s, %(latitude)s), 4326
+                )::GEOGRAPHY,
+                %(radius)s
+            );
+        """  # noqa: WPS323
+        res = await conn.execute(
+            raw_query,
+            params={"latitude": latitude, "longitude": longitude, "radius": radius},
+        )
+        expected = Statistics(**await res.fetchone())
+
+    repository = PsycopgRestaurantRepository(dbpool)
+    statistics = await repository.get_statistics(latitude, longitude, radius)
+    assert statistics.count == expected.count
+    assert statistics.avg == pytest.approx(expected.avg)
+    assert statistics.std == pytest.approx(expected.std)
+
+
+@pytest.mark.anyio
+async def test_statistics_batch(  # noqa: WPS218
+    client: AsyncClient, fastapi_app: FastAPI, dbpool: AsyncConnectionPool
+) -> None:
+    """
+    Checks that the batch returns the same statistics
+    as requesting every circle on its own.
+    """
+    points = [
+        {"latitude": 19.4373, "longitude": -99.1278, "radii": [100, 2000, 500]},
+        {"latitude": 19.44, "longitude": -99.13, "radii": [1000]},
+        {"latitude": 0, "longitude": 0, "radii": [10]},
+    ]
+    url = fastapi_app.url_path_for("get_restaurants_statistics_batch")
+    response = await client.post(url, json={"points": points})
+    assert response.status_code == status.HTTP_200_OK
+    batch = response.json()
+
+    repository = PsycopgRestaurantRepository(dbpool)
+    assert [len(point_statistics) for point_statistics in batch] == [3, 1, 1]
+    for point, point_statistics in zip(points, batch):
+        for radius, statistics in zip(point["radii"], point_statistics):
+            expected = await repository.get_statistics(
+                point["latitude"],
+                point["longitude"],
+                radius,
+            )
+            assert statistics["count"] == expected.count
+            assert statistics["avg"] == pytest.approx(expected.avg)
+            assert statistics["std"] == pytest.approx(expected.std)
+
+    response = await client.post(url, json={"points": []})
+    assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+
+
+async def raw_region_statistics(
+    dbpool: AsyncConnectionPool,
+    level: RegionLevel,
+) -> List[RegionStatistics]:
+    """Statistics of the regions computed over every restaurant."""
+    city = "NULL" if level == RegionLevel.STATE else "nullif(city, '')"
+    histogram = ", ".join(
+        f"count(*) FILTER (WHERE rating = {rating})" for rating in range(5)
+    )
+    query = f"""
+        SELECT nullif(state, '') AS state, {city} AS city,
+            count(*), avg(rating), stddev(rating),
+            ARRAY[{histogram}] AS histogram
+        FROM restaurants
+        GROUP BY 1, 2
+        ORDER BY 1 NULLS LAST, 2 NULLS LAST;
+    """  # noqa: S608
+    async with dbpool.connection() as conn:
+        res = await conn.execute(query)
+        return [RegionStatistics(**row) for row in await res.fetchall()]
+
+
+@pytest.mark.anyio
+@pytest.mark.parametrize("level", list(RegionLevel))
+async def test_region_statistics_match_raw_rows(  # noqa: WPS217, WPS218
+    client: AsyncClient,
+    fastapi_app: FastAPI,
+    dbpool: AsyncConnectionPool,
+    level: RegionLevel,
+) -> None:
+    """
+    Checks that the aggregates of the regions follow the writes
+    and match the statistics computed over every restaurant.
+    """
+    async with dbpool.connection() as conn:
+        await conn.execute(
+            "UPDATE restaurants SET city = 'Zapopan', state = 'Jalisco', "
+            "rating = 4 WHERE rating = 0",
+        )
+        await conn.execute("DELETE FROM restaurants WHERE rating = 1")
+        await conn.execute(
+            "INSERT INTO restaurants (id, rating, city, state, lat, lng) "
+            "VALUES ('region-one', 2, 'Zapopan', 'Jalisco', 20.7, -103.4), "
+            "('region-two', NULL, NULL, NULL, 20.7, -103.4)",
+        )
+
+    url = fastapi_app.url_path_for("get_restaurants_statistics_by_region")
+    response = await client.get(url, params={"level": level.value})
+    assert response.status_code == status.HTTP_200_OK
+    regions = response.json()
+
+    expected = await raw_region_statistics(dbpool, level)
+    assert len(regions) == len(expected)
+    for region, expected_region in zip(regions, expected):
+        assert region["state"] == expected_region.state
+        assert region["city"] == expected_region.city
+        assert region["count"] == expected_region.count
+        assert region["avg"] == pytest.approx(expected_region.avg)
+        assert region["stddev"] == pytest.approx(expected_region.std)
+        assert region["histogram"] == expected_region.histogram
+    assert any(found["state"] == "Jalisco" for found in regions)
+    assert regions[-1]["state"] is None
+
+    response = await client.get(url, params={"level": "country"})
+    assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+
+
+@pytest.mark.anyio
+async def test_region_statistics_rebuild(dbpool: AsyncConnectionPool) -> None:
+    """Checks that the rebuild recovers the aggregates of the regions."""
+    expected = await raw_region_statistics(dbpool, RegionLevel.CITY)
+    async with dbpool.connection() as conn:
+        # Truncating skips the triggers, the aggregates are lost.
+        await conn.execute("TRUNCATE restaurant_region_statistics")
+
+    repository = PsycopgRestaurantRepository(dbpool)
+    assert not await repository.get_region_statistics(RegionLevel.CITY)
+
+    async with dbpool.connection() as rebuild_conn:
+        assert await rebuild_region_statistics(rebuild_conn) == len(expected)
+    regions = await repository.get_region_statistics(RegionLevel.CITY)
+    assert [region.count for region in regions] == [region.count for region in expected]
+    assert [region.histogram for region in regions] == [
+        region.histogram for region in expected
+    ]
+
+
+@pytest.mark.anyio
+@pytest.mark.parametrize("radius", [300, 2000, 20000])
+async def test_snapshot_matches_postgis(
+    dbpool: AsyncConnectionPool, radius: float
+) -> None:
+    """
+    Checks that the snapshot counts the same restaurants as ST_DWithin,
+    except for the ones within the documented tolerance of the border.
+    """
+    restaurant_snapshot = pytest.importorskip(
+        "test_project_edt.repository.restaurant_snapshot",
+    )
+    snapshot = restaurant_snapshot.RestaurantSnapshot()
+    await snapshot.reload(dbpool)
+    latitude, longitude = 19.4373, -99.1278
+
+    async def postgis_count(distance: float) -> int:  # noqa: WPS430
+        count_query = """
+            SELECT count(*) FROM restaurants WHERE ST_DWithin(
+                geog,
+                ST_SetSRID(
+                    ST_MakePoint(%(longitude)s, %(latitude)s), 4326
+                )::GEOGRAPHY,
+                %(distance)s
+            );
+        """  # noqa: WPS323
+        async with dbpool.connection() as conn:
+            res = await conn.execute(
+                count_query,
+                params={
+                    "latitude": latitude,
+                    "longitude": longitude,
+                    "distance": distance,
+                },
+            )
+            return (await res.fetchone())["count"]
+
+    statistics = snapshot.statistics(latitude, longitude, radius)
+    tolerance = restaurant_snapshot.SPHEROID_TOLERANCE
+    assert await postgis_count(radius * (1 - tolerance)) <= statistics.count
+    assert statistics.count <= await postgis_count(radius * (1 + tolerance))
+
+
+async def write_restaurants(
+    dbpool: AsyncConnectionPool,
+    query: str,
+    params: Optional[Dict[str, str]] = None,
+) -> None:
+    """Run a write over the restaurants in a transaction of its own."""
+    async with dbpool.connection() as conn:
+        await conn.execute(query, params=params)
+
+
+async def logged_changes(
+    dbpool: AsyncConnectionPool,
+    since: int,
+) -> List[Dict[str, Any]]:
+    """Entries of the change log from a sequence number on."""
+    async with dbpool.connection() as conn:
+        res = await conn.execute(
+            "SELECT restaurant_id, operation FROM restaurant_changes "
+            "WHERE seq >= %(seq)s",
+            params={"seq": since},
+        )
+        return await res.fetchall()
+
+
+async def assert_changes_delivered(  # noqa: WPS217, WPS218
+    dbpool: AsyncConnectionPool,
+    listener: RestaurantChangeListener,
+    changes: "asyncio.Queue[RestaurantChange]",
+) -> None:
+    """Write the restaurants and check the changes the listener delivers."""
+    await write_restaurants(
+        dbpool,
+        "UPDATE restaurants SET lat = 10, lng = 20 WHERE id = %(id)s",  # noqa: WPS323
+        {"id": "851f799f-0852-439e-b9b2-df92c43e7672"},
+    )
+    change = await asyncio.wait_for(changes.get(), timeout=5)
+    assert change.op == ChangeOperation.UPDATE
+    assert change.id == "851f799f-0852-439e-b9b2-df92c43e7672"
+    assert (change.lat, change.lng) == (10, 20)
+    assert change.old_lat == pytest.approx(19.4400570537131)
+
+    await listener.stop()
+    await write_restaurants(
+        dbpool,
+        "DELETE FROM restaurants WHERE id = %(id)s",  # noqa: WPS323
+        {"id": "851f799f-0852-439e-b9b2-df92c43e7672"},
+    )
+    await listener.start()
+    change = await asyncio.wait_for(changes.get(), timeout=5)
+    assert change.op == ChangeOperation.DELETE
+    assert changes.empty()
+
+    await write_restaurants(
+        dbpool,
+        "INSERT INTO restaurants (id) "
+        "SELECT 'many-' || position FROM generate_series(1, 150) AS position",
+    )
+    change = await asyncio.wait_for(changes.get(), timeout=5)
+    assert change.op == ChangeOperation.BULK
+    # The rows of a bulk change are not logged one by one.
+    assert await logged_changes(dbpool, change.seq) == [
+        {"restaurant_id": None, "operation": "BULK"},
+    ]
+
+
+@pytest.mark.anyio
+async def test_change_listener(dbpool: AsyncConnectionPool) -> None:
+    """
+    Checks that the writes reach the listener, as notifications
+    while it is connected and from the change log after reconnecting.
+    """
+    listener = RestaurantChangeListener(str(settings.db_url), reconnect_delay=0)
+    changes: "asyncio.Queue[RestaurantChange]" = asyncio.Queue()
+    listener.subscribe(changes.put_nowait)
+    await listener.start()
+    try:
+        await assert_changes_delivered(dbpool, listener, changes)
+    finally:
+        await listener.stop()
+
 
 @pytest.mark.anyio
 async def test_healths(
@@ -199,7 +1207,138 @@ async def test_healths(
     :param fastapi_app: current FastAPI application.
     """
     async with dbpool.connection() as conn_check:
-        res = await conn_check.execute(
-            """SELECT * FROM restaurants"""
-        )
+        res = await conn_check.execute("SELECT * FROM restaurants")
         await res.fetchall()
+
+
+@pytest.mark.anyio
+async def test_caches_stats(  # noqa: WPS218
+    client: AsyncClient, fastapi_app: FastAPI, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    """
+    Checks that the lookups of a restaurant show up in the cache counters.
+
+    :param client: client for the app.
+    :param fastapi_app: current FastAPI application.
+    """
+    monkeypatch.setattr(settings, "restaurant_cache_size", 100)
+    monkeypatch.setattr(settings, "single_flight_enabled", value=True)
+    setup_caches(fastapi_app)
+    url = fastapi_app.url_path_for("get_restaurants_by_id", restaurant_id="missing")
+    for _ in range(2):
+        response = await client.get(url)
+        assert response.status_code == status.HTTP_404_NOT_FOUND
+
+    response = await client.get(fastapi_app.url_path_for("caches_stats"))
+    assert response.status_code == status.HTTP_200_OK
+    restaurants_stats = response.json()["restaurants"]
+    assert restaurants_stats["hits"] == 1
+    assert restaurants_stats["misses"] == 1
+    assert restaurants_stats["memory_size"] > 0
+    assert response.json()["single_flight"]["calls"] == 1
+    assert response.json()["tiles"] is None
+
+
+@pytest.mark.anyio
+async def test_read_after_lsn(client: AsyncClient, fastapi_app: FastAPI) -> None:
+    """
+    Checks that reads after a write position are answered without replicas.
+
+    :param client: client for the app.
+    :param fastapi_app: current FastAPI application.
+    """
+    url = fastapi_app.url_path_for("get_all_restaurants")
+    response = await client.get(url, headers={READ_AFTER_LSN_HEADER: "0/16B3748"})
+    assert response.status_code == status.HTTP_200_OK
+    assert WRITE_LSN_HEADER not in response.headers
+
+    response = await client.get(url, headers={READ_AFTER_LSN_HEADER: "latest"})
+    assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+
+    response = await client.get(fastapi_app.url_path_for("replicas_stats"))
+    assert not response.json()
+
+
+@pytest.mark.anyio
+async def test_metrics(client: AsyncClient, fastapi_app: FastAPI) -> None:
+    """
+    Checks that the requests and queries show up in the metrics.
+
+    :param client: client for the app.
+    :param fastapi_app: current FastAPI application.
+    """
+    url = fastapi_app.url_path_for("get_restaurants_by_id", restaurant_id="missing")
+    response = await client.get(url)
+    assert response.status_code == status.HTTP_404_NOT_FOUND
+
+    response = await client.get(fastapi_app.url_path_for("metrics"))
+    assert response.status_code == status.HTTP_200_OK
+    assert response.headers["content-type"].startswith("text/plain")
+    assert (
+        'http_request_duration_seconds_count{method="GET",'
+        'route="/api/restaurants/{restaurant_id}",status="404"}'
+    ) in response.text
+    assert 'repository_query_duration_seconds_count{method="get"}' in response.text
+
+
+@pytest.mark.anyio
+async def test_query_tracing(  # noqa: WPS218
+    dbpool: AsyncConnectionPool,
+    caplog: pytest.LogCaptureFixture,
+) -> None:
+    """
+    Checks that the statements are timed and the slow ones logged with their plan.
+
+    :param dbpool: pool of the test database.
+    """
+    pool = AsyncConnectionPool(
+        conninfo=str(settings.db_url),
+        kwargs={"row_factory": dict_row},
+        configure=instrument_connection,
+    )
+    await pool.wait()
+    repository = PsycopgRestaurantRepository(pool, timed_connections=True)
+    query_trace = QueryTrace()
+    token = current_trace.set(query_trace)
+    enable_slow_query_log(SlowQueryLog(threshold=0, sample_rate=1))
+    try:
+        with caplog.at_level(logging.WARNING):
+            await repository.get_statistics(19.4373, -99.1278, 1000)
+    finally:
+        enable_slow_query_log(None)
+        current_trace.reset(token)
+        await pool.close()
+
+    assert query_trace.wait > 0
+    assert query_trace.execute > 0
+    assert query_trace.rows == 1
+    assert "restaurants" in next(iter(query_trace.statements))
+    assert "Slow query took" in caplog.text
+    assert "Plan:" in caplog.text
+    assert "latitude: float" in caplog.text
+
+
+@pytest.mark.parametrize(
+    "workers_count,max_size,expected_max,expected_min",
+    [
+        (1, None, 20, 2),
+        (4, None, 5, 2),
+        (4, 3, 3, 2),
+        (30, None, 1, 1),
+    ],
+)
+def test_pool_budget_split(
+    workers_count: int,
+    max_size: Optional[int],
+    expected_max: int,
+    expected_min: int,
+) -> None:
+    """Checks that the connections budget is split between the workers."""
+    pool_settings = Settings(
+        workers_count=workers_count,
+        db_pool_connections_budget=20,
+        db_pool_min_size=2,
+        db_pool_max_size=max_size,
+    )
+    assert pool_settings.db_pool_worker_max_size == expected_max
+    assert pool_settings.db_pool_worker_min_size == expected_min
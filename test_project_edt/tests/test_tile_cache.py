@@ -0,0 +1,120 @@
+from dataclasses import asdict
+from pathlib import Path
+
+import pytest
+
+from test_project_edt.db.models.restaurant import Restaurant, UpdatedRestaurant
+from test_project_edt.entities.common import Tile
+from test_project_edt.entities.restaurant import ChangeOperation, RestaurantChange
+from test_project_edt.repository.restaurant_repository_decorator import (
+    RestaurantRepositoryDecorator,
+)
+from test_project_edt.repository.tile_cache_repository import (
+    TileCache,
+    TileCacheRepository,
+    tile_etag,
+    tiles_around,
+)
+
+CENTRO = Tile(10, 230, 455)
+
+
+class MovingRepository(RestaurantRepositoryDecorator):
+    """Repository whose restaurant moves to the location of the update."""
+
+    def __init__(self) -> None:
+        super().__init__(None)  # type: ignore
+        self.restaurant = Restaurant(id="one", lat=19.4326, lng=-99.1332, rating=1)
+
+    async def update(
+        self,
+        restaurant_id: str,
+        restaurant_data: Restaurant,
+    ) -> UpdatedRestaurant | None:
+        previous = self.restaurant
+        self.restaurant = restaurant_data
+        return UpdatedRestaurant(
+            **asdict(restaurant_data),
+            old_lat=previous.lat,
+            old_lng=previous.lng,
+        )
+
+
+@pytest.fixture
+def tile_cache(tmp_path: Path) -> TileCache:
+    return TileCache(max_size=10, directory=str(tmp_path))
+
+
+def test_tiles_around() -> None:
+    tiles = list(tiles_around(19.4326, -99.1332))
+    assert tiles[0] == Tile(0, 0, 0)
+    assert CENTRO in tiles
+    zooms = {tile.zoom for tile in tiles}
+    assert zooms == set(range(23))
+    assert all(tile.exists for tile in tiles)
+
+    # Close to a corner, the neighbour tiles may show the point.
+    corner_tiles = [tile for tile in tiles_around(0, 0) if tile.zoom == 1]
+    assert sorted(corner_tiles) == [
+        Tile(1, 0, 0),
+        Tile(1, 0, 1),
+        Tile(1, 1, 0),
+        Tile(1, 1, 1),
+    ]
+
+
+@pytest.mark.anyio
+async def test_tile_cache_eviction(tile_cache: TileCache) -> None:  # noqa: WPS218
+    first = await tile_cache.store(Tile(0, 0, 0), b"first", tile_cache.generation)
+    assert first is not None
+    assert first.path.read_bytes() == b"first"
+    assert first.etag == tile_etag(b"first")
+
+    await tile_cache.store(Tile(1, 0, 0), b"second", tile_cache.generation)
+    assert tile_cache.lookup(Tile(0, 0, 0)) is None
+    assert tile_cache.lookup(Tile(1, 0, 0)) is not None
+    assert tile_cache.stats()["size"] == len(b"second")
+    assert tile_cache.stats()["evictions"] == 1
+
+    assert await tile_cache.store(CENTRO, b"more than ten bytes", 0) is None
+    tile_cache.close()
+    assert not list(first.path.parent.parent.iterdir())
+
+
+@pytest.mark.anyio
+async def test_tile_cache_invalidation(tile_cache: TileCache) -> None:
+    generation = tile_cache.generation
+    await tile_cache.store(CENTRO, b"centro", generation)
+    await tile_cache.store(Tile(10, 0, 0), b"corner", generation)
+
+    tile_cache.apply_change(
+        RestaurantChange(
+            seq=1,
+            op=ChangeOperation.UPDATE,
+            id="one",
+            lat=19.4327,
+            lng=-99.1333,
+            old_lat=19.4326,
+            old_lng=-99.1332,
+        ),
+    )
+    assert tile_cache.lookup(CENTRO) is None
+    assert tile_cache.lookup(Tile(10, 0, 0)) is not None
+    # Tiles rendered before the change aren't stored.
+    assert await tile_cache.store(CENTRO, b"stale", generation) is None
+
+    tile_cache.apply_change(RestaurantChange(seq=2, op=ChangeOperation.BULK))
+    assert not len(tile_cache)
+
+
+@pytest.mark.anyio
+async def test_tile_cache_repository(tile_cache: TileCache) -> None:
+    repository = TileCacheRepository(MovingRepository(), tile_cache)
+    await tile_cache.store(CENTRO, b"centro", tile_cache.generation)
+
+    await repository.update(
+        "one",
+        Restaurant(id="one", lat=20.6597, lng=-103.3496, rating=1),
+    )
+    # The tile of the location before the update is removed.
+    assert tile_cache.lookup(CENTRO) is None
@@ -1,7 +1,14 @@
-from fastapi import APIRouter
+from typing import Any, Dict, List, Optional
+
+from fastapi import APIRouter, Request, Response
+
+from test_project_edt.metrics import render_metrics
 
 router = APIRouter()
 
+# Counters of a cache, null when the cache is disabled.
+CacheStats = Optional[Dict[str, float]]
+
 
 @router.get("/health")
 def health_check() -> None:
@@ -10,3 +17,47 @@ def health_check() -> None:
 
     It returns 200 if the project is healthy.
     """
+
+
+@router.get("/caches")
+def caches_stats(request: Request) -> Dict[str, CacheStats]:
+    """
+    Returns the counters of the caches of the worker that answers.
+
+    Disabled caches are reported as null. The reads coalesced by the
+    worker are reported as well, each one is a query saved.
+    """
+    statistics_cache = request.app.state.statistics_cache
+    restaurant_cache = request.app.state.restaurant_cache
+    tile_cache = request.app.state.tile_cache
+    single_flight = request.app.state.single_flight
+    return {
+        "statistics": statistics_cache and statistics_cache.cache.stats(),
+        "restaurants": restaurant_cache and restaurant_cache.cache.stats(),
+        "tiles": tile_cache and tile_cache.stats(),
+        "single_flight": single_flight and single_flight.stats(),
+    }
+
+
+@router.get("/replicas")
+def replicas_stats(request: Request) -> List[Dict[str, Any]]:
+    """
+    Returns the status of the read replicas seen by the worker that answers.
+
+    Replicas that aren't healthy don't receive any read.
+    """
+    replicas = request.app.state.db_replicas
+    return replicas.stats() if replicas is not None else []
+
+
+@router.get("/monitoring/metrics", response_class=Response)
+def metrics() -> Response:
+    """
+    Returns the metrics of every worker in the Prometheus text format.
+
+    The values of the workers are aggregated when they share
+    a PROMETHEUS_MULTIPROC_DIR, otherwise only the ones of the
+    worker that answers are returned.
+    """
+    content, media_type = render_metrics()
+    return Response(content=content, media_type=media_type)
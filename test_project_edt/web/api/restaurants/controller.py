@@ -1,30 +1,103 @@
-from typing import List
+from typing import Dict, List, Optional, Tuple
 
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Request, Response, status
+from fastapi.responses import FileResponse, StreamingResponse
 
-from test_project_edt.db.dependencies import inject_repository
+from test_project_edt.db.dependencies import get_tile_cache, inject_repository
 from test_project_edt.db.models.restaurant import Restaurant
-from test_project_edt.db.models.statistics import Statistics
-from test_project_edt.entities.common import PaginationParams
+from test_project_edt.db.models.statistics import RegionStatistics, Statistics
+from test_project_edt.entities.common import (
+    ClusterParams,
+    ExportParams,
+    NearestParams,
+    PaginationParams,
+    SearchParams,
+    Tile,
+)
+from test_project_edt.entities.http_entities import ClientError, ClientErrorType
 from test_project_edt.entities.restaurant import (
     CreateRestaurantValidator,
+    FeedFormat,
+    ImportConflictPolicy,
+    ImportResult,
+    NearbyRestaurant,
+    RestaurantCluster,
+    RestaurantMatch,
     UpdateRestaurantValidator,
 )
+from test_project_edt.entities.restaurant_feed import (
+    RestaurantFeed,
+    csv_chunks,
+    ndjson_chunks,
+)
+from test_project_edt.entities.statistics import RegionLevel, StatisticsBatchRequest
+from test_project_edt.repository.pyscopg_restaurant_repository import RESTAURANT_FIELDS
 from test_project_edt.repository.resturant_repository_protocol import (
     RestaurantRepository,
 )
+from test_project_edt.repository.tile_cache_repository import (
+    CachedTile,
+    TileCache,
+    tile_etag,
+)
+from test_project_edt.settings import settings
 
 router = APIRouter()
 
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+JSON_MEDIA_TYPE = "application/json"
+TILE_MEDIA_TYPE = "application/vnd.mapbox-vector-tile"
+
+IMPORT_MEDIA_TYPES = {
+    "text/csv": FeedFormat.CSV,
+    "application/x-ndjson": FeedFormat.NDJSON,
+    "application/jsonl": FeedFormat.NDJSON,
+}
+IMPORT_MEDIA_TYPES_LIST = ", ".join(IMPORT_MEDIA_TYPES)
+
+CLIENT_ERROR_STATUS = {
+    ClientErrorType.INVALID_INPUT: status.HTTP_422_UNPROCESSABLE_ENTITY,
+    ClientErrorType.UNAUTHORIZED: status.HTTP_401_UNAUTHORIZED,
+    ClientErrorType.FORBIDDEN: status.HTTP_403_FORBIDDEN,
+    ClientErrorType.NOT_FOUND: status.HTTP_404_NOT_FOUND,
+    ClientErrorType.CONFLICT: status.HTTP_409_CONFLICT,
+}
+
+
+def set_next_cursor(
+    response: Response,
+    params: PaginationParams,
+    last_restaurant: Restaurant,
+) -> None:
+    """Send the cursor of the page that follows a full one."""
+    response.headers[NEXT_CURSOR_HEADER] = params.next_cursor(last_restaurant)
+
 
 @router.get("/restaurants")
 async def get_all_restaurants(
+    response: Response,
     repository: RestaurantRepository = Depends(inject_repository),
     params: PaginationParams = Depends(),
 ) -> List[Restaurant]:
-    """Retrieve a list of restaurants with optional pagination parameters."""
+    """Retrieve a list of restaurants with optional pagination parameters.
+
+    When the page is full, the `X-Next-Cursor` header contains the cursor
+    of the following page."""
+
+    # The body rendered by the database is sent without being parsed,
+    # the return annotation still documents it in the schema.
+    if settings.restaurants_list_json_passthrough:
+        page = await repository.get_all_json(params)
+        rendered = Response(content=page.body, media_type=JSON_MEDIA_TYPE)
+        if page.count == params.limit and page.last is not None:
+            set_next_cursor(rendered, params, page.last)
+        return rendered
+
+    restaurants = await repository.get_all(params)
+    if len(restaurants) == params.limit:
+        set_next_cursor(response, params, restaurants[-1])
 
-    return await repository.get_all(params)
+    return restaurants
 
 
 @router.get("/restaurants/statistics")
@@ -39,19 +112,215 @@ async def get_restaurants_statistics(
     return await repository.get_statistics(latitude, longitude, radius)
 
 
+@router.post("/restaurants/statistics/batch")
+async def get_restaurants_statistics_batch(
+    batch: StatisticsBatchRequest,
+    repository: RestaurantRepository = Depends(inject_repository),
+) -> List[List[Statistics]]:
+    """Return the statistics of many circles at once.
+
+    The response contains a list per requested point with the statistics
+    of each of its radii, in the order they were requested."""
+    return await repository.get_statistics_many(batch.points)
+
+
+@router.get("/restaurants/statistics/by-region")
+async def get_restaurants_statistics_by_region(
+    level: RegionLevel = RegionLevel.STATE,
+    repository: RestaurantRepository = Depends(inject_repository),
+) -> List[RegionStatistics]:
+    """Return the statistics of the ratings of every state or city.
+
+    Besides the amount, the average and the standard deviation of the
+    ratings, every region has the amount of restaurants with each rating
+    from 0 to 4. They are read from aggregates the database keeps up to
+    date, so they cost the same however many restaurants there are."""
+    return await repository.get_region_statistics(level)
+
+
+@router.get("/restaurants/export", response_class=StreamingResponse)
+async def export_restaurants(
+    params: ExportParams = Depends(),
+    repository: RestaurantRepository = Depends(inject_repository),
+) -> StreamingResponse:
+    """Download the restaurants matching the filters as NDJSON or CSV.
+
+    The document is streamed while it is read from the database."""
+    rows_chunks = repository.export(params, settings.export_chunk_size)
+    if params.format == FeedFormat.CSV:
+        return StreamingResponse(
+            csv_chunks(rows_chunks, RESTAURANT_FIELDS),
+            media_type="text/csv",
+        )
+    return StreamingResponse(
+        ndjson_chunks(rows_chunks, RESTAURANT_FIELDS),
+        media_type="application/x-ndjson",
+    )
+
+
+@router.get("/restaurants/search")
+async def search_restaurants(
+    response: Response,
+    params: SearchParams = Depends(),
+    repository: RestaurantRepository = Depends(inject_repository),
+) -> List[RestaurantMatch]:
+    """Find the restaurants whose name, city or state match a text.
+
+    Words starting with the text or with a few typos match as well, the
+    results are sorted from the best match. When the page is full, the
+    `X-Next-Cursor` header contains the cursor of the following page."""
+    matches = await repository.search(params)
+    if len(matches) == params.limit:
+        last = matches[-1]
+        response.headers[NEXT_CURSOR_HEADER] = params.next_cursor(
+            last.rank,
+            last.restaurant.id,
+        )
+    return matches
+
+
+@router.get("/restaurants/nearest")
+async def get_nearest_restaurants(
+    response: Response,
+    params: NearestParams = Depends(),
+    repository: RestaurantRepository = Depends(inject_repository),
+) -> List[NearbyRestaurant]:
+    """Find the k restaurants closest to a point.
+
+    The distances are in meters and the results are sorted from the
+    closest one. When the page is full, the `X-Next-Cursor` header
+    contains the cursor of the following k restaurants."""
+    restaurants = await repository.nearest(params)
+    if len(restaurants) == params.k:
+        last = restaurants[-1]
+        response.headers[NEXT_CURSOR_HEADER] = params.next_cursor(
+            last.distance,
+            last.restaurant.id,
+        )
+    return restaurants
+
+
+@router.get("/restaurants/clusters")
+async def get_restaurant_clusters(
+    params: ClusterParams = Depends(),
+    repository: RestaurantRepository = Depends(inject_repository),
+) -> List[RestaurantCluster]:
+    """Group the restaurants of a map viewport in the cells of a grid.
+
+    The cells get smaller as the zoom grows, every one of them has the
+    centroid, the amount and the average rating of its restaurants. The
+    cells with only a few restaurants list them as well."""
+    return await repository.clusters(
+        params,
+        settings.cluster_restaurants_threshold,
+    )
+
+
+def tile_headers(etag: str) -> Dict[str, str]:
+    """Headers that let the clients and the CDNs cache a tile."""
+    return {
+        "ETag": etag,
+        "Cache-Control": f"public, max-age={settings.tile_max_age}",
+    }
+
+
+def tile_not_modified(request: Request, etag: str) -> bool:
+    """Whether the client already has the tile with the entity tag."""
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is None:
+        return False
+    tags = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+    return etag in tags or "*" in tags
+
+
+def path_tile(zoom: int, column: int, row: int) -> Tile:
+    """Tile of the path, answered with a 404 when it isn't in the map."""
+    tile = Tile(zoom, column, row)
+    if not tile.exists:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Tile {zoom}/{column}/{row} not found",
+        )
+    return tile
+
+
+async def rendered_tile(
+    tile: Tile,
+    repository: RestaurantRepository,
+    tile_cache: Optional[TileCache],
+) -> Tuple[bytes, Optional[CachedTile]]:
+    """
+    Render a tile, or find its file in the cache.
+
+    :return: the rendered tile, empty when it was cached, and its file.
+    """
+    if tile_cache is None:
+        return await repository.tile(tile), None
+    cached_tile = tile_cache.lookup(tile)
+    if cached_tile is not None:
+        return b"", cached_tile
+    generation = tile_cache.generation
+    body = await repository.tile(tile)
+    return body, await tile_cache.store(tile, body, generation)
+
+
+@router.get(
+    "/restaurants/tiles/{zoom}/{column}/{row}.mvt",
+    response_class=Response,
+    responses={status.HTTP_200_OK: {"content": {TILE_MEDIA_TYPE: {}}}},
+)
+async def get_restaurant_tile(
+    request: Request,
+    tile: Tile = Depends(path_tile),
+    repository: RestaurantRepository = Depends(inject_repository),
+    tile_cache: Optional[TileCache] = Depends(get_tile_cache),
+) -> Response:
+    """Render the restaurants of a map tile as a Mapbox Vector Tile.
+
+    The tile has a `restaurants` layer with the id, the name and the
+    rating of every restaurant. Rendered tiles are kept in a cache on
+    disk until a restaurant they show changes."""
+    body, cached_tile = await rendered_tile(tile, repository, tile_cache)
+    etag = tile_etag(body) if cached_tile is None else cached_tile.etag
+
+    if tile_not_modified(request, etag):
+        return Response(
+            status_code=status.HTTP_304_NOT_MODIFIED,
+            headers=tile_headers(etag),
+        )
+    if cached_tile is None:
+        return Response(
+            content=body,
+            media_type=TILE_MEDIA_TYPE,
+            headers=tile_headers(etag),
+        )
+    return FileResponse(
+        cached_tile.path,
+        media_type=TILE_MEDIA_TYPE,
+        headers=tile_headers(etag),
+        stat_result=cached_tile.stat_result,
+    )
+
+
 @router.get("/restaurants/{restaurant_id}")
 async def get_restaurants_by_id(
     restaurant_id: str,
     repository: RestaurantRepository = Depends(inject_repository),
 ) -> Restaurant:
     """Retrieve a restaurant by its unique identifier."""
-    result = await repository.get(restaurant_id)
+    result: Restaurant | bytes | None
+    if settings.restaurant_detail_json_passthrough:
+        result = await repository.get_json(restaurant_id)
+    else:
+        result = await repository.get(restaurant_id)
     if not result:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail=f"Restaurant {restaurant_id} not found",
         )
 
+    if isinstance(result, bytes):
+        return Response(content=result, media_type=JSON_MEDIA_TYPE)
     return result
 
 
@@ -64,6 +333,54 @@ async def add_restaurant(
     return await repository.add(Restaurant(**restaurant_information.model_dump()))
 
 
+@router.post(
+    "/restaurants/bulk",
+    openapi_extra={
+        "requestBody": {
+            "required": True,
+            "content": {
+                media_type: {"schema": {"type": "string"}}
+                for media_type in IMPORT_MEDIA_TYPES
+            },
+        },
+    },
+)
+async def bulk_add_restaurants(
+    request: Request,
+    on_conflict: ImportConflictPolicy = ImportConflictPolicy.FAIL,
+    repository: RestaurantRepository = Depends(inject_repository),
+) -> ImportResult:
+    """Import many restaurants from a CSV or NDJSON document.
+
+    The body is validated and copied to the database while it is received.
+    Restaurants with an existing identifier are updated when `on_conflict`
+    is `upsert`, otherwise the whole import is rejected."""
+    content_type = request.headers.get("content-type", "")
+    media_type = content_type.split(";")[0].strip()
+    if media_type not in IMPORT_MEDIA_TYPES:
+        raise HTTPException(
+            status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+            detail=f"the content type must be one of {IMPORT_MEDIA_TYPES_LIST}",
+        )
+
+    feed = RestaurantFeed(request.stream(), IMPORT_MEDIA_TYPES[media_type])
+    try:
+        result = await repository.bulk_add(
+            feed.restaurants(),
+            on_conflict,
+            settings.bulk_import_batch_size,
+        )
+    except ClientError as error:
+        raise HTTPException(
+            status_code=CLIENT_ERROR_STATUS[error.client_error_type],
+            detail=error.message,
+        )
+
+    result.rejected = feed.rejected
+    result.errors = feed.errors
+    return result
+
+
 @router.patch("/restaurants/{restaurant_id}", status_code=status.HTTP_204_NO_CONTENT)
 async def update_restaurant(
     restaurant_id: str,
@@ -71,9 +388,14 @@ async def update_restaurant(
     repository: RestaurantRepository = Depends(inject_repository),
 ):
     """Update an existing restaurant's information based on its unique identifier."""
-    await repository.update(
+    restaurant = await repository.update(
         restaurant_id, Restaurant(**restaurant_information.model_dump())
     )
+    if restaurant is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Restaurant {restaurant_id} not found",
+        )
 
 
 @router.delete("/restaurants/{restaurant_id}", status_code=status.HTTP_204_NO_CONTENT)
@@ -82,4 +404,8 @@ async def delete_restaurant(
     repository: RestaurantRepository = Depends(inject_repository),
 ):
     """Delete a restaurant based on its unique identifier."""
-    await repository.delete(restaurant_id)
+    if await repository.delete(restaurant_id) is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Restaurant {restaurant_id} not found",
+        )
@@ -7,7 +7,10 @@ from test_project_edt.web.api.router import api_router
 from test_project_edt.web.lifetime import (
     register_shutdown_event,
     register_startup_event,
+    setup_caches,
 )
+from test_project_edt.web.middlewares import WriteLsnMiddleware
+from test_project_edt.web.route_metrics import instrument_routes
 
 
 def get_app() -> FastAPI:
@@ -27,11 +30,21 @@ def get_app() -> FastAPI:
         default_response_class=UJSONResponse,
     )
 
+    # Caches shared by the requests of the worker.
+    setup_caches(app)
+    # Opened on startup when read replicas are configured.
+    app.state.db_replicas = None
+
+    # Tells the clients the position of their writes.
+    app.add_middleware(WriteLsnMiddleware)
+
     # Adds startup and shutdown events.
     register_startup_event(app)
     register_shutdown_event(app)
 
     # Main router for the API.
     app.include_router(router=api_router, prefix="/api")
+    # Measures the requests of every route.
+    instrument_routes(app)
 
     return app
@@ -1,85 +1,252 @@
+import asyncio
 import logging
+import os
+import time
 from typing import Awaitable, Callable
 
 from fastapi import FastAPI
-from opentelemetry.exporter.otlp.proto.grpc.trace_exporter import OTLPSpanExporter
-from opentelemetry.instrumentation.fastapi import FastAPIInstrumentor
-from opentelemetry.instrumentation.logging import LoggingInstrumentor
-from opentelemetry.sdk.resources import (
-    DEPLOYMENT_ENVIRONMENT,
-    SERVICE_NAME,
-    TELEMETRY_SDK_LANGUAGE,
-    Resource,
-)
-from opentelemetry.sdk.trace import TracerProvider
-from opentelemetry.sdk.trace.export import BatchSpanProcessor
-from opentelemetry.trace import set_tracer_provider
 from psycopg.rows import dict_row
 from psycopg_pool import AsyncConnectionPool
 
+from test_project_edt.db.change_listener import RestaurantChangeListener
+from test_project_edt.db.query_tracing import (
+    SlowQueryLog,
+    enable_slow_query_log,
+    instrument_connection,
+)
+from test_project_edt.db.replicas import ReplicaPools
+from test_project_edt.metrics import EVENT_LOOP_LAG, mark_worker_dead, record_pool_stats
+from test_project_edt.repository.lru_cache import LRUCache
+from test_project_edt.repository.restaurant_cache_repository import (
+    RestaurantCache,
+    restaurant_size,
+)
+from test_project_edt.repository.single_flight_repository import SingleFlight
+from test_project_edt.repository.statistics_cache_repository import StatisticsCache
+from test_project_edt.repository.tile_cache_repository import TileCache
 from test_project_edt.settings import settings
 
 
-async def create_connection_pool() -> AsyncConnectionPool:
-    return AsyncConnectionPool(
+async def _setup_db(app: FastAPI) -> None:
+    """
+    Creates the connection pool shared by every request of this worker.
+
+    The pool is filled up to its minimum size before the worker
+    starts to accept requests, so the first requests don't pay
+    for the connection handshakes. Each read replica gets a pool
+    of its own with the same limits.
+
+    When the queries are instrumented, the connections use cursors
+    that time their statements.
+
+    :param app: current application.
+    """
+    configure = None
+    if settings.db_queries_instrumented:
+        configure = instrument_connection
+    if settings.db_slow_query_threshold > 0:
+        enable_slow_query_log(
+            SlowQueryLog(
+                threshold=settings.db_slow_query_threshold,
+                sample_rate=settings.db_slow_query_sample_rate,
+            ),
+        )
+
+    pool = AsyncConnectionPool(
         conninfo=str(settings.db_url),
         kwargs={"row_factory": dict_row},
+        configure=configure,
+        min_size=settings.db_pool_worker_min_size,
+        max_size=settings.db_pool_worker_max_size,
+        max_idle=settings.db_pool_max_idle,
+        max_lifetime=settings.db_pool_max_lifetime,
+        timeout=settings.db_pool_timeout,
+        open=False,
     )
+    await pool.open(wait=True, timeout=settings.db_pool_timeout)
+    app.state.db_pool = pool
+
+    if settings.db_replica_urls:
+        replicas = ReplicaPools(
+            pool,
+            [
+                AsyncConnectionPool(
+                    conninfo=replica_url,
+                    kwargs={"row_factory": dict_row},
+                    configure=configure,
+                    min_size=settings.db_pool_worker_min_size,
+                    max_size=settings.db_pool_worker_max_size,
+                    max_idle=settings.db_pool_max_idle,
+                    max_lifetime=settings.db_pool_max_lifetime,
+                    timeout=settings.db_pool_timeout,
+                    open=False,
+                )
+                for replica_url in settings.db_replica_urls
+            ],
+            routing=settings.db_replica_routing,
+            max_lag=settings.db_replica_max_lag,
+        )
+        await replicas.open(
+            timeout=settings.db_pool_timeout,
+            check_interval=settings.db_replica_check_interval,
+        )
+        app.state.db_replicas = replicas
 
 
-async def retrieve_db_pool() -> AsyncConnectionPool:
-    pool = await create_connection_pool()
-    return pool
+def setup_caches(app: FastAPI) -> None:
+    """
+    Creates the in-process caches of the worker.
 
+    The caches don't need any connection, so they are created
+    along with the application instead of on startup.
 
-def setup_opentelemetry(app: FastAPI) -> None:  # pragma: no cover
+    :param app: current application.
     """
-    Enables opentelemetry instrumentation.
+    app.state.statistics_cache = None
+    if settings.statistics_cache_size > 0:
+        app.state.statistics_cache = StatisticsCache(
+            LRUCache(
+                maxsize=settings.statistics_cache_size,
+                ttl=settings.statistics_cache_ttl,
+            ),
+            coordinates_precision=settings.statistics_cache_coordinates_precision,
+            radius_step=settings.statistics_cache_radius_step,
+        )
+    app.state.restaurant_cache = None
+    if settings.restaurant_cache_size > 0:
+        app.state.restaurant_cache = RestaurantCache(
+            LRUCache(
+                maxsize=settings.restaurant_cache_size,
+                ttl=settings.restaurant_cache_ttl,
+                sizeof=restaurant_size,
+            ),
+            negative_ttl=settings.restaurant_cache_negative_ttl,
+        )
+    # The directory of the tiles is only created along with the first one.
+    app.state.tile_cache = None
+    if settings.tile_cache_size > 0:
+        app.state.tile_cache = TileCache(
+            max_size=settings.tile_cache_size,
+            directory=settings.tile_cache_dir,
+        )
+    # Loaded on startup, since it is read from the database.
+    app.state.restaurant_snapshot = None
+    app.state.single_flight = None
+    if settings.single_flight_enabled:
+        app.state.single_flight = SingleFlight()
+
+
+async def _setup_change_listener(app: FastAPI) -> None:  # pragma: no cover
+    """
+    Starts listening to the changes of the restaurants.
+
+    The caches of the worker drop the entries changed by any worker,
+    instead of waiting for them to expire.
 
     :param app: current application.
     """
-    if not settings.opentelemetry_endpoint:
+    app.state.change_listener = None
+    if not settings.change_listener_enabled:
         return
 
-    tracer_provider = TracerProvider(
-        resource=Resource(
-            attributes={
-                SERVICE_NAME: "test_project_edt",
-                TELEMETRY_SDK_LANGUAGE: "python",
-                DEPLOYMENT_ENVIRONMENT: settings.environment,
-            },
-        ),
+    listener = RestaurantChangeListener(
+        str(settings.db_url),
+        reconnect_delay=settings.change_listener_reconnect_delay,
+        retention=settings.change_log_retention,
     )
-
-    tracer_provider.add_span_processor(
-        BatchSpanProcessor(
-            OTLPSpanExporter(
-                endpoint=settings.opentelemetry_endpoint,
-                insecure=True,
-            ),
-        ),
+    caches = (
+        app.state.statistics_cache,
+        app.state.restaurant_cache,
+        app.state.tile_cache,
+        app.state.single_flight,
     )
+    for cache in caches:
+        if cache is not None:
+            listener.subscribe(cache.apply_change)
+    try:
+        await asyncio.wait_for(listener.start(), timeout=settings.db_pool_timeout)
+    except asyncio.TimeoutError:
+        logging.warning("The changes listener isn't connected yet, retrying")
+    app.state.change_listener = listener
+
+
+async def _setup_snapshot(app: FastAPI) -> None:  # pragma: no cover
+    """
+    Loads the restaurants snapshot and keeps it up to date.
+
+    The snapshot is reloaded periodically, and as soon as
+    possible once a write has made it stale.
 
-    excluded_endpoints = [
-        app.url_path_for("health_check"),
-        app.url_path_for("openapi"),
-        app.url_path_for("swagger_ui_html"),
-        app.url_path_for("swagger_ui_redirect"),
-        app.url_path_for("redoc_html"),
-    ]
-
-    FastAPIInstrumentor().instrument_app(
-        app,
-        tracer_provider=tracer_provider,
-        excluded_urls=",".join(excluded_endpoints),
+    :param app: current application.
+    """
+    app.state.restaurant_snapshot_refresher = None
+    if not settings.statistics_snapshot_enabled:
+        return
+
+    from test_project_edt.repository.restaurant_snapshot import (  # noqa: WPS433
+        RestaurantSnapshot,
     )
-    LoggingInstrumentor().instrument(
-        tracer_provider=tracer_provider,
-        set_logging_format=True,
-        log_level=logging.getLevelName(settings.log_level.value),
+
+    snapshot = RestaurantSnapshot(cell_size=settings.statistics_snapshot_cell_size)
+    # Changes received while loading are replayed over the loaded content.
+    if app.state.change_listener is not None:
+        app.state.change_listener.subscribe(snapshot.apply_change)
+    await snapshot.reload(app.state.db_pool)
+    app.state.restaurant_snapshot = snapshot
+    app.state.restaurant_snapshot_refresher = asyncio.create_task(
+        snapshot.refresh(
+            app.state.db_pool,
+            settings.statistics_snapshot_refresh_interval,
+        ),
     )
 
-    set_tracer_provider(tracer_provider=tracer_provider)
+
+def _record_pools_stats(app: FastAPI) -> None:  # pragma: no cover
+    record_pool_stats("primary", app.state.db_pool)
+    if app.state.db_replicas is not None:
+        for position, replica in enumerate(app.state.db_replicas.replicas):
+            record_pool_stats(f"replica-{position}", replica.pool)
+
+
+def _setup_metrics_sampler(app: FastAPI) -> None:  # pragma: no cover
+    """
+    Samples the event loop lag and the statistics of the pools.
+
+    The lag is how late the sampler wakes up, the time that other
+    callbacks held the event loop for.
+
+    :param app: current application.
+    """
+    interval = settings.metrics_sample_interval
+
+    async def _sample() -> None:  # noqa: WPS430
+        while True:
+            start = time.perf_counter()
+            await asyncio.sleep(interval)
+            EVENT_LOOP_LAG.observe(max(0, time.perf_counter() - start - interval))
+            try:
+                _record_pools_stats(app)
+            except Exception:
+                logging.exception("The statistics of the pools couldn't be sampled")
+
+    app.state.metrics_sampler = asyncio.create_task(_sample())
+
+
+def setup_opentelemetry(app: FastAPI) -> None:  # pragma: no cover
+    """
+    Enables opentelemetry instrumentation.
+
+    Opentelemetry is imported only when it is enabled, the exporter
+    and the instrumentors take longer to import than the application.
+
+    :param app: current application.
+    """
+    if not settings.opentelemetry_endpoint:
+        return
+
+    from test_project_edt.web import telemetry  # noqa: WPS433
+
+    telemetry.instrument(app)
 
 
 def stop_opentelemetry(app: FastAPI) -> None:  # pragma: no cover
@@ -91,7 +258,9 @@ def stop_opentelemetry(app: FastAPI) -> None:  # pragma: no cover
     if not settings.opentelemetry_endpoint:
         return
 
-    FastAPIInstrumentor().uninstrument_app(app)
+    from test_project_edt.web import telemetry  # noqa: WPS433
+
+    telemetry.uninstrument(app)
 
 
 def register_startup_event(
@@ -110,6 +279,10 @@ def register_startup_event(
     @app.on_event("startup")
     async def _startup() -> None:  # noqa: WPS430
         app.middleware_stack = None
+        await _setup_db(app)
+        await _setup_change_listener(app)
+        await _setup_snapshot(app)
+        _setup_metrics_sampler(app)
         setup_opentelemetry(app)
         app.middleware_stack = app.build_middleware_stack()
         pass  # noqa: WPS420
@@ -129,6 +302,16 @@ def register_shutdown_event(
 
     @app.on_event("shutdown")
     async def _shutdown() -> None:  # noqa: WPS430
+        app.state.metrics_sampler.cancel()
+        mark_worker_dead(os.getpid())
+        if app.state.restaurant_snapshot_refresher is not None:
+            app.state.restaurant_snapshot_refresher.cancel()
+        if app.state.change_listener is not None:
+            await app.state.change_listener.stop()
+        if app.state.tile_cache is not None:
+            app.state.tile_cache.close()
+        if app.state.db_replicas is not None:
+            await app.state.db_replicas.close()
         await app.state.db_pool.close()
         stop_opentelemetry(app)
         pass  # noqa: WPS420
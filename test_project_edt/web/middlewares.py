@@ -0,0 +1,33 @@
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from test_project_edt.db.replicas import WRITE_LSN_HEADER, format_lsn
+
+
+class WriteLsnMiddleware:
+    """
+    Sends the position of the writes of a request to the client.
+
+    Clients that send it back in the `X-Read-After-LSN` header
+    of their next requests are guaranteed to read their writes.
+    It is a plain ASGI middleware, so streamed responses are
+    passed through untouched.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        async def send_with_lsn(message: Message) -> None:  # noqa: WPS430
+            if message["type"] == "http.response.start":
+                read_position = scope.get("state", {}).get("read_position")
+                if read_position is not None and read_position.write_lsn is not None:
+                    headers = MutableHeaders(scope=message)
+                    headers[WRITE_LSN_HEADER] = format_lsn(read_position.write_lsn)
+            await send(message)
+
+        await self.app(scope, receive, send_with_lsn)
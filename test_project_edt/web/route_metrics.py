@@ -0,0 +1,94 @@
+import time
+
+from fastapi import FastAPI
+from fastapi.exceptions import RequestValidationError
+from starlette.exceptions import HTTPException
+from starlette.routing import Route
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from test_project_edt.metrics import (
+    HTTP_REQUEST_DURATION,
+    HTTP_REQUESTS_IN_FLIGHT,
+    LabelCache,
+)
+
+
+class _StatusRecorder:
+    """Send callable that keeps the status of the response it sends."""
+
+    def __init__(self, send: Send):
+        # Unless a response starts, the request failed.
+        self.status = "500"
+        self._send = send
+
+    async def __call__(self, message: Message) -> None:
+        if message["type"] == "http.response.start":
+            self.status = str(message["status"])
+        await self._send(message)
+
+
+def _error_status(error: Exception) -> str | None:
+    """
+    Status of the response the exception handlers give to an error.
+
+    The errors are answered by the exception handlers, outside the route.
+
+    :param error: the error raised by the route.
+    :return: the status, None when it isn't handled.
+    """
+    if isinstance(error, HTTPException):
+        return str(error.status_code)
+    if isinstance(error, RequestValidationError):
+        return "422"
+    return None
+
+
+def _instrument(app: ASGIApp, route: str) -> ASGIApp:
+    """
+    Measure the requests of a route.
+
+    The route is known beforehand, so the requests only look up
+    the children of the metrics by method and status.
+
+    :param app: the application of the route.
+    :param route: path of the route, used as label.
+    :return: the instrumented application.
+    """
+    in_flight = LabelCache(HTTP_REQUESTS_IN_FLIGHT)
+    durations = LabelCache(HTTP_REQUEST_DURATION)
+
+    async def instrumented(  # noqa: WPS430
+        scope: Scope,
+        receive: Receive,
+        send: Send,
+    ) -> None:
+        method = scope["method"]
+        recorder = _StatusRecorder(send)
+        in_flight(method, route).inc()
+        start = time.perf_counter()
+        try:
+            await app(scope, receive, recorder)
+        except Exception as error:
+            recorder.status = _error_status(error) or recorder.status
+            raise
+        finally:
+            durations(method, route, recorder.status).observe(
+                time.perf_counter() - start,
+            )
+            in_flight(method, route).dec()
+
+    return instrumented
+
+
+def instrument_routes(app: FastAPI) -> None:
+    """
+    Record the latency and the requests in flight of every route.
+
+    Each route is wrapped on its own instead of adding a middleware,
+    so no request has to find out which route it belongs to.
+
+    :param app: the application, with every route already included.
+    """
+    for route in app.routes:
+        if isinstance(route, Route):
+            route.app = _instrument(route.app, route.path)
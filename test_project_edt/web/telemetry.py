@@ -0,0 +1,79 @@
+"""
+Opentelemetry instrumentation of the application.
+
+The module is imported only when opentelemetry is enabled, the exporter
+and the instrumentors take longer to import than the application.
+"""
+import logging
+
+from fastapi import FastAPI
+from opentelemetry.exporter.otlp.proto.grpc.trace_exporter import OTLPSpanExporter
+from opentelemetry.instrumentation.fastapi import FastAPIInstrumentor
+from opentelemetry.instrumentation.logging import LoggingInstrumentor
+from opentelemetry.sdk.resources import (
+    DEPLOYMENT_ENVIRONMENT,
+    SERVICE_NAME,
+    TELEMETRY_SDK_LANGUAGE,
+    Resource,
+)
+from opentelemetry.sdk.trace import TracerProvider
+from opentelemetry.sdk.trace.export import BatchSpanProcessor
+from opentelemetry.trace import set_tracer_provider
+
+from test_project_edt.settings import settings
+
+
+def instrument(app: FastAPI) -> None:  # pragma: no cover
+    """
+    Instruments the application and the logging.
+
+    :param app: current application.
+    """
+    tracer_provider = TracerProvider(
+        resource=Resource(
+            attributes={
+                SERVICE_NAME: "test_project_edt",
+                TELEMETRY_SDK_LANGUAGE: "python",
+                DEPLOYMENT_ENVIRONMENT: settings.environment,
+            },
+        ),
+    )
+
+    tracer_provider.add_span_processor(
+        BatchSpanProcessor(
+            OTLPSpanExporter(
+                endpoint=settings.opentelemetry_endpoint,
+                insecure=True,
+            ),
+        ),
+    )
+
+    excluded_endpoints = [
+        app.url_path_for("health_check"),
+        app.url_path_for("openapi"),
+        app.url_path_for("swagger_ui_html"),
+        app.url_path_for("swagger_ui_redirect"),
+        app.url_path_for("redoc_html"),
+    ]
+
+    FastAPIInstrumentor().instrument_app(
+        app,
+        tracer_provider=tracer_provider,
+        excluded_urls=",".join(excluded_endpoints),
+    )
+    LoggingInstrumentor().instrument(
+        tracer_provider=tracer_provider,
+        set_logging_format=True,
+        log_level=logging.getLevelName(settings.log_level.value),
+    )
+
+    set_tracer_provider(tracer_provider=tracer_provider)
+
+
+def uninstrument(app: FastAPI) -> None:  # pragma: no cover
+    """
+    Removes the instrumentation of the application.
+
+    :param app: current application.
+    """
+    FastAPIInstrumentor().uninstrument_app(app)